@@ -12,13 +12,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
-import subprocess
 import tempfile
 import os
 from pathlib import Path
 from datetime import datetime
 import logging
 
+from llm.ops.async_pipeline import LLMWorkerPool, StageLimits, run_cmd
+from llm.ops.ts_service import shared_ts_service, shutdown_ts_services
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -80,6 +82,12 @@ class FortalezaAPI:
         # Garantir que diretórios existem
         self.memory_dir.mkdir(parents=True, exist_ok=True)
         
+        # Etapas externas com limites de concorrência; LLM em workers quentes (sem fork de CLI por pedido)
+        self.limits = StageLimits()
+        self.llm_pool = LLMWorkerPool(cwd=self.root_path)
+        # tsserver quente do workspace (fallback: tsc --noEmit --incremental a frio)
+        self.ts = shared_ts_service(self.root_path)
+        
         logger.info(f"Fortaleza API inicializada em {self.root_path}")
     
     async def fix_error(self, request: FixRequest) -> FixResponse:
@@ -137,14 +145,15 @@ class FortalezaAPI:
     async def run_pre_llm_pipeline(self, request: FixRequest) -> Dict[str, Any]:
         """Executa pipeline pré-LLM (ferramentas determinísticas)"""
         try:
-            # Executar make pre-llm
-            result = subprocess.run(
-                ["make", "pre-llm"],
-                cwd=self.root_path,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+            # Executar make pre-llm (não bloqueia o event loop)
+            result = await run_cmd(["make", "pre-llm"], cwd=self.root_path, timeout=60,
+                                   sem=self.limits("pre_llm"))
+            if result.timed_out:
+                return {
+                    "success": False,
+                    "method": "pipeline",
+                    "error": "Timeout na execução da pipeline"
+                }
             
             if result.returncode == 0:
                 # Verificar se o erro foi corrigido
@@ -164,12 +173,6 @@ class FortalezaAPI:
                     "error": result.stderr
                 }
                 
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "method": "pipeline",
-                "error": "Timeout na execução da pipeline"
-            }
         except Exception as e:
             return {
                 "success": False,
@@ -183,39 +186,22 @@ class FortalezaAPI:
             # Preparar input para LLM
             llm_input = self.prepare_llm_input(request)
             
-            # Executar LLM
-            result = subprocess.run(
-                ["python3", "-m", "fortaleza-llm.llm.cli"],
-                cwd=self.root_path,
-                input=json.dumps(llm_input),
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
-            
-            if result.returncode == 0:
-                try:
-                    llm_output = json.loads(result.stdout)
-                    return {
-                        "success": llm_output.get("success", False),
-                        "diff": llm_output.get("diff"),
-                        "method": "llm",
-                        "confidence": llm_output.get("confidence", 0.7)
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        "success": False,
-                        "method": "llm",
-                        "error": "Resposta inválida da LLM"
-                    }
-            else:
+            # Executar LLM em processo (worker com llm.cli já carregado)
+            llm_output = await self.llm_pool.run(llm_input, timeout=120)
+            if not isinstance(llm_output, dict):
                 return {
                     "success": False,
                     "method": "llm",
-                    "error": result.stderr
+                    "error": "Resposta inválida da LLM"
                 }
+            return {
+                "success": llm_output.get("success", False),
+                "diff": llm_output.get("diff"),
+                "method": "llm",
+                "confidence": llm_output.get("confidence", 0.7)
+            }
                 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             return {
                 "success": False,
                 "method": "llm",
@@ -243,27 +229,26 @@ class FortalezaAPI:
                 "workspace": request.context.workspace,
                 "timestamp": request.context.timestamp
             },
-            "mode": "fix"
+            "mode": "fix",
+            # formato consumido por llm.cli.handle_request
+            "logs": {
+                request.error.type or "tsc": (
+                    f"{request.error.file}({request.error.line},{request.error.column}): "
+                    f"error {request.error.code}: {request.error.message}"
+                )
+            }
         }
     
     async def check_errors_remaining(self, request: FixRequest) -> int:
         """Verifica quantos erros ainda existem"""
         try:
-            # Executar verificação rápida
-            result = subprocess.run(
-                ["npx", "tsc", "--noEmit"],
-                cwd=self.root_path,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            # Contar erros no output
-            error_lines = [line for line in result.stderr.split('\n') if 'error TS' in line]
-            return len(error_lines)
+            # tsserver quente: sincroniza o ficheiro do erro e pede diagnósticos do projeto
+            changed = [request.error.file] if request.error.file else []
+            async with self.limits("typecheck"):
+                return await asyncio.to_thread(self.ts.error_count, changed)
             
         except Exception:
-            return 1  # Assumir que ainda há erros
+            return 1  # Assumir que ainda há erros (inclui timeout)
     
     async def save_episode(self, request: FixRequest, result: Dict[str, Any], duration: float):
         """Salva episódio para aprendizagem"""
@@ -280,10 +265,12 @@ class FortalezaAPI:
                 "workspace": request.context.workspace.get("name", "unknown")
             }
             
-            # Salvar em episodes.jsonl
+            # Salvar em episodes.jsonl (I/O fora do event loop)
             episodes_file = self.memory_dir / "episodes.jsonl"
-            with open(episodes_file, "a") as f:
-                f.write(json.dumps(episode) + "\n")
+            def _append() -> None:
+                with open(episodes_file, "a") as f:
+                    f.write(json.dumps(episode) + "\n")
+            await asyncio.to_thread(_append)
                 
             logger.info(f"Episódio salvo: {episode['error_code']} -> {episode['success']}")
             
@@ -293,6 +280,11 @@ class FortalezaAPI:
 # Instanciar API
 fortaleza_api = FortalezaAPI()
 
+@app.on_event("shutdown")
+async def _shutdown_workers():
+    fortaleza_api.llm_pool.shutdown()
+    shutdown_ts_services()
+
 # Rotas da API
 @app.post("/fix", response_model=FixResponse)
 async def fix_error(request: FixRequest):
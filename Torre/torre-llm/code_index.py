@@ -1,37 +1,22 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Dict, List
-import json, re
+import json
+
+try:
+    from .llm.reverse.scanner import parse_exports, shared_scan_cache, walk_files
+except ImportError:  # execução fora do pacote (tests/, scripts)
+    from llm.reverse.scanner import parse_exports, shared_scan_cache, walk_files
 
 IGNORE_DIRS = {".git", "node_modules", "dist", "build", ".venv", "venv", ".pytest_cache", ".tox"}
 EXTS = {".ts", ".tsx", ".js", ".jsx"}
 
-RX_EXPORT = re.compile(r"^\s*export\s+(?:const|let|var|function|class)\s+(?P<name>[A-Za-z_]\w*)", re.M)
-RX_EXPORT_DEFAULT = re.compile(r"^\s*export\s+default\s+(?:function|class)?\s*(?P<name>[A-Za-z_]\w*)?", re.M)
-RX_EXPORT_TYPE = re.compile(r"^\s*export\s+(?:type|interface)\s+(?P<name>[A-Za-z_]\w*)", re.M)
-
 def _iter_code_files(root: Path) -> List[Path]:
-    files: List[Path] = []
-    for p in root.rglob("*"):
-        if p.is_dir():
-            if p.name in IGNORE_DIRS:
-                # skip subtree
-                for _ in p.rglob("*"):
-                    pass
-                continue
-            continue
-        if p.suffix in EXTS:
-            files.append(p)
-    return files
+    # os.scandir com poda: subárvores ignoradas nunca são percorridas
+    return [root / rel for rel, _, _ in walk_files(root, EXTS, IGNORE_DIRS)]
 
 def _extract_symbols(text: str) -> List[str]:
-    out: List[str] = []
-    for rx in (RX_EXPORT, RX_EXPORT_DEFAULT, RX_EXPORT_TYPE):
-        for m in rx.finditer(text):
-            name = (m.group("name") or "default").strip()
-            if name and name not in out:
-                out.append(name)
-    return out
+    return parse_exports(text)
 
 def build_code_index(root: Path) -> Dict:
     """
@@ -40,19 +25,16 @@ def build_code_index(root: Path) -> Dict:
     """
     by_file: Dict[str, List[str]] = {}
     total_symbols = 0
-    files = _iter_code_files(root)
-    for f in files:
-        try:
-            text = f.read_text(encoding="utf-8", errors="ignore")
-        except Exception:
-            continue
-        syms = _extract_symbols(text)
-        if syms:
-            by_file[str(f)] = syms
-            total_symbols += len(syms)
+    listing = walk_files(root, EXTS, IGNORE_DIRS)
+    scans = shared_scan_cache(root).scan(listing)  # leitura/parse em paralelo, partilhada com CodeMap/OmniContext
+    for rel, _, _ in listing:
+        sc = scans.get(rel)
+        if sc and sc.exports:
+            by_file[str(root / rel)] = sc.exports
+            total_symbols += len(sc.exports)
     return {
         "root": str(root),
-        "files_indexed": len(files),
+        "files_indexed": len(listing),
         "files_with_symbols": len(by_file),
         "symbols": total_symbols,
         "by_file": by_file,
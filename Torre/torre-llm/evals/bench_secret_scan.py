@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark do motor único de segredos/PII (llm/guard/scan_engine.py).
+Compara com as 4 passagens antigas (secret_scan, guardrails, forense, episódico) sobre o mesmo diff
+sintético e imprime MB/s em JSON.  Uso: python evals/bench_secret_scan.py [MB] [repetições]
+"""
+from __future__ import annotations
+import json, random, re, sys, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from llm.guard.scan_engine import ENGINE  # noqa: E402
+
+# regex das passagens antigas (referência)
+_LEGACY = [
+    re.compile(r'(sk-[A-Za-z0-9_\-]{16,}|ghp_[A-Za-z0-9]{20,}|xox[baprs]-[A-Za-z0-9\-]{10,}|AIza[0-9A-Za-z\-_]{35}'
+               r'|(?:api|token|secret|key)[-_]?[=:]\s*["\'][A-Za-z0-9_\-]{16,}["\'])', re.I),
+    re.compile(r"(?i)(api[_-]?key|secret|token)\s*[:=]\s*['\"][A-Za-z0-9_\-]{16,}"),
+    re.compile(r"-----BEGIN (RSA|EC) PRIVATE KEY-----"),
+    re.compile(r"([A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,})", re.I),
+    re.compile(r"(sk-[A-Za-z0-9_\-]{16,}|ghp_[A-Za-z0-9]{20,}|xox[baprs]-[A-Za-z0-9\-]{10,}|AIza[0-9A-Za-z\-_]{35})"),
+]
+
+_CODE = [
+    "+  const total = items.reduce((acc, it) => acc + it.price * it.qty, 0);",
+    "+  if (!user || !user.id) { throw new Error('missing user'); }",
+    "   return <Button onClick={() => setOpen(!open)} key={row.id}>{label}</Button>;",
+    "-  import { useState, useEffect } from 'react';",
+    "+  for (let i = 0; i < rows.length; i++) { render(rows[i]); }",
+    "+  // TODO: mover para o serviço de pagamentos",
+]
+
+
+def synthetic_diff(mb: float, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    out, size, i = [], 0, 0
+    while size < mb * 1024 * 1024:
+        if i % 200 == 0:
+            out.append(f"--- a/src/f{i}.ts\n+++ b/src/f{i}.ts\n@@ -1,200 +1,200 @@")
+        if i % 5000 == 4999:
+            line = f"+const k = 'sk-{''.join(rnd.choices('abcdefghijKLMNOP0123456789', k=24))}';"
+        else:
+            line = _CODE[rnd.randrange(len(_CODE))]
+        out.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(out) + "\n"
+
+
+def _legacy(diff: str) -> int:
+    n = 0
+    for line in diff.splitlines():                   # secret_scan: loop por linha
+        if line and line[0] in "+- " and not line.startswith(("---", "+++", "@@")):
+            n += sum(1 for _ in _LEGACY[0].finditer(line))
+    n += sum(1 for p in _LEGACY[1:3] if p.search(diff))   # guardrails
+    n += sum(1 for _ in _LEGACY[0].finditer(diff))        # forense
+    _LEGACY[4].sub("x", _LEGACY[3].sub("x", diff))        # episódico
+    return n
+
+
+def _engine(diff: str) -> int:
+    n = len(ENGINE.scan_diff(diff, kinds=None))
+    ENGINE.redact(diff)
+    return n
+
+
+def bench(fn, diff: str, reps: int) -> float:
+    best = float("inf")
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn(diff)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> int:
+    mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    diff = synthetic_diff(mb)
+    size = len(diff.encode()) / (1024 * 1024)
+    t_old, t_new = bench(_legacy, diff, reps), bench(_engine, diff, reps)
+    print(json.dumps({
+        "input_mb": round(size, 2),
+        "legacy_4_pass_mb_s": round(size / t_old, 1),
+        "engine_mb_s": round(size / t_new, 1),
+        "engine_scan_only_mb_s": round(size / bench(lambda d: ENGINE.scan_diff(d), diff, reps), 1),
+        "speedup": round(t_old / t_new, 2),
+        "findings": len(ENGINE.scan_diff(diff)),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
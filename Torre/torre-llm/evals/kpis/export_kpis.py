@@ -5,6 +5,8 @@ from pathlib import Path
 from datetime import datetime, timezone
 
 ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))  # llm.* também quando corre como script
 FORT = ROOT / ".fortaleza"
 KPIS = FORT / "kpis"
 KPIS.mkdir(parents=True, exist_ok=True)
@@ -22,6 +24,24 @@ def _load_json(p: Path) -> dict:
     except Exception:
         return {}
 
+def _latency_sketch(trace_dir: Path, day: str):
+    from llm.ops.quantile_sketch import ALL, LatencySketch, load_sketches
+    sk = load_sketches(trace_dir, [day]).get(ALL)
+    if sk is not None:
+        return sk
+    sk = LatencySketch()
+    trace = trace_dir / f"trace-{day}.jsonl"
+    if trace.exists():
+        with trace.open() as fh:
+            for line in fh:
+                try:
+                    v = json.loads(line).get("latency_ms")
+                except Exception:
+                    continue
+                if isinstance(v, (int, float)):
+                    sk.add(v)
+    return sk
+
 def _collect():
     # Golden
     golden = _latest(FORT / "golden" / "golden-*.json")
@@ -40,27 +60,31 @@ def _collect():
     # Memory episodic (opcional)
     mem_meta = FORT / "memory" / "meta.json"
     mem = _load_json(mem_meta) if mem_meta.exists() else {}
+    # contadores do EpisodeStore (EpisodicMemory/MetricsAggregator) dão as taxas já calculadas
+    try:
+        from llm.memory.metrics_agg import read_metrics
+        snap = read_metrics(FORT / "memory" / "episodes.sqlite")
+    except Exception:
+        snap = {}
+    if snap:
+        mem = {**mem, "repeat_error_rate": snap.get("repeat_error_rate"),
+               "rules_promoted": snap.get("rules_promoted"), "rules_hit_rate": snap.get("rules_hit_rate")}
     repeat_rate = mem.get("repeat_error_rate")
     rules_promoted = mem.get("rules_promoted")
     rules_hit_rate = mem.get("rules_hit_rate")
-    # Traces de hoje → reqs, latência média/mediana
-    trace_today = FORT / "trace" / f"trace-{datetime.now().strftime('%Y%m%d')}.jsonl"
-    reqs = 0; lat_list = []
-    if trace_today.exists():
-        with trace_today.open() as fh:
-            for line in fh:
-                try:
-                    ev = json.loads(line)
-                except Exception:
-                    continue
-                reqs += 1
-                lat = ev.get("latency_ms")
-                if isinstance(lat,(int,float)): lat_list.append(float(lat))
-    avg_lat = (sum(lat_list)/len(lat_list)) if lat_list else None
-    p95_lat = None
-    if lat_list:
-        lat_list.sort()
-        p95_lat = lat_list[int(0.95*len(lat_list))-1]
+    # Traces de hoje → sketches de quantis mantidos pelo TraceStore (merge entre processos);
+    # sem sketches (traces antigos), um único passe em streaming sobre o JSONL
+    day = datetime.now(timezone.utc).strftime('%Y%m%d')
+    lat = _latency_sketch(FORT / "trace", day)
+    reqs = lat.count
+    # Cache de inferência (contadores persistidos em SQLite; mesmo caminho/LLM_CACHE_DB da InferenceCache)
+    try:
+        from llm.backends.cache import cache_db_path, read_cache_stats
+        icache = read_cache_stats(str(cache_db_path(ROOT)))
+    except Exception:
+        icache = {}
+    avg_lat = lat.mean
+    p95_lat = lat.quantile(0.95)
     return {
         "ts": _utc_now(),
         "golden_success_rate": golden_sr,
@@ -71,6 +95,11 @@ def _collect():
         "requests_today": reqs,
         "latency_ms_avg": avg_lat,
         "latency_ms_p95": p95_lat,
+        "latency_ms_p50": lat.quantile(0.50),
+        "latency_ms_p99": lat.quantile(0.99),
+        "inference_cache_hit_rate": icache.get("hit_rate"),
+        "inference_cache_hits": icache.get("hits"),
+        "inference_cache_misses": icache.get("misses"),
     }
 
 def main():
@@ -1,14 +1,20 @@
 from __future__ import annotations
 import re
-from typing import Dict, List, Set, Any
+from typing import Dict, List, Optional, Set, Any
+
+from llm.optimization.log_miner import ENABLED as LOG_MINER_ENABLED, LogMiner, shared_log_miner
 
 class LogOptimizer:
     """
     Sistema de otimização de logs para reduzir TTG
     Objetivo: Trim de logs no pré-processamento, remover stack traces repetitivos
+    Com o log_miner ativo, linhas repetidas (incl. stack traces) colapsam em templates
+    dentro de `budget_tokens` em vez de serem apagadas.
     """
     
-    def __init__(self):
+    def __init__(self, budget_tokens: int = 3000, miner: Optional[LogMiner] = None):
+        self.budget_tokens = budget_tokens
+        self.miner = miner if miner is not None else (shared_log_miner() if LOG_MINER_ENABLED else None)
         # Padrões de stack traces repetitivos
         self.stack_patterns = [
             r'at\s+\w+\.\w+\s+\([^)]+\)',
@@ -35,6 +41,14 @@ class LogOptimizer:
         """Otimiza logs removendo redundâncias e verbosidade"""
         optimized = {}
         
+        if self.miner is not None:
+            cleaned = {k: self._remove_verbose_logs(v or "") for k, v in logs.items()}
+            for log_type, content in self.miner.compress(cleaned, self.budget_tokens).items():
+                content = self._trim_content(content)
+                if content.strip():
+                    optimized[log_type] = content
+            return optimized
+        
         for log_type, log_content in logs.items():
             # Remove stack traces repetitivos
             content = self._remove_stack_traces(log_content)
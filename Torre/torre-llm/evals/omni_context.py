@@ -3,6 +3,19 @@ import os, re, pathlib, json
 from typing import Dict, Any, List, Set, Tuple
 from collections import defaultdict
 
+from llm.reverse.scanner import FileScan, shared_scan_cache, walk_files
+
+DISCOVER_EXTS = ['.ts', '.tsx', '.js', '.jsx', '.py', '.md', '.json', '.yml', '.yaml', '.txt']
+CODE_EXTS = ['.ts', '.tsx', '.js', '.jsx', '.py']
+
+
+def _omni_features(content: str, file_ext: str) -> Tuple[Set[str], Set[str]]:
+    """Extrator executado nos workers do scanner (símbolos + imports numa só leitura)."""
+    symbols = OmniContext._extract_symbols(content, file_ext)
+    imports = OmniContext._extract_imports(content, file_ext) if file_ext in CODE_EXTS else set()
+    return symbols, imports
+
+
 class OmniContext:
     """
     Sistema de análise de contexto global para Fase 1.1
@@ -23,15 +36,19 @@ class OmniContext:
         print("🔍 Analisando contexto global do projeto...")
         
         # 1. Mapear todos os ficheiros
-        all_files = self._discover_files()
+        listing = self._listing()
+        all_files = [self.project_root / rel for rel, _, _ in listing]
         self.total_files = len(all_files)
         
+        # leitura única e paralela: símbolos + imports por ficheiro (partilhada com CodeMap/code_index)
+        scans = shared_scan_cache(self.project_root).scan(listing, extractor=_omni_features)
+        
         # 2. Indexar símbolos (funções, classes, etc.)
-        symbols_map = self._index_symbols(all_files)
+        symbols_map = self._index_symbols(all_files, scans)
         self.total_symbols = sum(len(symbols) for symbols in symbols_map.values())
         
         # 3. Construir grafo de imports
-        import_graph = self._build_import_graph(all_files)
+        import_graph = self._build_import_graph(all_files, scans)
         self.total_imports = sum(len(imports) for imports in import_graph.values())
         
         # 4. Resolver imports
@@ -50,43 +67,47 @@ class OmniContext:
             "import_resolution_rate": self.imports_resolved / max(1, self.total_imports)
         }
     
+    def _listing(self) -> List[Tuple[str, int, int]]:
+        # Inclui ficheiros sem extensão que possam ser relevantes
+        listing = walk_files(self.project_root, DISCOVER_EXTS, include_noext=True)
+        return [e for e in listing if pathlib.PurePosixPath(e[0]).name not in ['.gitignore', '.env']]
+    
     def _discover_files(self) -> List[pathlib.Path]:
-        """Descobre todos os ficheiros relevantes"""
-        files = []
-        for ext in ['.ts', '.tsx', '.js', '.jsx', '.py', '.md', '.json', '.yml', '.yaml', '.txt']:
-            files.extend(self.project_root.rglob(f"*{ext}"))
-        
-        # Incluir ficheiros sem extensão que possam ser relevantes
-        for file_path in self.project_root.rglob("*"):
-            if file_path.is_file() and not file_path.suffix and file_path.name not in ['.gitignore', '.env']:
-                files.append(file_path)
-                
-        return files
+        """Descobre todos os ficheiros relevantes (podando node_modules/.venv/.git/...)"""
+        return [self.project_root / rel for rel, _, _ in self._listing()]
+    
+    def _scans(self, files: List[pathlib.Path], scans: Dict[str, FileScan] | None) -> Dict[str, FileScan]:
+        if scans is not None:
+            return scans
+        listing = []
+        for p in files:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            listing.append((p.relative_to(self.project_root).as_posix(), st.st_mtime_ns, st.st_size))
+        return shared_scan_cache(self.project_root).scan(listing, extractor=_omni_features)
     
-    def _index_symbols(self, files: List[pathlib.Path]) -> Dict[str, Set[str]]:
+    def _index_symbols(self, files: List[pathlib.Path], scans: Dict[str, FileScan] | None = None) -> Dict[str, Set[str]]:
         """Indexa símbolos (funções, classes, etc.) por ficheiro"""
         symbols_map = {}
+        scans = self._scans(files, scans)
         
         for file_path in files:
-            if not file_path.is_file():
+            rel_path = str(file_path.relative_to(self.project_root))
+            sc = scans.get(rel_path)
+            if sc is None:
                 continue
-                
-            try:
-                content = file_path.read_text(encoding='utf-8', errors='ignore')
-                symbols = self._extract_symbols(content, file_path.suffix)
-                
-                # Mesmo sem símbolos, conta como ficheiro analisado
-                rel_path = str(file_path.relative_to(self.project_root))
-                symbols_map[rel_path] = symbols
-                self.symbols_indexed += len(symbols)
-                self.files_analyzed += 1
-                    
-            except Exception as e:
-                print(f"⚠️ Erro ao analisar {file_path}: {e}")
+            symbols = sc.extra[0]
+            # Mesmo sem símbolos, conta como ficheiro analisado
+            symbols_map[rel_path] = symbols
+            self.symbols_indexed += len(symbols)
+            self.files_analyzed += 1
                 
         return symbols_map
     
-    def _extract_symbols(self, content: str, file_ext: str) -> Set[str]:
+    @staticmethod
+    def _extract_symbols(content: str, file_ext: str) -> Set[str]:
         """Extrai símbolos baseado no tipo de ficheiro"""
         symbols = set()
         
@@ -122,28 +143,23 @@ class OmniContext:
                     
         return symbols
     
-    def _build_import_graph(self, files: List[pathlib.Path]) -> Dict[str, Set[str]]:
+    def _build_import_graph(self, files: List[pathlib.Path], scans: Dict[str, FileScan] | None = None) -> Dict[str, Set[str]]:
         """Constrói grafo de imports"""
         import_graph = defaultdict(set)
+        scans = self._scans([p for p in files if p.suffix in CODE_EXTS], scans)
         
         for file_path in files:
-            if not file_path.is_file() or file_path.suffix not in ['.ts', '.tsx', '.js', '.jsx', '.py']:
+            if file_path.suffix not in CODE_EXTS:
                 continue
-                
-            try:
-                content = file_path.read_text(encoding='utf-8', errors='ignore')
-                imports = self._extract_imports(content, file_path.suffix)
-                
-                if imports:
-                    rel_path = str(file_path.relative_to(self.project_root))
-                    import_graph[rel_path] = imports
-                    
-            except Exception as e:
-                print(f"⚠️ Erro ao analisar imports de {file_path}: {e}")
+            rel_path = str(file_path.relative_to(self.project_root))
+            sc = scans.get(rel_path)
+            if sc is not None and sc.extra[1]:
+                import_graph[rel_path] = sc.extra[1]
                 
         return dict(import_graph)
     
-    def _extract_imports(self, content: str, file_ext: str) -> Set[str]:
+    @staticmethod
+    def _extract_imports(content: str, file_ext: str) -> Set[str]:
         """Extrai imports baseado no tipo de ficheiro"""
         imports = set()
         
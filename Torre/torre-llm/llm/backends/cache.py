@@ -0,0 +1,276 @@
+from __future__ import annotations
+import atexit, os, json, time, sqlite3, threading, weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Optional
+
+from .singleflight import prompt_key
+
+DEFAULT_DB = ".fortaleza/cache/inference/llm.sqlite"
+
+def _is_cacheable(profile: Dict[str, Any]) -> bool:
+    """
+    Política: `profile["cache"]` explícito manda; caso contrário só perfis
+    determinísticos (seed fixa + temperatura baixa, ex.: PATCH) vão à cache.
+    """
+    if "cache" in profile:
+        return bool(profile["cache"])
+    max_t = float(os.getenv("LLM_CACHE_MAX_TEMP", "0.2"))
+    return "seed" in profile and float(profile.get("temperature", 1.0)) <= max_t
+
+
+def _is_network_response(meta: Dict[str, Any]) -> bool:
+    """Respostas fictícias/offline (usage.mode = smoke, …) não vão à cache."""
+    usage = meta.get("usage")
+    return not (isinstance(usage, dict) and usage.get("mode"))
+
+
+class InferenceCache:
+    """
+    Cache content-addressed de respostas da LLM.
+    - L1: LRU em memória (max_items); um hit L1 não toca no SQLite
+    - L2: SQLite em disco com TTL e limite de bytes (evicção por last_hit mais antigo)
+    - contadores hits/misses persistidos (partilhados entre CLI/servidor) para KPIs;
+      last_hit e contadores são acumulados em memória e gravados numa só transação
+      a cada LLM_CACHE_FLUSH_S (ou em put/flush/close)
+    - uma ligação SQLite por thread, reutilizada e fechada em close()
+    """
+    def __init__(self, db_path: str | None = None, max_items: int = 256,
+                 max_bytes: int | None = None, ttl_s: float | None = None) -> None:
+        self.db_path = Path(db_path) if db_path else cache_db_path()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self.max_bytes = int(max_bytes or os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.ttl_s = float(ttl_s or os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+        self.flush_s = float(os.getenv("LLM_CACHE_FLUSH_S", "5"))
+        self._mem: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self.hits = 0
+        self.misses = 0
+        # pendentes de gravação (batch)
+        self._touched: Dict[str, float] = {}
+        self._pending = {"hits": 0, "misses": 0}
+        self._last_flush = time.monotonic()
+        self._init_db()
+        _LIVE.add(self)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    meta TEXT,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_hit ON responses(last_hit)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _note(self, name: str, key: str | None = None, now: float = 0.0) -> bool:
+        """Regista hit/miss pendente (chamar com _lock); True se já é altura de gravar."""
+        self._pending[name] += 1
+        if key is not None:
+            self._touched[key] = now
+        return time.monotonic() - self._last_flush >= self.flush_s
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            ent = self._mem.get(key)
+            if ent and now - ent[0] < self.ttl_s:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                due = self._note("hits", key, now)
+                hit: Optional[Tuple[str, Dict[str, Any]]] = (ent[1], dict(ent[2]))
+            else:
+                self._mem.pop(key, None)
+                hit = None
+        if hit is not None:
+            if due:
+                self.flush()
+            return hit
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT text, meta, created_at FROM responses WHERE key=?", (key,)).fetchone()
+            if row and now - row[2] < self.ttl_s:
+                hit = (row[0], json.loads(row[1] or "{}"))
+            elif row:
+                with conn:
+                    conn.execute("DELETE FROM responses WHERE key=?", (key,))
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            if hit is not None:
+                self.hits += 1
+                self._remember(key, row[2], hit[0], hit[1])
+                due = self._note("hits", key, now)
+            else:
+                self.misses += 1
+                due = self._note("misses")
+        if due:
+            self.flush()
+        return hit
+
+    def flush(self) -> None:
+        """Grava last_hit e contadores pendentes numa única transação."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            pending, self._pending = self._pending, {"hits": 0, "misses": 0}
+            self._last_flush = time.monotonic()
+        if not touched and not any(pending.values()):
+            return
+        try:
+            conn = self._conn()
+            with conn:
+                self._write_pending(conn, touched, pending)
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _write_pending(conn: sqlite3.Connection, touched: Dict[str, float], pending: Dict[str, int]) -> None:
+        conn.executemany("UPDATE responses SET last_hit=? WHERE key=? AND last_hit < ?",
+                         [(ts, k, ts) for k, ts in touched.items()])
+        conn.executemany("INSERT INTO counters(name, value) VALUES(?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                         [(name, n) for name, n in pending.items() if n])
+
+    def _remember(self, key: str, created: float, text: str, meta: Dict[str, Any]) -> None:
+        self._mem[key] = (created, text, meta)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def put(self, key: str, text: str, meta: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, text, dict(meta))
+            touched, self._touched = self._touched, {}
+            pending, self._pending = self._pending, {"hits": 0, "misses": 0}
+            self._last_flush = time.monotonic()
+        size = len(text.encode("utf-8"))
+        try:
+            conn = self._conn()
+            with conn:
+                # já é uma escrita: leva os pendentes na mesma transação
+                self._write_pending(conn, touched, pending)
+                conn.execute("INSERT OR REPLACE INTO responses(key, text, meta, size, created_at, last_hit) "
+                             "VALUES(?,?,?,?,?,?)", (key, text, json.dumps(meta, default=str), size, now, now))
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # remove os menos usados recentemente até caber no orçamento
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_hit ASC"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM responses WHERE key=?", victims)
+
+    def close(self) -> None:
+        """Grava pendentes e fecha as ligações de todas as threads."""
+        self.flush()
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush()
+        return {**read_cache_stats(str(self.db_path)), "process_hits": self.hits,
+                "process_misses": self.misses, "memory_entries": len(self._mem)}
+
+
+# caches vivas no processo: os pendentes são gravados à saída
+_LIVE: "weakref.WeakSet[InferenceCache]" = weakref.WeakSet()
+
+@atexit.register
+def _flush_all() -> None:
+    for cache in list(_LIVE):
+        try:
+            cache.close()
+        except Exception:
+            pass
+
+
+def cache_db_path(root: str | os.PathLike | None = None) -> Path:
+    """BD da cache: LLM_CACHE_DB (relativo a `root`/cwd) ou <root>/.fortaleza/cache/inference/llm.sqlite."""
+    return Path(root or ".") / os.getenv("LLM_CACHE_DB", DEFAULT_DB)
+
+
+def read_cache_stats(db_path: str | None = None) -> Dict[str, Any]:
+    """Contadores persistidos (todas as execuções) — usado por /kpis/export."""
+    path = Path(db_path) if db_path else cache_db_path()
+    if not path.exists():
+        return {"hits": 0, "misses": 0, "hit_rate": None, "entries": 0, "bytes": 0}
+    conn = None
+    try:
+        conn = sqlite3.connect(path, timeout=5)
+        cnt = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+    except sqlite3.Error:
+        return {"hits": 0, "misses": 0, "hit_rate": None, "entries": 0, "bytes": 0}
+    finally:
+        if conn is not None:
+            conn.close()
+    hits, misses = int(cnt.get("hits", 0)), int(cnt.get("misses", 0))
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None,
+            "entries": int(entries), "bytes": int(size)}
+
+
+class CachedBackend:
+    """
+    Camada de cache sob um backend (generate(system, user, profile)).
+    Bypass por pedido: profile {"cache": False}; global: LLM_CACHE=0.
+    """
+    def __init__(self, backend: Any, cache: InferenceCache | None = None) -> None:
+        self.backend = backend
+        self.cache = cache or InferenceCache()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.backend, name)
+
+    def generate(self, system: str, user: str, profile: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        # smoke (offline) nunca lê nem escreve: a resposta fictícia não pode servir chamadas reais
+        if not _is_cacheable(profile) or os.getenv("LLM_SMOKE", "0") == "1":
+            return self.backend.generate(system, user, profile)
+        clean = {k: v for k, v in profile.items() if k != "cache"}
+        # o mesmo modelo noutro endpoint (vLLM local vs. remoto) é outra resposta
+        key = prompt_key(system, user, clean, f"{getattr(self.backend, 'base', '')}|{getattr(self.backend, 'model', '')}")
+        hit = self.cache.get(key)
+        if hit is not None:
+            text, meta = hit
+            return text, {**meta, "cache": "hit"}
+        text, meta = self.backend.generate(system, user, clean)
+        if not _is_network_response(meta or {}):
+            return text, {**(meta or {}), "cache": "bypass"}
+        self.cache.put(key, text, meta or {})
+        return text, {**(meta or {}), "cache": "miss"}
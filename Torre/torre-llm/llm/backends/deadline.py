@@ -0,0 +1,98 @@
+from __future__ import annotations
+import contextvars, threading, time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+class Budget:
+    """
+    Prazo + cancelamento de uma geração (ex.: um candidato do rerank).
+    Propaga-se por contextvars; backends e pool HTTP consultam-no para limitar
+    timeouts de socket e registar o abort da ligação em curso (on_cancel).
+    """
+    def __init__(self, timeout_s: float) -> None:
+        self.deadline = time.monotonic() + float(timeout_s)
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._hooks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.deadline
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise TimeoutError("geração cancelada")
+        if time.monotonic() >= self.deadline:
+            raise TimeoutError("prazo da geração esgotado")
+
+    def cancel(self) -> None:
+        """Marca como cancelado e corre os hooks registados (ex.: shutdown do socket)."""
+        with self._lock:
+            self._cancelled.set()
+            hooks, self._hooks = self._hooks, []
+        for fn in hooks:
+            try:
+                fn()
+            except Exception:
+                pass
+
+    @contextmanager
+    def on_cancel(self, fn: Callable[[], None]) -> Iterator[None]:
+        with self._lock:
+            now = self._cancelled.is_set()
+            if not now:
+                self._hooks.append(fn)
+        if now:
+            fn()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if fn in self._hooks:
+                    self._hooks.remove(fn)
+
+
+_CURRENT: contextvars.ContextVar[Optional[Budget]] = contextvars.ContextVar("llm_budget", default=None)
+
+@contextmanager
+def activate(budget: Budget) -> Iterator[Budget]:
+    """Torna `budget` o orçamento corrente neste contexto (thread)."""
+    token = _CURRENT.set(budget)
+    try:
+        yield budget
+    finally:
+        _CURRENT.reset(token)
+
+def current() -> Optional[Budget]:
+    return _CURRENT.get()
+
+def check() -> None:
+    """Lança TimeoutError se o orçamento corrente expirou ou foi cancelado (no-op sem orçamento)."""
+    b = _CURRENT.get()
+    if b is not None:
+        b.check()
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """min(default, tempo restante); lança TimeoutError se já não houver tempo."""
+    b = _CURRENT.get()
+    if b is None:
+        return default
+    b.check()
+    left = b.remaining()
+    return left if default is None else min(default, left)
+
+@contextmanager
+def on_cancel(fn: Callable[[], None]) -> Iterator[None]:
+    """Regista `fn` no orçamento corrente enquanto o bloco corre (no-op sem orçamento)."""
+    b = _CURRENT.get()
+    if b is None:
+        yield
+        return
+    with b.on_cancel(fn):
+        yield
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import http.client, queue, socket, threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+import urllib.error
+
+from . import deadline
+
+# erros típicos de ligação keep-alive fechada pelo servidor entre pedidos
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError, ConnectionResetError)
+
+class HTTPConnectionPool:
+    """
+    Pool mínimo (stdlib) de ligações HTTP/1.1 keep-alive para um único host.
+    - reutiliza ligações TCP/TLS entre pedidos (evita handshake por chamada)
+    - thread-safe; no máx. `maxsize` ligações inativas guardadas
+    - re-tenta uma vez quando uma ligação reutilizada já foi fechada pelo servidor
+    - respeita o orçamento corrente (deadline.Budget): timeout de socket limitado ao
+      tempo restante e, em cancelamento, shutdown do socket para acordar a leitura bloqueada
+    """
+    def __init__(self, base_url: str, maxsize: int = 8, timeout: float = 120.0) -> None:
+        u = urlsplit(base_url)
+        self.scheme = u.scheme or "https"
+        self.host = u.hostname or "localhost"
+        self.port = u.port
+        self.prefix = u.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _new(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.created += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+            return conn, True
+        except queue.Empty:
+            return self._new(), False
+
+    @staticmethod
+    def _set_timeout(conn: http.client.HTTPConnection, timeout: float) -> None:
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    @staticmethod
+    def _abort(conn: http.client.HTTPConnection) -> None:
+        sock = conn.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            self._set_timeout(conn, self.timeout)
+            try:
+                self._idle.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        conn.close()
+
+    def _send(self, method: str, path: str, body: bytes | None, headers: Dict[str, str],
+              timeout: Optional[float] = None):
+        hdrs = {"Connection": "keep-alive", **headers}
+        for attempt in (0, 1):
+            left = deadline.remaining(self.timeout if timeout is None else timeout)
+            conn, reused = self._acquire()
+            try:
+                self._set_timeout(conn, left)
+                with deadline.on_cancel(lambda: self._abort(conn)):
+                    conn.request(method, self.prefix + path, body=body, headers=hdrs)
+                    return conn, conn.getresponse()
+            except _STALE_ERRORS:
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+        raise RuntimeError("unreachable")
+
+    @staticmethod
+    def _raise_for_status(url: str, resp: http.client.HTTPResponse, data: bytes) -> None:
+        if resp.status >= 400:
+            import io
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+
+    def request(self, method: str, path: str, body: bytes | None = None,
+                headers: Dict[str, str] | None = None, timeout: Optional[float] = None) -> bytes:
+        conn, resp = self._send(method, path, body, headers or {}, timeout)
+        try:
+            with deadline.on_cancel(lambda: self._abort(conn)):
+                data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn, not resp.will_close)
+        self._raise_for_status(self.prefix + path, resp, data)
+        return data
+
+    @contextmanager
+    def stream(self, method: str, path: str, body: bytes | None = None,
+               headers: Dict[str, str] | None = None, timeout: Optional[float] = None) -> Iterator[http.client.HTTPResponse]:
+        """Resposta em streaming; a ligação só volta ao pool se o corpo foi lido até ao fim."""
+        conn, resp = self._send(method, path, body, headers or {}, timeout)
+        if resp.status >= 400:
+            data = resp.read()
+            self._release(conn, not resp.will_close)
+            self._raise_for_status(self.prefix + path, resp, data)
+        try:
+            with deadline.on_cancel(lambda: self._abort(conn)):
+                yield resp
+        finally:
+            if resp.isclosed():  # corpo lido até ao fim
+                self._release(conn, not resp.will_close)
+            else:                # paragem antecipada → ligação não é reutilizável
+                conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"created": self.created, "reused": self.reused, "idle": self._idle.qsize()}
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_POOLS: Dict[Tuple[str, float], HTTPConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(base_url: str, timeout: float = 120.0, maxsize: int = 8) -> HTTPConnectionPool:
+    """Pool partilhado por (base_url, timeout) no processo."""
+    key = (base_url.rstrip("/"), float(timeout))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = HTTPConnectionPool(base_url, maxsize=maxsize, timeout=timeout)
+        return pool
@@ -1,17 +1,36 @@
 from __future__ import annotations
-import os, json, time
+import os, json, time, asyncio
 from typing import Dict, Any, Tuple
 import urllib.request
 
+from . import deadline
+from .http_pool import get_pool
+from ..postprocess import patch_complete
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "off", "no")
+
 class OpenAICompat:
     """
     Cliente compatível com o endpoint /chat/completions (OpenAI-like).
     Funciona com provedores: vLLM, Together, OpenRouter, servidores self-hosted, etc.
+    Modos:
+      - LLM_HTTP_POOL=1 (padrão): ligações keep-alive partilhadas no processo
+      - LLM_STREAM=1: SSE; pára de ler quando o bloco ```diff``` fecha
+      - LLM_HTTP_POOL=0: urlopen por chamada (comportamento original)
+    Dentro de um deadline.Budget (ex.: candidato do rerank) o timeout HTTP é o tempo restante.
     """
-    def __init__(self) -> None:
+    def __init__(self, pooled: bool | None = None, stream: bool | None = None) -> None:
         self.base = os.getenv("OPENAI_BASE", "https://api.openai.com/v1")
         self.model = os.getenv("OPENAI_MODEL", "qwen2.5-coder-7b-instruct")
         self.api_key = os.getenv("OPENAI_API_KEY", "")
+        self.timeout = float(os.getenv("OPENAI_TIMEOUT_S", "120"))
+        self.pooled = _flag("LLM_HTTP_POOL", "1") if pooled is None else pooled
+        self.stream = _flag("LLM_STREAM", "0") if stream is None else stream
+
+    async def agenerate(self, system: str, user: str, profile: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Versão assíncrona de generate (corre no executor; o pool é thread-safe)."""
+        return await asyncio.to_thread(self.generate, system, user, profile)
 
     def generate(self, system: str, user: str, profile: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
         # --- SMOKE MODE (offline) -------------------------------------------------
@@ -50,13 +69,18 @@ class OpenAICompat:
             payload["seed"] = profile["seed"]
         if "repetition_penalty" in profile:
             payload["repetition_penalty"] = profile["repetition_penalty"]
-        data = json.dumps(payload).encode("utf-8")
         headers = {"Content-Type": "application/json"}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
-        req = urllib.request.Request(url, data=data, headers=headers, method="POST")
-        with urllib.request.urlopen(req, timeout=120) as resp:
-            raw = resp.read().decode("utf-8", "ignore")
+        if self.pooled and self.stream:
+            return self._generate_stream(payload, headers)
+        data = json.dumps(payload).encode("utf-8")
+        if self.pooled:
+            raw = get_pool(self.base, self.timeout).request("POST", "/chat/completions", data, headers).decode("utf-8", "ignore")
+        else:
+            req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+            with urllib.request.urlopen(req, timeout=deadline.remaining(self.timeout)) as resp:
+                raw = resp.read().decode("utf-8", "ignore")
         obj = json.loads(raw)
         text = ""
         try:
@@ -65,3 +89,37 @@ class OpenAICompat:
             text = obj.get("choices",[{}])[0].get("text","")
         usage = obj.get("usage", {})
         return text, {"provider": "openai_compat", "model": self.model, "usage": usage}
+
+    def _generate_stream(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+        """SSE (data: {...}); corta a leitura assim que o diff fica completo."""
+        payload = {**payload, "stream": True}
+        data = json.dumps(payload).encode("utf-8")
+        parts: list[str] = []
+        usage: Dict[str, Any] = {}
+        early = False
+        with get_pool(self.base, self.timeout).stream("POST", "/chat/completions", data,
+                                                      {**headers, "Accept": "text/event-stream"}) as resp:
+            while True:
+                deadline.check()
+                line = resp.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8", "ignore").strip()
+                if not line.startswith("data:"):
+                    continue
+                chunk = line[5:].strip()
+                if chunk == "[DONE]":
+                    resp.read()  # drena o resto para a ligação voltar ao pool
+                    break
+                try:
+                    obj = json.loads(chunk)
+                except Exception:
+                    continue
+                usage = obj.get("usage") or usage
+                choice = (obj.get("choices") or [{}])[0]
+                parts.append((choice.get("delta") or {}).get("content") or choice.get("text") or "")
+                if patch_complete("".join(parts)):
+                    early = True
+                    break
+        return "".join(parts), {"provider": "openai_compat", "model": self.model, "usage": usage,
+                                "stream": True, "early_stop": early}
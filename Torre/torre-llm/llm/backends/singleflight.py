@@ -0,0 +1,49 @@
+from __future__ import annotations
+import json, hashlib, threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Any, Tuple
+
+from . import deadline
+
+def prompt_key(system: str, user: str, profile: Dict[str, Any], model: str = "") -> str:
+    """Hash estável de (system, user, profile, model)."""
+    raw = json.dumps([system, user, profile, model], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class SingleFlightBackend:
+    """
+    Envolve um backend e deduplica pedidos idênticos:
+    chamadas concorrentes (ou repetidas) com o mesmo prompt/perfil partilham UMA geração.
+    Vida útil = uma execução de rerank (não é cache persistente).
+    """
+    def __init__(self, backend: Any) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self.calls = 0      # gerações reais
+        self.shared = 0     # pedidos servidos por uma geração já em curso/feita
+
+    def generate(self, system: str, user: str, profile: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        key = prompt_key(system, user, profile, getattr(self.backend, "model", ""))
+        with self._lock:
+            fut = self._flights.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._flights[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if owner:
+            try:
+                fut.set_result(self.backend.generate(system, user, profile))
+            except BaseException as e:
+                fut.set_exception(e)
+        try:
+            # quem espera por uma geração alheia respeita o seu próprio orçamento
+            text, meta = fut.result(timeout=deadline.remaining())
+        except FutureTimeout as e:
+            raise TimeoutError("prazo da geração esgotado à espera de pedido idêntico") from e
+        return text, dict(meta or {})
+
+    def stats(self) -> Dict[str, int]:
+        return {"backend_calls": self.calls, "deduplicated": self.shared}
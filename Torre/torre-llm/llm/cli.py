@@ -47,9 +47,11 @@ except Exception:
 try:
     from llm.strategos.scorer_v2 import StrategosV2Graph
     from llm.reverse.codemap import CodeMap
+    from llm.reverse.codemap_store import shared_codemap_store
 except Exception:
     StrategosV2Graph = None
     CodeMap = None
+    shared_codemap_store = None
 
 from llm.execution.reranker import Reranker  # novo
 try:
@@ -83,7 +85,7 @@ def _maybe_attach_strategos_plan(resp: dict, req: dict):
         if not StrategosV2Graph:
             return
         try:
-            codemap = CodeMap().build(".") if CodeMap else {"nodes": [], "edges": []}
+            codemap = shared_codemap_store(".").graph() if shared_codemap_store else {"nodes": [], "edges": []}
         except Exception:
             codemap = {"nodes": [], "edges": []}
         logs = req.get("logs") or {}
@@ -337,6 +339,15 @@ def main() -> None:
         print(json.dumps({"error":"Invalid JSON on stdin"}))
         sys.exit(1)
 
+    out = handle_request(body)
+    if out is not None:
+        print(json.dumps(out, ensure_ascii=False))
+
+def handle_request(body: dict) -> dict | None:
+    """
+    Mesmo fluxo da CLI, em processo: recebe o pedido já decodificado e devolve o JSON de saída.
+    Usado pelo api_server (workers quentes) para evitar arrancar um interpretador por pedido.
+    """
     from .engine import run_inference
     repo = Path(os.getenv("REPO_ROOT",".")).resolve()
     logs = body.get("logs") or {}
@@ -422,11 +433,16 @@ def main() -> None:
             strat = StrategosV2() if StrategosV2 else None
             learn = LearningSystem() if LearningSystem else None
             rer = Reranker(strategos_v2=strat, learning_system=learn)
+            # Backend partilhado: os geradores correm em paralelo e pedidos idênticos
+            # (mesmo prompt+perfil) são servidos por uma única chamada
+            from .engine import _backend_instance, _choose_backend
+            from .backends.singleflight import SingleFlightBackend
+            shared_backend = SingleFlightBackend(_backend_instance(_choose_backend()))
 
             # Geradores de candidatos:
             # 1) Base (engine padrão)
             def gen_base():
-                o = run_inference(repo, logs=logs, files=files)
+                o = run_inference(repo, logs=logs, files=files, backend=shared_backend)
                 return ("base", o.get("diff", ""))
             # 2) Lesson-assisted (se LearningSystem existir)
             def gen_lesson():
@@ -436,11 +452,11 @@ def main() -> None:
                         hints = learn.rewrite_prompt({"logs": logs, "files": files})
                 except Exception:
                     hints = None
-                o = run_inference(repo, logs=logs, files=files)  # simplificação: engine lê hints do contexto se suportado
+                o = run_inference(repo, logs=logs, files=files, backend=shared_backend)  # simplificação: engine lê hints do contexto se suportado
                 return ("lesson", o.get("diff", ""))
             # 3) Synthesis/Stub (opcional; fallback para base se não houver gerador próprio)
             def gen_synth():
-                o = run_inference(repo, logs=logs, files=files)  # em produção: chamar sintetizador dedicado
+                o = run_inference(repo, logs=logs, files=files, backend=shared_backend)  # em produção: chamar sintetizador dedicado
                 return ("synth", o.get("diff", ""))
 
             result = rer.run(logs, files, [gen_base, gen_lesson, gen_synth])
@@ -498,6 +514,7 @@ def main() -> None:
                     "strategos": bool(result["strategos"]),
                     "memory_used": bool(result["memory"]),
                     "optimizer": os.environ.get("LLM_MODEL",""),
+                    "generation": {**shared_backend.stats(), "cancelled": result.get("cancelled", [])},
                 },
                 "patch_info": {"mode": "RERANK"},
             }
@@ -533,15 +550,15 @@ def main() -> None:
             # publicar badge Strategos automaticamente quando invocado pelo editor
             _maybe_post_strategos_badge_from_cli(body, out)
             
-            print(json.dumps(out, ensure_ascii=False))
+            return out
         except Exception as _e:  # hard-fail nunca; log leve em métricas
             try:
                 # Fallback para o comportamento original se algo der errado
                 out = run_inference(repo, logs=logs, files=files)
                 out.setdefault("metrics", {})["rerank_error"] = str(_e)
-                print(json.dumps(out, ensure_ascii=False))
+                return out
             except Exception:
-                pass
+                return None
     else:
         out = run_inference(repo, logs=logs, files=files)  # mantém compat
         # Adicionar métricas de memória se disponíveis
@@ -579,7 +596,7 @@ def main() -> None:
         # publicar badge Strategos automaticamente quando invocado pelo editor
         _maybe_post_strategos_badge_from_cli(body, out)
         
-        print(json.dumps(out, ensure_ascii=False))
+        return out
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import os
 from .decoder import get_profiles
 from .prompt import load_system_prompt, build_user_prompt
@@ -13,35 +15,60 @@ except ImportError:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from utils.diff_utils import validate_unified_diff
 from .backends.openai_compat import OpenAICompat
+from .backends.cache import CachedBackend
 
 def _choose_backend() -> str:
     # por agora, apenas "openai_compat" — extensível
     return os.getenv("LLM_BACKEND", "openai_compat")
 
+_BACKENDS: Dict[Tuple[str, ...], Any] = {}
+
 def _backend_instance(name: str):
+    # instância reutilizada enquanto a config (env) não muda; o pool keep-alive fica quente
     if name == "openai_compat":
-        return OpenAICompat()
+        key = (name,) + tuple(os.getenv(k, "") for k in ("OPENAI_BASE", "OPENAI_MODEL", "OPENAI_API_KEY",
+                                                            "OPENAI_TIMEOUT_S", "LLM_HTTP_POOL", "LLM_STREAM",
+                                                            "LLM_CACHE", "LLM_CACHE_DB", "LLM_SMOKE"))
+        inst = _BACKENDS.get(key)
+        if inst is None:
+            inst = OpenAICompat()
+            # cache content-addressed (perfis determinísticos); opt-out via LLM_CACHE=0
+            if os.getenv("LLM_CACHE", "1") != "0":
+                inst = CachedBackend(inst)
+            _BACKENDS[key] = inst
+        return inst
     raise ValueError(f"Unsupported backend: {name}")
 
-def run_inference(repo_root: Path, logs: Dict[str,str] | None, files: Dict[str,str] | None) -> Dict[str, Any]:
+def _decode(backend, system: str, user: str, profile: Dict[str, Any]):
+    text, meta = backend.generate(system, user, profile)
+    diff, info = extract_patch(text)
+    return diff, info, meta
+
+def run_inference(repo_root: Path, logs: Dict[str,str] | None, files: Dict[str,str] | None,
+                  backend: Any = None, cache: bool = True) -> Dict[str, Any]:
     """
     Executa A/B com perfis (PATCH, PATCH_B) e escolhe o melhor diff válido.
     Critério: diff válido; desempate por menor comprimento.
+    `backend` opcional permite partilhar um cliente (ex.: SingleFlightBackend no rerank).
+    `cache=False` ignora a cache de inferência neste pedido.
     """
     main, ab, routing = get_profiles(repo_root)
+    if not cache:
+        main, ab = {**main, "cache": False}, {**ab, "cache": False}
     system = load_system_prompt(repo_root)
-    user = build_user_prompt(logs, files)
+    user = build_user_prompt(logs, files, repo_root)
     backend_name = _choose_backend()
-    backend = _backend_instance(backend_name)
+    if backend is None:
+        backend = _backend_instance(backend_name)
 
-    # Decode MAIN
-    text_a, meta_a = backend.generate(system, user, main)
-    diff_a, info_a = extract_patch(text_a)
+    # Decode MAIN e AB (fallback) em paralelo — são independentes;
+    # cada thread leva uma cópia do contexto (orçamento de tempo do candidato, se houver)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fut_a = ex.submit(contextvars.copy_context().run, _decode, backend, system, user, main)
+        fut_b = ex.submit(contextvars.copy_context().run, _decode, backend, system, user, ab)
+        diff_a, info_a, meta_a = fut_a.result()
+        diff_b, info_b, meta_b = fut_b.result()
     size_a = len(diff_a or "")
-
-    # Decode AB (fallback)
-    text_b, meta_b = backend.generate(system, user, ab)
-    diff_b, info_b = extract_patch(text_b)
     size_b = len(diff_b or "")
 
     # Escolha
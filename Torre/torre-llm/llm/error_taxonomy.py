@@ -0,0 +1,150 @@
+"""Taxonomia de erros partilhada (logs classificados uma única vez por pedido).
+
+Todos os classificadores (router, adapters Vanguard/SmartFix, Strategos v2, dicas de
+parsers/error_patterns) consultam o mesmo ErrorClassification em vez de re-varrer
+o texto com substrings próprias:
+- `terms`: palavras-chave presentes (semântica de `kw in log.lower()`)
+- extrações estruturadas: códigos TS, símbolos, módulos, posições, hooks, parse errors
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field, replace
+from functools import cached_property, lru_cache
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+# Vocabulário partilhado (minúsculas), pré-calculado em `terms`; outros termos de has()
+# caem numa pesquisa de substring (ex.: chave nova de um adapter ainda sem entrada aqui).
+KEYWORDS: Tuple[str, ...] = (
+    # códigos TypeScript
+    "ts2304", "ts2307", "ts2322", "ts2339", "ts2345", "ts2531", "ts2532", "ts2554", "ts6133", "ts6138",
+    # build / resolução
+    "module not found", "can't resolve", "cannot find module", "cannot find name", "import error",
+    "importerror", "cannot import", "dependency", "enoent", "vite build failed", "vite", "build",
+    # tipos
+    "type error", "type", "mypy", "ts",
+    # lint / estilo
+    "eslint", "prettier", "unused", "no-console", "no-unused-vars", "code style", "style",
+    # runtime
+    "typeerror", "referenceerror", "syntaxerror", "cannot read property", "undefined",
+    # testes
+    "test", "jest", "vitest", "pytest", "fail", "assert",
+)
+_KW_SET = frozenset(KEYWORDS)
+
+# extrações (sensíveis a maiúsculas, como os RX originais); todas começam por literal,
+# o que deixa o motor do `re` saltar direto para os candidatos
+RX_CODE = re.compile(r"TS\d{4,5}\b")
+RX_REF = re.compile(r"ReferenceError:\s*(?P<name>[A-Za-z_]\w*)\s+is\s+not\s+defined")
+RX_NAME = re.compile(r"Cannot\s+find\s+name\s+'(?P<name>[^']+)'")
+RX_UNRESOLVED = re.compile(r"Module\s+not\s+found:\s*Can't\s+resolve\s+['\"](?P<mod>[^'\"]+)['\"]")
+RX_MODULE = re.compile(r"Cannot\s+find\s+module\s+['\"](?P<mod>[^'\"]+)['\"]")
+RX_HOOK = re.compile(r"React\s+Hook\s+['\"]?(?P<hook>use\w+)['\"]?\s+is\s+called\s+in\s+function\s+['\"]?(?P<fn>[^'\"()]+)")
+RX_PARSE = re.compile(r"Parsing error:\s*(?P<msg>.+)")
+RX_POSITION = re.compile(
+    r"(?<![\w./\\-])(?P<file>[\w./\\-]+\.(?:tsx?|jsx?|mjs|cjs|py))"
+    r"(?:\((?P<line>\d+),(?P<col>\d+)\)|:(?P<line2>\d+)(?::(?P<col2>\d+))?)")
+
+# gatilhos baratos: só corre a regex se o literal aparecer no texto
+_GUARDS = (
+    ("undefined_refs", "ReferenceError", RX_REF, "name"),
+    ("missing_names", "Cannot", RX_NAME, "name"),
+    ("unresolved_modules", "Module", RX_UNRESOLVED, "mod"),
+    ("missing_modules", "Cannot", RX_MODULE, "mod"),
+    ("parse_errors", "Parsing error", RX_PARSE, "msg"),
+)
+
+
+@dataclass
+class ErrorClassification:
+    terms: FrozenSet[str] = frozenset()
+    codes: List[str] = field(default_factory=list)                  # TS2304, ... (1ª ocorrência)
+    missing_names: List[str] = field(default_factory=list)          # Cannot find name 'X'
+    undefined_refs: List[str] = field(default_factory=list)         # ReferenceError: X is not defined
+    unresolved_modules: List[str] = field(default_factory=list)     # Module not found: Can't resolve 'x'
+    missing_modules: List[str] = field(default_factory=list)        # Cannot find module 'x'
+    hooks: List[Tuple[str, str]] = field(default_factory=list)      # (hook, função)
+    parse_errors: List[str] = field(default_factory=list)
+    text: str = field(default="", repr=False, compare=False)
+
+    def has(self, *terms: str) -> bool:
+        """True se algum dos termos aparece nos logs (KEYWORDS pré-calculados; resto por substring)."""
+        for t in terms:
+            if t in _KW_SET:
+                if t in self.terms:
+                    return True
+            elif t.lower() in self._low:
+                return True
+        return False
+
+    @cached_property
+    def _low(self) -> str:
+        return self.text.lower()
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(dict.fromkeys(self.missing_names + self.undefined_refs))
+
+    @property
+    def modules(self) -> List[str]:
+        return list(dict.fromkeys(self.unresolved_modules + self.missing_modules))
+
+    @cached_property
+    def positions(self) -> List[Dict[str, Any]]:
+        """{file, line, col} de cada localização (calculado só se alguém pedir)."""
+        out: List[Dict[str, Any]] = []
+        for m in RX_POSITION.finditer(self.text):
+            col = m.group("col") or m.group("col2")
+            out.append({"file": m.group("file"), "line": int(m.group("line") or m.group("line2")),
+                        "col": int(col) if col else None})
+        return out
+
+    @property
+    def stage(self) -> str:
+        """Etapa dominante (build/types/tests/style/general) — regra do ProvidersRouter."""
+        if self.has("ts2304", "ts2307", "type"):
+            return "types"
+        if self.has("build", "module not found", "vite"):
+            return "build"
+        if self.has("test", "jest", "vitest", "pytest"):
+            return "tests"
+        if self.has("style", "eslint", "prettier"):
+            return "style"
+        return "general"
+
+
+def classify_text(text: str) -> ErrorClassification:
+    """
+    Classifica um texto de logs uma única vez (memo por conteúdo).
+    Devolve uma cópia rasa com listas próprias: quem a alterar não contamina a memo.
+    """
+    c = _classify_cached(text or "")
+    return replace(c, codes=list(c.codes), missing_names=list(c.missing_names),
+                   undefined_refs=list(c.undefined_refs), unresolved_modules=list(c.unresolved_modules),
+                   missing_modules=list(c.missing_modules), hooks=list(c.hooks),
+                   parse_errors=list(c.parse_errors))
+
+
+@lru_cache(maxsize=8)
+def _classify_cached(text: str) -> ErrorClassification:
+    """Palavras-chave: uma cópia em minúsculas + pesquisa de substring em C por termo."""
+    text = text or ""
+    low = text.lower()
+    c = ErrorClassification(terms=frozenset(k for k in KEYWORDS if k in low), text=text)
+    if "ts" in c.terms:
+        for m in RX_CODE.finditer(text):
+            i = m.start()
+            if i and (text[i - 1].isalnum() or text[i - 1] == "_"):
+                continue
+            if m.group(0) not in c.codes:
+                c.codes.append(m.group(0))
+    for attr, guard, rx, grp in _GUARDS:
+        if guard in text:
+            getattr(c, attr).extend(m.group(grp) for m in rx.finditer(text))
+    if "React" in text:
+        c.hooks.extend((m.group("hook"), m.group("fn")) for m in RX_HOOK.finditer(text))
+    return c
+
+
+def classify_logs(logs: Dict[str, str] | None) -> ErrorClassification:
+    """Mesma junção usada pelos consumidores (" ".join(logs.values()))."""
+    return classify_text(" ".join(str(v) for v in (logs or {}).values()))
@@ -1,7 +1,11 @@
 from __future__ import annotations
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Any, Dict, List, Tuple, Callable, Optional
 
+from llm.backends.deadline import Budget, activate
+
 try:
     # Prefer the real components se existirem
     from llm.simulation.preflight_simulator import PreflightSimulator  # type: ignore
@@ -37,10 +41,17 @@ class Reranker:
         preflight: Optional[Any] = None,
         strategos_v2: Optional[Any] = None,
         learning_system: Optional[Any] = None,
+        max_workers: Optional[int] = None,
+        timeout_s: Optional[float] = None,
+        early_stop: Optional[bool] = None,
     ):
         self.preflight = preflight or self._fallback_preflight()
         self.strategos_v2 = strategos_v2
         self.learning_system = learning_system
+        # geração concorrente: limite de simultâneos, timeout por candidato (desde o arranque), paragem no 1º verde
+        self.max_workers = int(os.getenv("LLM_GEN_WORKERS", "4") if max_workers is None else max_workers)
+        self.timeout_s = float(os.getenv("LLM_GEN_TIMEOUT_S", "150") if timeout_s is None else timeout_s)
+        self.early_stop = (os.getenv("LLM_GEN_EARLY_STOP", "1") != "0") if early_stop is None else early_stop
 
     def _fallback_preflight(self):
         class _PF:
@@ -100,6 +111,103 @@ class Reranker:
             score -= 1.0
         return score
 
+    def _evaluate(self, logs: Dict[str, str], files: Dict[str, str], gen: Callable[[], Tuple[str, str]],
+                  budget: Optional[Budget] = None) -> CandidateResult:
+        t0 = time.perf_counter()
+        try:
+            if budget is not None:
+                # gerador, backends e pool HTTP herdam o prazo/cancelamento do candidato
+                with activate(budget):
+                    name, diff = gen()
+                    budget.check()
+            else:
+                name, diff = gen()
+            c = CandidateResult(name, diff)
+            met = self._do_preflight(logs, files, diff)
+            c.metrics = met
+            # "ok" = todos os gates essenciais
+            c.ok = bool(met.get("apply_ok") and met.get("typecheck_ok") and met.get("lint_ok") and met.get("tests_ok") and met.get("secrets_ok"))
+        except Exception as e:
+            c = CandidateResult("generator_error", "")
+            c.metrics = {"error": str(e)}
+            c.ok = False
+        c.metrics["gen_ms"] = int((time.perf_counter() - t0) * 1000)
+        return c
+
+    def _generate_all(
+        self,
+        logs: Dict[str, str],
+        files: Dict[str, str],
+        candidate_generators: List[Callable[[], Tuple[str, str]]],
+    ) -> Tuple[List[CandidateResult], List[int]]:
+        """
+        Corre geradores+preflight num executor com no máximo self.max_workers threads.
+        - cada candidato tem um deadline.Budget de self.timeout_s desde o seu arranque; o prazo
+          chega aos backends/pool HTTP (timeout de socket = tempo restante) e o cancelamento
+          faz shutdown da ligação em curso
+        - expirado → candidato em erro "timeout" e Budget cancelado; a thread só liberta o lugar
+          quando termina de facto, por isso max_workers limita a concorrência real
+        - early_stop: ao primeiro candidato 100% verde, os que ainda não começaram são cancelados
+          e os que correm recebem cancel()
+        Devolve resultados na ordem dos geradores + índices cancelados.
+        """
+        n = len(candidate_generators)
+        if n == 0:
+            return [], []
+        slots: List[Optional[CandidateResult]] = [None] * n
+        timed_out: List[int] = []
+        queue = list(range(n))
+        live: Dict[Future, Tuple[int, Budget]] = {}     # submetidos e ainda vivos (inclui abandonados)
+        abandoned: set = set()
+        limit = max(1, min(self.max_workers, n))
+        ex = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="rerank-gen")
+        green = False
+        try:
+            while queue or len(live) > len(abandoned):
+                # só arranca candidatos com lugar real livre (threads abandonadas ainda contam)
+                while queue and len(live) < limit:
+                    i = queue.pop(0)
+                    b = Budget(self.timeout_s)
+                    live[ex.submit(self._evaluate, logs, files, candidate_generators[i], b)] = (i, b)
+                active = [b.deadline for f, (_, b) in live.items() if f not in abandoned]
+                left = max(0.0, min(active) - time.monotonic()) if active else None
+                done, _ = wait(list(live), timeout=left, return_when=FIRST_COMPLETED)
+                for f in done:
+                    i, b = live.pop(f)
+                    if f in abandoned:
+                        abandoned.discard(f)
+                        continue
+                    c = f.result()
+                    if not c.ok and time.monotonic() >= b.deadline:
+                        timed_out.append(i)     # o próprio gerador parou no prazo: conta como timeout
+                        continue
+                    slots[i] = c
+                    green = green or c.ok
+                for f, (i, b) in live.items():
+                    if f not in abandoned and b.expired():
+                        abandoned.add(f)
+                        timed_out.append(i)
+                        b.cancel()
+                if green and self.early_stop:
+                    break
+        finally:
+            for _, b in live.values():
+                b.cancel()
+            ex.shutdown(wait=False, cancel_futures=True)
+
+        results: List[CandidateResult] = []
+        cancelled: List[int] = []
+        for i, c in enumerate(slots):
+            if c is not None:
+                results.append(c)
+            elif i in timed_out or not (green and self.early_stop):
+                t = CandidateResult("generator_error", "")
+                t.metrics = {"error": f"timeout after {self.timeout_s:g}s"}
+                results.append(t)
+            else:
+                cancelled.append(i)
+        return results, cancelled
+
     def run(
         self,
         logs: Dict[str, str],
@@ -108,8 +216,8 @@ class Reranker:
         context: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """
-        Executa cada gerador → diffs → preflight → escolhe vencedor.
-        Retorna {winner: {name,diff,metrics}, candidates:[...], strategos:..., memory:...}
+        Executa os geradores em paralelo → diffs → preflight → escolhe vencedor.
+        Retorna {winner: {name,diff,metrics}, candidates:[...], strategos:..., memory:..., cancelled:[idx]}
         """
         context = context or {}
         # Anotação de Strategos v2 (se presente)
@@ -128,22 +236,7 @@ class Reranker:
             except Exception:
                 memory_note = None
 
-        results: List[CandidateResult] = []
-
-        for gen in candidate_generators:
-            try:
-                name, diff = gen()
-                c = CandidateResult(name, diff)
-                met = self._do_preflight(logs, files, diff)
-                c.metrics = met
-                # "ok" = todos os gates essenciais
-                c.ok = bool(met.get("apply_ok") and met.get("typecheck_ok") and met.get("lint_ok") and met.get("tests_ok") and met.get("secrets_ok"))
-                results.append(c)
-            except Exception as e:
-                c = CandidateResult("generator_error", "")
-                c.metrics = {"error": str(e)}
-                c.ok = False
-                results.append(c)
+        results, cancelled = self._generate_all(logs, files, candidate_generators)
 
         # Ordena por (ok desc, score desc, diff pequeno asc)
         def keyer(c: CandidateResult):
@@ -167,4 +260,5 @@ class Reranker:
             ],
             "strategos": strategos_note,
             "memory": memory_note,
+            "cancelled": cancelled,
         }
@@ -1,41 +1,11 @@
 from __future__ import annotations
-import re
 from typing import Dict, Any, List, Tuple
 
-# Cobertura mais robusta para chaves comuns (sem guardar valores reais)
-_SECRET_RE = re.compile(
-    r"("
-    r"sk-[A-Za-z0-9_\-]{16,}"                          # OpenAI-like
-    r"|ghp_[A-Za-z0-9]{20,}"                           # GitHub PAT
-    r"|xox[baprs]-[A-Za-z0-9\-]{10,}"                  # Slack tokens
-    r"|AIza[0-9A-Za-z\-_]{35}"                         # Google API
-    r"|(?:api|token|secret|key)[-_]?[=:]\s*['\"][A-Za-z0-9_\-]{16,}['\"]"  # genérico
-    r")",
-    re.I,
-)
-_HDR_OLD = re.compile(r"^--- a/(.+)$")
-_HDR_NEW = re.compile(r"^\+\+\+ b/(.+)$")
+from ..guard.scan_engine import ENGINE as _SECRET_ENGINE  # registo único de regras de segredos
+from ..parsed_diff import DiffLike, parse_diff
 
-def _parse_diff(diff:str)->List[Dict[str,Any]]:
-    files=[]; cur=None; adds=rems=0
-    old=new=None
-    for ln in diff.splitlines():
-        m1=_HDR_OLD.match(ln); m2=_HDR_NEW.match(ln)
-        if m1:
-            old=m1.group(1); continue
-        if m2:
-            # fecha anterior
-            if cur:
-                cur["adds"]=adds; cur["removes"]=rems; files.append(cur)
-                adds=rems=0
-            new=m2.group(1)
-            cur={"path":new or old or "", "adds":0, "removes":0}
-            continue
-        if ln.startswith("+") and not ln.startswith("+++"): adds+=1
-        elif ln.startswith("-") and not ln.startswith("---"): rems+=1
-    if cur:
-        cur["adds"]=adds; cur["removes"]=rems; files.append(cur)
-    return files
+def _parse_diff(diff:DiffLike)->List[Dict[str,Any]]:
+    return [{"path":f.path, "adds":len(f.added), "removes":len(f.removed)} for f in parse_diff(diff).files]
 
 def _layer_for(path:str)->str:
     p=path.lower()
@@ -52,16 +22,14 @@ def _ext(path:str)->str:
     return ""
 
 def _secret_hits(texts:List[str])->int:
-    c=0
-    for t in texts:
-        c+=len(list(_SECRET_RE.finditer(t)))
-    return c
+    return sum(len(_SECRET_ENGINE.scan_text(t, severities=("block",))) for t in texts)
 
-def analyze_diff(logs:Dict[str,str], files_before:Dict[str,str], diff:str)->Dict[str,Any]:
+def analyze_diff(logs:Dict[str,str], files_before:Dict[str,str], diff:DiffLike)->Dict[str,Any]:
     """
     Forense de impacto: ficheiros tocados, camadas, risco e sinais (segredos/hotspots/dup).
     """
-    touched=_parse_diff(diff)
+    pd=parse_diff(diff)
+    touched=_parse_diff(pd)
     layers_count={}
     total_adds=total_rems=0
     for f in touched:
@@ -71,7 +39,7 @@ def analyze_diff(logs:Dict[str,str], files_before:Dict[str,str], diff:str)->Dict
         total_adds+=f["adds"]; total_rems+=f["removes"]
 
     # Sinais rápidos
-    secrets=_secret_hits([diff])
+    secrets=_secret_hits([pd.text])
     big_patch = (total_adds+total_rems)>300
     ui_touches = sum(1 for f in touched if f["layer"]=="UI")
     infra_touches = sum(1 for f in touched if f["layer"]=="INFRA")
@@ -0,0 +1,189 @@
+from __future__ import annotations
+import math, re
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..parsed_diff import ADD, CONTENT_ROLES, DiffLike, parse_diff
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Regra do registo único: `literals` (minúsculas) filtram as linhas candidatas;
+    a regex só corre nessas linhas. `min_entropy` confirma o valor (grupo "v" ou match inteiro).
+    """
+    id: str
+    kind: str                     # secret | pii
+    literals: Tuple[str, ...]
+    regex: "re.Pattern[str]"
+    severity: str = "block"       # block | advisory
+    min_entropy: float = 0.0
+    label: str = "[redacted-secret]"
+
+
+_R = re.compile
+RULES: Tuple[Rule, ...] = (
+    Rule("openai_key", "secret", ("sk-",), _R(r"sk-[A-Za-z0-9_\-]{16,}", re.I)),
+    Rule("github_pat", "secret", ("ghp_",), _R(r"ghp_[A-Za-z0-9]{20,}", re.I)),
+    Rule("slack_token", "secret", ("xox",), _R(r"xox[baprs]-[A-Za-z0-9\-]{10,}", re.I)),
+    Rule("google_api_key", "secret", ("aiza",), _R(r"AIza[0-9A-Za-z\-_]{35}")),
+    Rule("aws_access_key", "secret", ("akia", "asia"), _R(r"(?:AKIA|ASIA)[0-9A-Z]{16}")),
+    Rule("private_key", "secret", ("-----begin",), _R(r"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP )?PRIVATE KEY-----")),
+    # atribuições genéricas: o valor tem de parecer aleatório (placeholders tipo "xxxx…" não contam)
+    Rule("generic_assignment", "secret", ("api", "key", "token", "secret"),
+         _R(r"(?:api[_-]?key|api|token|secret|key)[\"']?\s*[:=]\s*[\"'](?P<v>[A-Za-z0-9_\-]{16,})[\"']?", re.I),
+         min_entropy=3.0),
+    Rule("password_assignment", "secret", ("password", "passwd"),
+         _R(r"(?:password|passwd)[\"']?\s*[:=]\s*[\"'](?P<v>[A-Za-z0-9_\-]{8,})[\"']", re.I),
+         min_entropy=2.5),
+    Rule("email", "pii", ("@",), _R(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.I), label="[redacted-email]"),
+)
+
+
+def shannon_entropy(s: str) -> float:
+    """Entropia de Shannon em bits/carácter."""
+    if not s:
+        return 0.0
+    n = len(s)
+    counts: Dict[str, int] = {}
+    for ch in s:
+        counts[ch] = counts.get(ch, 0) + 1
+    return -sum(c / n * math.log2(c / n) for c in counts.values())
+
+
+@dataclass(frozen=True)
+class Finding:
+    rule: str
+    kind: str
+    severity: str
+    line: int                     # 1-based no texto analisado
+    col: int                      # 0-based na linha
+    match: str
+    path: Optional[str] = None    # ficheiro (só em scan_diff)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ScanEngine:
+    """
+    Motor único de segredos/PII:
+    1) filtro por literais sobre o texto inteiro (bytes.lower + find em C, um salto por linha)
+    2) regex apenas nas linhas candidatas e só das regras cujo literal apareceu
+    3) confirmação por entropia nas regras genéricas
+    """
+    def __init__(self, rules: Sequence[Rule] = RULES) -> None:
+        self.rules = tuple(rules)
+        self._literals: Dict[bytes, List[int]] = {}
+        for i, r in enumerate(self.rules):
+            for lit in r.literals:
+                self._literals.setdefault(lit.lower().encode("utf-8"), []).append(i)
+
+    # ------------------------------ pré-filtro ------------------------------
+    def _candidates(self, data: bytes, kinds: Optional[Iterable[str]]) -> Dict[int, List[int]]:
+        """posição de início de linha (bytes) → índices das regras a correr nessa linha."""
+        wanted = None if kinds is None else set(kinds)
+        low = data.lower()                     # só ASCII → offsets iguais aos de `data`
+        out: Dict[int, List[int]] = {}
+        for lit, rule_ids in self._literals.items():
+            ids = [i for i in rule_ids if wanted is None or self.rules[i].kind in wanted]
+            if not ids:
+                continue
+            pos = low.find(lit)
+            while pos >= 0:
+                start = low.rfind(b"\n", 0, pos) + 1
+                bucket = out.setdefault(start, [])
+                bucket.extend(i for i in ids if i not in bucket)
+                end = low.find(b"\n", pos)
+                if end < 0:
+                    break
+                pos = low.find(lit, end + 1)
+        return out
+
+    def _accept(self, rule: Rule, m: "re.Match[str]") -> bool:
+        if rule.min_entropy <= 0:
+            return True
+        v = m.groupdict().get("v") or m.group(0)
+        return shannon_entropy(v) >= rule.min_entropy
+
+    def _iter_lines(self, text: str, kinds: Optional[Iterable[str]]):
+        """(nº da linha 1-based, início em bytes, texto da linha, regras) para as linhas candidatas."""
+        data = text.encode("utf-8")
+        cands = self._candidates(data, kinds)
+        line, prev = 1, 0
+        for start in sorted(cands):
+            line += data.count(b"\n", prev, start)
+            prev = start
+            end = data.find(b"\n", start)
+            raw = data[start:] if end < 0 else data[start:end]
+            yield line, start, raw.decode("utf-8", "replace"), [self.rules[i] for i in sorted(cands[start])]
+
+    # -------------------------------- API --------------------------------
+    def scan_text(self, text: str, kinds: Optional[Iterable[str]] = ("secret",),
+                  severities: Optional[Iterable[str]] = None) -> List[Finding]:
+        sev = None if severities is None else set(severities)
+        out: List[Finding] = []
+        for line, _, s, rules in self._iter_lines(text, kinds):
+            for r in rules:
+                if sev is not None and r.severity not in sev:
+                    continue
+                for m in r.regex.finditer(s):
+                    if self._accept(r, m):
+                        out.append(Finding(r.id, r.kind, r.severity, line, m.start(), m.group(0)))
+        return out
+
+    def scan_diff(self, diff: DiffLike, kinds: Optional[Iterable[str]] = ("secret",), added_only: bool = False,
+                  severities: Optional[Iterable[str]] = None) -> List[Finding]:
+        """Só linhas de conteúdo do diff (papéis do ParsedDiff partilhado); `path` = ficheiro da linha."""
+        pd = parse_diff(diff)
+        findings = self.scan_text(pd.text, kinds, severities)
+        if not findings:
+            return findings
+        roles = (ADD,) if added_only else CONTENT_ROLES
+        out: List[Finding] = []
+        for f in findings:
+            if pd.role(f.line) not in roles:
+                continue
+            fd = pd.file_at(f.line)
+            out.append(Finding(f.rule, f.kind, f.severity, f.line, f.col, f.match, fd.path if fd else None))
+        return out
+
+    def has_findings(self, text: str, kinds: Optional[Iterable[str]] = ("secret",)) -> bool:
+        for _, _, s, rules in self._iter_lines(text, kinds):
+            for r in rules:
+                if any(self._accept(r, m) for m in r.regex.finditer(s)):
+                    return True
+        return False
+
+    def redact(self, text: str, kinds: Optional[Iterable[str]] = ("secret", "pii")) -> str:
+        """Substitui cada match pelo `label` da regra (PII antes de segredos, como no episódico)."""
+        data = text.encode("utf-8")
+        parts: List[bytes] = []
+        prev = 0
+        for _, start, s, rules in self._iter_lines(text, kinds):
+            new = s
+            for r in sorted(rules, key=lambda r: r.kind != "pii"):
+                new = r.regex.sub(lambda m, r=r: r.label if self._accept(r, m) else m.group(0), new)
+            if new != s:
+                parts.append(data[prev:start])
+                parts.append(new.encode("utf-8"))
+                prev = start + len(s.encode("utf-8"))
+        if not parts:
+            return text
+        parts.append(data[prev:])
+        return b"".join(parts).decode("utf-8")
+
+
+ENGINE = ScanEngine()
+
+
+def scan_text(text: str, kinds: Optional[Iterable[str]] = ("secret",)) -> List[Finding]:
+    return ENGINE.scan_text(text, kinds)
+
+
+def scan_diff(diff: DiffLike, kinds: Optional[Iterable[str]] = ("secret",), added_only: bool = False) -> List[Finding]:
+    return ENGINE.scan_diff(diff, kinds, added_only=added_only)
+
+
+def redact(text: str, kinds: Optional[Iterable[str]] = ("secret", "pii")) -> str:
+    return ENGINE.redact(text, kinds)
@@ -2,12 +2,11 @@ from __future__ import annotations
 import re
 from typing import Dict, Any, List, Optional, Tuple
 
+from ..guard.scan_engine import ENGINE as SECRET_ENGINE  # registo único de regras de segredos
+from ..parsed_diff import DiffLike, parse_diff
+
 Severity = str  # "block" | "advisory"
 
-SECRET_PATTERNS = [
-    re.compile(r"(?i)(api[_-]?key|secret|token)\s*[:=]\s*['\"][A-Za-z0-9_\-]{16,}"),
-    re.compile(r"-----BEGIN (RSA|EC) PRIVATE KEY-----"),
-]
 FORBIDDEN_PATH_HINTS = [
     ".env", ".ssh/", "secrets.", "id_rsa", ".pem"
 ]
@@ -15,20 +14,9 @@ FORBIDDEN_PATH_HINTS = [
 FUNC_DEF = re.compile(r"\b(function\s+([A-Za-z0-9_]+)\s*\(|const\s+([A-Za-z0-9_]+)\s*=\s*\(|export\s+function\s+([A-Za-z0-9_]+)\s*\()", re.M)
 IMPORT_LINE = re.compile(r"^\s*import\s+.*from\s+['\"]([^'\"]+)['\"]", re.M)
 
-def _collect_added_hunks(diff: str) -> Dict[str, List[str]]:
-    """Return {path: [added_lines...]} from unified diff."""
-    files: Dict[str, List[str]] = {}
-    cur: Optional[str] = None
-    for line in diff.splitlines():
-        if line.startswith("+++ b/"):
-            cur = line[6:].strip()
-            files[cur] = []
-            continue
-        if cur is None:
-            continue
-        if line.startswith("+") and not line.startswith("+++"):
-            files[cur].append(line[1:])
-    return files
+def _collect_added_hunks(diff: DiffLike) -> Dict[str, List[str]]:
+    """Return {path: [added_lines...]} from unified diff (ParsedDiff partilhado)."""
+    return parse_diff(diff).added_by_path()
 
 def _looks_layer_violation(path: str, import_target: str) -> bool:
     p = path.lower()
@@ -55,9 +43,9 @@ def scan_secrets_and_paths(added: Dict[str, List[str]]) -> List[Dict[str, Any]]:
         if any(h in low for h in FORBIDDEN_PATH_HINTS):
             findings.append({"kind":"security/path", "severity":"block", "path":path, "msg":"Path sensível referenciado no diff."})
         text = "\n".join(lines)
-        for pat in SECRET_PATTERNS:
-            if pat.search(text):
-                findings.append({"kind":"security/secret", "severity":"block", "path":path, "msg":"Possível segredo detectado nas adições."})
+        for rule in sorted({f.rule for f in SECRET_ENGINE.scan_text(text, severities=("block",))}):
+            findings.append({"kind":"security/secret", "severity":"block", "path":path, "rule":rule,
+                             "msg":"Possível segredo detectado nas adições."})
     return findings
 
 def scan_architecture(added: Dict[str, List[str]]) -> List[Dict[str, Any]]:
@@ -100,7 +88,7 @@ def scan_scalability(added: Dict[str, List[str]]) -> List[Dict[str, Any]]:
                              "msg":"Possível loop aninhado detectado; verifica complexidade (O(n^2))."})
     return findings
 
-def analyze_patch(files_before: Optional[Dict[str, str]], diff_text: str) -> Dict[str, Any]:
+def analyze_patch(files_before: Optional[Dict[str, str]], diff_text: DiffLike) -> Dict[str, Any]:
     """
     Retorna {"violations":[...], "proofs":[...], "score":float}
     Score (0-1) penaliza apenas violações 'block'; 'advisory' não bloqueia.
@@ -1,10 +1,12 @@
 from __future__ import annotations
-import json, re, os, hashlib
+import json, re, os, hashlib, zlib
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import Dict, Any, List, Tuple
 from datetime import datetime, timezone
 
+from ..guard.scan_engine import redact as redact_secrets
+
 # Limites defensivos
 MAX_FIELD_LEN = 2000           # cada string sanitizada
 MAX_LINE_BYTES = 32 * 1024     # cada linha JSONL
@@ -15,15 +17,17 @@ def _truncate(s: str, lim: int = MAX_FIELD_LEN) -> str:
         s = str(s)
     return s if len(s) <= lim else s[:lim] + "…"
 
-def _rotate_if_needed(path: str):
+def _rotate_if_needed(path: str) -> str | None:
     try:
         if os.path.exists(path) and os.path.getsize(path) >= MAX_FILE_BYTES:
             ts = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
             dst = f"{path.rsplit('.',1)[0]}-{ts}.jsonl"
             os.replace(path, dst)
+            return dst
     except Exception:
         # rotação best-effort; não impede execução
         pass
+    return None
 
 # Ficheiros
 MEM_DIR = Path(".fortaleza/memory")
@@ -31,8 +35,9 @@ EP_FILE = MEM_DIR / "episodes.jsonl"
 RULES_FILE = MEM_DIR / "rules.json"
 META_FILE = MEM_DIR / "meta.json"
 
-PII_RE = re.compile(r"([A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,})", re.I)
-SECRET_RE = re.compile(r"(sk-[A-Za-z0-9_\-]{16,}|ghp_[A-Za-z0-9]{20,}|xox[baprs]-[A-Za-z0-9\-]{10,}|AIza[0-9A-Za-z\-_]{35})")
+# promoção só considera os episódios mais recentes (falhas antigas deixam de bloquear)
+PROMOTE_WINDOW = 5000
+
 ABS_PATH_RE = re.compile(r"(^\/|^[A-Za-z]:\\)")
 
 def _utc_iso() -> str:
@@ -49,8 +54,7 @@ def _safe_rel(path: str) -> str:
     return path.lstrip("./")
 
 def _sanitize(s: str) -> str:
-    s = PII_RE.sub("[redacted-email]", s)
-    s = SECRET_RE.sub("[redacted-secret]", s)
+    s = redact_secrets(s, kinds=("pii", "secret"))
     return s[:2000]  # limite defensivo
 
 @dataclass
@@ -80,6 +84,14 @@ class Episode:
         )
 
 class EpisodicMemory:
+    """
+    Memória episódica. Backend de leitura/agregados:
+      - FORT_MEM_BACKEND=sqlite (padrão): EpisodeStore (SQLite/WAL, índices + agregados incrementais)
+      - FORT_MEM_BACKEND=jsonl: leitura completa de episodes.jsonl (comportamento original)
+    O episodes.jsonl continua a ser escrito (ferramentas como getafix/miner leem-no).
+    Métricas: contadores do EpisodeStore (MetricsAggregator) → metrics() em O(1);
+    no backend jsonl as métricas são recontadas a partir do ficheiro.
+    """
     def __init__(self, mem_dir: Path | None = None):
         self.mem_dir = mem_dir or MEM_DIR
         self.mem_dir.mkdir(parents=True, exist_ok=True)
@@ -87,6 +99,24 @@ class EpisodicMemory:
             RULES_FILE.write_text("[]", encoding="utf-8")
         if not META_FILE.exists():
             META_FILE.write_text(json.dumps({"avoidance_saves":0}, indent=2), encoding="utf-8")
+        self.store = None
+        if os.getenv("FORT_MEM_BACKEND", "sqlite") == "sqlite":
+            try:
+                from .sqlite_store import EpisodeStore, jsonl_history
+                self.store = EpisodeStore(self.mem_dir / "episodes.sqlite")
+                if self.store.created:
+                    # 1ª utilização: importa histórico JSONL (inclui ficheiros rotacionados)
+                    self.store.import_jsonl(jsonl_history(self.mem_dir))
+            except Exception:
+                self.store = None
+        self.agg = None
+        if self.store is not None:
+            from .metrics_agg import MetricsAggregator
+            self.agg = MetricsAggregator(self.store)
+            if not self.agg.initialized():
+                # 1ª utilização: total/repeats já vêm da importação; faltam regras/meta
+                self.agg.on_rules(self._load_rules())
+                self.agg.on_meta(self._load_meta())
 
     # ---------- persistência ----------
     def append(self, ep: Episode) -> None:
@@ -101,11 +131,18 @@ class EpisodicMemory:
             slim = {k: data.get(k) for k in ("ts", "repo", "file", "err_code", "err_msg", "toolchain", "action", "outcome")}
             line = json.dumps(slim, ensure_ascii=False)
         self.mem_dir.mkdir(parents=True, exist_ok=True)
-        _rotate_if_needed(str(EP_FILE))
+        rotated = _rotate_if_needed(str(EP_FILE))
         with EP_FILE.open("a", encoding="utf-8") as f:
             f.write(line + "\n")
+        if self.store is not None:
+            if rotated:
+                self.store.mark_imported(Path(rotated))
+            # total/repeats das métricas são atualizados na mesma transação
+            self.store.append(json.loads(line))
 
-    def _load_episodes(self, limit:int=5000) -> List[Dict[str,Any]]:
+    def _load_episodes(self, limit:int=PROMOTE_WINDOW) -> List[Dict[str,Any]]:
+        if self.store is not None:
+            return self.store.recent(limit)
         if not EP_FILE.exists(): return []
         out: List[Dict[str,Any]] = []
         with EP_FILE.open("r", encoding="utf-8") as f:
@@ -121,8 +158,25 @@ class EpisodicMemory:
         except:
             return []
 
+    def _rules_sig(self) -> int:
+        """CRC32 do rules.json (-1 se não existir) — deteta edições/reset externos."""
+        try:
+            return zlib.crc32(RULES_FILE.read_bytes())
+        except OSError:
+            return -1
+
     def _save_rules(self, rules: List[Dict[str,Any]]) -> None:
         RULES_FILE.write_text(json.dumps(rules, indent=2, ensure_ascii=False), encoding="utf-8")
+        if self.store is not None:
+            try:
+                self.store.set_counters({"rules_sig": self._rules_sig()})
+            except Exception:
+                pass  # sem assinatura → próxima promoção é completa
+        if self.agg is not None:
+            try:
+                self.agg.on_rules(rules)
+            except Exception:
+                pass  # contadores derivados; metrics(recompute=True) reconstrói
 
     def _load_meta(self) -> Dict[str,Any]:
         try:
@@ -132,10 +186,17 @@ class EpisodicMemory:
 
     def _save_meta(self, meta: Dict[str,Any]) -> None:
         META_FILE.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+        if self.agg is not None:
+            try:
+                self.agg.on_meta(meta)
+            except Exception:
+                pass  # contadores derivados; metrics(recompute=True) reconstrói
 
     # ---------- promoção de regras ----------
     def promote_rules(self, n:int=3) -> Tuple[int,int]:
         """Promove regras if-this-then-that após N≥3 sucessos sem regressão."""
+        if self.store is not None:
+            return self._promote_incremental(n)
         eps = self._load_episodes()
         buckets: Dict[str, List[Dict[str,Any]]] = {}
         for e in eps:
@@ -163,6 +224,35 @@ class EpisodicMemory:
         self._save_rules(rules)
         return added, kept
 
+    def _promote_incremental(self, n:int=3) -> Tuple[int,int]:
+        """
+        Igual a promote_rules (mesma janela de PROMOTE_WINDOW episódios), mas só revisita
+        chaves com episódios novos (O(alterados)). Se o rules.json falta ou não corresponde
+        ao último gravado (reset/edição externa), reavalia todas as chaves da janela.
+        """
+        dirty = self.store.take_dirty_buckets()
+        in_sync = self.store.counters().get("rules_sig") == self._rules_sig() != -1
+        if in_sync and not dirty:
+            return 0, 0
+        stats = self.store.window_stats(PROMOTE_WINDOW)
+        keys = dirty if in_sync else list(stats)
+        rules = self._load_rules()
+        by_key = {r.get("key"): r for r in rules}
+        added=0; kept=0
+        for key in keys:
+            succ, fail = stats.get(key, (0, 0))
+            if fail:
+                by_key.pop(key, None)   # regressão → despromove
+            elif succ >= n:
+                if key not in by_key:
+                    by_key[key] = {"key":key, "confidence":0.8, "hits":0, "regressions":0,
+                                   "policy":"apply_priors", "created_at":_utc_iso()}
+                    added+=1
+                else:
+                    kept+=1
+        self._save_rules(list(by_key.values()))
+        return added, kept
+
     # ---------- aplicação de priors seguros ----------
     def apply_priors(self, request: Dict[str,Any], logs: Dict[str,Any], context: Dict[str,Any] | None=None) -> Dict[str,Any]:
         """
@@ -201,20 +291,19 @@ class EpisodicMemory:
         return request
 
     # ---------- métricas ----------
-    def metrics(self) -> Dict[str,Any]:
-        eps = self._load_episodes()
-        rules = self._load_rules()
-        mem = self._load_meta()
-        # taxa de repetição: falhas com mesmo err_code+bucket após 2+ ocorrências
-        seen=set(); repeats=0; total=max(1,len(eps))
-        for e in eps:
-            k = (e.get("err_code"), (e.get("file") or "").split("/")[0])
-            if k in seen and e.get("outcome")=="fail":
-                repeats += 1
-            seen.add(k)
-        return {
-            "repeat_error_rate": round(100*repeats/total, 2),
-            "rules_promoted": len(rules),
-            "rules_hit_rate": round(100*sum(r.get("hits",0) for r in rules)/max(1,len(eps)), 2),
-            "avoidance_saves": int(mem.get("avoidance_saves",0)),
-        }
+    def metrics(self, recompute: bool = False) -> Dict[str,Any]:
+        """
+        Métricas a partir dos contadores do EpisodeStore (O(1)).
+        recompute=True reconstrói-os a partir da fonte de verdade; sem store recontagem completa.
+        """
+        if self.agg is None:
+            from .metrics_agg import scan_metrics
+            return scan_metrics(self._all_episodes(), self._load_rules(), self._load_meta())
+        if recompute:
+            return self.agg.rebuild(self._load_rules(), self._load_meta())
+        return self.agg.metrics()
+
+    def _all_episodes(self) -> List[Dict[str,Any]]:
+        if self.store is not None:
+            return self.store.recent(-1)   # LIMIT -1 = histórico completo
+        return self._load_episodes(limit=10**12)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, Iterable, List
+
+from .sqlite_store import EpisodeStore, file_bucket
+
+# contadores de regras/meta guardados ao lado de total/repeats (tabela counters do EpisodeStore)
+_RULE_COUNTERS = ("rules_promoted", "rules_hits", "avoidance_saves")
+
+
+def derive(counters: Dict[str, int]) -> Dict[str, Any]:
+    """Métricas públicas a partir dos contadores (total, repeats, rules_*, avoidance_saves)."""
+    total = max(1, int(counters.get("total", 0)))
+    return {
+        "repeat_error_rate": round(100 * int(counters.get("repeats", 0)) / total, 2),
+        "rules_promoted": int(counters.get("rules_promoted", 0)),
+        "rules_hit_rate": round(100 * int(counters.get("rules_hits", 0)) / total, 2),
+        "avoidance_saves": int(counters.get("avoidance_saves", 0)),
+    }
+
+
+def scan_metrics(episodes: Iterable[Dict[str, Any]], rules: List[Dict[str, Any]], meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Recontagem completa (backend jsonl, sem EpisodeStore)."""
+    seen: set = set(); repeats = 0; total = 0
+    for e in episodes:
+        k = (e.get("err_code") or "", file_bucket(e.get("file")))
+        if k in seen and e.get("outcome") == "fail":
+            repeats += 1
+        seen.add(k)
+        total += 1
+    return derive({"total": total, "repeats": repeats, "rules_promoted": len(rules),
+                   "rules_hits": sum(int(r.get("hits", 0) or 0) for r in rules),
+                   "avoidance_saves": int(meta.get("avoidance_saves", 0) or 0)})
+
+
+class MetricsAggregator:
+    """
+    Métricas da memória episódica sobre os contadores do EpisodeStore:
+    - total/repeats já são atualizados por append() na mesma transação do episódio
+    - on_rules()/on_meta() guardam rules_promoted, rules_hits e avoidance_saves na mesma tabela
+    - metrics() = um SELECT à tabela counters → O(1)
+    - rebuild() recalcula tudo a partir da fonte (episódios + rules.json + meta.json)
+    """
+    def __init__(self, store: EpisodeStore) -> None:
+        self.store = store
+
+    def initialized(self) -> bool:
+        return all(k in self.store.counters() for k in _RULE_COUNTERS)
+
+    def on_rules(self, rules: List[Dict[str, Any]]) -> None:
+        self.store.set_counters({"rules_promoted": len(rules),
+                                 "rules_hits": sum(int(r.get("hits", 0) or 0) for r in rules)})
+
+    def on_meta(self, meta: Dict[str, Any]) -> None:
+        self.store.set_counters({"avoidance_saves": int(meta.get("avoidance_saves", 0) or 0)})
+
+    def rebuild(self, rules: List[Dict[str, Any]], meta: Dict[str, Any]) -> Dict[str, Any]:
+        self.store.rebuild_counters()
+        self.on_rules(rules)
+        self.on_meta(meta)
+        return self.metrics()
+
+    def metrics(self) -> Dict[str, Any]:
+        return derive(self.store.counters())
+
+
+def read_metrics(db_path: str | Path) -> Dict[str, Any]:
+    """Leitura só de contadores (sem criar a BD) — usado pelo export de KPIs."""
+    path = Path(db_path)
+    if not path.exists():
+        return {}
+    try:
+        with sqlite3.connect(path, timeout=5) as conn:
+            counters = {k: int(v) for k, v in conn.execute("SELECT name, value FROM counters")}
+    except sqlite3.Error:
+        return {}
+    return derive(counters) if counters else {}
@@ -0,0 +1,217 @@
+from __future__ import annotations
+import json, sqlite3, threading
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Tuple
+
+_CORE = ("ts", "repo", "file", "err_code", "err_msg", "toolchain", "action", "outcome")
+
+def file_bucket(file: str | None) -> str:
+    """Bucket de ficheiro = 1º segmento do caminho relativo (ex.: 'src')."""
+    return (file or "").split("/")[0]
+
+def rule_key(ep: Dict[str, Any]) -> str:
+    """Mesma chave usada por EpisodicMemory.promote_rules (repo|err|bucket|toolchain)."""
+    return "|".join(filter(None, [
+        ep.get("repo"), ep.get("err_code"),
+        file_bucket(ep.get("file")) or None,
+        ep.get("toolchain") or None,
+    ]))
+
+
+class EpisodeStore:
+    """
+    Armazenamento indexado (SQLite/WAL) dos episódios da memória episódica.
+    - episodes: histórico completo (sem perda na rotação do JSONL)
+    - agregados incrementais atualizados em append():
+        counters(total, repeats), repeat_seen(err_code,bucket),
+        bucket_stats(key → succ/fail, histórico completo), dirty_buckets (pendentes p/ promote_rules)
+    - window_stats(): succ/fail por chave só nos últimos N episódios (janela da promoção)
+    """
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.created = not self.db_path.exists()
+        self._init_db()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self) -> None:
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS episodes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts TEXT, repo TEXT, file TEXT, bucket TEXT,
+                    err_code TEXT, err_msg TEXT, toolchain TEXT,
+                    action TEXT, outcome TEXT, extras TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ep_key ON episodes(repo, err_code, bucket, toolchain)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS repeat_seen (err_code TEXT, bucket TEXT, PRIMARY KEY (err_code, bucket))")
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket_stats (key TEXT PRIMARY KEY, succ INTEGER NOT NULL, fail INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS dirty_buckets (key TEXT PRIMARY KEY)")
+            conn.execute("CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, rows INTEGER NOT NULL)")
+
+    # ------------------------------- escrita --------------------------------
+    def _insert(self, conn: sqlite3.Connection, ep: Dict[str, Any]) -> None:
+        bucket = file_bucket(ep.get("file"))
+        extras = ep.get("extras")
+        if extras is None:
+            extras = {k: v for k, v in ep.items() if k not in _CORE}
+        conn.execute(
+            "INSERT INTO episodes(ts, repo, file, bucket, err_code, err_msg, toolchain, action, outcome, extras) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?)",
+            (ep.get("ts"), ep.get("repo"), ep.get("file"), bucket, ep.get("err_code"), ep.get("err_msg"),
+             ep.get("toolchain"), ep.get("action"), ep.get("outcome"), json.dumps(extras, ensure_ascii=False, default=str)),
+        )
+        # repeat_error_rate: falha com (err_code,bucket) já visto
+        cur = conn.execute("INSERT OR IGNORE INTO repeat_seen(err_code, bucket) VALUES(?,?)",
+                           (ep.get("err_code") or "", bucket))
+        repeat = 1 if (cur.rowcount == 0 and ep.get("outcome") == "fail") else 0
+        conn.execute("INSERT INTO counters(name, value) VALUES('total', 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+        if repeat:
+            conn.execute("INSERT INTO counters(name, value) VALUES('repeats', 1) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+        # agregados por chave de regra (promote_rules)
+        key = rule_key(ep)
+        succ = 1 if ep.get("outcome") == "green" else 0
+        fail = 1 if ep.get("outcome") == "fail" else 0
+        conn.execute("INSERT INTO bucket_stats(key, succ, fail) VALUES(?,?,?) "
+                     "ON CONFLICT(key) DO UPDATE SET succ = succ + excluded.succ, fail = fail + excluded.fail",
+                     (key, succ, fail))
+        conn.execute("INSERT OR IGNORE INTO dirty_buckets(key) VALUES(?)", (key,))
+
+    def append(self, ep: Dict[str, Any]) -> None:
+        with self._lock, self._conn() as conn:
+            self._insert(conn, ep)
+
+    def append_many(self, eps: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        with self._lock, self._conn() as conn:
+            for ep in eps:
+                self._insert(conn, ep)
+                n += 1
+        return n
+
+    # ------------------------------- leitura --------------------------------
+    def recent(self, limit: int = 5000) -> List[Dict[str, Any]]:
+        """Últimos `limit` episódios em ordem cronológica (formato do JSONL)."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT ts, repo, file, err_code, err_msg, toolchain, action, outcome, extras "
+                "FROM episodes ORDER BY id DESC LIMIT ?", (int(limit),)).fetchall()
+        out: List[Dict[str, Any]] = []
+        for r in reversed(rows):
+            d = dict(zip(_CORE, r[:8]))
+            try:
+                d["extras"] = json.loads(r[8] or "{}")
+            except Exception:
+                d["extras"] = {}
+            out.append(d)
+        return out
+
+    def counters(self) -> Dict[str, int]:
+        with self._conn() as conn:
+            return {k: int(v) for k, v in conn.execute("SELECT name, value FROM counters")}
+
+    def count(self) -> int:
+        return self.counters().get("total", 0)
+
+    def set_counters(self, values: Dict[str, int]) -> None:
+        """Grava contadores absolutos (ex.: rules_promoted, avoidance_saves) na tabela counters."""
+        with self._lock, self._conn() as conn:
+            conn.executemany("INSERT INTO counters(name, value) VALUES(?,?) "
+                             "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                             [(k, int(v)) for k, v in values.items()])
+
+    def rebuild_counters(self) -> Dict[str, int]:
+        """Recalcula total/repeats/repeat_seen a partir da tabela episodes (ordem de inserção)."""
+        with self._lock, self._conn() as conn:
+            seen: set = set(); total = 0; repeats = 0
+            for err_code, bucket, outcome in conn.execute(
+                    "SELECT err_code, bucket, outcome FROM episodes ORDER BY id"):
+                k = (err_code or "", bucket or "")
+                if k in seen and outcome == "fail":
+                    repeats += 1
+                seen.add(k)
+                total += 1
+            conn.execute("DELETE FROM repeat_seen")
+            conn.executemany("INSERT INTO repeat_seen(err_code, bucket) VALUES(?,?)", sorted(seen))
+            conn.executemany("INSERT INTO counters(name, value) VALUES(?,?) "
+                             "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                             [("total", total), ("repeats", repeats)])
+        return {"total": total, "repeats": repeats}
+
+    def take_dirty_buckets(self) -> List[str]:
+        """Devolve as chaves alteradas desde a última chamada e limpa a marca."""
+        with self._lock, self._conn() as conn:
+            rows = conn.execute("SELECT key FROM dirty_buckets").fetchall()
+            conn.execute("DELETE FROM dirty_buckets")
+        return [k for (k,) in rows]
+
+    def window_stats(self, window: int = 5000) -> Dict[str, Tuple[int, int]]:
+        """(succ, fail) por chave de regra nos últimos `window` episódios (mesma janela de _load_episodes)."""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT repo, err_code, bucket, toolchain, "
+                "SUM(outcome = 'green'), SUM(outcome = 'fail') "
+                "FROM (SELECT * FROM episodes ORDER BY id DESC LIMIT ?) "
+                "GROUP BY repo, err_code, bucket, toolchain", (int(window),)).fetchall()
+        out: Dict[str, Tuple[int, int]] = {}
+        for repo, err_code, bucket, toolchain, succ, fail in rows:
+            key = rule_key({"repo": repo, "err_code": err_code, "file": bucket, "toolchain": toolchain})
+            s0, f0 = out.get(key, (0, 0))
+            out[key] = (s0 + int(succ or 0), f0 + int(fail or 0))
+        return out
+
+    # ------------------------------ importação ------------------------------
+    def import_jsonl(self, paths: Iterable[Path]) -> Dict[str, int]:
+        """Importa ficheiros JSONL (rotacionados + atual) uma única vez cada."""
+        report: Dict[str, int] = {}
+        for p in paths:
+            p = Path(p)
+            with self._conn() as conn:
+                if conn.execute("SELECT 1 FROM imports WHERE path=?", (str(p.resolve()),)).fetchone():
+                    continue
+            eps: List[Dict[str, Any]] = []
+            try:
+                with p.open("r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            eps.append(json.loads(line))
+                        except Exception:
+                            pass
+            except OSError:
+                continue
+            n = self.append_many(eps)
+            with self._conn() as conn:
+                conn.execute("INSERT OR REPLACE INTO imports(path, rows) VALUES(?,?)", (str(p.resolve()), n))
+            report[str(p)] = n
+        return report
+
+    def mark_imported(self, path: Path) -> None:
+        """Regista um JSONL cujo conteúdo já está na base (ex.: ficheiro acabado de rotacionar)."""
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO imports(path, rows) VALUES(?, 0)", (str(Path(path).resolve()),))
+
+
+def jsonl_history(mem_dir: Path) -> List[Path]:
+    """episodes-<ts>.jsonl (rotacionados, por ordem) seguidos do episodes.jsonl atual."""
+    rotated = sorted(Path(mem_dir).glob("episodes-*.jsonl"))
+    live = Path(mem_dir) / "episodes.jsonl"
+    return rotated + ([live] if live.exists() else [])
+
+
+if __name__ == "__main__":
+    # Importação única do histórico JSONL existente:
+    #   python -m llm.memory.sqlite_store [.fortaleza/memory]
+    import sys
+    mem = Path(sys.argv[1] if len(sys.argv) > 1 else ".fortaleza/memory")
+    store = EpisodeStore(mem / "episodes.sqlite")
+    print(json.dumps({"imported": store.import_jsonl(jsonl_history(mem)), "total": store.count()}, indent=2))
@@ -0,0 +1,244 @@
+from __future__ import annotations
+import asyncio, os, queue, threading, time
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# limites por etapa (FORTALEZA_CONCURRENCY_<ETAPA>); make pre-llm mexe na árvore → 1 por defeito
+DEFAULT_LIMITS = {"pre_llm": 1, "typecheck": max(1, (os.cpu_count() or 2) // 2)}
+
+
+@dataclass
+class CmdResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+
+
+class StageLimits:
+    """Semáforos por etapa, criados no loop que os usa (asyncio.Semaphore é por loop)."""
+    def __init__(self, defaults: Dict[str, int] | None = None) -> None:
+        self.defaults = dict(DEFAULT_LIMITS if defaults is None else defaults)
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+
+    def limit(self, stage: str) -> int:
+        env = os.getenv(f"FORTALEZA_CONCURRENCY_{stage.upper()}")
+        try:
+            return max(1, int(env)) if env else self.defaults.get(stage, 4)
+        except ValueError:
+            return self.defaults.get(stage, 4)
+
+    def __call__(self, stage: str) -> asyncio.Semaphore:
+        sem = self._sems.get(stage)
+        if sem is None:
+            sem = self._sems[stage] = asyncio.Semaphore(self.limit(stage))
+        return sem
+
+
+async def run_cmd(argv: List[str], cwd: str | os.PathLike | None = None, timeout: float = 60.0,
+                  input: str | None = None, sem: asyncio.Semaphore | None = None) -> CmdResult:
+    """
+    Equivalente não-bloqueante de subprocess.run(capture_output=True, text=True).
+    Em timeout o processo é morto e devolve-se timed_out=True (não lança).
+    """
+    async def _run() -> CmdResult:
+        proc = await asyncio.create_subprocess_exec(
+            *argv, cwd=cwd,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            out, err = await asyncio.wait_for(
+                proc.communicate(input.encode("utf-8") if input is not None else None), timeout)
+        except asyncio.TimeoutError:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            return CmdResult(-9, "", "", timed_out=True)
+        return CmdResult(proc.returncode, out.decode("utf-8", "replace"), err.decode("utf-8", "replace"))
+
+    if sem is None:
+        return await _run()
+    async with sem:
+        return await _run()
+
+
+def _warm(cwd: str | None) -> None:
+    """Initializer dos workers: fixa cwd e importa a CLI uma vez (backends/caches ficam quentes)."""
+    if cwd:
+        os.chdir(cwd)
+    from llm import cli  # noqa: F401
+
+
+def _handle(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    from llm.cli import handle_request
+    return handle_request(body)
+
+
+def _job(target: Callable[[Dict[str, Any]], Any], body: Dict[str, Any]) -> Any:
+    """
+    Corre um pedido num worker reaproveitado: os.environ e cwd mutados pela CLI
+    (ex.: LLM_MODEL) são repostos no fim, senão passariam para o pedido seguinte.
+    """
+    env = dict(os.environ)
+    cwd = os.getcwd()
+    try:
+        return target(body)
+    finally:
+        if dict(os.environ) != env:
+            os.environ.clear()
+            os.environ.update(env)
+        if os.getcwd() != cwd:
+            os.chdir(cwd)
+
+
+def _worker_main(conn: Any, cwd: str | None) -> None:
+    """Loop de um worker: recebe (target, body), devolve ("ok", resultado) ou ("err", exceção)."""
+    _warm(cwd)
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        target, body = msg
+        try:
+            reply = ("ok", _job(target, body))
+        except BaseException as e:
+            reply = ("err", e)
+        try:
+            conn.send(reply)
+        except Exception as e:  # resultado/exceção não picklable
+            conn.send(("err", RuntimeError(f"resposta do worker não serializável: {e!r}")))
+
+
+class _Worker:
+    """Processo spawn dedicado + extremo do pipe do lado do servidor."""
+    def __init__(self, ctx: Any, cwd: str | None) -> None:
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, cwd), daemon=True, name="llm-worker")
+        self.proc.start()
+        child.close()
+
+    def kill(self) -> None:
+        try:
+            self.proc.terminate()
+            self.proc.join(1.0)
+            if self.proc.is_alive():
+                self.proc.kill()
+                self.proc.join(1.0)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+            self.proc.join(1.0)
+        except Exception:
+            pass
+        if self.proc.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class LLMWorkerPool:
+    """
+    Pool de processos com a lógica de llm.cli já importada.
+    Cada pedido vai para um worker quente (sem fork+import por fix) e escala com os cores, ao contrário de threads.
+    - workers criados com spawn: o api_server tem threads (tsserver, traces, geração) e ligações SQLite
+      que um fork herdaria a meio
+    - workers reaproveitados: _job repõe os.environ/cwd depois de cada pedido
+    - um pedido que excede o timeout só termina o *seu* worker (substituído a pedido);
+      os restantes pedidos em curso não são afetados
+    """
+    def __init__(self, max_workers: int | None = None, cwd: str | os.PathLike | None = None,
+                 target: Callable[[Dict[str, Any]], Any] = _handle) -> None:
+        self.max_workers = max_workers or int(os.getenv("FORTALEZA_LLM_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.cwd = os.fspath(cwd) if cwd else None
+        self.target = target
+        self._ctx = mp.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._workers: Set[_Worker] = set()
+        self._threads: ThreadPoolExecutor | None = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # uma thread por worker bloqueia no pipe; os pedidos em excesso esperam na fila do executor
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-pool")
+                for _ in range(self.max_workers):
+                    self._idle.put(None)      # lugar livre; o processo nasce no 1º uso
+            return self._threads
+
+    def _acquire(self) -> _Worker:
+        w = self._idle.get()
+        if w is None or not w.proc.is_alive():
+            if w is not None:
+                self._discard(w)
+            w = _Worker(self._ctx, self.cwd)
+            with self._lock:
+                self._workers.add(w)
+        return w
+
+    def _discard(self, w: _Worker) -> None:
+        with self._lock:
+            self._workers.discard(w)
+        w.kill()
+
+    def _call(self, body: Dict[str, Any], deadline: float) -> Any:
+        w = self._acquire()
+        try:
+            w.conn.send((self.target, body))
+            if not w.conn.poll(max(0.0, deadline - time.monotonic())):
+                # preso no pedido → termina só este worker; o lugar volta à fila vazio
+                self._discard(w)
+                w = None
+                raise TimeoutError("pedido excedeu o timeout do worker")
+            status, value = w.conn.recv()
+        except (EOFError, OSError) as e:
+            if w is not None:
+                self._discard(w)
+                w = None
+            raise BrokenProcessPool(f"worker terminou inesperadamente: {e!r}") from e
+        finally:
+            self._idle.put(w)
+        if status == "err":
+            raise value
+        return value
+
+    async def _submit(self, body: Dict[str, Any], timeout: float) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        fut = loop.run_in_executor(self._executor(), self._call, body, deadline)
+        try:
+            # wait_for cobre a espera na fila; _call cobre o pedido já entregue a um worker
+            return await asyncio.wait_for(fut, timeout)
+        except TimeoutError as e:
+            raise asyncio.TimeoutError(str(e)) from e
+
+    async def run(self, body: Dict[str, Any], timeout: float = 120.0) -> Any:
+        """Executa o pedido num worker; lança asyncio.TimeoutError se exceder `timeout`."""
+        try:
+            return await self._submit(body, timeout)
+        except BrokenProcessPool:
+            # worker morreu (OOM/segfault): tenta uma vez num worker novo
+            return await self._submit(body, timeout)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, None
+            workers, self._workers = list(self._workers), set()
+            self._idle = queue.Queue()
+        for w in workers:
+            w.stop()
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
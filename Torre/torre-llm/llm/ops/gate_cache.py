@@ -0,0 +1,192 @@
+from __future__ import annotations
+import hashlib, json, os, platform, shutil, subprocess, tempfile, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# FORTALEZA_GATE_CACHE=0 desliga a cache (equivalente a use_cache=False em todas as chamadas)
+CACHE_ENABLED = os.getenv("FORTALEZA_GATE_CACHE", "1") != "0"
+MAX_AGE_S = float(os.getenv("FORTALEZA_GATE_CACHE_TTL_S", str(7 * 24 * 3600)))
+# vermelhos podem ser flaky (rede, OOM, quota apertada): validade curta, 0 = nunca guardar
+RED_MAX_AGE_S = float(os.getenv("FORTALEZA_GATE_CACHE_RED_TTL_S", "300"))
+MAX_BYTES = int(float(os.getenv("FORTALEZA_GATE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# ficheiros (ignorados pelo git) cujo stat muda quando as dependências instaladas mudam
+_DEPS_MARKERS = ("node_modules/.package-lock.json", "node_modules/.modules.yaml", "node_modules/.yarn-state.yml")
+_NODE_VERSION: Optional[str] = None
+# quotas que mudam o resultado de um gate (timeout/OOM); max_parallel e mem_budget_mb não
+_QUOTA_KEYS = ("timeout_s", "cpu_seconds", "mem_mb")
+
+
+@contextmanager
+def _workspace_index(workspace: str) -> Iterator[Optional[Callable[[List[str]], subprocess.CompletedProcess]]]:
+    """
+    Índice temporário (cópia do real → stat cache) com o working tree completo
+    (`add -A`, sem ignorados nem .fortaleza) — o mesmo conteúdo que commit_diff comitaria.
+    Produz um runner git com GIT_INDEX_FILE apontado para ele (None se não for um repo).
+    """
+    def git(args: List[str], env: Dict[str, str] | None = None) -> subprocess.CompletedProcess:
+        return subprocess.run(["git", "-C", workspace] + args, capture_output=True, text=True, env=env)
+
+    r = git(["rev-parse", "--git-path", "index"])
+    if r.returncode != 0:
+        yield None
+        return
+    index = Path(r.stdout.strip())
+    if not index.is_absolute():
+        index = Path(workspace) / index
+    with tempfile.TemporaryDirectory(prefix="fort_idx_") as td:
+        tmp = os.path.join(td, "index")
+        if index.exists():
+            shutil.copyfile(index, tmp)
+        env = {**os.environ, "GIT_INDEX_FILE": tmp}
+        # .fortaleza (cache/locks) fica de fora, senão cada put mudaria o hash
+        if git(["add", "-A", "--", ".", ":(exclude).fortaleza"], env).returncode != 0:
+            yield None
+            return
+        yield lambda args: git(args, env)
+
+
+def tree_hash(workspace: str) -> Optional[str]:
+    """Hash `git write-tree` do working tree (HEAD + alterações + não seguidos, sem ignorados)."""
+    with _workspace_index(workspace) as git:
+        if git is None:
+            return None
+        r = git(["write-tree"])
+    return r.stdout.strip() if r.returncode == 0 else None
+
+
+def workspace_patch(workspace: str) -> Optional[str]:
+    """
+    Patch binário HEAD → working tree, incluindo ficheiros não seguidos (não ignorados).
+    `git diff HEAD` sozinho perde-os; é com este conteúdo que os gates devem correr.
+    """
+    with _workspace_index(workspace) as git:
+        if git is None:
+            return None
+        r = git(["diff", "--cached", "--binary", "HEAD"])
+    return r.stdout if r.returncode == 0 else None
+
+
+def toolchain_fingerprint(workspace: str) -> str:
+    """Versões de node/python + stat dos marcadores de node_modules (+ FORTALEZA_TOOLCHAIN_TAG)."""
+    global _NODE_VERSION
+    if _NODE_VERSION is None:
+        try:
+            _NODE_VERSION = subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=5).stdout.strip()
+        except Exception:
+            _NODE_VERSION = ""
+    parts = [_NODE_VERSION, platform.python_version(), os.getenv("FORTALEZA_TOOLCHAIN_TAG", "")]
+    for marker in _DEPS_MARKERS:
+        try:
+            st = os.stat(os.path.join(workspace, marker))
+            parts.append(f"{marker}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            continue
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class GateCache:
+    """
+    Resultados de gates por (tree hash, gate, comando, quotas, toolchain) em <workspace>/.fortaleza/cache/gates.
+    Um JSON por entrada; evicção por idade (TTL; red_max_age_s para vermelhos) e por tamanho total
+    (mais antigos primeiro).
+    """
+    def __init__(self, workspace: str, max_age_s: float = MAX_AGE_S, max_bytes: int = MAX_BYTES,
+                 red_max_age_s: float = RED_MAX_AGE_S) -> None:
+        self.workspace = str(Path(workspace).resolve())
+        self.dir = Path(self.workspace) / ".fortaleza" / "cache" / "gates"
+        self.max_age_s = max_age_s
+        self.red_max_age_s = red_max_age_s
+        self.max_bytes = max_bytes
+        self._fingerprint: Optional[str] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "puts": 0, "evicted": 0}
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = toolchain_fingerprint(self.workspace)
+        return self._fingerprint
+
+    def key(self, tree: str, gate: str, cmd: Any, quotas: Dict[str, Any] | None = None) -> str:
+        q = {k: (quotas or {}).get(k) for k in _QUOTA_KEYS}
+        raw = json.dumps([tree, gate, cmd, q, self.fingerprint], sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.json"
+
+    def get(self, tree: str, gate: str, cmd: Any, quotas: Dict[str, Any] | None = None) -> Optional[Dict[str, Any]]:
+        """Resultado em cache com proveniência em result["cache"], ou None."""
+        key = self.key(tree, gate, cmd, quotas)
+        p = self._path(key)
+        try:
+            entry = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.stats["misses"] += 1
+            return None
+        age = time.time() - float(entry.get("ts", 0))
+        if age > (self.max_age_s if entry["result"].get("passed") else min(self.max_age_s, self.red_max_age_s)):
+            p.unlink(missing_ok=True)
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        result = dict(entry["result"])
+        result["cache"] = {"hit": True, "key": key, "tree": tree, "cached_at": entry.get("ts"),
+                           "age_s": round(age, 1), "origin_wall_ms": result.get("wall_ms")}
+        result["wall_ms"] = 0.0
+        result["queue_ms"] = 0.0
+        return result
+
+    def put(self, tree: str, gate: str, cmd: Any, result: Dict[str, Any],
+            quotas: Dict[str, Any] | None = None) -> None:
+        # só resultados definitivos: nada de cancelados, skipped ou timeouts (flaky)
+        if result.get("cancelled") or result.get("skipped") or result.get("rc") == 124:
+            return
+        if not result.get("passed") and self.red_max_age_s <= 0:
+            return
+        key = self.key(tree, gate, cmd, quotas)
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"ts": time.time(), "tree": tree, "gate": gate, "cmd": cmd,
+                 "result": {k: v for k, v in result.items() if k != "cache"}}
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp, p)
+        self.stats["puts"] += 1
+        if self.stats["puts"] % 32 == 1:
+            self.evict()
+
+    def evict(self) -> int:
+        """Remove entradas expiradas e, se passar de max_bytes, as mais antigas."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for p in self.dir.glob("*/*.json"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            removed = 0
+            total = 0
+            keep = []
+            for mtime, size, p in entries:
+                if now - mtime > self.max_age_s:
+                    p.unlink(missing_ok=True)
+                    removed += 1
+                else:
+                    keep.append((mtime, size, p))
+                    total += size
+            for mtime, size, p in sorted(keep):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            self.stats["evicted"] += removed
+            return removed
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -1,7 +1,10 @@
-import os, json, subprocess, tempfile, time
+import os, json, subprocess, tempfile, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Dict, Any, Tuple, List
 from .sandbox import run_in_sandbox
+from .gate_cache import CACHE_ENABLED, GateCache, tree_hash
+from .ts_service import shared_ts_service
 
 DEFAULT_GATES = {
     "lint": ["bash","-lc","npm run -s lint || true; echo DONE"],
@@ -10,14 +13,19 @@ DEFAULT_GATES = {
     "build": ["bash","-lc","npm run -s build || true; echo DONE"],
 }
 
-def _git(workspace:str, args:List[str]) -> Tuple[int,str,str]:
-    # Git básico (init, config, add, commit) pode rodar sem sandbox
+# DAG dos gates: tests reaproveita o output do build; lint/types/build são independentes
+DEFAULT_GATE_DEPS = {"tests": ["build"]}
+# vermelho num destes cancela os irmãos em curso (os outros só bloqueiam dependentes)
+BLOCKING_GATES = ("build", "types")
+
+def _git(workspace:str, args:List[str], input:str|None=None) -> Tuple[int,str,str]:
+    # Git básico (init, config, add, commit, apply) pode rodar sem sandbox
     # Apenas operações de rede (fetch, push, pull) precisam de sandbox
     if any(network_op in args for network_op in ["fetch", "push", "pull", "clone"]):
         return run_in_sandbox(["git","-C",workspace] + args, timeout_s=30, no_network=True)
     else:
         import subprocess
-        result = subprocess.run(["git","-C",workspace] + args, capture_output=True, text=True)
+        result = subprocess.run(["git","-C",workspace] + args, capture_output=True, text=True, input=input)
         return (result.returncode, result.stdout, result.stderr)
 
 def _locked(workspace:str) -> Path:
@@ -30,11 +38,159 @@ def ensure_not_locked(workspace:str):
     if lf.exists():
         raise RuntimeError(f"workspace locked by rollback: {lf}")
 
+def _changed_files(diff:str) -> List[str]:
+    return [m for m in (l[6:].strip() for l in diff.splitlines() if l.startswith("+++ b/")) if m]
+
+def _types_gate_daemon(workspace:str, changed:List[str]) -> Dict[str,Any] | None:
+    """Gate 'types' via tsserver quente do workspace; None → sem daemon, usar o comando frio no sandbox."""
+    svc = shared_ts_service(workspace)
+    if not svc.available:
+        return None
+    try:
+        diags = svc.project_diagnostics(changed, cold=False)
+    except Exception:
+        return None
+    errors = [d for d in diags if d.category == "error"]
+    out = "\n".join(d.format() for d in errors)
+    return {"rc": 1 if errors else 0, "passed": not errors, "out": out[-4000:], "err": "", "via": "tsserver"}
+
+def _gate_spec(name:str, spec:Any) -> Tuple[List[str], List[str], bool]:
+    """Gate = comando (lista) ou {"cmd", "needs", "blocking"}; devolve (cmd, needs, blocking)."""
+    if isinstance(spec, dict):
+        return (spec["cmd"], list(spec.get("needs", DEFAULT_GATE_DEPS.get(name, []))),
+                bool(spec.get("blocking", name in BLOCKING_GATES)))
+    return spec, list(DEFAULT_GATE_DEPS.get(name, [])), name in BLOCKING_GATES
+
+def _run_gate(workspace:str, name:str, cmd:List[str], quotas:Dict[str,int], changed:List[str], cancel) -> Dict[str,Any]:
+    if name == "types" and cmd == DEFAULT_GATES["types"]:
+        r = _types_gate_daemon(workspace, changed)
+        if r is not None:
+            return r
+    rc, out, err = run_in_sandbox(
+        cmd, cwd=workspace,
+        timeout_s=quotas.get("timeout_s",120),
+        cpu_seconds=quotas.get("cpu_seconds",20),
+        mem_mb=quotas.get("mem_mb",2048),
+        no_network=True,
+        cancel=cancel,
+    )
+    if cancel.is_set() and rc == 130:
+        return {"rc": rc, "passed": False, "cancelled": True, "out": out[-4000:], "err": err[-4000:]}
+    passed = (rc==0)
+    # heurística: se comando devolve 0 mas contem 'FAIL' no stderr/stdout → falha
+    text = (out+"\n"+err).lower()
+    if "fail" in text or "error" in text and name!="build":
+        passed = False
+    return {"rc": rc, "passed": passed, "out": out[-4000:], "err": err[-4000:]}
+
+def run_gates(workspace:str, gates:Dict[str,Any], quotas:Dict[str,int], changed:List[str],
+              cache:GateCache|None=None, tree:str|None=None) -> Tuple[Dict[str,Any],bool]:
+    """
+    Escalonador DAG dos gates (sandbox, cwd=workspace); devolve (resultados, algum_vermelho).
+    - gates independentes correm em paralelo, limitados por quotas["max_parallel"] e pela
+      memória total quotas["mem_budget_mb"] (cada gate reserva quotas["mem_mb"])
+    - dependente de gate vermelho → skipped; vermelho num gate bloqueante cancela os irmãos
+    - cada resultado leva wall_ms (execução) e queue_ms (pronto → arranque)
+    - com `cache`, gates já avaliados para a mesma árvore (write-tree) vêm da cache (result["cache"])
+    """
+    specs = {name: _gate_spec(name, spec) for name, spec in gates.items()}
+    mem = quotas.get("mem_mb",2048)
+    max_par = max(1, int(quotas.get("max_parallel") or os.getenv("FORTALEZA_GATES_PARALLEL") or max(1, (os.cpu_count() or 2)//2)))
+    budget = max(mem, quotas.get("mem_budget_mb", mem*max_par))
+    cancel = threading.Event()
+    results: Dict[str,Any] = {}
+    ready_at: Dict[str,float] = {}
+    pending = dict(specs)
+    running: Dict[Any,Tuple[str,float]] = {}
+    any_red = False
+    if cache is not None and tree is None:
+        tree = tree_hash(workspace)
+    if cache is not None and tree:
+        for name, (cmd, _, blocking) in specs.items():
+            hit = cache.get(tree, name, cmd, quotas)
+            if hit is None:
+                continue
+            results[name] = hit
+            del pending[name]
+            if not hit["passed"]:
+                any_red = True
+                if blocking:
+                    cancel.set()
+
+    def _timed(name, cmd):
+        t0 = time.perf_counter()
+        r = _run_gate(workspace, name, cmd, quotas, changed, cancel)
+        r["wall_ms"] = round((time.perf_counter()-t0)*1000, 1)
+        return r
+
+    with ThreadPoolExecutor(max_workers=max_par) as ex:
+        while pending or running:
+            now = time.perf_counter()
+            n_pending = len(pending)
+            for name, (cmd, needs, _) in list(pending.items()):
+                if cancel.is_set():
+                    break
+                needs = [d for d in needs if d in specs]  # dependência de gate não configurado → satisfeita
+                failed = [d for d in needs if d in results and not results[d]["passed"]]
+                if failed:
+                    results[name] = {"rc": None, "passed": False, "skipped": True,
+                                     "reason": f"needs {', '.join(failed)}", "wall_ms": 0.0, "queue_ms": 0.0}
+                    any_red = True
+                    del pending[name]
+                    continue
+                if any(d not in results for d in needs):
+                    continue
+                ready_at.setdefault(name, now)
+                # admissão: slots livres e memória disponível (um gate sozinho entra sempre)
+                if len(running) >= max_par or (running and mem*(len(running)+1) > budget):
+                    break
+                fut = ex.submit(_timed, name, cmd)
+                running[fut] = (name, now)
+                del pending[name]
+            if cancel.is_set():
+                pending.clear()
+            if not running:
+                if len(pending) < n_pending:
+                    continue  # houve skips nesta passagem: reavaliar dependentes
+                # nada a correr e nada pronto → ciclo nas dependências
+                for name in pending:
+                    results[name] = {"rc": None, "passed": False, "skipped": True, "reason": "dependency cycle",
+                                     "wall_ms": 0.0, "queue_ms": 0.0}
+                any_red = any_red or bool(pending)
+                pending.clear()
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name, started = running.pop(fut)
+                r = fut.result()
+                r["queue_ms"] = round((started-ready_at.get(name, started))*1000, 1)
+                results[name] = r
+                if cache is not None and tree:
+                    cache.put(tree, name, specs[name][0], r, quotas)
+                if not r["passed"] and not r.get("cancelled"):
+                    any_red = True
+                    if specs[name][2]:
+                        cancel.set()
+    # ordem estável (declaração), como no loop sequencial
+    return {name: results[name] for name in gates if name in results}, any_red
+
+def commit_diff(workspace:str, diff:str) -> Tuple[bool,str,str]:
+    """git apply (check + apply) e commit do candidato; devolve (ok, stage|head, erro)."""
+    rc,_,err = _git(workspace, ["apply","--check","-"], input=diff)
+    if rc!=0: return False, "apply-check", err
+    rc,_,err = _git(workspace, ["apply","-"], input=diff)
+    if rc!=0: return False, "apply", err
+    _git(workspace, ["add","-A","--",".",":(exclude).fortaleza"])
+    _git(workspace, ["commit","-m","[fortaleza] apply candidate"])
+    rc,out,_ = _git(workspace, ["rev-parse","--short","HEAD"])
+    return True, out.strip(), ""
+
 def apply_with_rollback(
     workspace:str,
     diff:str,
     gates:Dict[str,Any]=None,
     quotas:Dict[str,int]=None,
+    use_cache:bool=True,
 ) -> Dict[str,Any]:
     ensure_not_locked(workspace)
     gates = gates or DEFAULT_GATES
@@ -44,34 +200,11 @@ def apply_with_rollback(
     if rc!=0: raise RuntimeError(f"git error: {err}")
     head = out.strip()
     # checar e aplicar diff
-    rc,_,err = _git(workspace, ["apply","--check","-"])
-    if rc!=0: return {"ok": False, "stage":"apply-check", "error": err}
-    rc,_,err = run_in_sandbox(["git","-C",workspace,"apply","-"], timeout_s=30, no_network=True, mem_mb=256)
-    if rc!=0: return {"ok": False, "stage":"apply", "error": err}
-    _git(workspace, ["add","-A"])
-    _git(workspace, ["commit","-m","[fortaleza] apply candidate"])
-    rc,out,_ = _git(workspace, ["rev-parse","--short","HEAD"])
-    new_head = out.strip()
+    ok, new_head, err = commit_diff(workspace, diff)
+    if not ok: return {"ok": False, "stage": new_head, "error": err}
     # executar gates no sandbox
-    results = {}
-    any_red = False
-    for name, cmd in gates.items():
-        rc, out, err = run_in_sandbox(
-            cmd, cwd=workspace,
-            timeout_s=quotas.get("timeout_s",120),
-            cpu_seconds=quotas.get("cpu_seconds",20),
-            mem_mb=quotas.get("mem_mb",2048),
-            no_network=True,
-        )
-        passed = (rc==0)
-        # heurística: se comando devolve 0 mas contem 'FAIL' no stderr/stdout → falha
-        text = (out+"\n"+err).lower()
-        if "fail" in text or "error" in text and name!="build":
-            passed = False
-        results[name] = {"rc": rc, "passed": passed, "out": out[-4000:], "err": err[-4000:]}
-        if not passed: any_red = True
-        # short-circuit: se build vermelho, para cedo
-        if not passed and name in ("build","types"): break
+    cache = GateCache(workspace) if use_cache and CACHE_ENABLED else None
+    results, any_red = run_gates(workspace, gates, quotas, _changed_files(diff), cache=cache)
     if any_red:
         # rollback + lock
         _git(workspace, ["revert","--no-edit", new_head])
@@ -0,0 +1,305 @@
+from __future__ import annotations
+import os, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from ..parsed_diff import DiffLike, FileDiff, Hunk, parse_diff
+except ImportError:  # pragma: no cover
+    from llm.parsed_diff import DiffLike, FileDiff, Hunk, parse_diff
+
+MAX_FUZZ = int(os.getenv("FORTALEZA_PATCH_FUZZ", "2"))
+CACHE_MAX_MB = float(os.getenv("FORTALEZA_FILE_CACHE_MB", "64"))
+
+
+# ------------------------------------------------------------------------------------
+# cache de conteúdos (validada por stat) partilhada entre preflight, editor e reranker
+# ------------------------------------------------------------------------------------
+class FileContentCache:
+    """Conteúdo de ficheiros por caminho relativo, revalidado por (mtime_ns, size); LRU limitada em bytes."""
+    def __init__(self, root: str | os.PathLike = ".", max_bytes: int = int(CACHE_MAX_MB * 1024 * 1024)) -> None:
+        self.root = Path(root).resolve()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def resolve(self, rel: str) -> Optional[Path]:
+        """Caminho dentro de `root`, ou None (absoluto, com '..' ou a sair da raiz por symlink)."""
+        pure = Path(rel)
+        if not rel or pure.is_absolute() or ".." in pure.parts:
+            return None
+        p = (self.root / pure).resolve()
+        return p if p.is_relative_to(self.root) else None
+
+    def get(self, rel: str) -> Optional[str]:
+        p = self.resolve(rel)
+        if p is None:
+            return None
+        try:
+            st = p.stat()
+        except OSError:
+            return None
+        with self._lock:
+            hit = self._items.get(rel)
+            if hit is not None and hit[:2] == (st.st_mtime_ns, st.st_size):
+                self._items.move_to_end(rel)
+                self.stats["hits"] += 1
+                return hit[2]
+        try:
+            text = p.read_bytes().decode("utf-8", "surrogateescape")
+        except OSError:
+            return None
+        with self._lock:
+            self.stats["misses"] += 1
+            old = self._items.pop(rel, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[rel] = (st.st_mtime_ns, st.st_size, text)
+            self._bytes += st.st_size
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, size, _) = self._items.popitem(last=False)
+                self._bytes -= size
+        return text
+
+
+_CACHES: Dict[str, FileContentCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def shared_file_cache(root: str | os.PathLike = ".") -> FileContentCache:
+    key = str(Path(root).resolve())
+    with _CACHES_LOCK:
+        c = _CACHES.get(key)
+        if c is None:
+            c = _CACHES[key] = FileContentCache(key)
+        return c
+
+
+# ------------------------------------------------------------------------------------
+# resultado
+# ------------------------------------------------------------------------------------
+@dataclass
+class HunkResult:
+    index: int
+    status: str                   # applied | offset | fuzz | conflict
+    line: Optional[int] = None    # 1-based no ficheiro original onde aplicou
+    offset: int = 0               # deslocamento face ao cabeçalho @@
+    fuzz: int = 0                 # linhas de contexto ignoradas (por ponta)
+    reason: str = ""
+
+
+@dataclass
+class FilePatchResult:
+    path: str
+    ok: bool
+    content: Optional[str]        # None = ficheiro apagado (ou conflito)
+    created: bool = False
+    deleted: bool = False
+    reason: str = ""
+    hunks: List[HunkResult] = field(default_factory=list)
+
+
+@dataclass
+class PatchResult:
+    ok: bool
+    files: List[FilePatchResult]
+
+    @property
+    def contents(self) -> Dict[str, Optional[str]]:
+        """caminho → conteúdo pós-patch (None = apagado); só ficheiros aplicados."""
+        return {f.path: f.content for f in self.files if f.ok}
+
+    @property
+    def conflicts(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for f in self.files:
+            if f.reason:
+                out.append({"path": f.path, "hunk": None, "reason": f.reason})
+            out += [{"path": f.path, "hunk": h.index, "reason": h.reason} for h in f.hunks if h.status == "conflict"]
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        hunks = [h for f in self.files for h in f.hunks]
+        return {"ok": self.ok, "files": len(self.files), "hunks": len(hunks),
+                "offset": sum(1 for h in hunks if h.status == "offset"),
+                "fuzz": sum(1 for h in hunks if h.status == "fuzz"),
+                "conflicts": self.conflicts}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ok": self.ok, "files": [asdict(f) for f in self.files]}
+
+
+# ------------------------------------------------------------------------------------
+# motor
+# ------------------------------------------------------------------------------------
+def _split(text: str) -> Tuple[List[str], str, bool]:
+    """linhas sem terminador, terminador dominante, se termina com newline."""
+    eol = "\r\n" if "\r\n" in text else "\n"
+    if not text:
+        return [], eol, True
+    lines = text.split(eol)
+    trailing = lines[-1] == ""
+    if trailing:
+        lines.pop()
+    return lines, eol, trailing
+
+
+def _hunk_sides(h: Hunk) -> Tuple[List[str], List[str], int, int, bool]:
+    """(old, new, contexto inicial, contexto final, new sem newline final)."""
+    old: List[str] = []
+    new: List[str] = []
+    kinds: List[str] = []
+    no_eol_new = False
+    for ln in h.lines:
+        c = ln[:1] or " "
+        if c == "\\":
+            if kinds and kinds[-1] in " +":
+                no_eol_new = True
+            continue
+        body = ln[1:]
+        if c in " -":
+            old.append(body)
+        if c in " +":
+            new.append(body)
+        kinds.append(c)
+    lead = 0
+    while lead < len(kinds) and kinds[lead] == " ":
+        lead += 1
+    trail = 0
+    while trail < len(kinds) - lead and kinds[-1 - trail] == " ":
+        trail += 1
+    return old, new, lead, trail, no_eol_new
+
+
+def _find(lines: List[str], block: List[str], expected: int, lo: int = 0) -> Optional[int]:
+    """Posição (≥ lo) de `block` em `lines` mais próxima de `expected` (alterna +d/-d, como o GNU patch)."""
+    n, m = len(lines), len(block)
+    if m == 0:
+        return max(lo, min(expected, n))
+    last = n - m
+    if last < lo:
+        return None
+    expected = max(lo, min(expected, last))
+    first = block[0]
+    for d in range(0, max(expected - lo, last - expected) + 1):
+        for pos in ((expected,) if d == 0 else (expected - d, expected + d)):
+            if lo <= pos <= last and lines[pos] == first and lines[pos:pos + m] == block:
+                return pos
+    return None
+
+
+def apply_hunks(text: str, hunks: List[Hunk], max_fuzz: int = MAX_FUZZ) -> Tuple[Optional[str], List[HunkResult]]:
+    """Aplica hunks a `text` em memória; devolve (novo texto | None se algum conflito, resultado por hunk)."""
+    lines, eol, trailing = _split(text)
+    results: List[HunkResult] = []
+    delta = 0                       # linhas acrescentadas/removidas pelos hunks anteriores
+    floor = 0                       # hunks aplicam-se por ordem, sem sobreposição
+    ok = True
+    for i, h in enumerate(hunks):
+        old, new, lead, trail, no_eol_new = _hunk_sides(h)
+        loose = (h.old_start, h.old_len, h.new_start, h.new_len) == (0, 0, 0, 0)   # diff solto (sem @@)
+        start_hint = None if loose else (h.old_start - 1 if h.old_len else h.old_start)
+        expected = (start_hint + delta) if start_hint is not None else floor
+        placed: Optional[Tuple[int, int, int, int]] = None       # (pos, fuzz, cut_lead, cut_trail)
+        for fuzz in range(0, max_fuzz + 1):
+            cut_l, cut_t = min(fuzz, lead), min(fuzz, trail)
+            if fuzz and not (cut_l or cut_t):
+                break
+            block = old[cut_l:len(old) - cut_t]
+            if not block and loose:
+                break                  # hunk solto só com adições: sem âncora
+            pos = _find(lines, block, expected + cut_l, floor)
+            if pos is not None:
+                placed = (pos, fuzz, cut_l, cut_t)
+                break
+        if placed is None:
+            # já aplicado? (o lado novo está no sítio) → conflito explícito, não silencioso
+            if not old and loose:
+                reason = "no_anchor"
+            elif new and new != old and _find(lines, new, expected, floor) is not None:
+                reason = "already_applied"
+            else:
+                reason = "context_mismatch"
+            results.append(HunkResult(i, "conflict", reason=reason))
+            ok = False
+            continue
+        pos, fuzz, cut_l, cut_t = placed
+        repl = new[cut_l:len(new) - cut_t]
+        block_len = len(old) - cut_l - cut_t
+        lines[pos:pos + block_len] = repl
+        offset = pos - cut_l - (start_hint + delta) if start_hint is not None else 0
+        status = "fuzz" if fuzz else ("offset" if offset else "applied")
+        results.append(HunkResult(i, status, line=pos - cut_l - delta + 1, offset=offset, fuzz=fuzz))
+        delta += len(repl) - block_len
+        floor = pos + len(repl)
+        if pos + len(repl) == len(lines) and (cut_t == 0 or not repl):
+            trailing = not no_eol_new     # hunk toca o fim do ficheiro: o lado novo decide o newline final
+    if not ok:
+        return None, results
+    out = eol.join(lines)
+    if lines and trailing:
+        out += eol
+    return out, results
+
+
+def safe_relpath(path: str) -> bool:
+    """Caminho relativo sem '..' (os diffs vêm de candidatos do LLM / pedidos da API)."""
+    pure = Path(path)
+    return bool(path) and not pure.is_absolute() and ".." not in pure.parts and "\0" not in path
+
+
+def _read(path: str, overlay: Mapping[str, str], cache: Optional[FileContentCache]) -> Optional[str]:
+    if path in overlay:
+        return overlay[path]
+    return cache.get(path) if cache is not None else None
+
+
+def apply_file(fd: FileDiff, current: Optional[str], max_fuzz: int = MAX_FUZZ) -> FilePatchResult:
+    path = fd.path
+    if fd.is_new:
+        if current is not None and current != "":
+            return FilePatchResult(path, False, None, created=True, reason="already_exists")
+        text, hunks = apply_hunks("", fd.hunks, max_fuzz)
+        return FilePatchResult(path, text is not None, text, created=True, hunks=hunks)
+    if current is None:
+        return FilePatchResult(path, False, None, reason="missing")
+    text, hunks = apply_hunks(current, fd.hunks, max_fuzz)
+    if fd.is_deleted:
+        ok = text is not None and text == ""
+        return FilePatchResult(path, ok, None, deleted=True, hunks=hunks,
+                               reason="" if ok or text is None else "delete_mismatch")
+    return FilePatchResult(path, text is not None, text, hunks=hunks)
+
+
+def apply_patch(diff: DiffLike, root: str | os.PathLike | None = ".", files: Optional[Mapping[str, str]] = None,
+                max_fuzz: int = MAX_FUZZ, cache: Optional[FileContentCache] = None) -> PatchResult:
+    """
+    Aplica o diff em memória contra os conteúdos reais: `files` (ex.: buffers do editor) têm prioridade,
+    o resto vem da cache partilhada de `root` (None = só `files`). Nada é escrito em disco.
+    """
+    pd = parse_diff(diff)
+    overlay = dict(files or {})
+    if cache is None and root is not None:
+        cache = shared_file_cache(root)
+    results: List[FilePatchResult] = []
+    staged: Dict[str, Optional[str]] = {}          # vários blocos para o mesmo ficheiro encadeiam
+    for fd in pd.files:
+        if not fd.path:
+            continue
+        src = fd.old_path or fd.path
+        unsafe = [p for p in (fd.old_path, fd.new_path) if p and not safe_relpath(p)]
+        if not unsafe and cache is not None:
+            unsafe = [p for p in (fd.old_path, fd.new_path) if p and cache.resolve(p) is None]
+        if unsafe:
+            results.append(FilePatchResult(fd.path, False, None, reason="outside_root"))
+            continue
+        current = staged[src] if src in staged else _read(src, overlay, cache)
+        res = apply_file(fd, current, max_fuzz)
+        if res.ok:
+            staged[fd.path] = res.content
+        results.append(res)
+    return PatchResult(all(r.ok for r in results) and bool(results), results)
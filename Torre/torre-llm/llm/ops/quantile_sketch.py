@@ -0,0 +1,182 @@
+from __future__ import annotations
+import glob, json, math, os, threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+# erro relativo dos quantis (1% → ~700 buckets para 1µs..1h, na prática dezenas)
+REL_ACCURACY = 0.01
+
+
+class LatencySketch:
+    """
+    Sketch de quantis com erro relativo garantido (estilo DDSketch / HDR logarítmico):
+    bucket i = ceil(log_gamma(x)); contagens somáveis → merge exato entre dias e processos.
+    Memória e quantil em O(#buckets), independente do nº de observações.
+    """
+    __slots__ = ("alpha", "gamma", "_lg", "buckets", "zeros", "count", "total", "min", "max")
+
+    def __init__(self, alpha: float = REL_ACCURACY) -> None:
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._lg = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, n: int = 1) -> None:
+        v = float(value)
+        if v < 0 or math.isnan(v):
+            return
+        if v == 0:
+            self.zeros += n
+        else:
+            i = math.ceil(math.log(v) / self._lg)
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.count += n
+        self.total += v * n
+        self.min = min(self.min, v)
+        self.max = max(self.max, v)
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.alpha != self.alpha:
+            raise ValueError("sketches com precisões diferentes")
+        for i, c in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen > rank:
+                # ponto médio do bucket (erro relativo ≤ alpha), limitado ao [min, max] observado
+                v = 2 * self.gamma ** i / (self.gamma + 1)
+                return min(max(v, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {"count": self.count, "avg": self.mean, "p50": self.quantile(0.50),
+                "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"a": self.alpha, "b": {str(k): v for k, v in self.buckets.items()}, "z": self.zeros,
+                "n": self.count, "s": self.total, "lo": self.min if self.count else None,
+                "hi": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LatencySketch":
+        sk = cls(float(d.get("a", REL_ACCURACY)))
+        sk.buckets = {int(k): int(v) for k, v in (d.get("b") or {}).items()}
+        sk.zeros = int(d.get("z", 0))
+        sk.count = int(d.get("n", 0))
+        sk.total = float(d.get("s", 0.0))
+        if sk.count:
+            sk.min, sk.max = float(d["lo"]), float(d["hi"])
+        return sk
+
+
+ALL = "*"  # agregado de todos os endpoints
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SketchStore:
+    """
+    Sketches de latência por (dia, endpoint) persistidos em <dir>/sketch-YYYYMMDD.<pid>.json.
+    Cada processo escreve o seu ficheiro (sem corridas); leitura = merge dos ficheiros do dia.
+    Ficheiros de processos mortos do mesmo dia são absorvidos pelo processo atual.
+    """
+    def __init__(self, directory: str | os.PathLike) -> None:
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.pid = os.getpid()
+        self._days: Dict[str, Dict[str, LatencySketch]] = {}
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+
+    def _path(self, day: str, pid: int | None = None) -> Path:
+        return self.dir / f"sketch-{day}.{pid or self.pid}.json"
+
+    def _day(self, day: str) -> Dict[str, LatencySketch]:
+        sk = self._days.get(day)
+        if sk is None:
+            sk = self._days[day] = {}
+            # adota ficheiros órfãos (processos terminados) do mesmo dia
+            for fn in glob.glob(str(self.dir / f"sketch-{day}.*.json")):
+                try:
+                    pid = int(fn.rsplit(".", 2)[-2])
+                except ValueError:
+                    continue
+                if pid == self.pid or not _alive(pid):
+                    for ep, other in _read(Path(fn)).items():
+                        sk.setdefault(ep, LatencySketch()).merge(other)
+                    if pid != self.pid:
+                        self._dirty.add(day)
+                        os.replace(fn, fn + ".merged")
+        return sk
+
+    def observe(self, endpoint: str, value: float, day: str) -> None:
+        with self._lock:
+            sk = self._day(day)
+            for ep in (endpoint or "", ALL):
+                s = sk.get(ep)
+                if s is None:
+                    s = sk[ep] = LatencySketch()
+                s.add(value)
+            self._dirty.add(day)
+
+    def persist(self) -> None:
+        with self._lock:
+            for day in list(self._dirty):
+                data = {ep: s.to_dict() for ep, s in self._days.get(day, {}).items()}
+                p = self._path(day)
+                tmp = p.with_suffix(".tmp")
+                tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+                os.replace(tmp, p)
+                for fn in glob.glob(str(self.dir / f"sketch-{day}.*.json.merged")):
+                    os.unlink(fn)
+            self._dirty.clear()
+
+
+def _read(fn: Path) -> Dict[str, LatencySketch]:
+    try:
+        raw = json.loads(fn.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {ep: LatencySketch.from_dict(d) for ep, d in raw.items()}
+
+
+def load_sketches(directory: str | os.PathLike, days: Iterable[str]) -> Dict[str, LatencySketch]:
+    """Merge (entre processos e dias) dos sketches persistidos: endpoint → sketch."""
+    out: Dict[str, LatencySketch] = {}
+    for day in days:
+        for fn in sorted(glob.glob(str(Path(directory) / f"sketch-{day}.*.json"))):
+            for ep, sk in _read(Path(fn)).items():
+                out.setdefault(ep, LatencySketch()).merge(sk)
+    return out
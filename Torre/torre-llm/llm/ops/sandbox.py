@@ -1,5 +1,5 @@
-import os, subprocess, tempfile, shutil, sys, signal, json
-from typing import List, Dict, Optional, Tuple
+import os, subprocess, tempfile, shutil, sys, signal, json, time, threading, atexit
+from typing import Any, List, Dict, Optional, Tuple
 try:
     import resource  # POSIX
 except Exception:
@@ -42,6 +42,142 @@ def _fake_bin_dir() -> str:
         os.chmod(p, 0o755)
     return d
 
+def _limits(cpu_seconds:int, mem_mb:int, nproc:int, nofile:int) -> List[str]:
+    """
+    Opções do prlimit(1) para o perfil de quotas; calculado uma vez por perfil.
+    Cada valor fica limitado ao hard limit atual (sem privilégios não se pode subir, e o
+    prlimit falharia o comando inteiro em vez de ignorar o limite como o preexec).
+    """
+    limit = mem_mb * 1024 * 1024
+    out = []
+    for opt, name, value in (("cpu", "RLIMIT_CPU", cpu_seconds), ("as", "RLIMIT_AS", limit),
+                             ("data", "RLIMIT_DATA", limit), ("rss", "RLIMIT_RSS", limit),
+                             ("nproc", "RLIMIT_NPROC", nproc), ("nofile", "RLIMIT_NOFILE", nofile)):
+        rl = getattr(resource, name, None) if resource else None
+        if rl is None:
+            continue
+        try:
+            hard = resource.getrlimit(rl)[1]
+        except (OSError, ValueError):
+            continue
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        out.append(f"--{opt}={value}")
+    return out
+
+# prlimit(1) aplica os limites (setrlimit) e só depois faz exec do comando: o comando e qualquer
+# neto nascem já limitados, sem preexec_fn (que corre Python entre fork e exec no pai multithread)
+_PRLIMIT_BIN = shutil.which("prlimit") if resource else None
+
+
+class SandboxPool:
+    """
+    Executor partilhado de comandos em sandbox:
+    - diretório de shims anti-rede persistente (criado uma vez por processo, não por comando)
+    - limites por perfil de quotas calculados uma vez (cache) e aplicados antes do exec (wrapper prlimit)
+    - concorrência limitada por semáforo (FORTALEZA_SANDBOX_WORKERS), thread-safe
+    - métricas de overhead por execução (setup/spawn/fila)
+    """
+    def __init__(self, max_workers:Optional[int]=None):
+        n = max_workers or int(os.getenv("FORTALEZA_SANDBOX_WORKERS", str(max(4, 2*(os.cpu_count() or 1)))))
+        self.max_workers = max(1, n)
+        self._sem = threading.BoundedSemaphore(self.max_workers)
+        self._lock = threading.Lock()
+        self._shims: Optional[str] = None
+        self._profiles: Dict[Tuple[int,int,int,int], List[str]] = {}
+        self.metrics: Dict[str, Any] = {"runs": 0, "timeouts": 0, "cancelled": 0, "setup_ms": 0.0,
+                                        "spawn_ms": 0.0, "queue_ms": 0.0, "max_overhead_ms": 0.0,
+                                        "spawn_mode": "prlimit-exec" if _PRLIMIT_BIN else "preexec"}
+
+    def shim_dir(self) -> str:
+        with self._lock:
+            if self._shims is None or not os.path.isdir(self._shims):
+                self._shims = _fake_bin_dir()
+                atexit.register(shutil.rmtree, self._shims, True)
+            return self._shims
+
+    def _profile(self, key:Tuple[int,int,int,int]) -> List[str]:
+        lim = self._profiles.get(key)
+        if lim is None:
+            lim = self._profiles[key] = _limits(*key)
+        return lim
+
+    def _spawn(self, cmd:List[str], cwd:Optional[str], env:Dict[str,str], key:Tuple[int,int,int,int]) -> subprocess.Popen:
+        common = dict(cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if not _PRLIMIT_BIN:
+            return subprocess.Popen(cmd, preexec_fn=_preexec(*key), **common)
+        return subprocess.Popen([_PRLIMIT_BIN, *self._profile(key), "--", *cmd], start_new_session=True, **common)
+
+    def run(self, cmd:List[str], cwd:Optional[str]=None, env:Optional[Dict[str,str]]=None, timeout_s:int=60,
+            cpu_seconds:int=15, mem_mb:int=1024, nproc:int=256, nofile:int=1024, no_network:bool=True,
+            cancel=None) -> Tuple[int,str,str]:
+        t_q = time.perf_counter()
+        with self._sem:
+            t0 = time.perf_counter()
+            env2 = dict(os.environ)
+            if env: env2.update({k:str(v) for k,v in env.items()})
+            env2.pop("HTTP_PROXY", None); env2.pop("HTTPS_PROXY", None)
+            env2["FORT_NO_NET"] = "1" if no_network else "0"
+            # Shims anti-rede primeiro no PATH
+            if no_network:
+                env2["PATH"] = f"{self.shim_dir()}:{env2.get('PATH','')}"
+            t1 = time.perf_counter()
+            p = self._spawn(cmd, cwd, env2, (cpu_seconds, mem_mb, nproc, nofile))
+            t2 = time.perf_counter()
+            self._record(t0-t_q, t1-t0, t2-t1)
+            deadline = time.monotonic() + timeout_s
+            while True:
+                try:
+                    # com cancel, espera em fatias curtas (communicate retoma onde parou)
+                    step = max(0.0, deadline - time.monotonic())
+                    out, err = p.communicate(timeout=min(step, 0.05) if cancel is not None else step)
+                    break
+                except subprocess.TimeoutExpired:
+                    cancelled = cancel is not None and cancel.is_set()
+                    if not cancelled and time.monotonic() < deadline:
+                        continue
+                    try:
+                        os.killpg(p.pid, signal.SIGKILL)
+                    except Exception:
+                        p.kill()
+                    p.communicate()
+                    with self._lock:
+                        self.metrics["cancelled" if cancelled else "timeouts"] += 1
+                    return (130, "", "cancelled") if cancelled else (124, "", "timeout")
+            return (p.returncode, out or "", err or "")
+
+    def _record(self, queue_s:float, setup_s:float, spawn_s:float) -> None:
+        with self._lock:
+            m = self.metrics
+            m["runs"] += 1
+            m["queue_ms"] += queue_s*1000
+            m["setup_ms"] += setup_s*1000
+            m["spawn_ms"] += spawn_s*1000
+            m["max_overhead_ms"] = max(m["max_overhead_ms"], (setup_s+spawn_s)*1000)
+
+    def stats(self) -> Dict[str, Any]:
+        """Totais + médias por execução (overhead = setup + spawn, sem contar o comando)."""
+        with self._lock:
+            m = dict(self.metrics)
+        n = max(1, m["runs"])
+        m["avg_overhead_ms"] = round((m["setup_ms"]+m["spawn_ms"])/n, 3)
+        m["avg_queue_ms"] = round(m["queue_ms"]/n, 3)
+        return m
+
+
+_POOL: Optional[SandboxPool] = None
+_POOL_LOCK = threading.Lock()
+
+def shared_sandbox_pool() -> SandboxPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = SandboxPool()
+        return _POOL
+
+def sandbox_metrics() -> Dict[str, Any]:
+    return shared_sandbox_pool().stats()
+
 def run_in_sandbox(
     cmd: List[str],
     cwd: Optional[str]=None,
@@ -52,36 +188,8 @@ def run_in_sandbox(
     nproc:int=256,
     nofile:int=1024,
     no_network:bool=True,
+    cancel=None,
 ) -> Tuple[int,str,str]:
-    env2 = dict(os.environ)
-    if env: env2.update({k:str(v) for k,v in env.items()})
-    env2.pop("HTTP_PROXY", None); env2.pop("HTTPS_PROXY", None)
-    env2["FORT_NO_NET"] = "1" if no_network else "0"
-    # Shims anti-rede primeiro no PATH
-    clean = None
-    if no_network:
-        fake = _fake_bin_dir()
-        clean = fake
-        env2["PATH"] = f"{fake}:{env2.get('PATH','')}"
-    try:
-        p = subprocess.Popen(
-            cmd,
-            cwd=cwd,
-            env=env2,
-            preexec_fn=_preexec(cpu_seconds, mem_mb, nproc, nofile),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-        try:
-            out, err = p.communicate(timeout=timeout_s)
-        except subprocess.TimeoutExpired:
-            try:
-                os.killpg(p.pid, signal.SIGKILL)
-            except Exception:
-                p.kill()
-            return (124, "", "timeout")
-        return (p.returncode, out or "", err or "")
-    finally:
-        if clean and os.path.isdir(clean):
-            shutil.rmtree(clean, ignore_errors=True)
+    """`cancel` (threading.Event opcional): se ficar set, mata o grupo do processo → (130, "", "cancelled")."""
+    return shared_sandbox_pool().run(cmd, cwd=cwd, env=env, timeout_s=timeout_s, cpu_seconds=cpu_seconds,
+                                     mem_mb=mem_mb, nproc=nproc, nofile=nofile, no_network=no_network, cancel=cancel)
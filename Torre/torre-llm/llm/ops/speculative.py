@@ -0,0 +1,194 @@
+from __future__ import annotations
+import hashlib, os, queue, shutil, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .gate_cache import CACHE_ENABLED, GateCache, workspace_patch
+from .guard_apply import DEFAULT_GATES, _changed_files, _git, commit_diff, ensure_not_locked, run_gates
+from .ts_service import drop_ts_service, refresh_ts_service
+
+DEFAULT_SLOTS = int(os.getenv("FORTALEZA_SPEC_SLOTS", "3"))
+
+
+def _diff_size(diff: str) -> int:
+    return sum(1 for l in diff.splitlines() if l[:1] in "+-" and not l.startswith(("+++", "---")))
+
+
+@dataclass
+class SpecResult:
+    index: int
+    passed: bool
+    stage: str                      # apply | gates
+    ttg_ms: float
+    diff_size: int
+    gates: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+
+
+class WorktreePool:
+    """
+    Slots `git worktree` pré-criados fora do workspace (não entram no `git add -A` nem no tsc do repo).
+    acquire() devolve um slot limpo no HEAD atual (+ alterações não commitadas e ficheiros
+    não seguidos do workspace, ver gate_cache.workspace_patch);
+    os slots são reaproveitados entre pedidos (criados uma vez, reset barato), tal como o
+    tsserver de cada slot (gate "types"), fechado em close().
+    """
+    def __init__(self, workspace: str, size: int = DEFAULT_SLOTS, base_dir: str | None = None) -> None:
+        self.workspace = str(Path(workspace).resolve())
+        tag = hashlib.sha1(self.workspace.encode("utf-8")).hexdigest()[:12]
+        root = base_dir or os.getenv("FORTALEZA_WORKTREES_DIR") or os.path.join(tempfile.gettempdir(), "fortaleza-worktrees")
+        self.base = Path(root) / tag
+        self.size = max(1, size)
+        self._free: "queue.Queue[str]" = queue.Queue()
+        self._slots: List[str] = []
+        self._lock = threading.Lock()
+
+    def _ensure_slots(self) -> None:
+        with self._lock:
+            if self._slots:
+                return
+            self.base.mkdir(parents=True, exist_ok=True)
+            _git(self.workspace, ["worktree", "prune"])
+            for i in range(self.size):
+                slot = str(self.base / f"slot-{i}")
+                if not (Path(slot) / ".git").exists():
+                    shutil.rmtree(slot, ignore_errors=True)
+                    rc, _, err = _git(self.workspace, ["worktree", "add", "-q", "--detach", slot, "HEAD"])
+                    if rc != 0:
+                        raise RuntimeError(f"git worktree add falhou: {err}")
+                self._slots.append(slot)
+                self._free.put(slot)
+
+    def _reset(self, slot: str, head: str, base_patch: str) -> None:
+        rc, _, err = _git(slot, ["checkout", "-q", "--detach", "-f", head])
+        if rc != 0:
+            raise RuntimeError(f"git checkout no worktree falhou: {err}")
+        # -x: artefactos ignorados (dist/, *.tsbuildinfo) do candidato anterior também saem
+        _git(slot, ["clean", "-fdxq", "-e", "node_modules"])
+        if base_patch:
+            rc, _, err = _git(slot, ["apply", "--binary", "-"], input=base_patch)
+            if rc != 0:
+                raise RuntimeError(f"alterações do workspace não aplicam no worktree: {err}")
+        # dependências instaladas (ignoradas pelo git) partilhadas por symlink
+        nm_src, nm_dst = Path(self.workspace) / "node_modules", Path(slot) / "node_modules"
+        if nm_src.is_dir() and not nm_dst.exists():
+            try:
+                os.symlink(nm_src, nm_dst, target_is_directory=True)
+            except OSError:
+                pass
+        # tsserver do slot (gate "types") é reaproveitado: resincroniza o que o reset mudou
+        refresh_ts_service(slot)
+
+    @contextmanager
+    def acquire(self, head: str, base_patch: str = "") -> Iterator[str]:
+        self._ensure_slots()
+        slot = self._free.get()
+        try:
+            self._reset(slot, head, base_patch)
+            yield slot
+        finally:
+            self._free.put(slot)
+
+    def close(self) -> None:
+        with self._lock:
+            for slot in self._slots:
+                drop_ts_service(slot)
+                _git(self.workspace, ["worktree", "remove", "--force", slot])
+            self._slots = []
+            self._free = queue.Queue()
+            shutil.rmtree(self.base, ignore_errors=True)
+
+
+class SpeculativeEvaluator:
+    """
+    Avaliação especulativa de n candidatos: cada diff é aplicado no seu worktree e os gates
+    correm em paralelo (TTG ≈ candidato mais lento, não a soma). O workspace real não é tocado.
+    """
+    def __init__(self, workspace: str, gates: Dict[str, Any] | None = None, quotas: Dict[str, int] | None = None,
+                 pool: WorktreePool | None = None, use_cache: bool = True) -> None:
+        self.workspace = str(Path(workspace).resolve())
+        self.gates = gates or DEFAULT_GATES
+        self.quotas = quotas or {"cpu_seconds": 20, "mem_mb": 2048, "timeout_s": 120}
+        self.pool = pool or shared_worktree_pool(self.workspace)
+        # cache no workspace real (os slots são limpos a cada uso)
+        self.cache = GateCache(self.workspace) if use_cache and CACHE_ENABLED else None
+
+    def _eval_one(self, index: int, diff: str, head: str, base_patch: str) -> SpecResult:
+        t0 = time.perf_counter()
+        size = _diff_size(diff)
+        with self.pool.acquire(head, base_patch) as slot:
+            rc, _, err = _git(slot, ["apply", "-"], input=diff)
+            if rc != 0:
+                return SpecResult(index, False, "apply", (time.perf_counter() - t0) * 1000, size, error=err)
+            results, any_red = run_gates(slot, self.gates, self.quotas, _changed_files(diff), cache=self.cache)
+        return SpecResult(index, not any_red, "gates", (time.perf_counter() - t0) * 1000, size, results)
+
+    def evaluate(self, candidates: List[str]) -> List[SpecResult]:
+        rc, out, err = _git(self.workspace, ["rev-parse", "HEAD"])
+        if rc != 0:
+            raise RuntimeError(f"git error: {err}")
+        head = out.strip()
+        # base = o que commit_diff vai comitar (inclui não seguidos), não só `git diff HEAD`
+        base_patch = workspace_patch(self.workspace)
+        if base_patch is None:
+            raise RuntimeError("git error: não foi possível capturar o working tree do workspace")
+        # candidatos repetidos (gen_base/gen_lesson/gen_synth) avaliados uma só vez
+        first: Dict[str, int] = {}
+        for i, d in enumerate(candidates):
+            first.setdefault(d, i)
+        uniq = sorted(first.values())
+        if len(uniq) <= 1:
+            done = {i: self._eval_one(i, candidates[i], head, base_patch) for i in uniq}
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(uniq), self.pool.size)) as ex:
+                futs = {i: ex.submit(self._eval_one, i, candidates[i], head, base_patch) for i in uniq}
+                done = {i: f.result() for i, f in futs.items()}
+        out = []
+        for i, d in enumerate(candidates):
+            r = done[first[d]]
+            out.append(r if r.index == i else SpecResult(i, r.passed, r.stage, r.ttg_ms, r.diff_size, r.gates, r.error))
+        return out
+
+    @staticmethod
+    def select(results: List[SpecResult]) -> Optional[SpecResult]:
+        """Mesma política do ExecutionReranker: verdes primeiro, menor diff, depois menor TTG."""
+        green = [r for r in results if r.passed]
+        return min(green, key=lambda r: (r.diff_size, r.ttg_ms)) if green else None
+
+
+def speculative_apply(workspace: str, candidates: List[str], gates: Dict[str, Any] | None = None,
+                      quotas: Dict[str, int] | None = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Variante n-best do apply_with_rollback: só o diff vencedor chega ao workspace real.
+    Sem vencedor não há revert nem lock (nada foi aplicado).
+    """
+    ensure_not_locked(workspace)
+    ev = SpeculativeEvaluator(workspace, gates=gates, quotas=quotas, use_cache=use_cache)
+    results = ev.evaluate(candidates)
+    report = [{"index": r.index, "passed": r.passed, "stage": r.stage, "ttg_ms": round(r.ttg_ms, 1),
+               "diff_size": r.diff_size, "error": r.error[-2000:]} for r in results]
+    winner = ev.select(results)
+    if winner is None:
+        return {"ok": False, "stage": "gates", "rolled_back": False, "selected_index": None, "candidates": report}
+    _, head, _ = _git(workspace, ["rev-parse", "--short", "HEAD"])
+    ok, new_head, err = commit_diff(workspace, candidates[winner.index])
+    if not ok:
+        return {"ok": False, "stage": new_head, "error": err, "selected_index": winner.index, "candidates": report}
+    return {"ok": True, "rolled_back": False, "head": new_head, "previous_head": head.strip(),
+            "selected_index": winner.index, "gates": winner.gates, "candidates": report}
+
+
+# ----------------------- pools partilhados (um por workspace) -----------------------
+_POOLS: Dict[str, WorktreePool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def shared_worktree_pool(workspace: str, size: int | None = None) -> WorktreePool:
+    key = str(Path(workspace).resolve())
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = WorktreePool(key, size or DEFAULT_SLOTS)
+    return pool
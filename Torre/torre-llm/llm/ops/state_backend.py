@@ -0,0 +1,229 @@
+from __future__ import annotations
+import json, os, sqlite3, threading, time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Protocol, Tuple
+
+# sqlite (omissão: correto com qualquer nº de workers, mesmo sem WEB_CONCURRENCY) | memory (1 processo)
+BACKEND = os.getenv("FORTALEZA_STATE_BACKEND", "sqlite").strip().lower()
+STATE_REL = Path(".fortaleza") / "state" / "server.sqlite"
+
+
+def state_db_path() -> Path:
+    """FORTALEZA_STATE_DB, senão <REPO_ROOT>/.fortaleza/state/server.sqlite."""
+    env = os.getenv("FORTALEZA_STATE_DB")
+    return Path(env) if env else Path(os.getenv("REPO_ROOT", ".")).resolve() / STATE_REL
+
+
+class StateBackend(Protocol):
+    """
+    Estado partilhado do servidor (rate limit, eventos, badges) com primitivas atómicas:
+    - get/set: valores JSON
+    - incr_window: contador por janela fixa (rate limit)
+    - push_capped/recent: lista limitada (ring buffer)
+    - mark/count_since: janela deslizante de timestamps
+    """
+    name: str
+    def get(self, key: str, default: Any = None) -> Any: ...
+    def set(self, key: str, value: Any) -> None: ...
+    def incr_window(self, key: str, window_s: int, now: Optional[float] = None) -> int:
+        """Incrementa e devolve a contagem da janela atual (floor(now / window_s))."""
+        ...
+    def push_capped(self, key: str, value: Any, cap: int) -> None: ...
+    def recent(self, key: str, n: int) -> List[Any]:
+        """Últimos n elementos, do mais antigo para o mais recente."""
+        ...
+    def mark(self, key: str, keep_s: float, now: Optional[float] = None) -> None: ...
+    def count_since(self, key: str, seconds: float, now: Optional[float] = None) -> int: ...
+    def close(self) -> None: ...
+
+
+class MemoryBackend(StateBackend):
+    """Estado no processo (1 worker, testes): dicts/deques protegidos por lock."""
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._kv: Dict[str, Any] = {}
+        self._counters: Dict[str, Tuple[int, int]] = {}
+        self._lists: Dict[str, Deque[Any]] = {}
+        self._marks: Dict[str, Deque[float]] = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._kv.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._kv[key] = value
+
+    def incr_window(self, key: str, window_s: int, now: Optional[float] = None) -> int:
+        win = int((time.time() if now is None else now) // window_s)
+        with self._lock:
+            w, c = self._counters.get(key, (win, 0))
+            c = c + 1 if w == win else 1
+            self._counters[key] = (win, c)
+            return c
+
+    def push_capped(self, key: str, value: Any, cap: int) -> None:
+        with self._lock:
+            dq = self._lists.get(key)
+            if dq is None or dq.maxlen != cap:
+                dq = self._lists[key] = deque(dq or (), maxlen=cap)
+            dq.append(value)
+
+    def recent(self, key: str, n: int) -> List[Any]:
+        with self._lock:
+            return list(self._lists.get(key, ()))[-n:] if n > 0 else []
+
+    def mark(self, key: str, keep_s: float, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            dq = self._marks.setdefault(key, deque())
+            dq.append(now)
+            while dq and dq[0] < now - keep_s:
+                dq.popleft()
+
+    def count_since(self, key: str, seconds: float, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - seconds
+        with self._lock:
+            return sum(1 for t in self._marks.get(key, ()) if t >= cutoff)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Estado partilhado entre processos num SQLite em modo WAL (sem serviços externos).
+    Cada operação é uma transação curta (BEGIN IMMEDIATE) → correta com N workers uvicorn.
+    Uma ligação por thread; contadores expirados são podados à passagem.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str | os.PathLike | None = None, busy_timeout_s: float = 5.0) -> None:
+        self.path = Path(path) if path is not None else state_db_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_s = busy_timeout_s
+        self._local = threading.local()
+        self._ops = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, win INTEGER, count INTEGER, exp REAL);
+            CREATE TABLE IF NOT EXISTS lists (seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, value TEXT);
+            CREATE INDEX IF NOT EXISTS idx_lists_key ON lists(key, seq);
+            CREATE TABLE IF NOT EXISTS marks (key TEXT, ts REAL);
+            CREATE INDEX IF NOT EXISTS idx_marks_key ON marks(key, ts);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit: as transações são abertas explicitamente em _tx
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _tx(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return out
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute("SELECT value FROM kv WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key: str, value: Any) -> None:
+        self._conn().execute("INSERT OR REPLACE INTO kv(key, value) VALUES(?, ?)",
+                             (key, json.dumps(value, ensure_ascii=False)))
+
+    def incr_window(self, key: str, window_s: int, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        win = int(now // window_s)
+        exp = (win + 1) * window_s
+
+        def op(conn: sqlite3.Connection) -> int:
+            # upsert atómico: mesma janela → +1; janela nova → recomeça em 1
+            (count,) = conn.execute(
+                "INSERT INTO counters(key, win, count, exp) VALUES(?, ?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "count = CASE WHEN counters.win = excluded.win THEN counters.count + 1 ELSE 1 END, "
+                "win = excluded.win, exp = excluded.exp RETURNING count",
+                (key, win, exp)).fetchone()
+            self._ops += 1
+            if self._ops % 1000 == 0:
+                conn.execute("DELETE FROM counters WHERE exp < ?", (now,))
+            return int(count)
+        return self._tx(op)
+
+    def push_capped(self, key: str, value: Any, cap: int) -> None:
+        def op(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT INTO lists(key, value) VALUES(?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+            conn.execute("DELETE FROM lists WHERE key=? AND seq <= "
+                         "(SELECT seq FROM lists WHERE key=? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                         (key, key, cap))
+        self._tx(op)
+
+    def recent(self, key: str, n: int) -> List[Any]:
+        if n <= 0:
+            return []
+        rows = self._conn().execute("SELECT value FROM lists WHERE key=? ORDER BY seq DESC LIMIT ?",
+                                    (key, n)).fetchall()
+        return [json.loads(v) for (v,) in reversed(rows)]
+
+    def mark(self, key: str, keep_s: float, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+
+        def op(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT INTO marks(key, ts) VALUES(?, ?)", (key, now))
+            conn.execute("DELETE FROM marks WHERE key=? AND ts < ?", (key, now - keep_s))
+        self._tx(op)
+
+    def count_since(self, key: str, seconds: float, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - seconds
+        (n,) = self._conn().execute("SELECT COUNT(*) FROM marks WHERE key=? AND ts >= ?", (key, cutoff)).fetchone()
+        return int(n)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def make_state_backend(kind: str | None = None, path: str | os.PathLike | None = None) -> StateBackend:
+    """
+    sqlite por omissão: `uvicorn --workers N` não define WEB_CONCURRENCY, por isso o nº de workers
+    não é detetável aqui. memory só é seguro com um único processo (testes, dev).
+    """
+    kind = (kind if kind is not None else BACKEND) or "sqlite"
+    if kind == "memory":
+        if int(os.getenv("WEB_CONCURRENCY", "1") or 1) > 1:
+            raise ValueError("state backend memory com WEB_CONCURRENCY>1: cada worker teria o seu estado")
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    raise ValueError(f"state backend desconhecido: {kind}")
+
+
+_BACKEND: Optional[StateBackend] = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def shared_state_backend() -> StateBackend:
+    """Backend único por processo (configurado por FORTALEZA_STATE_BACKEND / FORTALEZA_STATE_DB)."""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = make_state_backend()
+        return _BACKEND
@@ -0,0 +1,256 @@
+from __future__ import annotations
+import atexit, gzip, json, os, queue, shutil, threading, time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from .quantile_sketch import SketchStore
+
+try:
+    import fcntl  # lock entre processos (POSIX); opcional
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+MAX_QUEUE = int(os.getenv("FORTALEZA_TRACE_QUEUE", "10000"))
+FSYNC_INTERVAL_S = float(os.getenv("FORTALEZA_TRACE_FSYNC_S", "1.0"))
+# dias comprimidos a manter (0 = todos)
+KEEP_GZ = int(os.getenv("FORTALEZA_TRACE_KEEP_GZ", "0"))
+
+
+def _day(ts: float | None = None) -> str:
+    return datetime.fromtimestamp(ts if ts is not None else time.time(), timezone.utc).strftime("%Y%m%d")
+
+
+def _last_line(fn: Path, chunk: int = 65536) -> Optional[str]:
+    """Última linha não vazia lendo só o fim do ficheiro (sem readlines)."""
+    try:
+        with fn.open("rb") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            f.seek(max(0, end - chunk))
+            lines = [l for l in f.read().splitlines() if l.strip()]
+    except OSError:
+        return None
+    return lines[-1].decode("utf-8", "replace") if lines else None
+
+
+class TraceStore:
+    """
+    Traces do servidor sem I/O no caminho do pedido:
+    - log() só enfileira (fila limitada; cheia → descarta e conta) e atualiza o índice em memória
+    - uma thread escreve em lotes no trace-YYYYMMDD.jsonl do dia, com fsync no máximo 1×/FSYNC_INTERVAL_S
+    - latest()/tail(endpoint) servem /traces/badge em O(1)
+    - dias anteriores são comprimidos (trace-YYYYMMDD.jsonl.gz) em vez de apagados; com vários
+      workers a escrever no mesmo diretório, cada lote é um único write(2) num fd O_APPEND (linhas
+      nunca se intercalam) feito sob flock partilhado em trace.lock, e a compressão corre sob flock
+      exclusivo (nenhum processo comprime um ficheiro onde outro ainda escreve)
+    - latências alimentam sketches de quantis por (dia, endpoint), persistidos junto do fsync
+    """
+    def __init__(self, directory: str | os.PathLike = ".fortaleza/trace", max_queue: int = MAX_QUEUE,
+                 fsync_interval_s: float = FSYNC_INTERVAL_S, tail_size: int = 50, keep_gz: int = KEEP_GZ,
+                 sketches: bool = True) -> None:
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.fsync_interval_s = fsync_interval_s
+        self.tail_size = tail_size
+        self.keep_gz = keep_gz
+        self._q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._idx_lock = threading.Lock()
+        self._latest: Optional[Dict[str, Any]] = None
+        self._tails: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._fd: Optional[int] = None      # O_APPEND: um lote = um write(2)
+        self._fd_day = ""
+        self._last_fsync = 0.0
+        self._pending_sync = False
+        self.sketches = SketchStore(self.dir) if sketches else None
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "fsyncs": 0, "compressed": 0,
+                      "write_errors": 0, "lost": 0}
+        self.last_error = ""
+        self._lock_fh = (self.dir / "trace.lock").open("a") if fcntl is not None else None
+        self._rolled = False
+        self._load_latest()
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ------------------------------ pedido (não bloqueia) ------------------------------
+    def log(self, record: Dict[str, Any]) -> bool:
+        self._index(record)
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["queued"] += 1
+        return True
+
+    def _index(self, record: Dict[str, Any]) -> None:
+        with self._idx_lock:
+            self._latest = record
+            ep = str(record.get("endpoint", ""))
+            tail = self._tails.get(ep)
+            if tail is None:
+                tail = self._tails[ep] = deque(maxlen=self.tail_size)
+            tail.append(record)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self._latest
+
+    def tail(self, endpoint: str, n: int = 10) -> List[Dict[str, Any]]:
+        with self._idx_lock:
+            return list(self._tails.get(endpoint, ()))[-n:]
+
+    # ------------------------------------ writer ------------------------------------
+    def _load_latest(self) -> None:
+        for fn in sorted(self.dir.glob("trace-*.jsonl"), reverse=True):
+            line = _last_line(fn)
+            if not line:
+                continue
+            try:
+                self._index(json.loads(line))
+                return
+            except ValueError:
+                continue
+
+    def _open(self, day: str) -> int:
+        if self._fd is not None and self._fd_day == day:
+            return self._fd
+        if self._fd is not None:
+            self._sync(force=True)
+            os.close(self._fd)
+            self._fd = None
+        self._fd = os.open(self.dir / f"trace-{day}.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._fd_day = day
+        self._rolled = True     # comprime os dias anteriores fora do lock partilhado
+        return self._fd
+
+    @contextmanager
+    def _dir_lock(self, exclusive: bool):
+        if self._lock_fh is None:
+            yield
+            return
+        fcntl.flock(self._lock_fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+
+    def _sync(self, force: bool = False) -> None:
+        if self._fd is None or not self._pending_sync:
+            return
+        now = time.monotonic()
+        if force or now - self._last_fsync >= self.fsync_interval_s:
+            os.fsync(self._fd)
+            if self.sketches is not None:
+                self.sketches.persist()
+            self._last_fsync = now
+            self._pending_sync = False
+            self.stats["fsyncs"] += 1
+
+    def _compress_old(self, today: str) -> None:
+        """
+        Sob flock exclusivo: os escritores calculam o dia do lote já dentro do lock partilhado,
+        por isso depois de `today` ninguém volta a escrever num dia anterior.
+        """
+        with self._dir_lock(exclusive=True):
+            for fn in sorted(self.dir.glob("trace-*.jsonl")):
+                if fn.name >= f"trace-{today}.jsonl":
+                    continue
+                gz = fn.with_name(fn.name + ".gz")
+                tmp = gz.with_name(f"{gz.name}.{os.getpid()}.tmp")
+                try:
+                    with fn.open("rb") as src, gzip.open(tmp, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(tmp, gz)
+                    fn.unlink()
+                    self.stats["compressed"] += 1
+                except OSError:
+                    tmp.unlink(missing_ok=True)
+                    continue
+            if self.keep_gz > 0:
+                old = sorted(self.dir.glob("trace-*.jsonl.gz"))
+                for fn in old[: max(0, len(old) - self.keep_gz)]:
+                    fn.unlink(missing_ok=True)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in batch).encode("utf-8")
+        with self._dir_lock(exclusive=False):
+            day = _day()
+            # um único write(2) em O_APPEND: lotes de vários workers nunca se intercalam
+            # (um write de ficheiro em buffer seria partido em vários write(2) acima de 8 KiB)
+            n = os.write(self._open(day), data)
+        if n != len(data):
+            raise OSError(f"escrita parcial do lote ({n}/{len(data)} bytes)")
+        if self._rolled:
+            self._rolled = False
+            self._compress_old(day)
+        if self.sketches is not None:
+            for rec in batch:
+                lat = rec.get("latency_ms")
+                if isinstance(lat, (int, float)):
+                    self.sketches.observe(str(rec.get("endpoint", "")), lat, day)
+        self._pending_sync = True
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def _run(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=self.fsync_interval_s)
+            except queue.Empty:
+                self._sync()
+                continue
+            batch = [first]
+            # drena o que já estiver na fila (um write por lote)
+            while len(batch) < 1024:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            written = self.stats["written"]
+            try:
+                if records:
+                    self._write_batch(records)
+                self._sync(force=stop)
+            except Exception as e:
+                # o writer não pode morrer; a falha fica visível em stats/last_error
+                self.stats["write_errors"] += 1
+                self.stats["lost"] += len(records) if self.stats["written"] == written else 0
+                self.last_error = f"{type(e).__name__}: {e}"
+            for _ in batch:
+                self._q.task_done()
+            if stop:
+                return
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera que tudo o que foi enfileirado esteja escrito no ficheiro (testes/shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        try:
+            self._q.put(None, timeout=1.0)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5.0)
+        if self._fd is not None:
+            try:
+                self._sync(force=True)
+                os.close(self._fd)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+            self._fd = None
+        if self._lock_fh is not None:
+            self._lock_fh.close()
+            self._lock_fh = None
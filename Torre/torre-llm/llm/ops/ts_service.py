@@ -0,0 +1,394 @@
+from __future__ import annotations
+import json, os, queue, re, shutil, subprocess, threading, time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# FORTALEZA_TS_DAEMON=0 força sempre o caminho frio (tsc --noEmit)
+DAEMON_ENABLED = os.getenv("FORTALEZA_TS_DAEMON", "1") != "0"
+REQUEST_TIMEOUT_S = float(os.getenv("FORTALEZA_TS_TIMEOUT_S", "30"))
+TS_EXTS = (".ts", ".tsx", ".js", ".jsx", ".mts", ".cts")
+
+# saída de `tsc --pretty false`: src/a.ts(3,7): error TS2304: Cannot find name 'x'.
+RX_TSC_LINE = re.compile(r"^(?P<file>[^\s(][^(]*?)\((?P<line>\d+),(?P<col>\d+)\):\s+(?P<cat>error|warning|message)\s+TS(?P<code>\d+):\s*(?P<msg>.*)$", re.M)
+
+
+@dataclass(frozen=True)
+class TSDiagnostic:
+    file: str       # relativo à raiz (posix)
+    line: int
+    col: int
+    code: str       # TS2304
+    message: str
+    category: str = "error"
+
+    def format(self) -> str:
+        """Mesmo formato do tsc (consumível por error_taxonomy/parsers)."""
+        return f"{self.file}({self.line},{self.col}): {self.category} {self.code}: {self.message}"
+
+
+def _rel(root: Path, file: str) -> str:
+    p = Path(file)
+    try:
+        return (p if not p.is_absolute() else p.resolve().relative_to(root)).as_posix()
+    except ValueError:
+        return p.as_posix()
+
+
+def parse_tsc_output(text: str, root: str | os.PathLike = ".") -> List[TSDiagnostic]:
+    root_p = Path(root).resolve()
+    return [TSDiagnostic(_rel(root_p, m.group("file").strip()), int(m.group("line")), int(m.group("col")),
+                         "TS" + m.group("code"), m.group("msg").strip(), m.group("cat"))
+            for m in RX_TSC_LINE.finditer(text or "")]
+
+
+def find_tsserver(root: str | os.PathLike) -> Optional[List[str]]:
+    """tsserver local (node_modules) ou global; nunca via npx (não queremos downloads no daemon)."""
+    local = Path(root) / "node_modules" / "typescript" / "lib" / "tsserver.js"
+    node = shutil.which("node")
+    if local.is_file() and node:
+        return [node, str(local)]
+    exe = shutil.which("tsserver")
+    return [exe] if exe else None
+
+
+def find_tsc(root: str | os.PathLike, allow_npx: bool = True) -> Optional[List[str]]:
+    local = Path(root) / "node_modules" / ".bin" / "tsc"
+    if local.is_file():
+        return [str(local)]
+    exe = shutil.which("tsc")
+    if exe:
+        return [exe]
+    return ["npx", "tsc"] if allow_npx and shutil.which("npx") else None
+
+
+def cold_tsc(root: str | os.PathLike, files: Iterable[str] | None = None, timeout_s: float = 30.0,
+             allow_npx: bool = True) -> List[TSDiagnostic]:
+    """
+    Fallback frio: tsc --noEmit sobre o projeto, com --incremental (buildinfo em .fortaleza/cache/tsc)
+    para que a 2ª execução já reaproveite o grafo. Lança subprocess.TimeoutExpired / FileNotFoundError.
+    """
+    root_p = Path(root).resolve()
+    cmd = find_tsc(root_p, allow_npx=allow_npx)
+    if cmd is None:
+        raise FileNotFoundError("tsc não encontrado")
+    info = root_p / ".fortaleza" / "cache" / "tsc" / "tsconfig.tsbuildinfo"
+    info.parent.mkdir(parents=True, exist_ok=True)
+    proc = subprocess.run(cmd + ["--noEmit", "--pretty", "false", "--incremental", "--tsBuildInfoFile", str(info)],
+                          cwd=root_p, capture_output=True, text=True, timeout=timeout_s)
+    diags = parse_tsc_output(proc.stdout + "\n" + proc.stderr, root_p)
+    if files is not None:
+        wanted = {_rel(root_p, f) for f in files}
+        diags = [d for d in diags if d.file in wanted]
+    return diags
+
+
+class TSServerClient:
+    """
+    Cliente mínimo do protocolo stdio do tsserver.
+    Pedidos: uma linha JSON; respostas/eventos: `Content-Length: N` + corpo JSON.
+    Um pedido de cada vez (lock); uma thread lê o stdout para uma fila.
+    """
+    def __init__(self, cmd: List[str], cwd: str | os.PathLike) -> None:
+        self.cmd = list(cmd)
+        self.cwd = os.fspath(cwd)
+        self._proc: subprocess.Popen | None = None
+        self._msgs: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._seq = 0
+        self._lock = threading.RLock()
+
+    def start(self) -> None:
+        self._proc = subprocess.Popen(self.cmd + ["--disableAutomaticTypingAcquisition"], cwd=self.cwd,
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._msgs = queue.Queue()
+        threading.Thread(target=self._reader, args=(self._proc.stdout, self._msgs), daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    @staticmethod
+    def _reader(stream, out: "queue.Queue") -> None:
+        try:
+            while True:
+                line = stream.readline()
+                if not line:
+                    break
+                if not line.lower().startswith(b"content-length:"):
+                    continue
+                n = int(line.split(b":", 1)[1])
+                stream.readline()  # linha em branco
+                body = stream.read(n)
+                try:
+                    out.put(json.loads(body))
+                except ValueError:
+                    continue
+        finally:
+            out.put(None)  # EOF: processo morreu
+
+    def _send(self, command: str, arguments: Dict[str, Any] | None = None) -> int:
+        self._seq += 1
+        msg = {"seq": self._seq, "type": "request", "command": command, "arguments": arguments or {}}
+        assert self._proc is not None and self._proc.stdin is not None
+        self._proc.stdin.write((json.dumps(msg) + "\n").encode("utf-8"))
+        self._proc.stdin.flush()
+        return self._seq
+
+    def _next(self, deadline: float) -> Dict[str, Any]:
+        try:
+            msg = self._msgs.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            raise TimeoutError("tsserver não respondeu a tempo")
+        if msg is None:
+            raise RuntimeError("tsserver terminou")
+        return msg
+
+    def request(self, command: str, arguments: Dict[str, Any] | None = None, timeout_s: float = REQUEST_TIMEOUT_S) -> Any:
+        """Pedido síncrono; devolve `body` da resposta (eventos intermédios são descartados)."""
+        with self._lock:
+            seq = self._send(command, arguments)
+            deadline = time.monotonic() + timeout_s
+            while True:
+                msg = self._next(deadline)
+                if msg.get("type") == "response" and msg.get("request_seq") == seq:
+                    if not msg.get("success", False):
+                        raise RuntimeError(msg.get("message") or f"tsserver: {command} falhou")
+                    return msg.get("body")
+
+    def notify(self, command: str, arguments: Dict[str, Any] | None = None) -> None:
+        with self._lock:
+            self._send(command, arguments)
+
+    def geterr_project(self, file: str, timeout_s: float = REQUEST_TIMEOUT_S) -> Dict[str, List[Dict[str, Any]]]:
+        """geterrForProject: recolhe eventos syntaxDiag/semanticDiag até requestCompleted."""
+        with self._lock:
+            seq = self._send("geterrForProject", {"file": file, "delay": 0})
+            deadline = time.monotonic() + timeout_s
+            out: Dict[str, List[Dict[str, Any]]] = {}
+            while True:
+                msg = self._next(deadline)
+                if msg.get("type") != "event":
+                    continue
+                ev, body = msg.get("event"), msg.get("body") or {}
+                if ev in ("syntaxDiag", "semanticDiag"):
+                    out.setdefault(body.get("file", ""), []).extend(body.get("diagnostics") or [])
+                elif ev == "requestCompleted" and body.get("request_seq") == seq:
+                    return out
+
+    def close(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            if proc.stdin:
+                proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+
+
+class TSService:
+    """
+    Serviço TypeScript de longa duração por workspace (tsserver quente).
+    - diagnostics(files): abre/recarrega só os ficheiros pedidos e pede diagnósticos síncronos
+      (ms depois de um diff aplicado; `contents` permite avaliar conteúdo em memória)
+    - project_diagnostics(): geterrForProject (substitui `tsc --noEmit` a frio)
+    Sem tsserver (ou FORTALEZA_TS_DAEMON=0), ambos caem para cold_tsc() (ou lançam, com cold=False).
+    """
+    def __init__(self, root: str | os.PathLike = ".", cmd: List[str] | None = None,
+                 timeout_s: float = REQUEST_TIMEOUT_S) -> None:
+        self.root = Path(root).resolve()
+        self.cmd = cmd if cmd is not None else find_tsserver(self.root)
+        self.timeout_s = timeout_s
+        self._client: TSServerClient | None = None
+        self._open: Dict[str, tuple] = {}   # abs → (mtime_ns, size) | ("mem",) se conteúdo em memória
+        self._lock = threading.RLock()
+        self.stats = {"daemon": 0, "cold": 0, "restarts": 0}
+
+    @property
+    def available(self) -> bool:
+        return DAEMON_ENABLED and bool(self.cmd)
+
+    def _ensure(self) -> TSServerClient:
+        if self._client is None or not self._client.alive:
+            if self._client is not None:
+                self.stats["restarts"] += 1
+            self._client = TSServerClient(self.cmd or [], self.root)
+            self._client.start()
+            self._open.clear()
+            self._client.request("configure", {"preferences": {}, "watchOptions": {}}, timeout_s=self.timeout_s)
+        return self._client
+
+    def _abs(self, file: str) -> str:
+        p = Path(file)
+        return str(p if p.is_absolute() else self.root / p)
+
+    def _sync(self, client: TSServerClient, files: List[str], contents: Dict[str, str] | None) -> None:
+        """Abre ficheiros novos; recarrega do disco os que mudaram de stat (ou tinham conteúdo em memória)."""
+        contents = contents or {}
+        # conteúdos em memória de pedidos anteriores (candidatos nunca aplicados) voltam ao disco,
+        # senão contaminariam consultas ao projeto que não os pedem
+        mine = {self._abs(f) for f in contents}
+        for path, sig in list(self._open.items()):
+            if sig == ("mem",) and path not in mine:
+                self._restore(client, path)
+        for f in files:
+            path = self._abs(f)
+            text = contents.get(f, contents.get(path))
+            if text is not None:
+                if path in self._open:
+                    client.notify("close", {"file": path})
+                client.notify("open", {"file": path, "fileContent": text, "projectRootPath": str(self.root)})
+                self._open[path] = ("mem",)
+                continue
+            try:
+                st = os.stat(path)
+                sig = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                sig = None
+            prev = self._open.get(path)
+            if prev is None:
+                client.notify("open", {"file": path, "projectRootPath": str(self.root)})
+            elif prev != sig:
+                client.request("reload", {"file": path, "tmpfile": path}, timeout_s=self.timeout_s)
+            self._open[path] = sig
+
+    def _restore(self, client: TSServerClient, path: str) -> None:
+        if os.path.exists(path):
+            client.request("reload", {"file": path, "tmpfile": path}, timeout_s=self.timeout_s)
+            try:
+                st = os.stat(path)
+                self._open[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                self._open[path] = None
+        else:
+            client.notify("close", {"file": path})
+            del self._open[path]
+
+    def refresh(self) -> None:
+        """Volta a sincronizar com o disco todos os ficheiros abertos (ex.: após checkout/clean do worktree)."""
+        with self._lock:
+            if self._client is None or not self._client.alive:
+                return
+            try:
+                for path, sig in list(self._open.items()):
+                    try:
+                        st = os.stat(path)
+                        cur = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        cur = None
+                    if sig != cur:
+                        self._restore(self._client, path)
+            except (OSError, RuntimeError, TimeoutError):
+                self.close()
+
+    def _convert(self, path: str, items: List[Dict[str, Any]]) -> List[TSDiagnostic]:
+        rel = _rel(self.root, path)
+        out = []
+        for d in items or []:
+            start = d.get("start") or {}
+            out.append(TSDiagnostic(rel, int(start.get("line", 0)), int(start.get("offset", 0)),
+                                    f"TS{d.get('code')}", str(d.get("text", "")), str(d.get("category", "error"))))
+        return out
+
+    def diagnostics(self, files: Iterable[str], contents: Dict[str, str] | None = None,
+                    allow_npx: bool = True, cold: bool = True) -> List[TSDiagnostic]:
+        files = [f for f in files if f.endswith(TS_EXTS)]
+        if not files:
+            return []
+        if self.available:
+            with self._lock:
+                try:
+                    client = self._ensure()
+                    self._sync(client, files, contents)
+                    out: List[TSDiagnostic] = []
+                    for f in files:
+                        path = self._abs(f)
+                        for cmd in ("syntacticDiagnosticsSync", "semanticDiagnosticsSync"):
+                            body = client.request(cmd, {"file": path, "includeLinePosition": False}, timeout_s=self.timeout_s)
+                            out.extend(self._convert(path, body))
+                    self.stats["daemon"] += 1
+                    return out
+                except (OSError, RuntimeError, TimeoutError):
+                    self.close()
+        if not cold:
+            raise RuntimeError("tsserver indisponível")
+        self.stats["cold"] += 1
+        return cold_tsc(self.root, files, timeout_s=self.timeout_s, allow_npx=allow_npx)
+
+    def project_diagnostics(self, changed: Iterable[str] = (), allow_npx: bool = True,
+                            cold: bool = True) -> List[TSDiagnostic]:
+        """Todos os diagnósticos do projeto; `changed` são sincronizados antes (sem esperar pelos watchers)."""
+        if self.available:
+            changed = [f for f in changed if f.endswith(TS_EXTS)]
+            anchor = changed[0] if changed else self._anchor()
+            if anchor:
+                with self._lock:
+                    try:
+                        client = self._ensure()
+                        self._sync(client, list(dict.fromkeys([anchor] + changed)), None)
+                        by_file = client.geterr_project(self._abs(anchor), timeout_s=self.timeout_s)
+                        self.stats["daemon"] += 1
+                        return [d for path, items in sorted(by_file.items()) for d in self._convert(path, items)]
+                    except (OSError, RuntimeError, TimeoutError):
+                        self.close()
+        if not cold:
+            raise RuntimeError("tsserver indisponível")
+        self.stats["cold"] += 1
+        return cold_tsc(self.root, timeout_s=self.timeout_s, allow_npx=allow_npx)
+
+    def error_count(self, changed: Iterable[str] = ()) -> int:
+        return sum(1 for d in self.project_diagnostics(changed) if d.category == "error")
+
+    def _anchor(self) -> Optional[str]:
+        """Um ficheiro qualquer do projeto para o geterrForProject (preferência: src/)."""
+        for sub in ("src", "."):
+            base = self.root / sub
+            if not base.is_dir():
+                continue
+            for entry in sorted(os.scandir(base), key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith((".ts", ".tsx")) and not entry.name.endswith(".d.ts"):
+                    return entry.path
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._open.clear()
+
+
+# ----------------------- pool de serviços (um por workspace) -----------------------
+_SERVICES: Dict[str, TSService] = {}
+_SERVICES_LOCK = threading.Lock()
+
+def shared_ts_service(root: str | os.PathLike = ".") -> TSService:
+    """Um tsserver por raiz, reutilizado por todos os pedidos do processo."""
+    key = str(Path(root).resolve())
+    with _SERVICES_LOCK:
+        svc = _SERVICES.get(key)
+        if svc is None:
+            svc = _SERVICES[key] = TSService(key)
+    return svc
+
+def refresh_ts_service(root: str | os.PathLike) -> None:
+    """Resincroniza com o disco o tsserver de uma raiz, se já existir (não arranca nenhum)."""
+    with _SERVICES_LOCK:
+        svc = _SERVICES.get(str(Path(root).resolve()))
+    if svc is not None:
+        svc.refresh()
+
+def drop_ts_service(root: str | os.PathLike) -> None:
+    """Fecha e esquece o tsserver de uma raiz (ex.: worktree removido)."""
+    with _SERVICES_LOCK:
+        svc = _SERVICES.pop(str(Path(root).resolve()), None)
+    if svc is not None:
+        svc.close()
+
+def shutdown_ts_services() -> None:
+    with _SERVICES_LOCK:
+        services = list(_SERVICES.values())
+        _SERVICES.clear()
+    for svc in services:
+        svc.close()
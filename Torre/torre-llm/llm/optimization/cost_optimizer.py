@@ -2,6 +2,8 @@ from __future__ import annotations
 import os, math
 from typing import Dict, Any, Tuple
 
+from .log_miner import ENABLED as LOG_MINER_ENABLED, shared_log_miner
+
 DEFAULT_7B=os.getenv("LLM_MODEL_7B","qwen2.5-coder-7b-instruct")
 DEFAULT_14B=os.getenv("LLM_MODEL_14B","qwen2.5-coder-14b-instruct")
 
@@ -14,7 +16,13 @@ def _len(obj:Any)->int:
         return 0
 
 def compress_logs(logs:Dict[str,str], budget:int=4000)->Dict[str,str]:
-    """Compressão ingênua: mantém as últimas N linhas por chave; corta excesso."""
+    """
+    Templates de logs (log_miner) num orçamento de `budget` tokens: linhas repetidas colapsam
+    em [xN] template + amostras, erros/novidades primeiro. FORTALEZA_LOG_MINER=0 → compressão ingénua.
+    """
+    if LOG_MINER_ENABLED:
+        return shared_log_miner().compress(logs, budget)
+    # ingénua: mantém as últimas N linhas por chave; corta excesso
     out={}
     remaining=budget
     keys=list(logs.keys())
@@ -0,0 +1,376 @@
+from __future__ import annotations
+import atexit, json, math, os, re, threading, time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl  # lock entre processos no save (POSIX); opcional
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+# FORTALEZA_LOG_MINER=0 volta ao corte por caracteres/linhas
+ENABLED = os.getenv("FORTALEZA_LOG_MINER", "1") != "0"
+# estado por workspace (<repo>/.fortaleza/...); FORTALEZA_LOG_MINER_STATE fixa outro ficheiro
+STATE_REL = Path(".fortaleza") / "cache" / "log_templates.json"
+MAX_CLUSTERS = int(os.getenv("FORTALEZA_LOG_MINER_MAX", "5000"))
+SAVE_INTERVAL_S = float(os.getenv("FORTALEZA_LOG_MINER_SAVE_S", "5"))
+SIM_THRESHOLD = 0.5          # semelhança mínima para juntar uma linha a um template
+DEPTH = 2                    # tokens iniciais usados como prefixo na árvore
+MAX_CHILDREN = 100
+MAX_LINE_TOKENS = 120        # linhas maiores são encurtadas antes do parse
+CHARS_PER_TOKEN = 4
+WILDCARD = "<*>"
+
+# valores que nunca fazem parte do template (números, hex, uuids, durações, posições)
+_MASK = re.compile(r"^(?:[-+]?\d[\d.,:_]*(?:ms|s|m|h|kb|mb|gb|%)?|0x[0-9a-f]+|[0-9a-f]{8,}|"
+                   r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$", re.I)
+
+# gravidade por linha: o primeiro padrão que casar decide
+_SEVERITY: Tuple[Tuple[int, "re.Pattern[str]"], ...] = (
+    (4, re.compile(r"\b(?:fatal|panic|traceback|exception|error|err!|failed|failure)\b|\bTS\d{4,5}\b|✖|✗", re.I)),
+    (3, re.compile(r"\b(?:assert\w*|expected|cannot|can't|undefined|not found|denied|timed? ?out|refused)\b", re.I)),
+    (2, re.compile(r"\b(?:warn\w*|deprecat\w*)\b", re.I)),
+)
+
+
+def state_path(workspace: Optional[str | os.PathLike] = None) -> Path:
+    """Ficheiro de estado: FORTALEZA_LOG_MINER_STATE, senão <workspace|REPO_ROOT>/.fortaleza/cache."""
+    env = os.getenv("FORTALEZA_LOG_MINER_STATE")
+    if env:
+        return Path(env)
+    return Path(workspace or os.getenv("REPO_ROOT", ".")).resolve() / STATE_REL
+
+
+def line_severity(line: str) -> int:
+    for level, rx in _SEVERITY:
+        if rx.search(line):
+            return level
+    return 1
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _tokens(line: str) -> List[str]:
+    toks = line.split()
+    return toks[:MAX_LINE_TOKENS]
+
+
+def _masked(toks: List[str]) -> List[str]:
+    return [WILDCARD if _MASK.match(t) else t for t in toks]
+
+
+@dataclass
+class LogCluster:
+    id: int
+    template: List[str]
+    count: int = 0              # ocorrências acumuladas (todas as execuções)
+    runs: int = 0               # execuções em que apareceu
+    last: float = 0.0           # última vez visto (epoch)
+    saved: Tuple[int, int] = (0, 0)   # (count, runs) já no ficheiro: o save junta só o delta
+
+    def similarity(self, toks: List[str]) -> Tuple[float, int]:
+        same = wild = 0
+        for a, b in zip(self.template, toks):
+            if a == b:
+                same += 1       # inclui valores mascarados nas duas pontas
+            elif a == WILDCARD:
+                wild += 1
+        return same / max(1, len(toks)), wild
+
+    def merge(self, toks: List[str]) -> None:
+        self.template = [a if a == b else WILDCARD for a, b in zip(self.template, toks)]
+
+
+@dataclass
+class TemplateHit:
+    """Template visto numa execução: contagem, amostras das variáveis e pontuação."""
+    cluster: LogCluster
+    key: str
+    first: int                  # posição (linha) da 1ª ocorrência nesta execução
+    raw: str                    # 1ª linha original
+    toks: List[str]
+    count: int = 0
+    severity: int = 1
+    novel: bool = False
+    varying: List[bool] = field(default_factory=list)
+    samples: List[str] = field(default_factory=list)
+
+    def add(self, line: str, toks: List[str], max_samples: int = 3) -> None:
+        self.count += 1
+        self.severity = max(self.severity, line_severity(line))
+        if self.count == 1:
+            self.varying = [False] * len(toks)
+            return
+        diff = [i for i, (a, b) in enumerate(zip(self.toks, toks)) if a != b]
+        for i in diff:
+            self.varying[i] = True
+        if diff and len(self.samples) < max_samples:
+            sample = " ".join(toks[i] for i in diff)
+            if sample not in self.samples:
+                self.samples.append(sample)
+
+    @property
+    def score(self) -> float:
+        # gravidade domina; raridade desempata (repetição custa uma só linha). A novidade fica de
+        # fora: depende do histórico e tornaria o prompt diferente para o mesmo pedido (cache de inferência)
+        return self.severity * 10 + 2 / (1 + math.log(self.count))
+
+    def render(self) -> str:
+        """Linha única: o original se só apareceu uma vez, senão o template desta execução com contagem."""
+        if self.count == 1:
+            return self.raw
+        tpl = " ".join(WILDCARD if v else t for t, v in zip(self.toks, self.varying))
+        out = f"[x{self.count}] {tpl}"
+        if self.samples:
+            out += " (ex.: " + "; ".join(self.samples) + ")"
+        return out
+
+
+class LogMiner:
+    """
+    Mineração online de templates de logs (árvore tipo Drain):
+    raiz → nº de tokens → primeiros DEPTH tokens → clusters (semelhança ≥ SIM_THRESHOLD).
+    Com `path`, a árvore é persistida em JSON e aquece entre execuções (mine() marca os templates
+    inéditos como `novel`); vários processos partilham o ficheiro: save() junta o estado em disco
+    sob lock em vez de o substituir (sem `path`, só em memória).
+    """
+    def __init__(self, path: Optional[str | os.PathLike] = None, max_clusters: int = MAX_CLUSTERS,
+                 sim_threshold: float = SIM_THRESHOLD) -> None:
+        self.path = Path(path) if path else None
+        self.max_clusters = max_clusters
+        self.sim_threshold = sim_threshold
+        self._lock = threading.RLock()
+        self._tree: Dict[int, Dict[str, Any]] = {}
+        self._clusters: Dict[int, LogCluster] = {}
+        self._next_id = 1
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.runs = 0
+        self._saved_runs = 0
+        self._load()
+
+    # ------------------------------------ árvore ------------------------------------
+    def _leaf(self, toks: List[str], create: bool) -> Optional[List[LogCluster]]:
+        node: Dict[str, Any] = self._tree.setdefault(len(toks), {}) if create else self._tree.get(len(toks), {})
+        for tok in toks[:DEPTH]:
+            key = WILDCARD if tok == WILDCARD or any(ch.isdigit() for ch in tok) else tok
+            nxt = node.get(key)
+            if nxt is None and create:
+                if key != WILDCARD and len(node) >= MAX_CHILDREN:
+                    key = WILDCARD
+                nxt = node.setdefault(key, {})
+            elif nxt is None:
+                nxt = node.get(WILDCARD)
+                if nxt is None:
+                    return None
+            node = nxt
+        if create:
+            return node.setdefault("", [])
+        return node.get("")
+
+    def _add_cluster(self, template: List[str], cid: Optional[int] = None, **state: Any) -> LogCluster:
+        if cid is None:
+            cid = self._next_id
+        self._next_id = max(self._next_id, cid + 1)
+        c = LogCluster(cid, list(template), **state)
+        self._clusters[cid] = c
+        self._leaf(c.template, create=True).append(c)
+        return c
+
+    def match(self, toks: List[str]) -> LogCluster:
+        """Cluster da linha (mascarada); cria ou generaliza o template."""
+        leaf = self._leaf(toks, create=False) or []
+        best: Optional[LogCluster] = None
+        best_key = (-1.0, -1)
+        for c in leaf:
+            key = c.similarity(toks)
+            if key > best_key:
+                best, best_key = c, key
+        if best is not None and best_key[0] >= self.sim_threshold:
+            if best.template != toks:
+                best.merge(toks)
+            return best
+        return self._add_cluster(toks)
+
+    # ------------------------------------ mineração ------------------------------------
+    def mine(self, logs: Dict[str, str]) -> List[TemplateHit]:
+        """Agrupa as linhas em templates (um TemplateHit por log × cluster); atualiza a árvore persistente."""
+        hits: Dict[Tuple[str, int], TemplateHit] = {}
+        offset = 0
+        with self._lock:
+            for k, text in logs.items():
+                text = text or ""
+                for i, line in enumerate(text.splitlines()):
+                    raw = _tokens(line)
+                    if not raw:
+                        continue
+                    c = self.match(_masked(raw))
+                    hit = hits.get((k, c.id))
+                    if hit is None:
+                        hit = hits[(k, c.id)] = TemplateHit(c, k, offset + i, line.rstrip(), raw, novel=c.count == 0)
+                    hit.add(line, raw)
+                offset += text.count("\n") + 1
+            now = time.time()
+            seen: Dict[int, int] = {}
+            for hit in hits.values():
+                seen[hit.cluster.id] = seen.get(hit.cluster.id, 0) + hit.count
+            for cid, n in seen.items():
+                c = self._clusters[cid]
+                c.count += n
+                c.runs += 1
+                c.last = now
+            self.runs += 1
+            self._dirty = True
+            self._maybe_save()
+        return list(hits.values())
+
+    def compress(self, logs: Dict[str, str], budget_tokens: int) -> Dict[str, str]:
+        """
+        Comprime vários logs num orçamento de tokens: templates com contagem e amostras,
+        ordenados por gravidade/raridade para a seleção e devolvidos pela ordem original.
+        Determinístico para a mesma entrada: agrupa numa árvore nova (a persistente só regista
+        o histórico), por isso pedidos repetidos geram o mesmo prompt.
+        """
+        self.mine(logs)
+        scratch = LogMiner(max_clusters=self.max_clusters, sim_threshold=self.sim_threshold)
+        ranked = sorted(scratch.mine(logs), key=lambda h: (-h.score, h.first))
+        left = max(0, budget_tokens)
+        chosen: List[Tuple[TemplateHit, str]] = []
+        for h in ranked:
+            line = h.render()
+            cost = approx_tokens(line)
+            if cost > left:
+                if left > 8 and h.severity >= 3:
+                    line = line[: (left - 1) * CHARS_PER_TOKEN] + "…"
+                    cost = left
+                else:
+                    continue
+            chosen.append((h, line))
+            left -= cost
+        out: Dict[str, List[Tuple[int, str]]] = {k: [] for k in logs}
+        for h, line in chosen:
+            out[h.key].append((h.first, line))
+        return {k: "\n".join(line for _, line in sorted(v)) for k, v in out.items()}
+
+    def compress_text(self, text: str, budget_tokens: int) -> str:
+        return self.compress({"": text}, budget_tokens)[""]
+
+    # ------------------------------------ persistência ------------------------------------
+    def _load(self) -> None:
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self.runs = self._saved_runs = int(data.get("runs", 0))
+        for c in data.get("clusters", []):
+            try:
+                count, runs = int(c.get("count", 0)), int(c.get("runs", 0))
+                self._add_cluster(c["template"], int(c["id"]), count=count, runs=runs,
+                                  last=float(c.get("last", 0.0)), saved=(count, runs))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def _merge_disk(self) -> None:
+        """Junta o ficheiro atual (escrito por outros processos) ao estado em memória, por deltas."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        disk_runs = int(data.get("runs", 0))
+        self.runs = disk_runs + (self.runs - self._saved_runs)
+        self._saved_runs = disk_runs
+        mine = {tuple(c.template): c for c in self._clusters.values()}
+        for d in data.get("clusters", []):
+            try:
+                tpl, count, runs, last = list(d["template"]), int(d.get("count", 0)), int(d.get("runs", 0)), \
+                    float(d.get("last", 0.0))
+            except (KeyError, TypeError, ValueError):
+                continue
+            c = mine.get(tuple(tpl))
+            if c is None:
+                mine[tuple(tpl)] = self._add_cluster(tpl, count=count, runs=runs, last=last, saved=(count, runs))
+                continue
+            c.count = count + (c.count - c.saved[0])
+            c.runs = runs + (c.runs - c.saved[1])
+            c.last = max(c.last, last)
+            c.saved = (count, runs)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_name(self.path.name + ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _maybe_save(self) -> None:
+        if self._dirty and time.monotonic() - self._last_save >= SAVE_INTERVAL_S:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Escrita atómica sob lock de ficheiro: junta primeiro o que outros processos gravaram
+        (contagens somadas por delta, templates alheios mantidos); acima de max_clusters
+        ficam os vistos mais recentemente.
+        """
+        if self.path is None:
+            return
+        try:
+            with self._file_lock():
+                self._save_locked()
+        except OSError:
+            self._dirty = True
+
+    def _save_locked(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self._merge_disk()
+            clusters = sorted(self._clusters.values(), key=lambda c: (c.last, c.count), reverse=True)
+            if len(clusters) > self.max_clusters:
+                clusters = clusters[: self.max_clusters]
+                keep = {c.id for c in clusters}
+                self._clusters = {cid: c for cid, c in self._clusters.items() if cid in keep}
+                self._tree.clear()
+                for c in self._clusters.values():
+                    self._leaf(c.template, create=True).append(c)
+            data = {"version": 1, "runs": self.runs,
+                    "clusters": [{"id": c.id, "template": c.template, "count": c.count, "runs": c.runs, "last": c.last}
+                                 for c in clusters]}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+            for c in clusters:
+                c.saved = (c.count, c.runs)
+            self._saved_runs = self.runs
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+
+_MINERS: Dict[str, LogMiner] = {}
+_MINERS_LOCK = threading.Lock()
+
+
+def shared_log_miner(path: Optional[str | os.PathLike] = None,
+                     workspace: Optional[str | os.PathLike] = None) -> LogMiner:
+    """Miner único por ficheiro de estado (gravado à saída do processo); por omissão o do workspace."""
+    path = path or state_path(workspace)
+    key = str(Path(path).resolve())
+    with _MINERS_LOCK:
+        m = _MINERS.get(key)
+        if m is None:
+            m = _MINERS[key] = LogMiner(path)
+            atexit.register(m.save)
+        return m
@@ -0,0 +1,256 @@
+from __future__ import annotations
+import hashlib, os, re, threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+CACHE_SIZE = int(os.getenv("FORTALEZA_DIFF_CACHE", "32"))
+
+HUNK_RX = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+# papel de cada linha do texto (ParsedDiff.roles)
+OTHER, HEADER, HUNK, CTX, ADD, DEL, NOEOL = range(7)
+CONTENT_ROLES = (CTX, ADD, DEL)
+
+
+@dataclass
+class Hunk:
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    section: str
+    line: int                                   # nº (1-based) da linha @@ no texto
+    lines: List[str] = field(default_factory=list)   # conteúdo com prefixo (' ', '+', '-', '\\')
+
+
+@dataclass
+class FileDiff:
+    old_path: Optional[str]                     # None = /dev/null
+    new_path: Optional[str]
+    line: int                                   # 1ª linha (1-based) do bloco do ficheiro
+    offset: int                                 # offset em bytes (UTF-8) do início do bloco
+    end: int = 0                                # offset em bytes do fim do bloco
+    hunks: List[Hunk] = field(default_factory=list)
+    added: List[str] = field(default_factory=list)     # sem o prefixo '+'
+    removed: List[str] = field(default_factory=list)   # sem o prefixo '-'
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path or ""
+
+    @property
+    def is_new(self) -> bool:
+        return self.old_path is None and self.new_path is not None
+
+    @property
+    def is_deleted(self) -> bool:
+        return self.new_path is None and self.old_path is not None
+
+
+def _strip_path(raw: str) -> Optional[str]:
+    p = raw.split("\t", 1)[0].strip()
+    if p == "/dev/null":
+        return None
+    if p.startswith(("a/", "b/")):
+        p = p[2:]
+    return p
+
+
+class ParsedDiff:
+    """
+    Diff unificado parseado numa única passagem: ficheiros, hunks, linhas +/- e offsets em bytes.
+    Partilhado (só leitura) entre postprocess, guardrails, forense, reranker, preflight e servidor
+    via parse_diff(), que guarda em cache por hash do conteúdo.
+    - dentro de um hunk as contagens do cabeçalho decidem o que é conteúdo ("--- x" removido ≠ cabeçalho)
+    - diffs "soltos" (contagens erradas ou sem @@, comuns em saída de LLM) são aceites em modo tolerante
+    """
+    def __init__(self, text: str, sha1: Optional[str] = None) -> None:
+        self.text = text or ""
+        self.sha1 = sha1 or _sha1(self.text)
+        self.files: List[FileDiff] = []
+        self.roles = bytearray()                # papel por linha (índice = nº da linha - 1)
+        self._file_lines: List[int] = []         # linha inicial de cada ficheiro (bisect)
+        self._parse()
+
+    # ------------------------------------ parse ------------------------------------
+    def _parse(self) -> None:
+        lines = self.text.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        ascii_only = self.text.isascii()
+        roles = self.roles
+        cur: Optional[FileDiff] = None
+        hunk: Optional[Hunk] = None
+        old_left = new_left = 0
+        pending_old: Optional[Tuple[Optional[str], int, int]] = None   # '--- ' à espera do '+++ '
+        git_open = False                                                # "diff --git" sem '+++ ' ainda
+        off = 0
+
+        def open_file(old: Optional[str], new: Optional[str], line: int, offset: int) -> FileDiff:
+            if self.files:
+                self.files[-1].end = offset
+            f = FileDiff(old, new, line, offset)
+            self.files.append(f)
+            self._file_lines.append(line)
+            return f
+
+        for no, ln in enumerate(lines, 1):
+            size = (len(ln) if ascii_only else len(ln.encode("utf-8", "surrogatepass"))) + 1
+            if hunk is not None and (old_left > 0 or new_left > 0):
+                c = ln[:1]
+                if c == "+" and new_left > 0:
+                    new_left -= 1
+                    cur.added.append(ln[1:]); hunk.lines.append(ln); roles.append(ADD)
+                    off += size
+                    continue
+                if c == "-" and old_left > 0:
+                    old_left -= 1
+                    cur.removed.append(ln[1:]); hunk.lines.append(ln); roles.append(DEL)
+                    off += size
+                    continue
+                if (c == " " or ln == "") and old_left > 0 and new_left > 0:
+                    old_left -= 1; new_left -= 1
+                    hunk.lines.append(ln); roles.append(CTX)
+                    off += size
+                    continue
+            if ln.startswith("\\") and hunk is not None:
+                hunk.lines.append(ln); roles.append(NOEOL)
+            elif ln.startswith("diff --git "):
+                parts = ln[len("diff --git "):].split(" b/", 1)
+                old = _strip_path(parts[0])
+                new = _strip_path("b/" + parts[1]) if len(parts) > 1 else old
+                cur = open_file(old, new, no, off)
+                hunk = None; pending_old = None; git_open = True
+                roles.append(HEADER)
+            elif ln.startswith("--- ") and (no >= len(lines) or lines[no].startswith("+++ ")):
+                pending_old = (_strip_path(ln[4:]), no, off)
+                hunk = None
+                roles.append(HEADER)
+            elif ln.startswith("+++ "):
+                new = _strip_path(ln[4:])
+                if pending_old is not None:
+                    old, line0, off0 = pending_old
+                else:
+                    old, line0, off0 = (cur.old_path if cur else new), no, off
+                if git_open and cur is not None:
+                    cur.old_path, cur.new_path = old, new   # completa o bloco "diff --git"
+                else:
+                    cur = open_file(old, new, line0, off0)
+                pending_old = None; hunk = None; git_open = False
+                roles.append(HEADER)
+            elif ln.startswith("@@"):
+                m = HUNK_RX.match(ln)
+                if cur is None:
+                    cur = open_file(None, None, no, off)
+                if m:
+                    a, b, c2, d, sec = m.groups()
+                    hunk = Hunk(int(a), int(b if b is not None else 1), int(c2), int(d if d is not None else 1), sec.strip(), no)
+                    old_left, new_left = hunk.old_len, hunk.new_len
+                else:
+                    hunk = Hunk(0, 0, 0, 0, ln[2:].strip(" @"), no)
+                    old_left = new_left = 0
+                cur.hunks.append(hunk)
+                roles.append(HUNK)
+            elif cur is not None and ln[:1] in ("+", "-") and pending_old is None:
+                # tolerante: contagens esgotadas/ausentes mas a linha é claramente conteúdo
+                if hunk is None:
+                    hunk = Hunk(0, 0, 0, 0, "", no)
+                    cur.hunks.append(hunk)
+                hunk.lines.append(ln)
+                if ln[0] == "+":
+                    cur.added.append(ln[1:]); roles.append(ADD)
+                else:
+                    cur.removed.append(ln[1:]); roles.append(DEL)
+            elif cur is not None and hunk is not None and ln[:1] == " ":
+                hunk.lines.append(ln); roles.append(CTX)
+            else:
+                roles.append(OTHER)
+            off += size
+        if self.files:
+            total = len(self.text) if ascii_only else len(self.text.encode("utf-8", "surrogatepass"))
+            self.files[-1].end = min(off, total)
+
+    # ------------------------------------ consultas ------------------------------------
+    @property
+    def paths(self) -> List[str]:
+        return [f.path for f in self.files if f.path]
+
+    @property
+    def new_paths(self) -> List[str]:
+        return [f.new_path for f in self.files if f.new_path]
+
+    @property
+    def added_count(self) -> int:
+        return sum(len(f.added) for f in self.files)
+
+    @property
+    def removed_count(self) -> int:
+        return sum(len(f.removed) for f in self.files)
+
+    @property
+    def changed_lines(self) -> int:
+        return self.added_count + self.removed_count
+
+    @property
+    def is_unified(self) -> bool:
+        """Tem cabeçalhos ---/+++ e pelo menos um hunk ou linha +/-."""
+        return any(f.new_path is not None or f.old_path is not None for f in self.files) and \
+            any(f.hunks or f.added or f.removed for f in self.files)
+
+    def added_by_path(self) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {}
+        for f in self.files:
+            if f.new_path:
+                out.setdefault(f.new_path, []).extend(f.added)
+        return out
+
+    def role(self, line: int) -> int:
+        return self.roles[line - 1] if 0 < line <= len(self.roles) else OTHER
+
+    def file_at(self, line: int) -> Optional[FileDiff]:
+        i = bisect_right(self._file_lines, line) - 1
+        return self.files[i] if i >= 0 else None
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+DiffLike = Union[str, ParsedDiff]
+
+_CACHE: "OrderedDict[str, ParsedDiff]" = OrderedDict()
+_BY_ID: Dict[int, ParsedDiff] = {}
+_LOCK = threading.Lock()
+
+
+def parse_diff(diff: DiffLike) -> ParsedDiff:
+    """Parse único por conteúdo (LRU por sha1; o mesmo objeto str nem volta a ser hasheado)."""
+    if isinstance(diff, ParsedDiff):
+        return diff
+    text = diff or ""
+    with _LOCK:
+        pd = _BY_ID.get(id(text))
+        if pd is not None and pd.text is text:
+            return pd
+    sha = _sha1(text)
+    with _LOCK:
+        pd = _CACHE.get(sha)
+        if pd is not None:
+            _CACHE.move_to_end(sha)
+    if pd is None:
+        pd = ParsedDiff(text, sha)
+    with _LOCK:
+        _CACHE[sha] = pd
+        _CACHE.move_to_end(sha)
+        while len(_CACHE) > CACHE_SIZE:
+            old = _CACHE.popitem(last=False)[1]
+            _BY_ID.pop(id(old.text), None)
+        if pd.text is text:
+            _BY_ID[id(text)] = pd
+    return pd
+
+
+def diff_text(diff: DiffLike) -> str:
+    return diff.text if isinstance(diff, ParsedDiff) else (diff or "")
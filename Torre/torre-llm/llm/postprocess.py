@@ -9,9 +9,24 @@ except ImportError:
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from utils.diff_utils import validate_unified_diff
 
+try:
+    from .parsed_diff import parse_diff
+except ImportError:
+    from llm.parsed_diff import parse_diff
+
 PATCH_INFO_RX = re.compile(r"<patch-info>(.*?)</patch-info>", re.S)
 FENCE_RX = re.compile(r"```diff\\n(.*?)```", re.S)
 
+def patch_complete(text: str) -> bool:
+    """
+    True quando o bloco ```diff``` já foi fechado — usado pelo streaming para
+    parar de ler assim que extract_patch tem tudo o que precisa.
+    """
+    start = (text or "").find("```diff")
+    if start == -1:
+        return False
+    return text.find("\n```", start + len("```diff")) != -1
+
 def extract_patch(text: str) -> Tuple[str, Dict[str, Any]]:
     """
     Extrai o bloco ```diff``` e um JSON opcional entre <patch-info>...</patch-info>.
@@ -37,4 +52,6 @@ def extract_patch(text: str) -> Tuple[str, Dict[str, Any]]:
             raise ValueError("MISSING:diff block")
         diff = text[s:].strip()
     validate_unified_diff(diff)
+    # parse único em cache (por hash): guardrails/forense/reranker/preflight reusam o mesmo ParsedDiff
+    parse_diff(diff)
     return diff, info
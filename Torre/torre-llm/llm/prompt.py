@@ -1,7 +1,12 @@
 from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any
-import time, json
+import os, time, json
+
+from .optimization.log_miner import ENABLED as LOG_MINER_ENABLED, shared_log_miner
+
+# orçamento (tokens) da secção de logs do prompt (o corte antigo era 6 × 2000 caracteres ≈ 3000 tokens)
+LOG_BUDGET_TOKENS = int(os.getenv("LLM_PROMPT_LOG_TOKENS", "3000"))
 
 PROTO_HEADER = """# ORDEM DE MISSÃO: PROTOCOLO DE OUTPUT (VANGUARDA)
 1) Responder APENAS com:
@@ -22,11 +27,17 @@ def load_system_prompt(repo_root: Path) -> str:
         "Regras: 1 diff, compatível com `git apply`, sem tocar em segredos.\n"
     )
 
-def build_user_prompt(logs: Dict[str, str] | None, files: Dict[str, str] | None) -> str:
+def build_user_prompt(logs: Dict[str, str] | None, files: Dict[str, str] | None,
+                      repo_root: Path | None = None) -> str:
     logs = logs or {}
     files = files or {}
-    log_txt = "\\n".join((v or "")[:2000] for _, v in list(logs.items())[:6])
-    file_list = "\\n".join(f"- {k}" for k in list(files.keys())[:20])
+    if LOG_MINER_ENABLED:
+        # templates com contagens; o erro de origem sobrevive mesmo que esteja no fim de um log enorme
+        mined = shared_log_miner(workspace=repo_root).compress({k: v or "" for k, v in logs.items()}, LOG_BUDGET_TOKENS)
+        log_txt = "\n".join(v for v in mined.values() if v)
+    else:
+        log_txt = "\n".join((v or "")[:2000] for _, v in list(logs.items())[:6])
+    file_list = "\n".join(f"- {k}" for k in list(files.keys())[:20])
     return (
         PROTO_HEADER
         + "\n## CONTEXTO\n"
@@ -3,6 +3,7 @@ import time
 import re
 from typing import Dict, Any, List
 from ..base import Provider, ProviderRequest, ProviderResponse, _est_tokens
+from ...error_taxonomy import classify_logs
 
 class SmartFixAdapter(Provider):
     name = "fortaleza/smart-fix"
@@ -42,25 +43,25 @@ class SmartFixAdapter(Provider):
     
     def _analyze_error_type(self, logs: Dict[str, str]) -> str:
         """Analisa os logs para determinar o tipo de erro"""
-        log_text = " ".join(logs.values()).lower()
+        c = classify_logs(logs)
         
-        if "ts2304" in log_text and "cannot find name" in log_text:
+        if c.has("ts2304") and c.has("cannot find name"):
             return "missing_import"
-        elif "ts2307" in log_text and "cannot find module" in log_text:
+        elif c.has("ts2307") and c.has("cannot find module"):
             return "missing_module"
-        elif "ts2322" in log_text and "type" in log_text:
+        elif c.has("ts2322") and c.has("type"):
             return "type_mismatch"
-        elif "module not found" in log_text or "can't resolve" in log_text:
+        elif c.has("module not found", "can't resolve"):
             return "module_resolution"
-        elif "importerror" in log_text or "cannot import" in log_text:
+        elif c.has("importerror", "cannot import"):
             return "import_error"
-        elif "eslint" in log_text and "unused" in log_text:
+        elif c.has("eslint") and c.has("unused"):
             return "unused_variable"
-        elif "prettier" in log_text or "code style" in log_text:
+        elif c.has("prettier", "code style"):
             return "formatting"
-        elif "jest" in log_text or "test" in log_text:
+        elif c.has("jest", "test"):
             return "test_failure"
-        elif "typeerror" in log_text and "undefined" in log_text:
+        elif c.has("typeerror") and c.has("undefined"):
             return "null_check"
         else:
             return "general_fix"
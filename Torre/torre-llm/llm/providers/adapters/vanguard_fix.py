@@ -4,6 +4,11 @@ import re
 import ast
 from typing import Dict, Any, List, Optional
 from ..base import Provider, ProviderRequest, ProviderResponse, _est_tokens
+from ...error_taxonomy import classify_logs
+try:
+    from ...reverse.symbol_index import shared_symbol_index, import_statement
+except Exception:  # índice opcional
+    shared_symbol_index = None
 
 class VanguardFixAdapter(Provider):
     name = "fortaleza/vanguard-fix"
@@ -102,17 +107,19 @@ class VanguardFixAdapter(Provider):
             meta={
                 "error_type": error_analysis.get("type"),
                 "confidence": error_analysis.get("confidence"),
+                "advisory": error_analysis.get("advisory"),
                 "fix_strategy": "vanguard_multi_layer"
             }
         )
     
     def _vanguard_error_analysis(self, logs: Dict[str, str], content: str, filename: str) -> Dict[str, Any]:
         """Análise vanguard com múltiplas camadas de detecção"""
-        log_text = " ".join(logs.values()).lower()
+        # logs classificados uma única vez (taxonomia partilhada com router/scorer)
+        c = classify_logs(logs)
         
         # Camada 1: Detecção por padrões TypeScript (Alta precisão)
         for error_code, fix_func in self.typescript_patterns.items():
-            if error_code.lower() in log_text:
+            if c.has(error_code.lower()):
                 return {
                     "type": "typescript",
                     "error_code": error_code,
@@ -122,7 +129,7 @@ class VanguardFixAdapter(Provider):
         
         # Camada 2: Detecção por padrões de build
         for pattern, fix_func in self.build_patterns.items():
-            if pattern in log_text:
+            if c.has(pattern):
                 return {
                     "type": "build",
                     "pattern": pattern,
@@ -132,7 +139,7 @@ class VanguardFixAdapter(Provider):
         
         # Camada 3: Detecção por padrões de linting
         for pattern, fix_func in self.linting_patterns.items():
-            if pattern in log_text:
+            if c.has(pattern):
                 return {
                     "type": "linting",
                     "pattern": pattern,
@@ -142,7 +149,7 @@ class VanguardFixAdapter(Provider):
         
         # Camada 4: Detecção por padrões de runtime
         for pattern, fix_func in self.runtime_patterns.items():
-            if pattern in log_text:
+            if c.has(pattern):
                 return {
                     "type": "runtime",
                     "pattern": pattern,
@@ -299,15 +306,14 @@ class VanguardFixAdapter(Provider):
     
     def _fix_missing_symbol(self, filename: str, content: str, logs: Dict[str, str], analysis: Dict[str, Any]) -> str:
         """Correção avançada para símbolos faltantes"""
-        log_text = " ".join(logs.values())
-        match = re.search(r"Cannot find name '([^']+)'", log_text)
-        if not match:
+        names = classify_logs(logs).missing_names
+        if not names:
             return ""
         
-        symbol = match.group(1)
+        symbol = names[0]
         
         # Busca inteligente por import correto
-        import_line = self._find_correct_import(symbol, content)
+        import_line = self._find_correct_import(symbol, content, filename, analysis)
         if not import_line:
             return ""
         
@@ -579,13 +585,14 @@ class VanguardFixAdapter(Provider):
     def _fix_missing_import_advanced(self, filename: str, content: str, logs: Dict[str, str], analysis: Dict[str, Any]) -> str:
         """Correção avançada para imports faltantes"""
         symbol = analysis.get("symbol", "")
-        import_line = self._find_correct_import(symbol, content)
+        import_line = self._find_correct_import(symbol, content, filename, analysis)
         if import_line:
             return self._add_import_to_file(filename, content, import_line)
         return ""
     
-    def _find_correct_import(self, symbol: str, content: str) -> str:
-        """Encontra o import correto para um símbolo"""
+    def _find_correct_import(self, symbol: str, content: str, filename: str = "",
+                             analysis: Optional[Dict[str, Any]] = None) -> str:
+        """Encontra o import correto para um símbolo (nomes parecidos só vão para analysis["advisory"])"""
         # Busca em imports comuns
         for category, imports in self.common_imports.items():
             if symbol in imports:
@@ -599,6 +606,20 @@ class VanguardFixAdapter(Provider):
         elif symbol.lower() in ["axios", "fetch"]:
             return f"import {symbol} from '{symbol}'"
         
+        # Índice invertido do repositório (símbolo → ficheiro que o exporta)
+        if shared_symbol_index is not None and filename:
+            try:
+                index = shared_symbol_index(".")
+                hit = index.resolve(symbol)
+                similar = [] if hit else [n for n in index.fuzzy(symbol) if n != symbol]
+            except Exception:
+                hit, similar = None, []
+            if hit is not None and hit.file != filename:
+                # só exatos recebem o nome pedido; hit case-insensitive importa o nome real (sem alias)
+                return import_statement(hit, filename, symbol if hit.symbol == symbol else None)
+            if similar and analysis is not None:
+                analysis["advisory"] = f"'{symbol}' não é exportado no repositório; talvez: {', '.join(similar)}"
+        
         # Fallback
         return f"import {{ {symbol} }} from './{symbol.lower()}'"
     
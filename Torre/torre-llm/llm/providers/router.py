@@ -9,6 +9,7 @@ from .adapters.google import GoogleStub
 from .adapters.smart_fix import SmartFixAdapter
 from .adapters.vanguard_fix import VanguardFixAdapter
 from .policy import ProvidersPolicy
+from ..error_taxonomy import classify_logs
 
 ALL_ADAPTERS = {
     "openai/gpt-4o": OpenAIStub(),
@@ -20,16 +21,7 @@ ALL_ADAPTERS = {
 }
 
 def _classify(logs: Dict[str, str], files: Dict[str, str]) -> str:
-    msg = " ".join((logs or {}).values()).lower()
-    if "ts2304" in msg or "ts2307" in msg or "type" in msg:
-        return "types"
-    if "build" in msg or "module not found" in msg or "vite" in msg:
-        return "build"
-    if "test" in msg or "jest" in msg or "vitest" in msg or "pytest" in msg:
-        return "tests"
-    if "style" in msg or "eslint" in msg or "prettier" in msg:
-        return "style"
-    return "general"
+    return classify_logs(logs).stage
 
 def _providers_for_stage(stage: str) -> List[str]:
     # regra simples e auditável
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
 from typing import Any, Dict, List, Optional, Tuple
 
 from llm.guard.secret_scan import scan_diff_for_secrets
+from llm.parsed_diff import DiffLike, parse_diff
 
 # Tenta integrar com o preflight real; senão, usa fallback leve.
 try:
@@ -12,22 +15,20 @@ try:
 except Exception:  # pragma: no cover
     PreflightSimulator = None  # type: ignore
 
+# Avaliação especulativa em worktrees (opt-in: FORTALEZA_SPECULATIVE=1 e workspace = repo git)
+try:
+    from llm.ops.speculative import SpeculativeEvaluator  # type: ignore
+except Exception:  # pragma: no cover
+    SpeculativeEvaluator = None  # type: ignore
+
 
-def _is_unified_diff(text: str) -> bool:
-    # Checagem leve — não perfeito, mas suficiente como gate rápido
-    return ("--- " in text and "+++ " in text) and ("@@ " in text or "\n+" in text or "\n-" in text)
+def _is_unified_diff(text: DiffLike) -> bool:
+    # cabeçalhos de ficheiro + pelo menos um hunk/linha alterada (parse partilhado, em cache)
+    return parse_diff(text).is_unified
 
 
-def _diff_size(text: str) -> int:
-    n = 0
-    for line in text.splitlines():
-        if not line:
-            continue
-        if line.startswith(("---", "+++", "@@")):
-            continue
-        if line[0] in "+-":
-            n += 1
-    return n
+def _diff_size(text: DiffLike) -> int:
+    return parse_diff(text).changed_lines
 
 
 def _preflight_eval(workspace: str, diff: str) -> Dict[str, Any]:
@@ -76,12 +77,21 @@ class CandidateReport:
     violations: List[Dict[str, str]]
 
 
+def _speculative_enabled(workspace: str, flag: Optional[bool]) -> bool:
+    if flag is None:
+        flag = os.getenv("FORTALEZA_SPECULATIVE", "0") == "1"
+    return bool(flag) and SpeculativeEvaluator is not None and os.path.isdir(os.path.join(workspace, ".git"))
+
+
 class ExecutionReranker:
-    def __init__(self, *, max_lines: int = 300):
+    def __init__(self, *, max_lines: int = 300, speculative: Optional[bool] = None):
         self.max_lines = max_lines
+        self.speculative = speculative
 
-    def evaluate_candidate(self, workspace: str, diff: str, index: int) -> CandidateReport:
+    def evaluate_candidate(self, workspace: str, diff: DiffLike, index: int, preflight: bool = True) -> CandidateReport:
         t0 = time.perf_counter()
+        # parse único: formato, tamanho, segredos e preflight partilham o mesmo ParsedDiff
+        diff = parse_diff(diff)
         # 1) Formato
         if not _is_unified_diff(diff):
             return CandidateReport(
@@ -120,8 +130,8 @@ class ExecutionReranker:
                 preflight={"all_green": False, "reason": "secrets_detected"},
                 violations=violations,
             )
-        # 4) Preflight (lint/type/tests/build)
-        pre = _preflight_eval(workspace, diff)
+        # 4) Preflight (lint/type/tests/build); no modo especulativo os gates correm depois, em worktrees
+        pre = _preflight_eval(workspace, diff.text) if preflight else {"all_green": True, "pending": "speculative"}
         ttg_ms = (time.perf_counter() - t0) * 1000
         return CandidateReport(
             index=index,
@@ -143,10 +153,29 @@ class ExecutionReranker:
         winners.sort(key=lambda r: (r.diff_size, r.ttg_ms))
         return winners[0]
 
+    def _speculative_gates(self, workspace: str, diffs: List[str], reports: List[CandidateReport]) -> None:
+        """Gates reais (sandbox) de todos os candidatos permitidos, cada um no seu worktree, em paralelo."""
+        allowed = [r for r in reports if r.allowed]
+        if not allowed:
+            return
+        results = SpeculativeEvaluator(workspace).evaluate([diffs[r.index] for r in allowed])  # type: ignore
+        for r, res in zip(allowed, results):
+            r.gates_passed = res.passed
+            r.discard_reason = None if res.passed else ("apply_failed" if res.stage == "apply" else "gates_failed")
+            r.ttg_ms += res.ttg_ms
+            r.preflight = {"all_green": res.passed, "speculative": True, "stage": res.stage,
+                           **{k: ("green" if v.get("passed") else "red") for k, v in res.gates.items()}}
+
     def run(self, workspace: str, candidates: List[str], k: int = 3) -> Dict[str, Any]:
         k = max(1, min(k, len(candidates)))
         subset = candidates[:k]
-        reports = [self.evaluate_candidate(workspace, d, i) for i, d in enumerate(subset)]
+        spec = _speculative_enabled(workspace, self.speculative)
+        # candidatos independentes → avaliados em paralelo (TTG ≈ o mais lento)
+        with ThreadPoolExecutor(max_workers=max(1, len(subset))) as ex:
+            reports = list(ex.map(lambda p: self.evaluate_candidate(workspace, p[1], p[0], preflight=not spec),
+                                  enumerate(subset)))
+        if spec:
+            self._speculative_gates(workspace, subset, reports)
         winner = self.select(reports)
         return {
             "selected_index": None if winner is None else winner.index,
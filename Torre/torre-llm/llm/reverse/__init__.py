@@ -2,17 +2,26 @@
 Reverse-engineering toolkit (Fase 8)
 ------------------------------------
 CodeMap:        Grafo multi-linguagem (TS/JS/TSX/JSX/Py) + estatísticas
+CodeMapStore:   Índice persistente/incremental do CodeMap (mtime/hash por ficheiro)
+SymbolIndex:    Índice invertido símbolo → ficheiro (SQLite; exato/prefixo/fuzzy)
 HotspotMiner:   Sinal de hotspots (churn aproximado, TODOs, grau do grafo)
 CouplingSentinel:Deteção de acoplamentos proibidos entre camadas
 RefactorAdvisor:Plano de refactor mínimo + provas (gates) em modo advisory
 """
 from .codemap import CodeMap
+from .codemap_store import CodeMapStore, shared_codemap_store
+from .symbol_index import SymbolIndex, SymbolHit, shared_symbol_index
 from .hotspot_miner import HotspotMiner
 from .coupling_sentinel import CouplingSentinel, DEFAULT_LAYERS
 from .refactor_advisor import RefactorAdvisor
 
 __all__ = [
     "CodeMap",
+    "CodeMapStore",
+    "shared_codemap_store",
+    "SymbolIndex",
+    "SymbolHit",
+    "shared_symbol_index",
     "HotspotMiner",
     "CouplingSentinel",
     "DEFAULT_LAYERS",
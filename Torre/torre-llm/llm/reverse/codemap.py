@@ -18,6 +18,8 @@ PY_IMPORT_RE = re.compile(
 )
 
 EXTS = {".ts", ".tsx", ".js", ".jsx", ".py"}
+# diretórios nunca varridos (dependências/ambientes)
+IGNORED_DIRS = {".venv", "node_modules", ".git"}
 
 def _norm(p: str) -> str:
     return str(Path(p).as_posix())
@@ -31,6 +33,23 @@ def _strip_ext(p: str) -> str:
             return p[: -len(e)]
     return p
 
+def parse_imports(text: str, suffix: str) -> List[str]:
+    """Extrai módulos importados de um texto JS/TS/Py (sem resolver caminhos)."""
+    out: List[str] = []
+    if suffix in {".ts", ".tsx", ".js", ".jsx"}:
+        for m in JS_IMPORT_RE.finditer(text):
+            mod = m.group("mod") or m.group("mod2") or m.group("mod3")
+            if not mod:
+                continue
+            out.append(mod.strip())
+    elif suffix == ".py":
+        for m in PY_IMPORT_RE.finditer(text):
+            mod = m.group("from") or m.group("imp")
+            if not mod:
+                continue
+            out.append(mod.strip().replace(".", "/"))
+    return out
+
 class CodeMap:
     """
     Lê o repositório e constrói um grafo de dependências leve (arquivo->arquivo).
@@ -46,13 +65,11 @@ class CodeMap:
         self.files_scanned: int = 0
         self.files_total: int = 0
 
-    def _list_files(self) -> List[Path]:
-        files: List[Path] = []
-        for p in self.root.rglob("*"):
-            if p.is_file() and p.suffix in EXTS and ".venv" not in p.parts and "node_modules" not in p.parts:
-                files.append(p)
-        self.files_total = len(files)
-        return files
+    def _list_files(self) -> List[Tuple[str, int, int]]:
+        from .scanner import walk_files  # import tardio (scanner depende deste módulo)
+        listing = walk_files(self.root, EXTS, IGNORED_DIRS)
+        self.files_total = len(listing)
+        return listing
 
     def _resolve_rel(self, src: Path, mod: str) -> str | None:
         # tenta variantes: ./x, ./x.tsx, ./x/index.ts, etc.
@@ -72,32 +89,15 @@ class CodeMap:
                 return rel
         return None
 
-    def _parse_imports(self, p: Path) -> List[str]:
-        out: List[str] = []
-        try:
-            text = p.read_text(encoding="utf-8", errors="ignore")
-        except Exception:
-            return out
-        if p.suffix in {".ts", ".tsx", ".js", ".jsx"}:
-            for m in JS_IMPORT_RE.finditer(text):
-                mod = m.group("mod") or m.group("mod2") or m.group("mod3")
-                if not mod:
-                    continue
-                out.append(mod.strip())
-        elif p.suffix == ".py":
-            for m in PY_IMPORT_RE.finditer(text):
-                mod = m.group("from") or m.group("imp")
-                if not mod:
-                    continue
-                out.append(mod.strip().replace(".", "/"))
-        return out
-
     def build(self) -> Dict[str, Any]:
-        files = self._list_files()
-        for f in files:
-            src = _norm(f.relative_to(self.root))
+        from .scanner import shared_scan_cache
+        listing = self._list_files()
+        scans = shared_scan_cache(self.root).scan(listing)
+        for src, _, _ in listing:
+            f = self.root / src
             self.nodes.add(src)
-            mods = self._parse_imports(f)
+            sc = scans.get(src)
+            mods = sc.imports if sc else []
             for mod in mods:
                 if _is_rel(mod):
                     tgt = self._resolve_rel(f, mod)
@@ -139,5 +139,12 @@ class CodeMap:
             "stats": self.stats(),
         }
 
+    def to_graph(self) -> Dict[str, Any]:
+        """Formato consumido por StrategosV2Graph / /graph/summary ({id} + {from,to})."""
+        return {
+            "nodes": [{"id": n} for n in sorted(self.nodes)],
+            "edges": [{"from": a, "to": b} for a, b in self.edges],
+        }
+
     def to_json(self) -> str:
         return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+import os, json, time, threading
+from pathlib import Path
+from typing import Dict, List, Any, Tuple, Optional
+
+from .codemap import CodeMap, EXTS, IGNORED_DIRS, _is_rel, _strip_ext
+from .scanner import shared_scan_cache, walk_files
+
+STORE_VERSION = 1
+DEFAULT_TTL_S = float(os.getenv("FORTALEZA_CODEMAP_TTL_S", "2.0"))
+
+_RESOLVE_SUFFIXES = (".ts", ".tsx", ".js", ".jsx", ".py")
+_RESOLVE_INDEX = ("index.ts", "index.tsx", "index.js", "index.jsx", "__init__.py")
+
+
+class CodeMapStore:
+    """
+    Índice persistente e incremental do CodeMap.
+    - Guarda por ficheiro: mtime/size/sha1 + imports brutos + alvos resolvidos
+    - refresh() só re-lê ficheiros com stat alterado e só re-parseia se o hash mudou
+    - Arestas são corrigidas por ficheiro (sem rebuild global)
+    Persistência em <repo>/.fortaleza/cache/codemap/index.json
+    """
+    def __init__(self, repo_root: str = ".", cache_dir: str | None = None) -> None:
+        self.root = Path(repo_root).resolve()
+        self.cache_dir = Path(cache_dir) if cache_dir else self.root / ".fortaleza" / "cache" / "codemap"
+        self.index_path = self.cache_dir / "index.json"
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.version: int = 0
+        self.last_refresh: float = 0.0
+        self.last_stats: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._cached: Dict[str, Any] = {}   # derivados (codemap/graph) da versão atual
+        self._load()
+
+    # ----------------------------- persistência -----------------------------
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except Exception:
+            return
+        if data.get("store_version") != STORE_VERSION or data.get("root") != str(self.root):
+            return
+        self.files = data.get("files") or {}
+        self.version = int(data.get("version") or 0)
+
+    def save(self) -> None:
+        payload = {
+            "store_version": STORE_VERSION,
+            "root": str(self.root),
+            "version": self.version,
+            "files": self.files,
+        }
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+        except Exception:
+            pass  # cache é best-effort
+
+    # ------------------------------- varrimento ------------------------------
+    def _walk(self) -> Dict[str, Tuple[int, int]]:
+        """Lista ficheiros de código → (mtime_ns, size), podando dirs ignorados."""
+        return {rel: (mtime_ns, size) for rel, mtime_ns, size in walk_files(self.root, EXTS, IGNORED_DIRS)}
+
+    # ------------------------------- resolução -------------------------------
+    def _resolve_rel(self, src: str, mod: str) -> str | None:
+        base = os.path.normpath(os.path.join(os.path.dirname(src), mod)).replace(os.sep, "/")
+        if base.startswith("../"):
+            return None
+        cands = [base] + [base + e for e in _RESOLVE_SUFFIXES] + [f"{base}/{i}" for i in _RESOLVE_INDEX]
+        for c in cands:
+            if c in self.files:
+                return c
+        # assets não-código (ex.: ./styles.css) — mesmo comportamento do CodeMap
+        if (self.root / base).is_file():
+            return base
+        return None
+
+    def _targets(self, src: str, imports: List[str]) -> List[str]:
+        out: List[str] = []
+        for mod in imports:
+            if _is_rel(mod):
+                tgt = self._resolve_rel(src, mod)
+                if tgt:
+                    out.append(tgt)
+            else:
+                out.append(f"pkg:{_strip_ext(mod)}")
+        return out
+
+    # -------------------------------- refresh --------------------------------
+    def refresh(self) -> Dict[str, Any]:
+        """Sincroniza o índice com o disco; devolve contagens do delta."""
+        with self._lock:
+            t0 = time.perf_counter()
+            current = self._walk()
+            deleted = [p for p in self.files if p not in current]
+            added: List[str] = []
+            reparsed: List[str] = []
+            touched = 0
+            stale = [rel for rel, st in current.items()
+                     if not (self.files.get(rel) and (self.files[rel].get("mtime_ns"), self.files[rel].get("size")) == st)]
+            # leitura + hash + parse em paralelo (índice frio usa todos os cores)
+            scans = shared_scan_cache(self.root).scan([(rel, *current[rel]) for rel in stale])
+            for rel in stale:
+                sc = scans.get(rel)
+                if sc is None:
+                    continue
+                mtime_ns, size = current[rel]
+                ent = self.files.get(rel)
+                if ent and ent.get("sha1") == sc.sha1:
+                    ent["mtime_ns"], ent["size"] = mtime_ns, size
+                    touched += 1
+                    continue
+                if not ent:
+                    added.append(rel)
+                self.files[rel] = {
+                    "mtime_ns": mtime_ns,
+                    "size": size,
+                    "sha1": sc.sha1,
+                    "imports": sc.imports,
+                    "targets": [],
+                }
+                reparsed.append(rel)
+            for rel in deleted:
+                self.files.pop(rel, None)
+
+            # o conjunto de ficheiros mudou → imports relativos de terceiros podem resolver diferente
+            if added or deleted:
+                to_resolve = [p for p, e in self.files.items() if any(_is_rel(m) for m in e.get("imports", []))]
+                to_resolve = sorted(set(to_resolve) | set(reparsed))
+            else:
+                to_resolve = reparsed
+            edges_changed = 0
+            for rel in to_resolve:
+                ent = self.files[rel]
+                tg = self._targets(rel, ent.get("imports", []))
+                if tg != ent.get("targets"):
+                    ent["targets"] = tg
+                    edges_changed += 1
+
+            changed = bool(reparsed or deleted or edges_changed)
+            if changed:
+                self.version += 1
+                self._cached.clear()
+            if changed or touched:
+                self.save()
+            self.last_refresh = time.time()
+            self.last_stats = {
+                "files": len(self.files),
+                "added": len(added),
+                "deleted": len(deleted),
+                "reparsed": len(reparsed),
+                "touched": touched,
+                "edges_changed": edges_changed,
+                "version": self.version,
+                "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+            }
+            return dict(self.last_stats)
+
+    def ensure_fresh(self, max_age_s: float | None = None) -> "CodeMapStore":
+        """Faz refresh apenas se o último tiver mais de max_age_s segundos."""
+        ttl = DEFAULT_TTL_S if max_age_s is None else max_age_s
+        if time.time() - self.last_refresh >= ttl:
+            self.refresh()
+        return self
+
+    # ------------------------------- derivados -------------------------------
+    def codemap(self) -> CodeMap:
+        """CodeMap preenchido a partir do índice (sem re-ler ficheiros)."""
+        with self._lock:
+            cm = self._cached.get("codemap")
+            if cm is not None:
+                return cm
+            cm = CodeMap(str(self.root))
+            for src, ent in self.files.items():
+                cm.nodes.add(src)
+                for tgt in ent.get("targets", []):
+                    cm.edges.append((src, tgt))
+                    if tgt.startswith("pkg:"):
+                        cm.externals.add(tgt)
+                    else:
+                        cm.nodes.add(tgt)
+            cm.files_total = cm.files_scanned = len(self.files)
+            self._cached["codemap"] = cm
+            return cm
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            if "dict" not in self._cached:
+                self._cached["dict"] = self.codemap().to_dict()
+            return self._cached["dict"]
+
+    def graph(self) -> Dict[str, Any]:
+        """Grafo no formato {nodes:[{id}], edges:[{from,to}]} (Strategos v2), com root/version p/ caches."""
+        with self._lock:
+            if "graph" not in self._cached:
+                self._cached["graph"] = {**self.codemap().to_graph(), "root": str(self.root), "version": self.version}
+            return self._cached["graph"]
+
+
+# ----------------------- instância partilhada (processo) -----------------------
+_SHARED: Dict[str, CodeMapStore] = {}
+_SHARED_LOCK = threading.Lock()
+
+def shared_codemap_store(repo_root: str = ".", max_age_s: float | None = None) -> CodeMapStore:
+    """Store único por raiz, reutilizado entre requests (FastAPI/CLI)."""
+    key = str(Path(repo_root).resolve())
+    with _SHARED_LOCK:
+        store = _SHARED.get(key)
+        if store is None:
+            store = _SHARED[key] = CodeMapStore(key)
+    return store.ensure_fresh(max_age_s)
@@ -0,0 +1,292 @@
+from __future__ import annotations
+import os, re, hashlib, threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .codemap import IGNORED_DIRS, parse_imports
+
+# diretórios podados antes de descer (superset do CodeMap; inclui artefactos de build)
+SCAN_IGNORED_DIRS: Set[str] = set(IGNORED_DIRS) | {"dist", "build", "venv", ".pytest_cache", ".tox", "__pycache__"}
+
+JS_EXTS = {".ts", ".tsx", ".js", ".jsx"}
+
+RX_EXPORT = re.compile(r"^\s*export\s+(?:const|let|var|function|class)\s+(?P<name>[A-Za-z_]\w*)", re.M)
+RX_EXPORT_DEFAULT = re.compile(r"^\s*export\s+default\s+(?:function|class)?\s*(?P<name>[A-Za-z_]\w*)?", re.M)
+RX_EXPORT_TYPE = re.compile(r"^\s*export\s+(?:type|interface)\s+(?P<name>[A-Za-z_]\w*)", re.M)
+
+# export com tipo/estilo (índice símbolo → ficheiro)
+RX_EXPORT_DECL = re.compile(
+    r"^\s*export\s+(?:declare\s+)?(?:async\s+)?(?:abstract\s+)?"
+    r"(?P<kind>const|let|var|function\*?|class|enum|type|interface|namespace)\s+(?P<name>[A-Za-z_$][\w$]*)", re.M)
+RX_EXPORT_DEFAULT_DECL = re.compile(
+    r"^\s*export\s+default\s+(?:async\s+)?(?:abstract\s+)?(?P<kind>function\*?|class)?\s*(?P<name>[A-Za-z_$][\w$]*)?", re.M)
+RX_EXPORT_LIST = re.compile(r"^\s*export\s*(?:type\s*)?\{(?P<body>[^}]*)\}", re.M)
+
+SCAN_WORKERS = int(os.getenv("FORTALEZA_SCAN_WORKERS", str(os.cpu_count() or 1)))
+# abaixo disto o arranque do pool custa mais do que ler em série
+SCAN_MIN_PARALLEL = int(os.getenv("FORTALEZA_SCAN_MIN_PARALLEL", "256"))
+SCAN_BATCH = int(os.getenv("FORTALEZA_SCAN_BATCH", "64"))
+
+Extractor = Callable[[str, str], Any]
+
+
+def parse_exports(text: str) -> List[str]:
+    """Símbolos exportados (export const/function/class/type/interface/default) por ordem de aparição."""
+    out: List[str] = []
+    for rx in (RX_EXPORT, RX_EXPORT_DEFAULT, RX_EXPORT_TYPE):
+        for m in rx.finditer(text):
+            name = (m.group("name") or "default").strip()
+            if name and name not in out:
+                out.append(name)
+    return out
+
+
+def parse_export_entries(text: str) -> List[Tuple[str, str, str]]:
+    """(nome, kind, estilo) de cada export; estilo ∈ {named, default}. Usado como extractor do scanner."""
+    out: List[Tuple[str, str, str]] = []
+    seen: Set[Tuple[str, str]] = set()
+
+    def add(name: str, kind: str, style: str) -> None:
+        if name and (name, style) not in seen:
+            seen.add((name, style))
+            out.append((name, kind, style))
+
+    for m in RX_EXPORT_DECL.finditer(text):
+        add(m.group("name"), m.group("kind").rstrip("*"), "named")
+    for m in RX_EXPORT_DEFAULT_DECL.finditer(text):
+        name = m.group("name")
+        if name and name not in ("function", "class", "async", "abstract"):
+            add(name, (m.group("kind") or "value").rstrip("*"), "default")
+    for m in RX_EXPORT_LIST.finditer(text):
+        for part in m.group("body").split(","):
+            bits = part.split()
+            if not bits:
+                continue
+            name = bits[-1] if len(bits) >= 3 and bits[-2] == "as" else bits[0]
+            if name == "default":
+                add(bits[0], "binding", "default")
+            elif re.fullmatch(r"[A-Za-z_$][\w$]*", name):
+                add(name, "binding", "named")
+    return out
+
+
+@dataclass
+class FileScan:
+    """Resultado de uma única leitura de ficheiro (partilhado por CodeMap/OmniContext/code_index)."""
+    rel: str
+    size: int
+    sha1: str
+    imports: List[str] = field(default_factory=list)
+    exports: List[str] = field(default_factory=list)
+    extra: Any = None
+
+
+def walk_files(root: str | os.PathLike,
+               exts: Optional[Iterable[str]] = None,
+               ignored: Iterable[str] = SCAN_IGNORED_DIRS,
+               include_noext: bool = False) -> List[Tuple[str, int, int]]:
+    """
+    Walker baseado em os.scandir: (rel_posix, mtime_ns, size), ordenado por caminho.
+    Diretórios em `ignored` nunca são abertos; symlinks de diretório não são seguidos.
+    """
+    base = os.fspath(root)
+    want = set(exts) if exts is not None else None
+    skip = set(ignored)
+    out: List[Tuple[str, int, int]] = []
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            it = os.scandir(os.path.join(base, rel_dir) if rel_dir else base)
+        except OSError:
+            continue
+        with it:
+            for de in it:
+                try:
+                    if de.is_dir(follow_symlinks=False):
+                        if de.name not in skip:
+                            stack.append(rel_dir + de.name + "/")
+                        continue
+                    if not de.is_file():
+                        continue
+                    ext = os.path.splitext(de.name)[1]
+                    if want is not None and ext not in want and not (include_noext and not ext):
+                        continue
+                    st = de.stat()
+                except OSError:
+                    continue
+                out.append((rel_dir + de.name, st.st_mtime_ns, st.st_size))
+    out.sort()
+    return out
+
+
+def _scan_one(base: str, rel: str, extractor: Optional[Extractor]) -> Optional[FileScan]:
+    try:
+        with open(os.path.join(base, rel), "rb") as fh:
+            data = fh.read()
+    except OSError:
+        return None
+    suffix = os.path.splitext(rel)[1]
+    text = data.decode("utf-8", errors="ignore")
+    return FileScan(
+        rel=rel,
+        size=len(data),
+        sha1=hashlib.sha1(data).hexdigest(),
+        imports=parse_imports(text, suffix),
+        exports=parse_exports(text) if suffix in JS_EXTS else [],
+        extra=extractor(text, suffix) if extractor else None,
+    )
+
+
+def _scan_batch(base: str, rels: Sequence[str], extractor: Optional[Extractor]) -> List[FileScan]:
+    return [s for s in (_scan_one(base, r, extractor) for r in rels) if s is not None]
+
+
+# pool de processos partilhado, arrancado com "spawn": o scanner corre dentro do servidor
+# (threads + locks), onde um fork herdaria locks tomados por outras threads
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _scan_pool(n_workers: int) -> ProcessPoolExecutor:
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != n_workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context("spawn"))
+            _POOL_WORKERS = n_workers
+        return _POOL
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def scan_files(root: str | os.PathLike,
+               rels: Sequence[str],
+               extractor: Optional[Extractor] = None,
+               workers: Optional[int] = None,
+               min_parallel: Optional[int] = None) -> Dict[str, FileScan]:
+    """
+    Lê e faz parse (imports/exports/tamanho/sha1 + `extractor` opcional) dos ficheiros `rels`.
+    Em lotes num ProcessPoolExecutor (spawn, reaproveitado entre chamadas) quando há ficheiros
+    suficientes; `extractor` tem de ser uma função de módulo (picklable). Qualquer falha do
+    pool cai para modo série.
+    """
+    base = os.fspath(Path(root))
+    n_workers = SCAN_WORKERS if workers is None else workers
+    threshold = SCAN_MIN_PARALLEL if min_parallel is None else min_parallel
+    rels = list(rels)
+    out: Dict[str, FileScan] = {}
+    if n_workers > 1 and len(rels) > 1 and len(rels) >= threshold:
+        size = max(1, min(SCAN_BATCH, -(-len(rels) // n_workers)))
+        batches = [rels[i:i + size] for i in range(0, len(rels), size)]
+        pool = None
+        try:
+            pool = _scan_pool(n_workers)
+            futs = [pool.submit(_scan_batch, base, b, extractor) for b in batches]
+            for fut in futs:
+                for s in fut.result():
+                    out[s.rel] = s
+            return out
+        except Exception:
+            out.clear()  # ex.: sem /dev/shm, extractor não picklable → série
+            if pool is not None and getattr(pool, "_broken", False):
+                _drop_pool(pool)
+    for s in _scan_batch(base, rels, extractor):
+        out[s.rel] = s
+    return out
+
+
+def scan_repo(root: str | os.PathLike,
+              exts: Optional[Iterable[str]] = None,
+              ignored: Iterable[str] = SCAN_IGNORED_DIRS,
+              extractor: Optional[Extractor] = None,
+              include_noext: bool = False,
+              workers: Optional[int] = None) -> Tuple[List[Tuple[str, int, int]], Dict[str, FileScan]]:
+    """Walk + parse numa única passagem (partilhada via shared_scan_cache): devolve (listagem, scans por rel)."""
+    listing = walk_files(root, exts=exts, ignored=ignored, include_noext=include_noext)
+    return listing, shared_scan_cache(root).scan(listing, extractor=extractor, workers=workers)
+
+
+def _extractor_key(extractor: Optional[Extractor]) -> str:
+    if extractor is None:
+        return ""
+    return f"{getattr(extractor, '__module__', '')}.{getattr(extractor, '__qualname__', repr(extractor))}"
+
+
+class ScanCache:
+    """
+    FileScans de uma raiz por (rel, mtime_ns, size): CodeMap, OmniContext, code_index e os
+    índices incrementais do mesmo processo partilham a mesma leitura/parse de cada ficheiro.
+    Resultados de extractors ficam ao lado do scan base (um ficheiro inalterado só é relido
+    para um extractor que ainda não correu sobre ele).
+    """
+    def __init__(self, root: str | os.PathLike) -> None:
+        self.root = os.fspath(Path(root).resolve())
+        self._entries: Dict[str, Tuple[int, int, FileScan]] = {}
+        self._extras: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "scanned": 0}
+
+    def scan(self, listing: Iterable[Tuple[str, int, int]],
+             extractor: Optional[Extractor] = None,
+             workers: Optional[int] = None) -> Dict[str, FileScan]:
+        """`listing` = (rel, mtime_ns, size) como devolvido por walk_files."""
+        listing = list(listing)
+        key = _extractor_key(extractor)
+        with self._lock:
+            need = []
+            for rel, mt, sz in listing:
+                ent = self._entries.get(rel)
+                if ent is None or ent[:2] != (mt, sz) or (key and key not in self._extras.get(rel, {})):
+                    need.append(rel)
+        scans = scan_files(self.root, need, extractor=extractor, workers=workers) if need else {}
+        out: Dict[str, FileScan] = {}
+        with self._lock:
+            fresh = set(need)
+            for rel, mt, sz in listing:
+                if rel in fresh:
+                    sc = scans.get(rel)
+                    if sc is None:
+                        self._entries.pop(rel, None)
+                        self._extras.pop(rel, None)
+                        continue
+                    old = self._entries.get(rel)
+                    if old is None or old[:2] != (mt, sz):
+                        self._extras[rel] = {}
+                    self._entries[rel] = (mt, sz, replace(sc, extra=None))
+                    if key:
+                        self._extras[rel][key] = sc.extra
+                    out[rel] = sc
+                    continue
+                ent = self._entries.get(rel)
+                if ent is None:
+                    continue
+                out[rel] = replace(ent[2], extra=self._extras.get(rel, {}).get(key)) if key else ent[2]
+            self.stats["scanned"] += len(need)
+            self.stats["hits"] += len(listing) - len(need)
+        return out
+
+
+_SCAN_CACHES: Dict[str, ScanCache] = {}
+_SCAN_CACHES_LOCK = threading.Lock()
+
+
+def shared_scan_cache(root: str | os.PathLike) -> ScanCache:
+    """Um ScanCache por raiz, partilhado por todos os consumidores do processo."""
+    key = os.fspath(Path(root).resolve())
+    with _SCAN_CACHES_LOCK:
+        cache = _SCAN_CACHES.get(key)
+        if cache is None:
+            cache = _SCAN_CACHES[key] = ScanCache(key)
+    return cache
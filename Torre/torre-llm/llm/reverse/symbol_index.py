@@ -0,0 +1,198 @@
+from __future__ import annotations
+import os, time, sqlite3, threading, bisect, difflib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .scanner import JS_EXTS, SCAN_IGNORED_DIRS, parse_export_entries, shared_scan_cache, walk_files
+
+DEFAULT_TTL_S = float(os.getenv("FORTALEZA_SYMBOLS_TTL_S", "5.0"))
+
+
+@dataclass(frozen=True)
+class SymbolHit:
+    symbol: str
+    file: str      # relativo à raiz (posix)
+    kind: str      # const/function/class/type/interface/enum/binding/value...
+    style: str     # named | default
+
+
+def _export_extractor(text: str, suffix: str) -> List[Tuple[str, str, str]]:
+    """Extractor do scanner (função de módulo → picklable para o pool)."""
+    return parse_export_entries(text) if suffix in JS_EXTS else []
+
+
+class SymbolIndex:
+    """
+    Índice invertido persistente símbolo → [(ficheiro, kind, estilo de export)].
+    - SQLite em <repo>/.fortaleza/cache/symbols/index.sqlite (sobrevive entre processos)
+    - carregado uma vez para dicts em memória: lookup exato O(1), prefixo via bisect,
+      fuzzy via difflib restrito ao bucket da 1ª letra
+    - refresh() incremental por mtime/size/sha1 (reusa o scanner paralelo)
+    """
+    def __init__(self, repo_root: str = ".", db_path: str | None = None) -> None:
+        self.root = Path(repo_root).resolve()
+        self.db_path = Path(db_path) if db_path else self.root / ".fortaleza" / "cache" / "symbols" / "index.sqlite"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.last_refresh: float = 0.0
+        self._files: Dict[str, Tuple[int, int, str]] = {}      # rel → (mtime_ns, size, sha1)
+        self._by_file: Dict[str, List[SymbolHit]] = {}
+        self._by_name: Dict[str, List[SymbolHit]] = {}
+        self._by_lower: Dict[str, List[str]] = {}
+        self._names: List[str] = []
+        self._by_head: Dict[str, List[str]] = {}
+        self._dirty = True
+        self._init_db()
+        self._load()
+
+    # ------------------------------ persistência -----------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self) -> None:
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha1 TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS symbols (symbol TEXT, file TEXT, kind TEXT, style TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sym_symbol ON symbols(symbol)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sym_file ON symbols(file)")
+
+    def _load(self) -> None:
+        with self._conn() as conn:
+            for f, mt, sz, sha in conn.execute("SELECT file, mtime_ns, size, sha1 FROM files"):
+                self._files[f] = (int(mt), int(sz), sha)
+            for sym, f, kind, style in conn.execute("SELECT symbol, file, kind, style FROM symbols ORDER BY file, rowid"):
+                self._by_file.setdefault(f, []).append(SymbolHit(sym, f, kind, style))
+        self._dirty = True
+
+    def _rebuild_maps(self) -> None:
+        by_name: Dict[str, List[SymbolHit]] = {}
+        for f in sorted(self._by_file):
+            for hit in self._by_file[f]:
+                by_name.setdefault(hit.symbol, []).append(hit)
+        by_lower: Dict[str, List[str]] = {}
+        for name in by_name:
+            by_lower.setdefault(name.lower(), []).append(name)
+        self._by_name, self._by_lower = by_name, by_lower
+        self._names = sorted(by_name)
+        by_head: Dict[str, List[str]] = {}
+        for name in self._names:
+            by_head.setdefault(name[0].lower(), []).append(name)
+        self._by_head = by_head
+        self._dirty = False
+
+    # -------------------------------- refresh --------------------------------
+    def refresh(self) -> Dict[str, int]:
+        """Sincroniza com o disco; só re-parseia ficheiros com stat/hash alterados."""
+        with self._lock:
+            current = {rel: (mt, sz) for rel, mt, sz in walk_files(self.root, JS_EXTS, SCAN_IGNORED_DIRS)}
+            deleted = [f for f in self._files if f not in current]
+            stale = [rel for rel, st in current.items() if self._files.get(rel, (None, None, ""))[:2] != st]
+            scans = shared_scan_cache(self.root).scan([(rel, *current[rel]) for rel in stale], extractor=_export_extractor)
+            reparsed = 0
+            with self._conn() as conn:
+                for f in deleted:
+                    conn.execute("DELETE FROM files WHERE file=?", (f,))
+                    conn.execute("DELETE FROM symbols WHERE file=?", (f,))
+                    self._files.pop(f, None)
+                    self._by_file.pop(f, None)
+                for rel in stale:
+                    sc = scans.get(rel)
+                    if sc is None:
+                        continue
+                    mt, sz = current[rel]
+                    old = self._files.get(rel)
+                    self._files[rel] = (mt, sz, sc.sha1)
+                    conn.execute("INSERT OR REPLACE INTO files(file, mtime_ns, size, sha1) VALUES(?,?,?,?)",
+                                 (rel, mt, sz, sc.sha1))
+                    if old and old[2] == sc.sha1:
+                        continue  # só o stat mudou
+                    hits = [SymbolHit(name, rel, kind, style) for name, kind, style in (sc.extra or [])]
+                    conn.execute("DELETE FROM symbols WHERE file=?", (rel,))
+                    conn.executemany("INSERT INTO symbols(symbol, file, kind, style) VALUES(?,?,?,?)",
+                                     [(h.symbol, h.file, h.kind, h.style) for h in hits])
+                    self._by_file[rel] = hits
+                    reparsed += 1
+            if deleted or reparsed:
+                self._dirty = True
+            self.last_refresh = time.time()
+            return {"files": len(self._files), "reparsed": reparsed, "deleted": len(deleted)}
+
+    def ensure_fresh(self, max_age_s: float | None = None) -> "SymbolIndex":
+        ttl = DEFAULT_TTL_S if max_age_s is None else max_age_s
+        if time.time() - self.last_refresh >= ttl:
+            self.refresh()
+        return self
+
+    # -------------------------------- consulta -------------------------------
+    def _maps(self) -> None:
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self._rebuild_maps()
+
+    def lookup(self, symbol: str, ignore_case: bool = False) -> List[SymbolHit]:
+        """Ficheiros que exportam `symbol` (named antes de default, depois por caminho)."""
+        self._maps()
+        names = self._by_lower.get(symbol.lower(), []) if ignore_case else [symbol]
+        hits = [h for n in names for h in self._by_name.get(n, [])]
+        return sorted(hits, key=lambda h: (h.style != "named", h.file))
+
+    def prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        self._maps()
+        i = bisect.bisect_left(self._names, prefix)
+        out: List[str] = []
+        while i < len(self._names) and self._names[i].startswith(prefix) and len(out) < limit:
+            out.append(self._names[i])
+            i += 1
+        return out
+
+    def fuzzy(self, symbol: str, limit: int = 5, cutoff: float = 0.8) -> List[str]:
+        """Nomes parecidos (typos/casing), restritos aos que partilham a 1ª letra."""
+        self._maps()
+        if not symbol:
+            return []
+        return difflib.get_close_matches(symbol, self._by_head.get(symbol[0].lower(), []), n=limit, cutoff=cutoff)
+
+    def resolve(self, symbol: str) -> Optional[SymbolHit]:
+        """
+        Candidato seguro para auto-import: exato → case-insensitive só se houver um único nome.
+        Fuzzy nunca resolve (renomearia um export alheio) — usar fuzzy() como sugestão.
+        """
+        hits = self.lookup(symbol)
+        if not hits:
+            self._maps()
+            if len(self._by_lower.get(symbol.lower(), [])) == 1:
+                hits = self.lookup(symbol, ignore_case=True)
+        return hits[0] if hits else None
+
+
+def import_statement(hit: SymbolHit, from_file: str, symbol: str | None = None) -> str:
+    """Linha de import (sem ';') de `from_file` para o export indicado, com caminho relativo sem extensão."""
+    target = os.path.splitext(hit.file)[0]
+    if target.endswith("/index"):
+        target = target[: -len("/index")]
+    rel = os.path.relpath(target, os.path.dirname(from_file) or ".").replace(os.sep, "/")
+    if not rel.startswith("."):
+        rel = "./" + rel
+    name = symbol or hit.symbol
+    if hit.style == "default":
+        return f"import {name} from '{rel}'"
+    return f"import {{ {hit.symbol} }} from '{rel}'" if name == hit.symbol else f"import {{ {hit.symbol} as {name} }} from '{rel}'"
+
+
+# ----------------------- instância partilhada (processo) -----------------------
+_SHARED: Dict[str, SymbolIndex] = {}
+_SHARED_LOCK = threading.Lock()
+
+def shared_symbol_index(repo_root: str = ".", max_age_s: float | None = None) -> SymbolIndex:
+    """Índice único por raiz, carregado uma vez por processo e refrescado por TTL."""
+    key = str(Path(repo_root).resolve())
+    with _SHARED_LOCK:
+        idx = _SHARED.get(key)
+        if idx is None:
+            idx = _SHARED[key] = SymbolIndex(key)
+    return idx.ensure_fresh(max_age_s)
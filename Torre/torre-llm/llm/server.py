@@ -23,8 +23,7 @@ def create_app():
         from pydantic import BaseModel, Field, validator
         from typing import Any, Dict, Optional, List
         from pathlib import Path
-        from datetime import datetime, timezone, timedelta
-        from collections import deque
+        from datetime import datetime, timezone
         from ipaddress import ip_address
         import json, uuid
         try:
@@ -54,25 +53,36 @@ def create_app():
         # ⬇️ PATCH: Fase 17 — Rollback on Red + Sandbox
         try:
             from .ops.guard_apply import apply_with_rollback, ensure_not_locked
+            from .ops.speculative import speculative_apply
             from .guard.secret_scan import scan_diff_for_secrets
         except Exception:
             apply_with_rollback = None
+            speculative_apply = None
             ensure_not_locked = None
             scan_diff_for_secrets = None
 
         # ⬇️ PATCH: Fase 15 — Strategos v2 com grafo
         try:
             from .reverse.codemap import CodeMap                 # F08 (reutilizado)
+            from .reverse.codemap_store import shared_codemap_store
             from .strategos.scorer_v2 import StrategosV2Graph    # F15
         except Exception:
             CodeMap = None
+            shared_codemap_store = None
             StrategosV2Graph = None
 
+        # --- Estado partilhado (memory | sqlite-WAL → correto com vários workers) ------
+        from .ops.state_backend import shared_state_backend
+        _STATE = shared_state_backend()
+
         # --- Strategos badge (volatile, para UI) -------------------------------------
-        _STRATEGOS_EVENTS: List[dict] = []  # ring buffer em memória (máx 50)
-        
+        _STRATEGOS_EVENTS = "strategos:events"       # lista limitada no backend (máx 50)
+        _STRATEGOS_BADGE = "strategos:badge"
+        _STRATEGOS_BADGE_POSTS = "strategos:badge_posts"  # timestamps dos POSTs (janela 1h)
+        _KPI_BADGE = "kpis:badge"
+
         # ---------------- Security & QoS helpers (rate limit + auth) -----------------
-        _RATE_BUCKETS: Dict[str, Dict[str, Any]] = {}  # key=f"{ip}|{route}", value={"win":int,"count":int}
+        _RATE_BUCKETS = "rate:"  # prefixo dos contadores; key=f"rate:{ip}|{route}" por janela
         
         # ========= Contracts & Tracing =========
         _CONTRACTS_DIR = Path(__file__).resolve().parent.parent / "contracts"
@@ -105,26 +115,12 @@ def create_app():
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Schema validation failed ({where}): {e}")
 
-        def _rotate_trace_files(max_files: int = 7):
-            files = sorted(_TRACE_DIR.glob("trace-*.jsonl"))
-            while len(files) > max_files:
-                old = files.pop(0)
-                try:
-                    old.unlink(missing_ok=True)
-                except Exception:
-                    break
+        # traces: fila + writer em background (sem I/O no pedido); índice do último registo em memória
+        from .ops.trace_store import TraceStore
+        _TRACES = TraceStore(_TRACE_DIR)
 
         def _trace_log(record: dict):
-            try:
-                fn = _TRACE_DIR / f"trace-{datetime.now(timezone.utc).strftime('%Y%m%d')}.jsonl"
-                line = json.dumps(record, ensure_ascii=False) + "\n"
-                fn.parent.mkdir(parents=True, exist_ok=True)
-                with fn.open("a", encoding="utf-8") as f:
-                    f.write(line)
-                if fn.stat().st_size > 5 * 1024 * 1024:
-                    _rotate_trace_files()
-            except Exception:
-                pass
+            _TRACES.log(record)
 
         def _estimate_tokens(s: str) -> int:
             # Rough heuristic: 1 token ~= 4 chars
@@ -143,18 +139,23 @@ def create_app():
             attempts_to_green_est: float | None = None
             ts: str | None = None
 
+        def _recent_badge_posts_1h() -> int:
+            """Conta POSTs do /strategos/badge feitos na última hora (todos os workers)."""
+            return _STATE.count_since(_STRATEGOS_BADGE_POSTS, 3600)
+
         @router.get("/strategos/badge")
         def get_strategos_badge(request: Request):
-            badge = dict(request.app.state.STRATEGOS_BADGE)
+            badge = dict(_STATE.get(_STRATEGOS_BADGE) or {})
             badge["recent_posts_1h"] = _recent_badge_posts_1h()
             return badge
 
         @router.post("/strategos/badge")
         def set_strategos_badge(badge: StrategosBadgeIn, request: Request):
-            request.app.state.STRATEGOS_BADGE = {**badge.dict(), "ts": _utc_iso()}
+            data = {**badge.dict(), "ts": _utc_iso()}
+            _STATE.set(_STRATEGOS_BADGE, data)
             # registra o POST para a janela de 1h
-            request.app.state.STRATEGOS_BADGE_POST_TIMES.append(datetime.now(timezone.utc))
-            return {"ok": True, "recent_posts_1h": _recent_badge_posts_1h(), "badge": request.app.state.STRATEGOS_BADGE}
+            _STATE.mark(_STRATEGOS_BADGE_POSTS, keep_s=3600)
+            return {"ok": True, "recent_posts_1h": _recent_badge_posts_1h(), "badge": data}
 
         # --- Strategos eventos (para hover card) -------------------------------------
         def _client_ip(req: Request) -> str:
@@ -163,16 +164,10 @@ def create_app():
 
         def rate_limit(limit: int, per_seconds: int = 60):
             def _dep(req: Request):
-                now = int(time.time())
-                win = now // per_seconds
                 ip = _client_ip(req)
-                key = f"{ip}|{req.url.path}"
-                entry = _RATE_BUCKETS.get(key)
-                if not entry or entry["win"] != win:
-                    _RATE_BUCKETS[key] = {"win": win, "count": 1}
-                    return
-                entry["count"] += 1
-                if entry["count"] > limit:
+                key = f"{_RATE_BUCKETS}{ip}|{req.url.path}"
+                # incremento atómico no backend → limite partilhado entre workers
+                if _STATE.incr_window(key, per_seconds) > limit:
                     raise HTTPException(status_code=429, detail="Rate limit exceeded")
             return _dep
 
@@ -185,9 +180,7 @@ def create_app():
         @router.get("/strategos/events", dependencies=[Depends(rate_limit(120, 60))])
         def get_strategos_events(limit: int = Query(3, ge=1, le=50)):
             # retorna mais recentes primeiro
-            if not _STRATEGOS_EVENTS:
-                return {"events": []}
-            sl = _STRATEGOS_EVENTS[-limit:]
+            sl = _STATE.recent(_STRATEGOS_EVENTS, limit)
             return {"events": list(reversed(sl))}
 
         @router.post("/strategos/events", dependencies=[Depends(rate_limit(60, 60))])
@@ -195,11 +188,8 @@ def create_app():
             data = ev.dict()
             if not data.get("ts"):
                 data["ts"] = datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
-            _STRATEGOS_EVENTS.append(data)
             # ring buffer máx 50
-            overflow = len(_STRATEGOS_EVENTS) - 50
-            if overflow > 0:
-                del _STRATEGOS_EVENTS[0:overflow]
+            _STATE.push_capped(_STRATEGOS_EVENTS, data, cap=50)
             return {"ok": True}
 
         def require_api_key(req: Request):
@@ -296,17 +286,20 @@ def create_app():
         # ===========================
         class ApplyIn(BaseModel):
             workspace: str
-            diff: str
+            diff: str = ""
             quotas: Optional[Dict[str,int]] = None
+            candidates: Optional[List[str]] = None  # n-best: avaliados em worktrees, só o vencedor é aplicado
+            no_cache: bool = False                  # ignora a cache de gates (.fortaleza/cache/gates)
 
         @router.post("/ops/apply", dependencies=[Depends(rate_limit(20, 60)), Depends(require_api_key)])
         def ops_apply(payload: ApplyIn):
             # validações rígidas (WAF)
-            if not payload.workspace or not payload.diff:
+            diffs = payload.candidates or ([payload.diff] if payload.diff else [])
+            if not payload.workspace or not diffs:
                 raise HTTPException(400, "workspace and diff required")
-            if len(payload.diff) > 800_000:
+            if any(len(d) > 800_000 for d in diffs):
                 raise HTTPException(413, "diff too large")
-            viol = scan_diff_for_secrets(payload.diff)
+            viol = [v for d in diffs for v in scan_diff_for_secrets(d)]
             if viol:
                 raise HTTPException(400, f"secret-like patterns detected: {len(viol)}")
             # lock check
@@ -315,7 +308,12 @@ def create_app():
             except Exception as e:
                 raise HTTPException(423, str(e))
             try:
-                res = apply_with_rollback(payload.workspace, payload.diff, quotas=payload.quotas or {})
+                if len(diffs) > 1 and speculative_apply is not None:
+                    res = speculative_apply(payload.workspace, diffs, quotas=payload.quotas or None,
+                                            use_cache=not payload.no_cache)
+                else:
+                    res = apply_with_rollback(payload.workspace, diffs[0], quotas=payload.quotas or {},
+                                              use_cache=not payload.no_cache)
                 return {"ok": bool(res.get('ok')), **res}
             except Exception as e:
                 raise HTTPException(500, str(e))
@@ -364,22 +362,20 @@ def create_app():
             )
             app.include_router(router)
             
-            # Estado global do app
-            app.state.STRATEGOS_BADGE = {"mode": "NONE", "attempts_to_green_est": None, "ttg_delta_est_ms": None, "meta": {}}
-            app.state.KPI_BADGE = {"golden_sr": None, "repeat_error_rate": None, "requests_today": None, "ts": None}
-            # Histórico de POSTs do badge (timestamps UTC) para métrica de 1h
-            app.state.STRATEGOS_BADGE_POST_TIMES = deque(maxlen=10000)
-
-            def _recent_badge_posts_1h() -> int:
-                """Prune e conta POSTs do /strategos/badge feitos na última hora."""
-                dq = app.state.STRATEGOS_BADGE_POST_TIMES
-                if dq is None:
-                    return 0
-                now = datetime.now(timezone.utc)
-                cutoff = now - timedelta(hours=1)
-                while dq and dq[0] < cutoff:
-                    dq.popleft()
-                return len(dq)
+            # Estado global do app (no backend partilhado; valores iniciais só se ainda não existirem)
+            app.state.STATE = _STATE
+            if _STATE.get(_STRATEGOS_BADGE) is None:
+                _STATE.set(_STRATEGOS_BADGE, {"mode": "NONE", "attempts_to_green_est": None, "ttg_delta_est_ms": None, "meta": {}})
+            if _STATE.get(_KPI_BADGE) is None:
+                _STATE.set(_KPI_BADGE, {"golden_sr": None, "repeat_error_rate": None, "requests_today": None, "ts": None})
+
+            _MEM: Dict[str, Any] = {}
+
+            def _shared_memory():
+                """EpisodicMemory única por processo (evita re-inicializar store/snapshot por request)."""
+                if "em" not in _MEM:
+                    _MEM["em"] = EpisodicMemory()
+                return _MEM["em"]
 
             @app.get("/health")
             def _health():
@@ -387,9 +383,10 @@ def create_app():
 
             # ---------- F14: Memória Episódica ----------
             @app.get("/memory/metrics")
-            def memory_metrics():
+            def memory_metrics(recompute: bool = False):
                 """
                 Retorna métricas da memória episódica + regras promovidas (read-only).
+                Métricas vêm do snapshot incremental (O(1)); ?recompute=true reconstrói da fonte.
                 Formato:
                 {
                   "metrics": { repeat_error_rate, rules_promoted, rules_hit_rate, avoidance_saves },
@@ -398,8 +395,8 @@ def create_app():
                 """
                 if not EpisodicMemory:
                     return {"metrics": {}, "rules": []}
-                em = EpisodicMemory()
-                metrics = em.metrics()
+                em = _shared_memory()
+                metrics = em.metrics(recompute=recompute)
                 try:
                     rules = em._load_rules()  # leitura segura (somente leitura)
                 except Exception:
@@ -415,7 +412,7 @@ def create_app():
                 """
                 if not EpisodicMemory:
                     return {"ok": False, "promoted": 0, "rules": []}
-                em = EpisodicMemory()
+                em = _shared_memory()
                 # em.promote_rules() pode retornar lista, contagem ou dict — normalizamos:
                 try:
                     res = em.promote_rules()  # método read-only sobre episodes.jsonl -> rules.json
@@ -443,10 +440,10 @@ def create_app():
                 Retorna contagem de nós/arestas e top-5 por centralidade aproximada.
                 Usa CodeMap (fase 8). Fallback gracioso se indisponível.
                 """
-                if not CodeMap:
+                if not CodeMap or not shared_codemap_store:
                     return {"nodes": 0, "edges": 0, "top": []}
-                cm = CodeMap()
-                g = cm.build(".")  # raiz do workspace (padrão)
+                # índice incremental partilhado entre requests (só re-parseia o que mudou)
+                g = shared_codemap_store(".").graph()
                 nodes = g.get("nodes") or []
                 edges = g.get("edges") or []
                 # centralidade aproximada = grau total
@@ -481,9 +478,9 @@ def create_app():
 
                     # grafo via CodeMap (fase 8)
                     codemap = {"nodes": [], "edges": []}
-                    if CodeMap:
+                    if shared_codemap_store:
                         try:
-                            codemap = CodeMap().build(".")
+                            codemap = shared_codemap_store(".").graph()
                         except Exception:
                             pass
 
@@ -491,7 +488,7 @@ def create_app():
                     episodes = []
                     if EpisodicMemory:
                         try:
-                            episodes = EpisodicMemory()._load_episodes()
+                            episodes = _shared_memory()._load_episodes()
                         except Exception:
                             episodes = []
 
@@ -576,30 +573,24 @@ def create_app():
             # ---- Trace Badge (último evento) ----
             @app.get("/traces/badge", dependencies=[Depends(rate_limit(60, 60))])
             def traces_badge():
-                files = sorted(_TRACE_DIR.glob("trace-*.jsonl"), reverse=True)
-                for fn in files:
+                rec = _TRACES.latest()
+                if rec:
                     try:
-                        with fn.open("r", encoding="utf-8") as f:
-                            lines = f.readlines()
-                            if not lines:
-                                continue
-                            # último evento do arquivo mais recente
-                            rec = json.loads(lines[-1])
-                            req_b = int(rec.get("req_bytes") or 0)
-                            res_b = int(rec.get("res_bytes") or 0)
-                            tokens_in_est = max(0, req_b // 4)
-                            tokens_out_est = max(0, res_b // 4)
-                            return {
-                                "ok": True,
-                                "trace_id": rec.get("trace_id", ""),
-                                "ts": rec.get("ts", ""),
-                                "endpoint": rec.get("endpoint", ""),
-                                "latency_ms": rec.get("latency_ms"),
-                                "tokens_in_est": tokens_in_est,
-                                "tokens_out_est": tokens_out_est,
-                            }
+                        req_b = int(rec.get("req_bytes") or 0)
+                        res_b = int(rec.get("res_bytes") or 0)
+                        tokens_in_est = max(0, req_b // 4)
+                        tokens_out_est = max(0, res_b // 4)
+                        return {
+                            "ok": True,
+                            "trace_id": rec.get("trace_id", ""),
+                            "ts": rec.get("ts", ""),
+                            "endpoint": rec.get("endpoint", ""),
+                            "latency_ms": rec.get("latency_ms"),
+                            "tokens_in_est": tokens_in_est,
+                            "tokens_out_est": tokens_out_est,
+                        }
                     except Exception:
-                        continue
+                        pass
                 return {"ok": True, "trace_id": "", "ts": "", "endpoint": "", "latency_ms": None, "tokens_in_est": 0, "tokens_out_est": 0}
 
                     # ------------------------------------------------------------
@@ -631,11 +622,14 @@ def create_app():
 
         # util local p/ diff seguro (não-fatal se indisponível)
         def _apply_unified_diff_safe(logs: Dict[str, str],
-                                     files: Dict[str, str]) -> Dict[str, Any]:
+                                     files: Dict[str, str],
+                                     workspace: Optional[str] = None) -> Dict[str, Any]:
             """
             Placeholder: você já tem a pipeline que produz o patch.
             Aqui só centralizamos chamada/integração de F13–F17.
             Retorne dict com 'mode','diff','files_out','metrics','report'.
+            O diff vencedor é aplicado em memória (buffers do editor > disco do workspace) para
+            produzir files_out; conflitos por hunk descem para ADVISORY.
             """
             result: Dict[str, Any] = {
                 "mode": "ADVISORY",
@@ -658,10 +652,18 @@ def create_app():
                         result["mode"] = "PATCH"
                         result["files_out"] = rr_out["winner"]["files_out"]
                         return result
-                    if rr_out.get("winner", {}).get("diff"):
-                        result["mode"] = "PATCH"
-                        result["diff"] = rr_out["winner"]["diff"]
-                        return result
+                    winner_diff = rr_out.get("winner", {}).get("diff") or \
+                        (candidates[rr_out["selected_index"]] if rr_out.get("selected_index") is not None else None)
+                    if winner_diff:
+                        from .ops.patch_apply import apply_patch
+                        root = workspace if workspace and os.path.isdir(workspace) else None
+                        applied = apply_patch(winner_diff, root=root, files=files)
+                        result["metrics"]["apply"] = applied.summary()
+                        result["diff"] = winner_diff
+                        if applied.ok:
+                            result["mode"] = "PATCH"
+                            result["files_out"] = {p: c for p, c in applied.contents.items() if c is not None}
+                            return result
             except Exception:
                 pass
 
@@ -704,21 +706,19 @@ def create_app():
             """
             trace_id = _ensure_trace_id(response)
             try:
-                out = _apply_unified_diff_safe(req.logs or {}, req.files or {})
+                out = _apply_unified_diff_safe(req.logs or {}, req.files or {}, req.workspace)
                 mode = out.get("mode", "ADVISORY")
                 diff = out.get("diff")
                 files_out = out.get("files_out")
 
-                # badge Strategos (se registrado no app.state)
+                # badge Strategos (estado partilhado)
                 try:
-                    app = request.app
                     badge = {
                         "mode": out.get("metrics", {}).get("strategos", {}).get("mode", mode),
                         "attempts_to_green_est": out.get("metrics", {}).get("strategos", {}).get("attempts_to_green_est", None),
                         "ts": None
                     }
-                    if hasattr(app.state, "STRATEGOS_BADGE"):
-                        app.state.STRATEGOS_BADGE = badge
+                    _STATE.set(_STRATEGOS_BADGE, badge)
                 except Exception:
                     pass
 
@@ -748,9 +748,10 @@ def create_app():
                     "repeat_error_rate": snap.get("repeat_error_rate"),
                     "requests_today": snap.get("requests_today"),
                     "latency_ms_p95": snap.get("latency_ms_p95"),
+                    "inference_cache_hit_rate": snap.get("inference_cache_hit_rate"),
                 }
             except Exception:
-                return app.state.KPI_BADGE
+                return _STATE.get(_KPI_BADGE)
 
             @app.get("/kpis/export", dependencies=[Depends(rate_limit(30, 60))])
             def kpis_export(format: str = "json"):
@@ -770,7 +771,7 @@ def create_app():
             @app.get("/kpis/badge", dependencies=[Depends(rate_limit(60, 60))])
             def get_kpi_badge():
                 # se não houver em memória, coleta on-demand
-                b = app.state.KPI_BADGE or {}
+                b = _STATE.get(_KPI_BADGE) or {}
                 if not b.get("ts"):
                     b = _collect_kpis_now()
                 return b
@@ -788,7 +789,7 @@ def create_app():
                 """Permite um job diário publicar o snapshot (ex.: via cron/CI)."""
                 snap = body.model_dump()
                 snap["ts"] = snap.get("ts") or datetime.utcnow().isoformat(timespec="seconds")+"Z"
-                app.state.KPI_BADGE = snap
+                _STATE.set(_KPI_BADGE, snap)
                 return {"ok": True, "badge": snap}
 
             return app
@@ -1,8 +1,13 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import Dict, List, Tuple, Any
+import heapq
 import math
 import os
+import threading
+
+from ..error_taxonomy import classify_logs
 
 # Ordem canónica das etapas
 STEPS = ["build", "types", "tests", "style"]
@@ -18,6 +23,22 @@ class NodeMetrics:
     is_core: bool = False    # heurística simples
 
 
+@dataclass
+class _GraphPrecomp:
+    """Tudo o que só depende do grafo + episódios (reutilizado entre pedidos)."""
+    metrics: Dict[str, NodeMetrics]
+    index: Dict[str, int]                    # ordem original (desempate estável)
+    ir: Dict[str, float]                     # impacto × risco por nó
+    ranked: List[Tuple[str, float]] = field(default_factory=list)  # ir desc, índice asc
+
+
+# cache por (raiz, versão do codemap, watermark dos episódios) — poucas entradas
+_PRECOMP_CACHE: "OrderedDict[Tuple[Any, ...], _GraphPrecomp]" = OrderedDict()
+_PRECOMP_MAX = 4
+_PRECOMP_LOCK = threading.Lock()
+PRECOMP_STATS = {"hits": 0, "misses": 0}
+
+
 def _safe_len_lines(s: str) -> int:
     if not isinstance(s, str):
         return 0
@@ -105,16 +126,72 @@ class StrategosV2Graph:
 
     # ----------------------- ORDEM POR ETAPA (GATES) -----------------------
     def _step_boosts(self, logs: Dict[str, str] | None) -> Dict[str, float]:
-        msg = " ".join(str(v) for v in (logs or {}).values()).lower()
+        c = classify_logs(logs)
         boosts = {k: 1.0 for k in STEPS}
-        if any(x in msg for x in ("module not found", "cannot find module", "enoent", "vite build failed", "import error")):
+        if c.has("module not found", "cannot find module", "enoent", "vite build failed", "import error"):
             boosts["build"] = 1.30
-        if any(x in msg for x in ("ts", "ts2304", "cannot find name", "type error", "mypy")):
+        if c.has("ts", "ts2304", "cannot find name", "type error", "mypy"):
             boosts["types"] = max(boosts["types"], 1.15)
-        if any(x in msg for x in ("fail", "assert", "pytest", "jest", "vitest")):
+        if c.has("fail", "assert", "pytest", "jest", "vitest"):
             boosts["tests"] = max(boosts["tests"], 1.05)
         return boosts
 
+    # ------------------------ CACHE DE MÉTRICAS DO GRAFO -------------------
+    @staticmethod
+    def _precomp_key(codemap: Dict[str, Any], episodes: List[Dict[str, Any]] | None) -> Tuple[Any, ...] | None:
+        """Chave só existe quando o grafo é versionado (CodeMapStore.graph())."""
+        if codemap.get("version") is None:
+            return None
+        eps = episodes or []
+        last = eps[-1] if eps else {}
+        watermark = (len(eps), last.get("ts"), last.get("file") or last.get("path"))
+        return (codemap.get("root"), codemap.get("version"), watermark)
+
+    def _precompute(self, codemap: Dict[str, Any], episodes: List[Dict[str, Any]] | None) -> _GraphPrecomp:
+        key = self._precomp_key(codemap, episodes)
+        if key is not None:
+            with _PRECOMP_LOCK:
+                hit = _PRECOMP_CACHE.get(key)
+                if hit is not None:
+                    _PRECOMP_CACHE.move_to_end(key)
+                    PRECOMP_STATS["hits"] += 1
+                    return hit
+        metrics = self.build_metrics(codemap, episodes)
+        index = {p: i for i, p in enumerate(metrics)}
+        ir = {p: self._impact(mx) * max(1e-3, self._risk(mx)) for p, mx in metrics.items()}
+        pre = _GraphPrecomp(metrics=metrics, index=index, ir=ir)
+        if key is not None:
+            # ordenação única por versão; pedidos seguintes fazem só top-k
+            pre.ranked = sorted(ir.items(), key=lambda kv: (-kv[1], index[kv[0]]))
+            with _PRECOMP_LOCK:
+                PRECOMP_STATS["misses"] += 1
+                _PRECOMP_CACHE[key] = pre
+                while len(_PRECOMP_CACHE) > _PRECOMP_MAX:
+                    _PRECOMP_CACHE.popitem(last=False)
+        return pre
+
+    def _top_k(self, pre: _GraphPrecomp, files_ctx: Dict[str, str] | None, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k por (impacto×risco)/custo sem ordenar todos os nós.
+        Só ficheiros presentes em files_ctx têm custo próprio; os restantes partilham
+        o custo neutro, logo o seu top-k é o prefixo de `ranked`.
+        """
+        if not pre.ranked:  # sem cache: heap sobre todos os nós
+            scores = ((p, ir / max(0.15, self._cost(p, files_ctx))) for p, ir in pre.ir.items())
+            return heapq.nlargest(k, scores, key=lambda kv: kv[1])
+        neutral = max(0.15, self._cost("", files_ctx) if files_ctx else 0.5)
+        ctx = [p for p in (files_ctx or {}) if p in pre.ir]
+        ctx_set = set(ctx)
+        cands: List[Tuple[str, float]] = []
+        for p, ir in pre.ranked:
+            if len(cands) >= k:
+                break
+            if p not in ctx_set:
+                cands.append((p, ir / neutral))
+        cands.extend((p, pre.ir[p] / max(0.15, self._cost(p, files_ctx))) for p in ctx)
+        cands.sort(key=lambda kv: pre.index[kv[0]])  # desempate = ordem original (como sorted estável)
+        return heapq.nlargest(k, cands, key=lambda kv: kv[1])
+
     def plan(self,
              codemap: Dict[str, Any] | None,
              logs: Dict[str, str] | None,
@@ -124,12 +201,14 @@ class StrategosV2Graph:
         """
         Gera plano com etapas ordenadas build→types→tests→style,
         priorizando nós pelos scores (impacto×risco)/custo com boosts e caps.
+        Métricas do grafo são reutilizadas entre pedidos quando o codemap traz `version`;
+        por pedido só se recalculam custo (files_ctx) e boosts (logs).
         """
         codemap = codemap or {"nodes": [], "edges": []}
-        metrics = self.build_metrics(codemap, episodes)
-        node_scores = self.score_nodes(metrics, files_ctx)
-        # ranking global por score
-        ranked = sorted(node_scores.items(), key=lambda kv: kv[1], reverse=True)[: max(top_k, 1)]
+        pre = self._precompute(codemap, episodes)
+        metrics = pre.metrics
+        # ranking global por score (top-k)
+        ranked = self._top_k(pre, files_ctx, max(top_k, 1))
         boosts = self._step_boosts(logs)
 
         steps: List[Dict[str, Any]] = []
@@ -1,12 +1,25 @@
 #!/usr/bin/env python3
-import os, json, time
+import os, json, time, hashlib, threading
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any, Iterable, Tuple
-from prometheus_client import REGISTRY, GaugeMetricFamily, CounterMetricFamily, start_http_server
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+try:
+    from prometheus_client import REGISTRY, GaugeMetricFamily, CounterMetricFamily, start_http_server
+    _HAS_PROMETHEUS = True
+except Exception:  # MetricsTail funciona sem o cliente (testes/ferramentas)
+    _HAS_PROMETHEUS = False
 
 METRICS_FILE = os.environ.get("METRICS_FILE", ".metrics")
 # Janelas úteis (pode ajustar via env se quiser)
 WINDOWS = os.environ.get("WINDOWS", "5m,1h,24h").split(",")
+# checkpoint do tail (offset + contadores + janelas); no compose o repo é :ro → volume próprio
+CHECKPOINT_FILE = os.environ.get("METRICS_CHECKPOINT", ".fortaleza/metrics-exporter.json")
+CHECKPOINT_INTERVAL_S = float(os.environ.get("METRICS_CHECKPOINT_S", "30"))
+# buckets por janela (resolução = janela / buckets)
+WINDOW_BUCKETS = int(os.environ.get("WINDOW_BUCKETS", "60"))
+
+STEPS = ("ts_codefix_resolved", "eslint_resolved", "semgrep_resolved", "codemods_edits")
+_SIG_BYTES = 256
+_CHUNK = 1 << 20
 
 def _parse_ts(ts: str) -> datetime:
     # espera ISO8601 com 'Z'
@@ -31,15 +44,216 @@ def _window_bounds(now: datetime, win: str) -> datetime:
     # fallback
     return now - timedelta(hours=1)
 
+def _window_seconds(win: str) -> int:
+    now = datetime.now(timezone.utc)
+    return max(1, int((now - _window_bounds(now, win)).total_seconds()))
+
 def _safe_int(x) -> int:
     try:
         return int(x)
     except Exception:
         return 0
 
+
+class WindowRing:
+    """
+    Somas por step numa janela deslizante com buckets de tempo (anel fixo):
+    add() e total() custam O(buckets), independente do nº de linhas já lidas.
+    Resolução = janela / buckets (o bucket mais antigo pode estar parcialmente fora).
+    """
+    def __init__(self, seconds: int, buckets: int = WINDOW_BUCKETS) -> None:
+        self.width = max(1, -(-seconds // max(1, buckets)))
+        self.n = -(-seconds // self.width)
+        self.idx: List[int] = [-1] * self.n
+        self.sums: List[List[int]] = [[0] * len(STEPS) for _ in range(self.n)]
+
+    def add(self, t: float, values: Tuple[int, ...]) -> None:
+        i = int(t // self.width)
+        slot = i % self.n
+        if self.idx[slot] != i:
+            if self.idx[slot] > i:
+                return  # mais antigo que o anel → já fora da janela
+            self.idx[slot] = i
+            self.sums[slot] = [0] * len(STEPS)
+        s = self.sums[slot]
+        for k, v in enumerate(values):
+            s[k] += v
+
+    def total(self, now: float) -> Dict[str, int]:
+        hi = int(now // self.width)
+        lo = hi - self.n + 1
+        out = [0] * len(STEPS)
+        for i, s in zip(self.idx, self.sums):
+            if lo <= i <= hi:
+                for k, v in enumerate(s):
+                    out[k] += v
+        return dict(zip(STEPS, out))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"w": self.width, "idx": self.idx, "sums": self.sums}
+
+    def load(self, d: Dict[str, Any]) -> None:
+        if d.get("w") == self.width and len(d.get("idx") or []) == self.n:
+            self.idx = [int(i) for i in d["idx"]]
+            self.sums = [[int(v) for v in s] for s in d["sums"]]
+
+
+class MetricsTail:
+    """
+    Estado incremental do .metrics: cada poll() lê só os bytes novos desde o último offset.
+    - linhas incompletas (escrita a meio) ficam para o próximo poll
+    - truncagem/rotação (inode diferente, tamanho < offset ou início do ficheiro alterado) → relê do 0,
+      mantendo os contadores cumulativos monótonos
+    - contadores, últimos valores e janelas vão para um checkpoint → reinício não relê o ficheiro todo
+    """
+    def __init__(self, path: str = METRICS_FILE, windows: Iterable[str] = WINDOWS,
+                 checkpoint: Optional[str] = CHECKPOINT_FILE, buckets: int = WINDOW_BUCKETS,
+                 checkpoint_interval_s: float = CHECKPOINT_INTERVAL_S) -> None:
+        self.path = path
+        self.checkpoint = checkpoint
+        self.checkpoint_interval_s = checkpoint_interval_s
+        self._lock = threading.Lock()
+        self.windows = {w: WindowRing(_window_seconds(w), buckets) for w in windows}
+        self.offset = 0
+        self.file_id: Optional[List[int]] = None
+        self.sig = ""
+        self.sig_len = 0
+        self.runs_total = 0
+        self.events_total = {s: 0 for s in STEPS}
+        self.codemods_total: Dict[str, int] = {}
+        self.latest = {s: 0 for s in STEPS}
+        self.latest_duration_ms = 0
+        self.latest_files_changed = 0
+        self.stats = {"rows": 0, "bytes": 0, "resets": 0}
+        self._dirty = False
+        self._last_save = 0.0
+        self._load()
+
+    # ------------------------------------ tail ------------------------------------
+    def _signature(self, f, n: int) -> str:
+        f.seek(0)
+        return hashlib.sha1(f.read(n)).hexdigest() if n else ""
+
+    def poll(self) -> int:
+        """Consome as linhas completas novas; devolve quantas linhas válidas foram lidas."""
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return 0
+            with f:
+                st = os.fstat(f.fileno())
+                fid = [st.st_dev, st.st_ino]
+                if self.offset and (fid != self.file_id or st.st_size < self.offset
+                                    or self._signature(f, self.sig_len) != self.sig):
+                    self.offset = 0
+                    self.sig, self.sig_len = "", 0
+                    self.stats["resets"] += 1
+                self.file_id = fid
+                rows = 0
+                f.seek(self.offset)
+                buf = b""
+                while True:
+                    chunk = f.read(_CHUNK)
+                    if not chunk:
+                        break
+                    buf += chunk
+                    cut = buf.rfind(b"\n")
+                    if cut < 0:
+                        continue
+                    for raw in buf[:cut].split(b"\n"):
+                        rows += self._ingest(raw.decode("utf-8", "replace"))
+                    self.offset += cut + 1
+                    self.stats["bytes"] += cut + 1
+                    buf = buf[cut + 1:]
+                if self.sig_len < min(_SIG_BYTES, self.offset):
+                    # assinatura dos primeiros bytes já consumidos (imutáveis num ficheiro append-only)
+                    self.sig_len = min(_SIG_BYTES, self.offset)
+                    self.sig = self._signature(f, self.sig_len)
+            if rows:
+                self._dirty = True
+                self.stats["rows"] += rows
+        self.maybe_save()
+        return rows
+
+    def _ingest(self, line: str) -> int:
+        row = _parse_line(line)
+        if not row or not isinstance(row, dict):
+            return 0
+        sm = row.get("step_metrics") or {}
+        values = tuple(_safe_int(sm.get(s)) for s in STEPS)
+        self.runs_total += 1
+        for s, v in zip(STEPS, values):
+            self.events_total[s] += v
+        for cm_name, cm_val in (row.get("codemods_per_codemod") or {}).items():
+            self.codemods_total[cm_name] = self.codemods_total.get(cm_name, 0) + _safe_int(cm_val)
+        # latest (mantém do último válido)
+        self.latest = dict(zip(STEPS, values))
+        self.latest_duration_ms = _safe_int(row.get("duration_ms"))
+        self.latest_files_changed = _safe_int(row.get("files_changed"))
+        t = _parse_ts(row.get("ts") or "").timestamp()
+        for ring in self.windows.values():
+            ring.add(t, values)
+        return 1
+
+    def window_sums(self, now: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            return {w: ring.total(now) for w, ring in self.windows.items()}
+
+    # --------------------------------- checkpoint ---------------------------------
+    def _load(self) -> None:
+        if not self.checkpoint:
+            return
+        try:
+            with open(self.checkpoint, "r", encoding="utf-8") as f:
+                cp = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cp.get("path") != os.path.abspath(self.path):
+            return
+        self.offset = _safe_int(cp.get("offset"))
+        self.file_id = cp.get("file_id")
+        self.sig = cp.get("sig") or ""
+        self.sig_len = _safe_int(cp.get("sig_len"))
+        self.runs_total = _safe_int(cp.get("runs_total"))
+        self.events_total.update({s: _safe_int(v) for s, v in (cp.get("events_total") or {}).items()})
+        self.codemods_total = {k: _safe_int(v) for k, v in (cp.get("codemods_total") or {}).items()}
+        self.latest.update({s: _safe_int(v) for s, v in (cp.get("latest") or {}).items()})
+        self.latest_duration_ms = _safe_int(cp.get("latest_duration_ms"))
+        self.latest_files_changed = _safe_int(cp.get("latest_files_changed"))
+        for w, d in (cp.get("windows") or {}).items():
+            if w in self.windows:
+                self.windows[w].load(d)
+
+    def save(self) -> None:
+        if not self.checkpoint:
+            return
+        with self._lock:
+            cp = {"path": os.path.abspath(self.path), "offset": self.offset, "file_id": self.file_id,
+                  "sig": self.sig, "sig_len": self.sig_len, "runs_total": self.runs_total, "events_total": self.events_total,
+                  "codemods_total": self.codemods_total, "latest": self.latest,
+                  "latest_duration_ms": self.latest_duration_ms, "latest_files_changed": self.latest_files_changed,
+                  "windows": {w: r.to_dict() for w, r in self.windows.items()}}
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint) or ".", exist_ok=True)
+            tmp = self.checkpoint + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cp, f, separators=(",", ":"))
+            os.replace(tmp, self.checkpoint)
+        except OSError:
+            pass  # volume read-only → segue só em memória
+
+    def maybe_save(self) -> None:
+        if self._dirty and time.monotonic() - self._last_save >= self.checkpoint_interval_s:
+            self.save()
+
+
 class FixerMetricsCollector:
     """
-    Lê .metrics (JSONL) a cada coleta e produz:
+    Segue .metrics (JSONL) incrementalmente (MetricsTail) e a cada coleta produz:
       - fortaleza_fixer_runs_total (counter cumulativa baseada no arquivo)
       - fortaleza_fixer_events_total{step} (counter cumulativa)
       - fortaleza_fixer_latest{step} (gauge último valor)
@@ -47,85 +261,22 @@ class FixerMetricsCollector:
       - fortaleza_fixer_duration_ms (última duração)
       - fortaleza_fixer_files_changed (último valor)
       - fortaleza_fixer_codemods_edits_total{codemod} (counter cumulativa)
+    O custo do scrape depende só das linhas novas e do nº de buckets, não do tamanho do ficheiro.
     """
-    def collect(self) -> Iterable:
-        now = datetime.now(timezone.utc)
-        runs_total = 0
-
-        # counters cumulativos
-        events_total = {
-            "ts_codefix_resolved": 0,
-            "eslint_resolved": 0,
-            "semgrep_resolved": 0,
-            "codemods_edits": 0,
-        }
-        codemods_total: Dict[str, int] = {}
-
-        # latest (do último run)
-        latest = {
-            "ts_codefix_resolved": 0,
-            "eslint_resolved": 0,
-            "semgrep_resolved": 0,
-            "codemods_edits": 0,
-        }
-        latest_duration_ms = 0
-        latest_files_changed = 0
-
-        # janelas
-        window_sums: Dict[str, Dict[str, int]] = {w: {
-            "ts_codefix_resolved": 0, "eslint_resolved": 0,
-            "semgrep_resolved": 0, "codemods_edits": 0
-        } for w in WINDOWS}
+    def __init__(self, tail: Optional[MetricsTail] = None) -> None:
+        self.tail = tail or MetricsTail()
 
-        try:
-            with open(METRICS_FILE, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-        except FileNotFoundError:
-            lines = []
-
-        for line in lines:
-            row = _parse_line(line)
-            if not row:
-                continue
-
-            runs_total += 1
-            ts = _parse_ts(row.get("ts") or "")
-            sm = row.get("step_metrics") or {}
-            ts_codefix = _safe_int(sm.get("ts_codefix_resolved"))
-            eslint = _safe_int(sm.get("eslint_resolved"))
-            semgrep = _safe_int(sm.get("semgrep_resolved"))
-            codemods = _safe_int(sm.get("codemods_edits"))
-            duration = _safe_int(row.get("duration_ms"))
-            files_changed = _safe_int(row.get("files_changed"))
-            per_codemod = row.get("codemods_per_codemod") or {}
-
-            # cumulativos
-            events_total["ts_codefix_resolved"] += ts_codefix
-            events_total["eslint_resolved"] += eslint
-            events_total["semgrep_resolved"] += semgrep
-            events_total["codemods_edits"] += codemods
-
-            for cm_name, cm_val in per_codemod.items():
-                codemods_total[cm_name] = codemods_total.get(cm_name, 0) + _safe_int(cm_val)
-
-            # latest (mantém do último válido)
-            latest = {
-                "ts_codefix_resolved": ts_codefix,
-                "eslint_resolved": eslint,
-                "semgrep_resolved": semgrep,
-                "codemods_edits": codemods,
-            }
-            latest_duration_ms = duration
-            latest_files_changed = files_changed
-
-            # janelas
-            for w in WINDOWS:
-                cutoff = _window_bounds(now, w)
-                if ts >= cutoff:
-                    window_sums[w]["ts_codefix_resolved"] += ts_codefix
-                    window_sums[w]["eslint_resolved"] += eslint
-                    window_sums[w]["semgrep_resolved"] += semgrep
-                    window_sums[w]["codemods_edits"] += codemods
+    def collect(self) -> Iterable:
+        tail = self.tail
+        tail.poll()
+        window_sums = tail.window_sums()
+        with tail._lock:
+            runs_total = tail.runs_total
+            events_total = dict(tail.events_total)
+            latest = dict(tail.latest)
+            latest_duration_ms = tail.latest_duration_ms
+            latest_files_changed = tail.latest_files_changed
+            codemods_total = dict(tail.codemods_total)
 
         # Export: runs total
         runs = CounterMetricFamily("fortaleza_fixer_runs_total", "Total de execuções (.metrics linhas)", labels=[])
@@ -165,11 +316,14 @@ class FixerMetricsCollector:
 
 if __name__ == "__main__":
     port = int(os.environ.get("EXPORTER_PORT", "9108"))
+    collector = FixerMetricsCollector()
     start_http_server(port)
-    REGISTRY.register(FixerMetricsCollector())
-    print(f"[exporter] lendo {METRICS_FILE} | escutando em :{port} (Prometheus /metrics)")
+    REGISTRY.register(collector)
+    print(f"[exporter] seguindo {METRICS_FILE} (checkpoint {CHECKPOINT_FILE}) | escutando em :{port} (Prometheus /metrics)")
     try:
         while True:
             time.sleep(60)
     except KeyboardInterrupt:
         pass
+    finally:
+        collector.tail.save()
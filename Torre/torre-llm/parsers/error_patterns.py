@@ -2,14 +2,25 @@ from __future__ import annotations
 import re
 from typing import List, Dict
 
-# Padrões comuns em Vite/React/TypeScript/ESLint/Jest/Pytest
+try:
+    from ..llm.error_taxonomy import (
+        RX_REF, RX_NAME, RX_UNRESOLVED, RX_HOOK, RX_PARSE, classify_text,
+    )
+except ImportError:
+    # Fallback para quando executado diretamente
+    import sys
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from llm.error_taxonomy import RX_REF, RX_NAME, RX_UNRESOLVED, RX_HOOK, RX_PARSE, classify_text
+
+# Padrões comuns em Vite/React/TypeScript/ESLint/Jest/Pytest (compilados na taxonomia partilhada)
 RX = {
-    "ref_is_not_defined": re.compile(r"(?:Uncaught\s+)?ReferenceError:\s*(?P<name>[A-Za-z_]\w*)\s+is\s+not\s+defined"),
-    "ts_cannot_find_name": re.compile(r"Cannot\s+find\s+name\s+'(?P<name>[^']+)'"),
-    "module_not_found": re.compile(r"Module\s+not\s+found:\s*Can't\s+resolve\s+['\"](?P<mod>[^'\"]+)['\"]"),
-    "react_hook_rule": re.compile(r"React\s+Hook\s+['\"]?(?P<hook>use\w+)['\"]?\s+is\s+called\s+in\s+function\s+['\"]?(?P<fn>[^'\"()]+)"),
+    "ref_is_not_defined": RX_REF,
+    "ts_cannot_find_name": RX_NAME,
+    "module_not_found": RX_UNRESOLVED,
+    "react_hook_rule": RX_HOOK,
     "eslint_unused": re.compile(r"no-unused-vars"),
-    "parsing_error": re.compile(r"Parsing error:\s*(?P<msg>.+)"),
+    "parsing_error": RX_PARSE,
 }
 
 def _hint_for_reference(name: str) -> str:
@@ -40,35 +51,32 @@ def extract_hints(log_text: str) -> List[str]:
     """Extrai dicas acionáveis a partir do texto de logs."""
     hints: List[str] = []
     seen: Dict[str, bool] = {}
+    c = classify_text(log_text)
 
-    for m in RX["ref_is_not_defined"].finditer(log_text):
-        name = m.group("name")
+    for name in c.undefined_refs:
         h = _hint_for_reference(name)
         if h not in seen:
             hints.append(h); seen[h] = True
 
-    for m in RX["ts_cannot_find_name"].finditer(log_text):
-        name = m.group("name")
+    for name in c.missing_names:
         h = _hint_for_ts_name(name)
         if h not in seen:
             hints.append(h); seen[h] = True
 
-    for m in RX["module_not_found"].finditer(log_text):
-        mod = m.group("mod")
+    for mod in c.unresolved_modules:
         h = _hint_for_module(mod)
         if h not in seen:
             hints.append(h); seen[h] = True
 
-    for m in RX["react_hook_rule"].finditer(log_text):
-        h = _hint_for_hook(m.group("hook"), m.group("fn"))
+    for hook, fn in c.hooks:
+        h = _hint_for_hook(hook, fn)
         if h not in seen:
             hints.append(h); seen[h] = True
 
-    if RX["eslint_unused"].search(log_text):
+    if c.has("no-unused-vars"):
         hints.append("ESLint: `no-unused-vars` → remover variáveis não usadas ou prefixar com `_`.")
 
-    for m in RX["parsing_error"].finditer(log_text):
-        msg = m.group("msg")
+    for msg in c.parse_errors:
         h = f"Parsing error: {msg} → rever sintaxe/TSConfig/ESLint parser."
         if h not in seen:
             hints.append(h); seen[h] = True
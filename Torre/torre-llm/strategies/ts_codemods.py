@@ -10,6 +10,13 @@ except ImportError:
     import os
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
     from utils.diff_utils import make_replace_file_diff
+try:
+    from ..llm.reverse.symbol_index import shared_symbol_index
+except ImportError:
+    try:
+        from llm.reverse.symbol_index import shared_symbol_index
+    except ImportError:
+        shared_symbol_index = None
 
 SRC_GLOB_EXTS = (".ts", ".tsx")
 
@@ -17,15 +24,6 @@ RX_UNUSED = re.compile(r"[\"'](?P<name>[A-Za-z_][A-Za-z0-9_]*)[\"'].*?(?:never u
 RX_TS_CANNOT_FIND = re.compile(r"Cannot\s+find\s+name\s+'(?P<name>[^']+)'")
 RX_MODULE_NOT_FOUND = re.compile(r"Module\s+not\s+found:\s*Can't\s+resolve\s+['\"](?P<mod>[^'\"]+)['\"]")
 
-def _load_index() -> Dict[str, Any]:
-    p = Path(".torre/code_index.json")
-    if p.exists():
-        try:
-            return json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            return {}
-    return {}
-
 def _iter_src_files(root: Path) -> List[Path]:
     out: List[Path] = []
     src = root / "src"
@@ -37,17 +35,17 @@ def _iter_src_files(root: Path) -> List[Path]:
     return out
 
 def _guess_file_for_symbol(root: Path, symbol: str) -> Optional[Path]:
-    """Procura em .torre/code_index.json um ficheiro que exporte `symbol`."""
-    idx = _load_index()
-    by_file = idx.get("by_file", {})
-    for path, syms in by_file.items():
-        try:
-            if symbol in syms:
-                p = Path(path)
-                if p.exists():
-                    return p
-        except Exception:
-            continue
+    """Procura no índice invertido de símbolos (SQLite, carregado 1× por processo) quem exporta `symbol`."""
+    if shared_symbol_index is None:
+        return None
+    try:
+        hits = shared_symbol_index(str(root)).lookup(symbol)
+    except Exception:
+        return None
+    for hit in hits:
+        p = Path(root) / hit.file
+        if p.exists():
+            return p
     return None
 
 def _relative_import(from_file: Path, to_file: Path) -> str:
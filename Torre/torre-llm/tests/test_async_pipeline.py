@@ -0,0 +1,105 @@
+from __future__ import annotations
+import asyncio
+import sys
+import time
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.async_pipeline import LLMWorkerPool, StageLimits, run_cmd
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(0.4); print('ok')"]
+
+def test_subprocess_stages_run_concurrently_within_limit(monkeypatch):
+    monkeypatch.setenv("FORTALEZA_CONCURRENCY_TYPECHECK", "3")
+
+    async def scenario():
+        limits = StageLimits()
+        ticks = 0
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+        hb = asyncio.create_task(heartbeat())
+        t0 = time.perf_counter()
+        res = await asyncio.gather(*(run_cmd(SLEEP, sem=limits("typecheck")) for _ in range(3)))
+        elapsed = time.perf_counter() - t0
+        hb.cancel()
+        return res, elapsed, ticks
+
+    res, elapsed, ticks = asyncio.run(scenario())
+    assert [r.stdout.strip() for r in res] == ["ok"] * 3
+    assert elapsed < 1.0          # 3×0.4s em paralelo, não em série
+    assert ticks >= 4             # event loop continuou a responder
+
+def test_timeout_kills_process():
+    res = asyncio.run(run_cmd(SLEEP, timeout=0.1))
+    assert res.timed_out and res.returncode != 0
+
+def test_worker_pool_runs_in_process_target():
+    pool = LLMWorkerPool(max_workers=2, target=len)
+    try:
+        async def scenario():
+            return await asyncio.gather(pool.run({"a": 1}), pool.run({"a": 1, "b": 2}))
+        assert asyncio.run(scenario()) == [1, 2]
+    finally:
+        pool.shutdown()
+
+def _leaky(body):
+    # simula a CLI: muta o ambiente do worker (LLM_MODEL por pedido)
+    seen = os.environ.get("LLM_MODEL")
+    if "model" in body:
+        os.environ["LLM_MODEL"] = body["model"]
+    return seen
+
+def _sleepy(body):
+    if "log" in body:
+        with open(body["log"], "a") as fh:
+            fh.write("run\n")
+    time.sleep(body.get("sleep", 0))
+    return os.getpid()
+
+def test_worker_env_is_restored_between_jobs(monkeypatch):
+    monkeypatch.delenv("LLM_MODEL", raising=False)
+    pool = LLMWorkerPool(max_workers=1, target=_leaky)
+    try:
+        async def scenario():
+            return [await pool.run({"model": "m-14b"}), await pool.run({})]
+        assert asyncio.run(scenario()) == [None, None]
+    finally:
+        pool.shutdown()
+
+def test_timed_out_job_recycles_worker():
+    pool = LLMWorkerPool(max_workers=1, target=_sleepy)
+    try:
+        async def scenario():
+            stuck = None
+            try:
+                await pool.run({"sleep": 30}, timeout=0.5)
+            except asyncio.TimeoutError:
+                stuck = True
+            t0 = time.perf_counter()
+            pid = await pool.run({}, timeout=10)
+            return stuck, pid, time.perf_counter() - t0
+        stuck, pid, elapsed = asyncio.run(scenario())
+        assert stuck and pid != os.getpid() and elapsed < 5   # slot livre, sem esperar pelos 30s
+    finally:
+        pool.shutdown()
+
+def test_timeout_only_recycles_its_own_worker(tmp_path):
+    log = tmp_path / "runs.log"
+    pool = LLMWorkerPool(max_workers=2, target=_sleepy)
+    try:
+        async def scenario():
+            async def stuck():
+                try:
+                    await pool.run({"sleep": 30}, timeout=0.5)
+                except asyncio.TimeoutError:
+                    return "timeout"
+            # o pedido em curso no outro worker sobrevive ao reciclar do worker preso
+            return await asyncio.gather(stuck(), pool.run({"sleep": 1.0, "log": str(log)}, timeout=10))
+        res, pid = asyncio.run(scenario())
+        assert res == "timeout" and pid != os.getpid()
+        assert log.read_text() == "run\n"          # não foi repetido num pool novo
+    finally:
+        pool.shutdown()
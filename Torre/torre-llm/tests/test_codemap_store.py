@@ -0,0 +1,57 @@
+from __future__ import annotations
+from pathlib import Path
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.reverse.codemap import CodeMap
+from llm.reverse.codemap_store import CodeMapStore
+
+def _repo(tmp_path: Path) -> Path:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.ts").write_text("import { b } from './b';\nimport React from 'react';\n")
+    (tmp_path / "src" / "b.ts").write_text("export const b = 1;\n")
+    (tmp_path / "node_modules" / "x").mkdir(parents=True)
+    (tmp_path / "node_modules" / "x" / "i.js").write_text("require('y')\n")
+    return tmp_path
+
+def test_store_matches_full_build(tmp_path: Path):
+    root = _repo(tmp_path)
+    store = CodeMapStore(str(root))
+    stats = store.refresh()
+    assert stats["reparsed"] == 2
+    full = CodeMap(str(root)).build()
+    got = store.to_dict()
+    assert got["nodes"] == full["nodes"]
+    assert sorted(got["edges"]) == sorted(full["edges"])
+    assert {"from": "src/a.ts", "to": "src/b.ts"} in store.graph()["edges"]
+
+def test_incremental_refresh_and_persistence(tmp_path: Path):
+    root = _repo(tmp_path)
+    store = CodeMapStore(str(root))
+    store.refresh()
+    v0 = store.version
+
+    # nada mudou → nada re-parseado
+    assert store.refresh()["reparsed"] == 0
+    assert store.version == v0
+
+    # novo ficheiro resolve import antes pendente
+    (root / "src" / "a.ts").write_text("import { c } from './c';\n")
+    stats = store.refresh()
+    assert stats["reparsed"] == 1
+    assert ("src/a.ts", "src/c.ts") not in store.codemap().edges
+    (root / "src" / "c.ts").write_text("export const c = 2;\n")
+    stats = store.refresh()
+    assert stats["added"] == 1 and stats["reparsed"] == 1
+    assert ("src/a.ts", "src/c.ts") in store.codemap().edges
+
+    # remoção corrige arestas sem re-parse
+    (root / "src" / "c.ts").unlink()
+    stats = store.refresh()
+    assert stats["deleted"] == 1 and stats["reparsed"] == 0
+    assert ("src/a.ts", "src/c.ts") not in store.codemap().edges
+
+    # nova instância reaproveita o índice em disco
+    again = CodeMapStore(str(root))
+    assert again.version == store.version
+    assert again.refresh()["reparsed"] == 0
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from pathlib import Path
+import json
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.memory import episodic as ep_mod
+from llm.memory.episodic import EpisodicMemory, Episode
+from llm.memory.sqlite_store import EpisodeStore, jsonl_history
+from llm.memory.metrics_agg import read_metrics
+
+def _isolate(tmp_path: Path, monkeypatch) -> Path:
+    mem = tmp_path / "memory"
+    monkeypatch.setattr(ep_mod, "MEM_DIR", mem)
+    monkeypatch.setattr(ep_mod, "EP_FILE", mem / "episodes.jsonl")
+    monkeypatch.setattr(ep_mod, "RULES_FILE", mem / "rules.json")
+    monkeypatch.setattr(ep_mod, "META_FILE", mem / "meta.json")
+    mem.mkdir(parents=True)
+    return mem
+
+def _feed(em: EpisodicMemory) -> None:
+    for outcome in ("green", "green", "green"):
+        em.append(Episode.build({"repo": "r", "file": "src/a.ts", "err_code": "TS2304", "outcome": outcome}))
+    for outcome in ("fail", "fail", "green"):
+        em.append(Episode.build({"repo": "r", "file": "lib/b.ts", "err_code": "TS2307", "outcome": outcome}))
+
+def test_sqlite_backend_matches_jsonl(tmp_path: Path, monkeypatch):
+    mem = _isolate(tmp_path, monkeypatch)
+    monkeypatch.setenv("FORT_MEM_BACKEND", "sqlite")
+    em = EpisodicMemory()
+    assert em.store is not None
+    _feed(em)
+    assert em.promote_rules() == (1, 0)
+    sq_metrics = em.metrics()
+    sq_eps = em._load_episodes()
+    # nada novo → promote não revisita chaves
+    assert em.promote_rules() == (0, 0)
+    assert [r["key"] for r in em._load_rules()] == ["r|TS2304|src"]
+
+    (mem / "rules.json").write_text("[]")
+    monkeypatch.setenv("FORT_MEM_BACKEND", "jsonl")
+    legacy = EpisodicMemory()
+    assert legacy.store is None
+    assert legacy.promote_rules() == (1, 0)
+    assert legacy.metrics() == sq_metrics
+    assert legacy._load_episodes() == sq_eps
+
+def test_importer_reads_rotated_history_once(tmp_path: Path):
+    mem = tmp_path / "memory"
+    mem.mkdir()
+    old = {"ts": "t0", "repo": "r", "file": "src/a.ts", "err_code": "E1", "outcome": "fail", "extras": {}}
+    (mem / "episodes-20250101-000000.jsonl").write_text(json.dumps(old) + "\n")
+    (mem / "episodes.jsonl").write_text(json.dumps({**old, "ts": "t1"}) + "\nnot-json\n")
+    store = EpisodeStore(mem / "episodes.sqlite")
+    paths = jsonl_history(mem)
+    assert [p.name for p in paths] == ["episodes-20250101-000000.jsonl", "episodes.jsonl"]
+    assert sum(store.import_jsonl(paths).values()) == 2
+    assert store.import_jsonl(paths) == {}
+    assert [e["ts"] for e in store.recent()] == ["t0", "t1"]
+    assert store.counters() == {"total": 2, "repeats": 1}
+
+def test_metrics_snapshot_is_incremental(tmp_path: Path, monkeypatch):
+    mem = _isolate(tmp_path, monkeypatch)
+    em = EpisodicMemory()
+    _feed(em)
+    counters = em.store.counters()
+    assert counters["total"] == 6 and counters["repeats"] == 1
+    assert not (mem / "metrics.json").exists()
+    fast = em.metrics()
+    assert fast["repeat_error_rate"] == round(100 / 6, 2)
+    assert read_metrics(mem / "episodes.sqlite") == fast
+
+    # contadores desalinhados (ex.: edição manual) → recompute=True volta à fonte
+    em.store.set_counters({"total": 1, "repeats": 1})
+    assert em.metrics()["repeat_error_rate"] == 100.0
+    assert em.metrics(recompute=True) == fast
+
+    # backend jsonl sem store → recontagem completa com o mesmo resultado
+    monkeypatch.setenv("FORT_MEM_BACKEND", "jsonl")
+    legacy = EpisodicMemory()
+    assert legacy.agg is None and legacy.metrics() == fast
+
+def test_promotion_uses_recent_window_and_resyncs_rules(tmp_path: Path, monkeypatch):
+    mem = _isolate(tmp_path, monkeypatch)
+    monkeypatch.setattr(ep_mod, "PROMOTE_WINDOW", 5)
+    em = EpisodicMemory()
+    build = lambda outcome: Episode.build({"repo": "r", "file": "src/a.ts", "err_code": "TS2304", "outcome": outcome})
+    em.append(build("fail"))
+    for _ in range(3):
+        em.append(build("green"))
+    assert em.promote_rules() == (0, 0)            # falha ainda dentro da janela
+    for _ in range(2):
+        em.append(build("green"))
+    assert em.promote_rules() == (1, 0)            # falha antiga saiu da janela
+    # reset externo do rules.json → promoção completa, mesmo sem episódios novos
+    (mem / "rules.json").write_text("[]")
+    assert em.promote_rules() == (1, 0)
+    (mem / "rules.json").unlink()
+    assert em.promote_rules() == (1, 0)
+    assert [r["key"] for r in em._load_rules()] == ["r|TS2304|src"]
+    assert em.promote_rules() == (0, 0)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.error_taxonomy import KEYWORDS, classify_logs, classify_text
+from llm.providers.router import _classify
+from llm.strategos.scorer_v2 import StrategosV2Graph
+
+LOGS = {
+    "tsc": "src/app.tsx(12,5): error TS2304: Cannot find name 'useState'.\nsrc/b.ts:3:1 - error TS2307: Cannot find module './c'",
+    "vite": "Module not found: Can't resolve './x'\nUncaught ReferenceError: base is not defined",
+    "eslint": "React Hook \"useEffect\" is called in function \"helper\"\nParsing error: Unexpected token\n 1:7 no-unused-vars",
+}
+
+def test_single_pass_extracts_structure():
+    c = classify_logs(LOGS)
+    assert c.codes == ["TS2304", "TS2307"]
+    assert c.symbols == ["useState", "base"]
+    assert c.modules == ["./x", "./c"]
+    assert c.hooks == [("useEffect", "helper")]
+    assert c.parse_errors == ["Unexpected token"]
+    assert c.positions[:2] == [{"file": "src/app.tsx", "line": 12, "col": 5}, {"file": "src/b.ts", "line": 3, "col": 1}]
+    # memo por conteúdo: uma classificação por pedido, mas cada chamador recebe a sua cópia
+    c.codes.append("TS9999")
+    c.hooks.clear()
+    again = classify_logs(LOGS)
+    assert again is not c and again.codes == ["TS2304", "TS2307"] and again.hooks == [("useEffect", "helper")]
+
+@pytest.mark.parametrize("text", [
+    LOGS["tsc"], LOGS["vite"], LOGS["eslint"], "vitest: 2 tests FAILED (assert)", "mypy: type error", "",
+])
+def test_terms_match_substring_semantics(text):
+    low = text.lower()
+    assert classify_text(text).terms == {k for k in KEYWORDS if k in low}
+
+def test_consumers_share_classification():
+    assert _classify({"jest": "3 tests failed"}, {}) == "tests"
+    assert _classify(LOGS, {}) == "types"
+    boosts = StrategosV2Graph()._step_boosts({"build": "Error: Cannot find module 'x'"})
+    assert boosts["build"] == 1.30
+
+def test_unknown_terms_fall_back_to_substring():
+    c = classify_text("Error: Hydration mismatch in <App>")
+    assert c.has("hydration mismatch") and not c.has("not-a-term")
+    assert c.has("not-a-term", "Hydration")
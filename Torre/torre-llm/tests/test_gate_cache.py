@@ -0,0 +1,85 @@
+from __future__ import annotations
+import subprocess
+import sys
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.gate_cache import GateCache, tree_hash
+from llm.ops.guard_apply import run_gates
+
+Q = {"timeout_s": 10, "cpu_seconds": 5, "mem_mb": 256, "max_parallel": 2}
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for args in (["init", "-q"], ["config", "user.email", "dev@local"], ["config", "user.name", "Dev"]):
+        subprocess.run(["git", "-C", str(repo), *args], check=True)
+    (repo / "app.txt").write_text("hello\n")
+    subprocess.run(["git", "-C", str(repo), "add", "app.txt"], check=True)
+    subprocess.run(["git", "-C", str(repo), "commit", "-q", "-m", "init"], check=True)
+    return repo
+
+
+def test_same_tree_is_served_from_cache(tmp_path):
+    repo = _repo(tmp_path)
+    runs = tmp_path / "runs.log"
+    gates = {"tests": ["bash", "-c", f"echo x >> {runs}; grep -q hello app.txt && echo ok"]}
+    cache = GateCache(str(repo))
+
+    res1, red1 = run_gates(str(repo), gates, Q, [], cache=cache)
+    res2, red2 = run_gates(str(repo), gates, Q, [], cache=cache)
+    assert not red1 and not red2
+    assert runs.read_text().count("x") == 1
+    prov = res2["tests"]["cache"]
+    assert prov["hit"] and prov["tree"] == tree_hash(str(repo)) and res2["tests"]["wall_ms"] == 0.0
+    assert res2["tests"]["out"] == res1["tests"]["out"]
+
+    # árvore diferente (alteração não commitada) → miss; índice real intacto
+    (repo / "app.txt").write_text("hello\nworld\n")
+    res3, _ = run_gates(str(repo), gates, Q, [], cache=cache)
+    assert "cache" not in res3["tests"] and runs.read_text().count("x") == 2
+    status = subprocess.run(["git", "-C", str(repo), "status", "--porcelain"], capture_output=True, text=True).stdout
+    assert status.startswith(" M app.txt")
+
+    # bypass explícito: sem cache corre sempre
+    run_gates(str(repo), gates, Q, [])
+    assert runs.read_text().count("x") == 3
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    repo = _repo(tmp_path)
+    cache = GateCache(str(repo), max_age_s=3600, max_bytes=10_000)
+    for i in range(20):
+        cache.put(f"tree{i}", "lint", ["true"], {"rc": 0, "passed": True, "out": "x" * 1000, "err": ""})
+    cache.put("t", "lint", ["true"], {"rc": 0, "passed": False, "cancelled": True})
+    assert cache.get("t", "lint", ["true"]) is None          # cancelados não entram
+    cache.evict()
+    size = sum(p.stat().st_size for p in cache.dir.glob("*/*.json"))
+    assert 0 < size <= 10_000
+    cache.put("fresh", "lint", ["true"], {"rc": 0, "passed": True, "out": "", "err": ""})
+    assert cache.get("fresh", "lint", ["true"])["passed"] is True
+
+    cache.max_age_s = -1
+    assert cache.get("fresh", "lint", ["true"]) is None
+
+
+def test_quotas_in_key_and_short_lived_reds(tmp_path):
+    repo = _repo(tmp_path)
+    cache = GateCache(str(repo), red_max_age_s=3600)
+    green = {"rc": 0, "passed": True, "out": "", "err": ""}
+    cache.put("t", "tests", ["npm", "test"], green, Q)
+    assert cache.get("t", "tests", ["npm", "test"], Q)["passed"] is True
+    # timeout/cpu/mem diferentes podem mudar o veredicto → outra entrada
+    assert cache.get("t", "tests", ["npm", "test"], {**Q, "timeout_s": 1}) is None
+    assert cache.get("t", "tests", ["npm", "test"], {**Q, "max_parallel": 8}) is not None
+
+    red = {"rc": 1, "passed": False, "out": "FAIL", "err": ""}
+    cache.put("t", "lint", ["true"], red, Q)
+    assert cache.get("t", "lint", ["true"], Q)["passed"] is False
+    cache.red_max_age_s = -1                                   # vermelho expira antes do verde
+    assert cache.get("t", "lint", ["true"], Q) is None
+    assert cache.get("t", "tests", ["npm", "test"], Q) is not None
+    cache.red_max_age_s = 0                                    # 0 → vermelhos nunca entram
+    cache.put("t2", "lint", ["true"], red, Q)
+    assert cache.get("t2", "lint", ["true"], Q) is None
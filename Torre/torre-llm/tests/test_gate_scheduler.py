@@ -0,0 +1,54 @@
+from __future__ import annotations
+import sys
+import time
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.guard_apply import run_gates
+
+def sh(script):
+    return ["bash", "-c", script]
+
+Q = {"timeout_s": 10, "cpu_seconds": 5, "mem_mb": 256}
+
+
+def test_independent_gates_run_concurrently(tmp_path):
+    gates = {"lint": sh("sleep 0.4; echo ok"), "types": sh("sleep 0.4; echo ok")}
+    t0 = time.perf_counter()
+    res, red = run_gates(str(tmp_path), gates, {**Q, "max_parallel": 2}, [])
+    assert not red and all(r["passed"] for r in res.values())
+    assert time.perf_counter() - t0 < 0.75
+    assert all(r["wall_ms"] >= 350 and r["queue_ms"] < 100 for r in res.values())
+
+
+def test_tests_reuse_build_output(tmp_path):
+    gates = {"tests": sh("cat dist.txt"), "build": sh("sleep 0.2; echo built > dist.txt")}
+    res, red = run_gates(str(tmp_path), gates, {**Q, "max_parallel": 2}, [])
+    assert not red
+    assert list(res) == ["tests", "build"]            # ordem de declaração
+    assert res["tests"]["out"].strip() == "built"
+
+
+def test_blocking_red_cancels_siblings_and_skips_dependents(tmp_path):
+    gates = {
+        "lint": sh("sleep 5; echo ok"),
+        "types": sh("sleep 0.2; echo 'FAIL types'; exit 1"),
+        "tests": {"cmd": sh("echo ok"), "needs": ["lint"]},
+    }
+    t0 = time.perf_counter()
+    res, red = run_gates(str(tmp_path), gates, {**Q, "max_parallel": 2}, [])
+    assert red and time.perf_counter() - t0 < 2.0
+    assert res["types"]["passed"] is False and not res["types"].get("cancelled")
+    assert res["lint"].get("cancelled") is True
+    assert "tests" not in res
+
+
+def test_non_blocking_red_skips_dependents_and_memory_budget_serializes(tmp_path):
+    gates = {"lint": sh("echo FAIL"), "docs": {"cmd": sh("echo ok"), "needs": ["lint"]},
+             "a": sh("sleep 0.2; echo ok"), "b": sh("sleep 0.2; echo ok")}
+    res, red = run_gates(str(tmp_path), gates, {**Q, "max_parallel": 4, "mem_budget_mb": 256}, [])
+    assert red
+    assert res["docs"]["skipped"] and res["docs"]["reason"] == "needs lint"
+    assert res["a"]["passed"] and res["b"]["passed"]
+    # orçamento de memória = 1 gate de cada vez → b espera por a
+    assert max(res["a"]["queue_ms"], res["b"]["queue_ms"]) >= 150
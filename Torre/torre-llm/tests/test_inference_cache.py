@@ -0,0 +1,100 @@
+from __future__ import annotations
+from pathlib import Path
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.backends.cache import CachedBackend, InferenceCache, read_cache_stats
+
+PATCH = {"temperature": 0.1, "seed": 42}
+PATCH_B = {"temperature": 0.3, "seed": 43}
+
+class CountingBackend:
+    model = "m"
+    def __init__(self) -> None:
+        self.calls = 0
+    def generate(self, system: str, user: str, profile: dict):
+        self.calls += 1
+        return f"out-{self.calls}", {"provider": "dummy"}
+
+def test_deterministic_profile_hits_cache(tmp_path: Path):
+    db = str(tmp_path / "c.sqlite")
+    be = CountingBackend()
+    cb = CachedBackend(be, InferenceCache(db_path=db))
+    assert cb.generate("s", "u", PATCH)[1]["cache"] == "miss"
+    text, meta = cb.generate("s", "u", PATCH)
+    assert (text, meta["cache"], be.calls) == ("out-1", "hit", 1)
+
+    # perfil não-determinístico e bypass explícito não usam cache
+    cb.generate("s", "u", PATCH_B)
+    cb.generate("s", "u", {**PATCH, "cache": False})
+    assert be.calls == 3
+
+    # L2 em disco sobrevive a um novo processo (nova instância)
+    cb2 = CachedBackend(be, InferenceCache(db_path=db))
+    assert cb2.generate("s", "u", PATCH) == ("out-1", {"provider": "dummy", "cache": "hit"})
+    cb.cache.flush(); cb2.cache.close()          # contadores são gravados em lote
+    stats = read_cache_stats(db)
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["hit_rate"] == round(2 / 3, 4)
+
+def test_ttl_and_size_eviction(tmp_path: Path):
+    cache = InferenceCache(db_path=str(tmp_path / "c.sqlite"), max_items=1, max_bytes=10, ttl_s=0.05)
+    cache.put("a", "x" * 8, {})
+    cache.put("b", "y" * 8, {})          # excede 10 bytes → "a" é removido do disco
+    assert read_cache_stats(str(cache.db_path))["entries"] == 1
+    time.sleep(0.06)
+    assert cache.get("b") is None        # expirado
+
+def test_smoke_responses_never_cached(tmp_path: Path, monkeypatch):
+    from llm.backends.openai_compat import OpenAICompat
+    db = str(tmp_path / "c.sqlite")
+    monkeypatch.setenv("LLM_SMOKE", "1")
+    cb = CachedBackend(OpenAICompat(), InferenceCache(db_path=db))
+    text, meta = cb.generate("s", "u", PATCH)
+    assert meta["usage"] == {"mode": "smoke"} and "cache" not in meta
+    # chamada real posterior (mesmo prompt) não pode receber o patch fictício
+    monkeypatch.setenv("LLM_SMOKE", "0")
+    real = CountingBackend()
+    real.base, real.model = cb.backend.base, cb.backend.model
+    cb_real = CachedBackend(real, InferenceCache(db_path=db))
+    assert cb_real.generate("s", "u", PATCH) == ("out-1", {"provider": "dummy", "cache": "miss"})
+    # respostas offline de outros backends também ficam de fora
+    offline = CachedBackend(type("B", (), {"generate": lambda self, s, u, p: ("x", {"usage": {"mode": "smoke"}})})(),
+                            InferenceCache(db_path=db))
+    assert offline.generate("s", "u2", PATCH)[1]["cache"] == "bypass"
+    assert read_cache_stats(db)["entries"] == 1
+
+
+def test_key_includes_endpoint(tmp_path: Path):
+    db = str(tmp_path / "c.sqlite")
+    a, b = CountingBackend(), CountingBackend()
+    a.base, b.base = "http://local:8000/v1", "https://remote/v1"
+    CachedBackend(a, InferenceCache(db_path=db)).generate("s", "u", PATCH)
+    assert CachedBackend(b, InferenceCache(db_path=db)).generate("s", "u", PATCH)[1]["cache"] == "miss"
+
+
+def test_memory_hits_skip_sqlite_and_counters_are_batched(tmp_path: Path, monkeypatch):
+    import sqlite3
+    db = str(tmp_path / "c.sqlite")
+    cache = InferenceCache(db_path=db)
+    cache.put("k", "text", {})
+    def no_sqlite():
+        raise AssertionError("hit L1 tocou no SQLite")
+    monkeypatch.setattr(cache, "_conn", no_sqlite)
+    assert all(cache.get("k") == ("text", {}) for _ in range(50))
+    monkeypatch.undo()
+    assert read_cache_stats(db)["hits"] == 0
+    cache.close()
+    assert read_cache_stats(db)["hits"] == 50
+    with sqlite3.connect(db) as conn:
+        (last_hit,) = conn.execute("SELECT last_hit FROM responses WHERE key='k'").fetchone()
+    assert last_hit > 0
+
+
+def test_cache_db_path_follows_env(tmp_path: Path, monkeypatch):
+    from llm.backends.cache import cache_db_path
+    assert cache_db_path(tmp_path) == tmp_path / ".fortaleza" / "cache" / "inference" / "llm.sqlite"
+    monkeypatch.setenv("LLM_CACHE_DB", str(tmp_path / "elsewhere.sqlite"))
+    assert cache_db_path(tmp_path) == tmp_path / "elsewhere.sqlite"
+    assert InferenceCache().db_path == tmp_path / "elsewhere.sqlite"
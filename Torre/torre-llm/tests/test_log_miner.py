@@ -0,0 +1,115 @@
+import json, os, sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm.optimization.log_miner import LogMiner, approx_tokens
+
+ROOT_CAUSE = "src/app/main.ts(42,7): error TS2304: Cannot find name 'fooBar'."
+
+
+def _ci_log(n=2000):
+    lines = []
+    for i in range(n):
+        lines.append(f"[{i}] Compiling module src/mod{i % 40}.ts in {i % 900 + 1}ms")
+        if i % 7 == 0:
+            lines.append(f"DEBUG cache hit key=abc{i:04x} size={i * 3}")
+    lines.insert(int(n * 0.8), ROOT_CAUSE)
+    lines.append("Build finished with 1 error")
+    return "\n".join(lines)
+
+
+def test_collapses_repetition_and_keeps_root_cause():
+    text = _ci_log()
+    assert ROOT_CAUSE not in text[:2000]
+    out = LogMiner(path=None).compress_text(text, 400)
+    lines = out.splitlines()
+    assert ROOT_CAUSE in lines
+    assert any(l.startswith("[x2000] <*> Compiling module <*> in <*> (ex.: ") for l in lines)
+    assert approx_tokens(out) <= 400 and len(out) < len(text) // 100
+    # ordem original preservada
+    assert lines.index(ROOT_CAUSE) < lines.index("Build finished with 1 error")
+
+
+def test_budget_prefers_errors_over_noise():
+    logs = {"build": "\n".join(f"step {i}: ok-{'x' * (i % 13)}-{chr(97 + i % 26)}" for i in range(300)),
+            "test": "FAILED tests/test_a.py::test_x - AssertionError: 1 != 2"}
+    out = LogMiner(path=None).compress(logs, 40)
+    assert set(out) == {"build", "test"}
+    assert "AssertionError" in out["test"]
+    assert approx_tokens(out["build"] + out["test"]) <= 40 + 2
+
+
+def test_tree_persists_and_novelty_decays(tmp_path):
+    state = tmp_path / "templates.json"
+    m = LogMiner(path=state)
+    hits = {h.render(): h for h in m.mine({"a": "worker 1 started\nworker 2 started\nboom: disk full"})}
+    assert all(h.novel for h in hits.values())
+    m.save()
+    data = json.loads(state.read_text())
+    assert data["runs"] == 1 and len(data["clusters"]) == 2
+    warm = LogMiner(path=state)
+    again = warm.mine({"a": "worker 7 started\nnew failure: exception in handler"})
+    novel = {h.raw: h.novel for h in again}
+    assert novel == {"worker 7 started": False, "new failure: exception in handler": True}
+    assert warm.runs == 2
+
+
+def test_eviction_keeps_most_recent(tmp_path):
+    state = tmp_path / "templates.json"
+    m = LogMiner(path=state, max_clusters=3)
+    words = ["red", "green", "blue", "cyan", "pink", "gold"]
+    for w in words:
+        m.mine({"a": f"{w} alpha beta gamma"})
+    m.save()
+    kept = json.loads(state.read_text())["clusters"]
+    assert [c["template"][0] for c in kept] == ["gold", "pink", "cyan"]
+    assert m.match(["gold", "alpha", "beta", "gamma"]).id == 6
+
+
+def test_prompt_keeps_error_past_old_cut(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORTALEZA_LOG_MINER_STATE", str(tmp_path / "templates.json"))
+    from llm.prompt import build_user_prompt
+    prompt = build_user_prompt({"build": _ci_log()}, {"src/app/main.ts": ""})
+    assert ROOT_CAUSE in prompt and "[x2000]" in prompt
+    assert "\\n" not in prompt.split("### LOGS (amostra)\n", 1)[1].split("### FICHEIROS", 1)[0]
+
+
+def test_state_is_anchored_to_workspace(tmp_path, monkeypatch):
+    from llm.optimization.log_miner import shared_log_miner, state_path
+    ws, elsewhere = tmp_path / "ws", tmp_path / "cwd"
+    elsewhere.mkdir()
+    monkeypatch.delenv("FORTALEZA_LOG_MINER_STATE", raising=False)
+    monkeypatch.chdir(elsewhere)
+    assert state_path(ws) == ws.resolve() / ".fortaleza" / "cache" / "log_templates.json"
+    m = shared_log_miner(workspace=ws)
+    m.mine({"a": "x"})
+    m.save()
+    assert (ws / ".fortaleza" / "cache" / "log_templates.json").exists()
+    assert not (elsewhere / ".fortaleza").exists()
+    assert LogMiner().path is None                      # instância avulsa não persiste
+
+
+def test_compress_is_deterministic_across_calls(tmp_path):
+    m = LogMiner(path=tmp_path / "templates.json")
+    m.mine({"lint": "warning: unused import os"})     # histórico: só parte da entrada já foi vista
+    logs = {"test": "\n".join(f"warning: slow test {i} took {i}ms" for i in range(50)),
+            "lint": "warning: unused import os"}
+    first = m.compress(logs, 22)            # orçamento só cabe um dos dois avisos
+    m.save()
+    again = LogMiner(path=tmp_path / "templates.json")
+    assert again.compress(logs, 22) == first == m.compress(logs, 22)
+    assert bool(first["test"]) != bool(first["lint"])
+
+
+def test_save_merges_state_from_other_processes(tmp_path):
+    state = tmp_path / "templates.json"
+    a, b = LogMiner(path=state), LogMiner(path=state)
+    a.mine({"x": "worker 1 started\nworker 2 started"})
+    b.mine({"x": "worker 3 started\nboom: disk full"})
+    a.save()
+    b.save()                                 # não pode apagar o que `a` gravou
+    a.mine({"x": "worker 4 started"})
+    a.save()
+    data = json.loads(state.read_text())
+    by_tpl = {" ".join(c["template"]): c for c in data["clusters"]}
+    assert by_tpl["worker <*> started"]["count"] == 4 and by_tpl["worker <*> started"]["runs"] == 3
+    assert "boom: disk full" in by_tpl and data["runs"] == 3
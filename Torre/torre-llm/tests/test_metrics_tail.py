@@ -0,0 +1,77 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'metrics', 'exporter'))
+from exporter import MetricsTail, WindowRing
+
+
+def _row(ts=None, eslint=1, codemods=None, duration=10):
+    ts = ts if ts is not None else time.time()
+    return json.dumps({"ts": datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z"),
+                       "step_metrics": {"eslint_resolved": eslint, "codemods_edits": 2},
+                       "duration_ms": duration, "files_changed": 3,
+                       "codemods_per_codemod": codemods or {"rename": 1}}) + "\n"
+
+
+def test_poll_reads_only_new_complete_lines(tmp_path):
+    mf = tmp_path / ".metrics"
+    mf.write_text(_row() * 3 + "not json\n")
+    tail = MetricsTail(str(mf), windows=["5m"], checkpoint=None)
+    assert tail.poll() == 3 and tail.runs_total == 3
+    assert tail.poll() == 0                                  # nada novo → nada relido
+    read = tail.stats["bytes"]
+    partial = _row(eslint=5, duration=99)
+    with mf.open("a") as f:
+        f.write(partial[:20])                                # linha a meio da escrita
+    assert tail.poll() == 0 and tail.stats["bytes"] == read
+    with mf.open("a") as f:
+        f.write(partial[20:])
+    assert tail.poll() == 1
+    assert tail.events_total["eslint_resolved"] == 8 and tail.latest_duration_ms == 99
+    assert tail.codemods_total == {"rename": 4}
+    assert tail.stats["bytes"] == mf.stat().st_size
+
+
+def test_truncation_and_rotation_keep_counters_monotonic(tmp_path):
+    mf = tmp_path / ".metrics"
+    mf.write_text(_row() * 4)
+    tail = MetricsTail(str(mf), windows=["1h"], checkpoint=None)
+    tail.poll()
+    mf.write_text(_row(eslint=10))                           # truncado (mesmo inode, menor)
+    assert tail.poll() == 1 and tail.runs_total == 5 and tail.stats["resets"] == 1
+    rotated = tmp_path / ".metrics.new"
+    rotated.write_text(_row(eslint=100) * 2)
+    os.replace(rotated, mf)                                  # rotação (inode novo)
+    assert tail.poll() == 2 and tail.events_total["eslint_resolved"] == 4 + 10 + 200
+
+
+def test_checkpoint_resumes_without_rereading(tmp_path):
+    mf = tmp_path / ".metrics"
+    cp = tmp_path / "state" / "cp.json"
+    mf.write_text(_row() * 5)
+    first = MetricsTail(str(mf), windows=["5m", "24h"], checkpoint=str(cp), checkpoint_interval_s=0)
+    first.poll()
+    assert cp.exists()
+    with mf.open("a") as f:
+        f.write(_row(eslint=7))
+    again = MetricsTail(str(mf), windows=["5m", "24h"], checkpoint=str(cp))
+    assert again.poll() == 1
+    assert again.runs_total == 6 and again.events_total["eslint_resolved"] == 12
+    assert again.window_sums()["5m"]["eslint_resolved"] == 12
+
+
+def test_window_ring_expires_old_buckets():
+    ring = WindowRing(300, buckets=60)                       # 5m em buckets de 5s
+    now = 1_000_000.0
+    ring.add(now - 3600, (1, 1, 1, 1))                       # fora da janela
+    ring.add(now - 100, (0, 2, 0, 0))
+    ring.add(now, (0, 3, 0, 0))
+    assert ring.total(now)["eslint_resolved"] == 5
+    assert ring.total(now + 200)["eslint_resolved"] == 3
+    assert ring.total(now + 400)["eslint_resolved"] == 0
+    ring.add(now - 10_000, (0, 9, 0, 0))                     # atrasado e já expirado → ignorado
+    assert ring.total(now)["eslint_resolved"] == 5
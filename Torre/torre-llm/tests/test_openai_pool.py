@@ -0,0 +1,112 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.backends.openai_compat import OpenAICompat
+from llm.backends.http_pool import get_pool
+from llm.backends import deadline
+
+DIFF = "```diff\n--- a/README.md\n+++ b/README.md\n@@ -1 +1,2 @@\n A\n+B\n```"
+CONNECTIONS = []
+HANG = threading.Event()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        CONNECTIONS.append(self.client_address)
+
+    def log_message(self, *a):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body.get("messages", [{}])[-1].get("content") == "hang":
+            HANG.wait(5)                      # servidor lento: nunca responde a tempo
+            return
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            # diff em 3 pedaços + lixo depois do fecho (não deve ser lido)
+            for piece in (DIFF[:20], DIFF[20:], "\nTRAILING", "[DONE]"):
+                data = piece if piece == "[DONE]" else json.dumps({"choices": [{"delta": {"content": piece}}]})
+                raw = f"data: {data}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(raw), raw))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        out = json.dumps({"choices": [{"message": {"content": DIFF}}], "usage": {"total_tokens": 3}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+def _serve():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def test_pooled_keepalive_stream_and_async(monkeypatch):
+    srv = _serve()
+    base = f"http://127.0.0.1:{srv.server_address[1]}/v1"
+    monkeypatch.setenv("OPENAI_BASE", base)
+    monkeypatch.setenv("LLM_SMOKE", "0")
+    try:
+        CONNECTIONS.clear()
+        cli = OpenAICompat(pooled=True, stream=False)
+        for _ in range(3):
+            text, meta = cli.generate("s", "u", {"temperature": 0.1})
+            assert text == DIFF and meta["usage"]["total_tokens"] == 3
+        assert len(CONNECTIONS) == 1          # keep-alive: uma só ligação TCP
+        assert get_pool(base, cli.timeout).stats()["reused"] >= 2
+
+        text, meta = OpenAICompat(pooled=True, stream=True).generate("s", "u", {})
+        assert text == DIFF and meta["early_stop"] is True
+
+        text, _ = asyncio.run(cli.agenerate("s", "u", {}))
+        assert text == DIFF
+    finally:
+        srv.shutdown()
+
+def test_budget_bounds_and_cancels_http_calls(monkeypatch):
+    srv = _serve()
+    monkeypatch.setenv("OPENAI_BASE", f"http://127.0.0.1:{srv.server_address[1]}/v1")
+    monkeypatch.setenv("LLM_SMOKE", "0")
+    HANG.clear()
+    try:
+        cli = OpenAICompat(pooled=True, stream=False)
+        # prazo do candidato limita o timeout de socket (o do cliente é 120s)
+        t0 = time.monotonic()
+        with deadline.activate(deadline.Budget(0.3)):
+            try:
+                cli.generate("s", "hang", {})
+                raised = False
+            except (TimeoutError, OSError):
+                raised = True
+        assert raised and time.monotonic() - t0 < 2
+        # cancelamento acorda a leitura bloqueada
+        budget, errors = deadline.Budget(30), []
+        def call():
+            with deadline.activate(budget):
+                try:
+                    cli.generate("s", "hang", {})
+                except Exception as e:
+                    errors.append(e)
+        th = threading.Thread(target=call)
+        th.start()
+        time.sleep(0.2)
+        budget.cancel()
+        th.join(2)
+        assert not th.is_alive() and errors
+    finally:
+        HANG.set()
+        srv.shutdown()
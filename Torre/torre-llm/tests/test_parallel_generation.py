@@ -0,0 +1,97 @@
+from __future__ import annotations
+from pathlib import Path
+import threading
+import time
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm import engine as eng_mod
+from llm.backends.singleflight import SingleFlightBackend
+from llm.execution.reranker import Reranker
+from llm.backends import deadline
+
+PATCH = """```diff
+--- a/README.md
++++ b/README.md
+@@ -1 +1,2 @@
+ A
++B
+```
+"""
+
+class CountingBackend:
+    def __init__(self) -> None:
+        self.calls = 0
+        self._lock = threading.Lock()
+    def generate(self, system: str, user: str, profile: dict):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.05)
+        return PATCH, {"provider": "dummy"}
+
+def test_generators_share_identical_prompts(tmp_path: Path):
+    backend = CountingBackend()
+    shared = SingleFlightBackend(backend)
+    gens = [
+        (lambda n=n: (n, eng_mod.run_inference(tmp_path, {"lint": "x"}, {}, backend=shared)["diff"]))
+        for n in ("base", "lesson", "synth")
+    ]
+    out = Reranker(early_stop=False).run({"lint": "x"}, {}, gens)
+    # 3 geradores × 2 perfis = 6 pedidos → 2 chamadas reais (PATCH, PATCH_B)
+    assert backend.calls == 2
+    assert shared.stats() == {"backend_calls": 2, "deduplicated": 4}
+    assert len(out["candidates"]) == 3
+    assert out["winner"]["ok"] is True
+
+def test_early_stop_and_timeout():
+    def fast():
+        return ("fast", "--- a/README.md\n+++ b/README.md\n@@ -1 +1,2 @@\n A\n+B\n")
+    def slow():
+        time.sleep(1.0)
+        return ("slow", "")
+    out = Reranker(max_workers=1).run({}, {}, [fast, slow])
+    assert out["winner"]["name"] == "fast"
+    assert out["cancelled"] == [1]
+
+    t0 = time.monotonic()
+    out = Reranker(timeout_s=0.2, early_stop=False).run({}, {}, [slow])
+    assert time.monotonic() - t0 < 0.9
+    assert "timeout" in out["candidates"][0]["metrics"]["error"]
+
+def test_timeout_counts_from_each_candidate_start():
+    def stuck():
+        # gerador cooperativo: o orçamento do candidato chega-lhe via contextvars
+        while True:
+            deadline.check()
+            time.sleep(0.01)
+    def fast():
+        time.sleep(0.1)
+        return ("fast", "--- a/README.md\n+++ b/README.md\n@@ -1 +1,2 @@\n A\n+B\n")
+    # 1 lugar: "fast" só arranca depois de "stuck" expirar e ainda tem 0.3s próprios
+    out = Reranker(max_workers=1, timeout_s=0.3, early_stop=False).run({}, {}, [stuck, fast])
+    assert out["winner"]["name"] == "fast" and out["cancelled"] == []
+    assert "timeout" in out["candidates"][-1]["metrics"]["error"]
+
+def test_abandoned_generators_still_count_against_the_limit():
+    lock, now, peak = threading.Lock(), [0], [0]
+    def track(name, secs):
+        def gen():
+            with lock:
+                now[0] += 1
+                peak[0] = max(peak[0], now[0])
+            try:
+                time.sleep(secs)            # não cooperativo: ignora o prazo
+            finally:
+                with lock:
+                    now[0] -= 1
+            return (name, "")
+        return gen
+    out = Reranker(max_workers=2, timeout_s=0.1, early_stop=False).run(
+        {}, {}, [track(f"g{i}", 0.3) for i in range(5)])
+    assert peak[0] == 2                     # expirar não liberta o lugar enquanto a thread vive
+    assert all("timeout" in c["metrics"]["error"] for c in out["candidates"])
+
+def test_explicit_zero_timeout_is_not_replaced_by_env(monkeypatch):
+    monkeypatch.setenv("LLM_GEN_TIMEOUT_S", "150")
+    assert Reranker(timeout_s=0).timeout_s == 0.0
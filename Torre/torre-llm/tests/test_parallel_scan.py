@@ -0,0 +1,66 @@
+from __future__ import annotations
+from pathlib import Path
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.reverse.scanner import scan_files, shared_scan_cache, walk_files
+from llm.reverse.codemap import CodeMap
+import code_index
+from evals.omni_context import OmniContext
+
+def _repo(tmp_path: Path) -> Path:
+    (tmp_path / "src" / "lib").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "src" / "a.ts").write_text("import { b } from './lib/b';\nexport const A = b;\n")
+    (tmp_path / "src" / "lib" / "b.ts").write_text("import React from 'react';\nexport function b() {}\nexport type T = {};\n")
+    (tmp_path / "src" / "util.py").write_text("import os\nfrom src.lib import b\n\ndef helper():\n    pass\n")
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("export const X = 1;\n")
+    (tmp_path / "README.md").write_text("# repo\n")
+    return tmp_path
+
+def test_walker_prunes_ignored_dirs(tmp_path: Path):
+    root = _repo(tmp_path)
+    rels = [r for r, _, _ in walk_files(root, {".ts", ".js", ".py"})]
+    assert rels == ["src/a.ts", "src/lib/b.ts", "src/util.py"]
+
+def test_parallel_scan_matches_serial(tmp_path: Path):
+    root = _repo(tmp_path)
+    rels = [r for r, _, _ in walk_files(root)]
+    serial = scan_files(root, rels, workers=1)
+    parallel = scan_files(root, rels, workers=2, min_parallel=0)
+    assert serial == parallel
+    assert serial["src/lib/b.ts"].exports == ["b", "T"]
+    assert serial["src/lib/b.ts"].imports == ["react"]
+
+def test_consumers_share_scanner(tmp_path: Path):
+    root = _repo(tmp_path)
+    idx = code_index.build_code_index(root)
+    assert idx["files_indexed"] == 2
+    assert idx["by_file"] == {str(root / "src/a.ts"): ["A"], str(root / "src/lib/b.ts"): ["b", "T"]}
+
+    cm = CodeMap(str(root))
+    cm.build()
+    assert ("src/a.ts", "src/lib/b.ts") in cm.edges and cm.files_total == 3
+
+    res = OmniContext(str(root)).analyze_project()
+    assert "node_modules/pkg/index.js" not in res["symbols_map"]
+    assert res["symbols_map"]["src/util.py"] >= {"helper"}
+    assert res["import_graph"]["src/lib/b.ts"] == {"react"}
+
+def test_consumers_share_one_pass(tmp_path: Path):
+    root = _repo(tmp_path)
+    cache = shared_scan_cache(root)
+    code_index.build_code_index(root)
+    scanned = cache.stats["scanned"]
+    assert scanned == 2
+    cm = CodeMap(str(root))
+    cm.build()
+    assert cache.stats["scanned"] == scanned + 1          # só src/util.py é novo para o CodeMap
+    (root / "src" / "a.ts").write_text("export const A2 = 1;\n")
+    assert code_index.build_code_index(root)["by_file"][str(root / "src/a.ts")] == ["A2"]
+    assert cache.stats["scanned"] == scanned + 2
+
+def test_process_pool_uses_spawn():
+    from llm.reverse import scanner
+    assert scanner._scan_pool(2)._mp_context.get_start_method() == "spawn"
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.parsed_diff import ADD, DEL, HEADER, ParsedDiff, parse_diff
+from llm.forensics.impact_analyzer import analyze_diff
+from llm.guardrails.advanced import _collect_added_hunks
+from llm.rerank.execution_reranker import _diff_size, _is_unified_diff
+
+DIFF = """diff --git a/db/q.sql b/db/q.sql
+index 1111111..2222222 100644
+--- a/db/q.sql
++++ b/db/q.sql
+@@ -1,2 +1,2 @@
+--- comentário antigo
++-- comentário novo ção
+ SELECT 1;
+diff --git a/src/new.ts b/src/new.ts
+new file mode 100644
+--- /dev/null
++++ b/src/new.ts
+@@ -0,0 +1,2 @@
++export const a = 1;
++export const b = 2;
+\\ No newline at end of file
+--- a/old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-x = 1
+"""
+
+
+def test_single_pass_model():
+    pd = ParsedDiff(DIFF)
+    assert [(f.old_path, f.new_path) for f in pd.files] == [("db/q.sql", "db/q.sql"), (None, "src/new.ts"), ("old.py", None)]
+    q, new, gone = pd.files
+    # "--- comentário" dentro do hunk é linha removida, não cabeçalho
+    assert q.removed == ["-- comentário antigo"] and q.added == ["-- comentário novo ção"]
+    assert new.is_new and gone.is_deleted and gone.path == "old.py"
+    assert (new.hunks[0].new_start, new.hunks[0].new_len) == (1, 2)
+    assert pd.added_count == 3 and pd.removed_count == 2 and pd.is_unified
+    # offsets em bytes UTF-8 contíguos
+    raw = DIFF.encode()
+    assert q.offset == 0 and q.end == new.offset and gone.end == len(raw)
+    assert raw[new.offset:new.end].decode().startswith("diff --git a/src/new.ts")
+    assert pd.role(3) == HEADER and pd.role(6) == DEL and pd.role(7) == ADD
+    assert pd.file_at(15).path == "src/new.ts"
+
+
+def test_loose_llm_diff_is_tolerated():
+    pd = ParsedDiff("--- a/x.ts\n+++ b/x.ts\n+const a = 1;\n-const b = 2;\n")
+    assert pd.added_by_path() == {"x.ts": ["const a = 1;"]} and pd.removed_count == 1
+    assert not ParsedDiff("só texto\nsem diff\n").is_unified
+
+
+def test_cache_and_consumers_share_one_parse():
+    pd = parse_diff(DIFF)
+    assert parse_diff(DIFF) is pd and parse_diff("".join([DIFF])) is pd and parse_diff(pd) is pd
+    assert _is_unified_diff(pd) and _diff_size(DIFF) == 5
+    assert _collect_added_hunks(pd) == {"db/q.sql": ["-- comentário novo ção"],
+                                        "src/new.ts": ["export const a = 1;", "export const b = 2;"]}
+    files = analyze_diff({}, {}, pd)["files"]
+    assert [(f["path"], f["adds"], f["removes"]) for f in files] == [("db/q.sql", 1, 1), ("src/new.ts", 2, 0), ("old.py", 0, 1)]
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import difflib
+import os
+import random
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.patch_apply import FileContentCache, apply_patch
+
+BASE = "".join(f"line {i}\n" for i in range(1, 41))
+
+
+def _diff(path, old, new, n=3):
+    return "".join(difflib.unified_diff(old.splitlines(True), new.splitlines(True), f"a/{path}", f"b/{path}", n=n))
+
+
+def test_applies_with_offset_and_reports_it():
+    new = BASE.replace("line 20\n", "line 20 changed\n")
+    diff = _diff("f.txt", BASE, new)
+    shifted = "header\nheader\n" + BASE                 # ficheiro real tem 2 linhas a mais
+    res = apply_patch(diff, root=None, files={"f.txt": shifted})
+    assert res.ok and res.contents["f.txt"] == "header\nheader\n" + new
+    h = res.files[0].hunks[0]
+    assert (h.status, h.offset, h.line) == ("offset", 2, 19)
+
+
+def test_fuzz_and_conflicts_per_hunk():
+    new = BASE.replace("line 10\n", "ten\n").replace("line 30\n", "thirty\n")
+    diff = _diff("f.txt", BASE, new)
+    drifted = BASE.replace("line 8\n", "line 8 (edited)\n")      # contexto do 1º hunk mudou numa ponta
+    res = apply_patch(diff, root=None, files={"f.txt": drifted}, max_fuzz=2)
+    assert res.ok and [h.status for h in res.files[0].hunks] == ["fuzz", "applied"]
+    assert "ten\n" in res.contents["f.txt"] and "line 8 (edited)\n" in res.contents["f.txt"]
+
+    broken = BASE.replace("line 30\n", "other\n")
+    res = apply_patch(diff, root=None, files={"f.txt": broken}, max_fuzz=0)
+    assert not res.ok and res.contents == {}
+    assert [h.status for h in res.files[0].hunks] == ["applied", "conflict"]
+    assert res.conflicts == [{"path": "f.txt", "hunk": 1, "reason": "context_mismatch"}]
+    res = apply_patch(diff, root=None, files={"f.txt": new})
+    assert res.conflicts[0]["reason"] == "already_applied"
+
+
+def test_new_deleted_missing_and_eol(tmp_path):
+    (tmp_path / "gone.txt").write_text("a\nb\n")
+    (tmp_path / "crlf.txt").write_bytes(b"x\r\ny\r\n")
+    diff = ("--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,2 @@\n+n1\n+n2\n\\ No newline at end of file\n"
+            "--- a/gone.txt\n+++ /dev/null\n@@ -1,2 +0,0 @@\n-a\n-b\n"
+            "--- a/crlf.txt\n+++ b/crlf.txt\n@@ -1,2 +1,2 @@\n x\n-y\n+z\n"
+            "--- a/nope.txt\n+++ b/nope.txt\n@@ -1 +1 @@\n-q\n+r\n")
+    cache = FileContentCache(tmp_path)
+    res = apply_patch(diff, root=tmp_path, cache=cache)
+    by = {f.path: f for f in res.files}
+    assert by["new.txt"].content == "n1\nn2" and by["new.txt"].created
+    assert by["gone.txt"].ok and by["gone.txt"].deleted and by["gone.txt"].content is None
+    assert by["crlf.txt"].content == "x\r\nz\r\n"
+    assert not by["nope.txt"].ok and by["nope.txt"].reason == "missing"
+    assert (tmp_path / "gone.txt").exists()                       # nada escrito em disco
+    apply_patch(diff, root=tmp_path, cache=cache)
+    assert cache.stats["hits"] >= 2
+
+
+def test_matches_git_apply_on_random_edits(tmp_path):
+    rnd = random.Random(3)
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    for trial in range(25):
+        lines = [f"v{rnd.randrange(8)} {i}\n" for i in range(rnd.randrange(5, 60))]
+        old = "".join(lines)
+        new_lines = list(lines)
+        for _ in range(rnd.randrange(1, 6)):
+            op, i = rnd.randrange(3), rnd.randrange(len(new_lines) + 1)
+            if op == 0:
+                new_lines.insert(i, f"ins {rnd.random():.4f}\n")
+            elif op == 1 and i < len(new_lines):
+                del new_lines[i]
+            elif i < len(new_lines):
+                new_lines[i] = f"mod {rnd.random():.4f}\n"
+        new = "".join(new_lines)
+        diff = _diff("f.txt", old, new, n=rnd.choice([0, 1, 3]))
+        if not diff:
+            continue
+        (tmp_path / "f.txt").write_text(old)
+        ours = apply_patch(diff, root=None, files={"f.txt": old})
+        git = subprocess.run(["git", "apply", "--unidiff-zero", "-"], input=diff, text=True, cwd=tmp_path,
+                             capture_output=True)
+        assert git.returncode == 0, git.stderr
+        assert ours.ok and ours.contents["f.txt"] == (tmp_path / "f.txt").read_text() == new, (trial, diff)
+
+
+def test_preflight_apply_check_uses_real_contents(tmp_path):
+    from llm.simulation.preflight_simulator import PreflightSimulator
+    (tmp_path / "f.txt").write_text(BASE)
+    sim = PreflightSimulator(repo_root=str(tmp_path))
+    good = _diff("f.txt", BASE, BASE.replace("line 5\n", "five\n"))
+    check = sim._check_git_apply(good)
+    assert check.passed and "1 hunks" in check.details
+    bad = _diff("f.txt", BASE.replace("line 5\n", "zzz\n"), BASE.replace("line 5\n", "five\n"))
+    check = sim._check_git_apply(bad)
+    assert not check.passed and "Conflito em f.txt hunk #1: context_mismatch" in check.details
+    # buffers do editor têm prioridade sobre o disco
+    res = sim.simulate_preflight(bad, ["f.txt"], {}, files={"f.txt": BASE.replace("line 5\n", "zzz\n")})
+    assert "git_apply_check" not in res.failing_checks
+
+
+def test_paths_confined_to_root(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    (tmp_path / "secret.txt").write_text("top secret\n")
+    (root / "link").symlink_to(tmp_path)
+    for path in ("/etc/passwd", "../secret.txt", "x/../../secret.txt", "link/secret.txt"):
+        diff = f"--- a/{path.lstrip('/')}\n+++ {path}\n@@ -1,1 +1,1 @@\n-top secret\n+x\n"
+        res = apply_patch(diff, root=str(root))
+        assert not res.ok and res.contents == {}
+        assert res.conflicts == [{"path": path, "hunk": None, "reason": "outside_root"}]
+    # também sem raiz (só buffers) e em ficheiros novos
+    res = apply_patch("--- /dev/null\n+++ b/../evil.txt\n@@ -0,0 +1,1 @@\n+x\n", root=None)
+    assert not res.ok and res.conflicts[0]["reason"] == "outside_root"
+    res = apply_patch("--- /etc/passwd\n+++ /etc/passwd\n@@ -0,0 +1,1 @@\n+x\n", root=str(root))
+    assert not res.ok and res.contents == {} and res.conflicts[0]["reason"] == "outside_root"
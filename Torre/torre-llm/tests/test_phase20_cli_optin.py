@@ -1,15 +1,21 @@
 import os, json, subprocess, sys
 
-def run_cli(payload: dict, env: dict):
-    p = subprocess.Popen([sys.executable, "-m", "llm.cli"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+def run_cli(payload: dict, env: dict, cwd: str | None = None):
+    if cwd is not None:
+        env["PYTHONPATH"] = os.path.abspath(ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    p = subprocess.Popen([sys.executable, "-m", "llm.cli"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, cwd=cwd)
     out, err = p.communicate(json.dumps(payload), timeout=10)
     return p.returncode, out, err
 
-def test_cli_providers_optin_smoke():
+def test_cli_providers_optin_smoke(tmp_path):
     payload = {"logs":{"types":"TS2307: Cannot find module ./x.css"}, "files":{"src/App.tsx":"console.log(1)"}}
     env = os.environ.copy()
     env["PROVIDERS_V1"] = "1"
-    code, out, err = run_cli(payload, env)
+    # estado da CLI (cache de inferência, memória, templates de logs) em tmp, não no repo
+    env["LLM_CACHE_DB"] = str(tmp_path / "llm.sqlite")
+    code, out, err = run_cli(payload, env, cwd=str(tmp_path))
     assert code == 0
     data = json.loads(out or "{}")
     # tolerante: só checa que o bloco providers existe quando opt-in
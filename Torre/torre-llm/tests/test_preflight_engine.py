@@ -0,0 +1,130 @@
+import os, sys, threading, time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from llm.simulation import preflight_simulator as ps
+from llm.simulation.preflight_simulator import PreflightCheck, PreflightSimulator, clear_preflight_cache
+
+BASE = "".join(f"line {i}\n" for i in range(1, 11))
+DIFF = "--- a/f.py\n+++ b/f.py\n@@ -4,3 +4,3 @@\n line 4\n-line 5\n+five\n line 6\n"
+
+
+def _sim(tmp_path, **kw):
+    (tmp_path / "f.py").write_text(BASE)
+    clear_preflight_cache()
+    return PreflightSimulator(repo_root=str(tmp_path), **kw)
+
+
+def test_default_checks_and_latency(tmp_path):
+    sim = _sim(tmp_path)
+    res = sim.simulate_preflight(DIFF, ["f.py"], {})
+    assert res.preflight_ok and not res.cache_hit
+    assert [c.name for c in res.checks] == sim.required_checks
+    assert set(res.latency_ms) == set(sim.required_checks)
+    assert all(c.duration_ms >= 0 for c in res.checks) and res.wall_ms > 0
+
+
+def test_independent_checks_run_concurrently(tmp_path, monkeypatch):
+    if ps.WORKERS < 2:
+        monkeypatch.setattr(ps, "WORKERS", 4)
+    sim = _sim(tmp_path, use_cache=False)
+    seen = []
+
+    def slow(name):
+        def fn(ctx):
+            seen.append(threading.current_thread().name)
+            time.sleep(0.2)
+            return PreflightCheck(name, True, "ok", 0)
+        return fn
+    for name in ("slow_a", "slow_b", "slow_c"):
+        sim.register_check(name, slow(name), backend="sleep")
+    t0 = time.perf_counter()
+    res = sim.simulate_preflight(DIFF, ["f.py"], {})
+    assert time.perf_counter() - t0 < 0.5
+    assert all(res.latency_ms[n] >= 190 for n in ("slow_a", "slow_b", "slow_c"))
+    assert len(set(seen)) > 1
+
+
+def test_needs_order_and_post_patch_contents(tmp_path):
+    sim = _sim(tmp_path, use_cache=False)
+    order = []
+    sim.register_check("first", lambda ctx: order.append("first") or PreflightCheck("first", True, "", 0),
+                       backend="order")
+    sim.register_check("second", lambda ctx: order.append("second") or
+                       PreflightCheck("second", "five\n" in ctx.post_contents()["f.py"], "", 0), needs=("first",),
+                       backend="order")
+    res = sim.simulate_preflight(DIFF, ["f.py"], {})
+    assert order == ["first", "second"] and res.preflight_ok
+
+
+def test_replace_heuristic_with_real_backend_and_errors(tmp_path):
+    sim = _sim(tmp_path, use_cache=False)
+    sim.register_check("lint_incremental", lambda ctx: PreflightCheck("lint_incremental", False, "E501", 0),
+                       backend="ruff")
+    sim.register_check("boom", lambda ctx: 1 / 0, backend="boom")
+    res = sim.simulate_preflight(DIFF, ["f.py"], {})
+    assert [c.name for c in res.checks][2] == "lint_incremental"     # mantém a posição
+    assert res.failing_checks == ["lint_incremental", "boom"]
+    assert "Erro no check" in res.checks[-1].details
+
+
+def test_results_memoized_by_diff_and_base(tmp_path):
+    sim = _sim(tmp_path)
+    calls = []
+    sim.register_check("count", lambda ctx: calls.append(1) or PreflightCheck("count", True, "", 0), backend="count")
+    first = sim.simulate_preflight(DIFF, ["f.py"], {})
+    again = PreflightSimulator(repo_root=str(tmp_path))
+    again.register_check("count", lambda ctx: calls.append(1) or PreflightCheck("count", True, "", 0), backend="count")
+    second = again.simulate_preflight(DIFF, ["f.py"], {})
+    assert len(calls) == 1 and second.cache_hit and all(c.cached for c in second.checks)
+    assert second.failing_checks == first.failing_checks
+    # base diferente (ficheiro alterado, base explícita ou buffer) → recalcula
+    (tmp_path / "f.py").write_text(BASE.replace("line 5\n", "zzz\n"))
+    third = sim.simulate_preflight(DIFF, ["f.py"], {})
+    assert not third.cache_hit and "git_apply_check" in third.failing_checks
+    sim.simulate_preflight(DIFF, ["f.py"], {}, base="tree-1")
+    sim.simulate_preflight(DIFF, ["f.py"], {}, files={"f.py": BASE})
+    assert len(calls) == 4
+
+
+def test_typecheck_key_tracks_whole_ts_project(tmp_path):
+    (tmp_path / "a.ts").write_text(BASE)
+    (tmp_path / "dep.ts").write_text("export const x = 1;\n")
+    sim = _sim(tmp_path)
+    diff = DIFF.replace("f.py", "a.ts")
+    assert not sim.simulate_preflight(diff, ["a.ts"], {}).cache_hit
+    assert sim.simulate_preflight(diff, ["a.ts"], {}).cache_hit
+    # dependência importada mudou (o diff não lhe toca) → o typecheck memorizado já não vale
+    (tmp_path / "dep.ts").write_text("export const x: string = 1;\n")
+    assert not sim.simulate_preflight(diff, ["a.ts"], {}).cache_hit
+    # base explícita continua a ser a chave
+    assert not sim.simulate_preflight(diff, ["a.ts"], {}, base="tree-1").cache_hit
+    (tmp_path / "dep.ts").write_text("export const y = 2;\n")
+    assert sim.simulate_preflight(diff, ["a.ts"], {}, base="tree-1").cache_hit
+
+
+def test_register_check_requires_backend(tmp_path):
+    sim = _sim(tmp_path)
+    with pytest.raises(TypeError):
+        sim.register_check("x", lambda ctx: PreflightCheck("x", True, "", 0))
+    with pytest.raises(ValueError):
+        sim.register_check("x", lambda ctx: PreflightCheck("x", True, "", 0), backend="")
+
+
+def test_dependents_of_a_failed_check_are_skipped(tmp_path, monkeypatch):
+    for workers in (1, 4):
+        monkeypatch.setattr(ps, "WORKERS", workers)
+        sim = _sim(tmp_path, use_cache=False)
+        ran = []
+        sim.register_check("typecheck_incremental", lambda ctx: ran.append(1) or
+                           PreflightCheck("typecheck_incremental", True, "", 0), needs=("git_apply_check",),
+                           backend="tsserver")
+        sim.register_check("after", lambda ctx: ran.append(2) or PreflightCheck("after", True, "", 0),
+                           needs=("typecheck_incremental",), backend="order")
+        res = sim.simulate_preflight(DIFF.replace("-line 5", "-nope"), ["f.py"], {})
+        by_name = {c.name: c for c in res.checks}
+        assert ran == [] and not res.preflight_ok
+        assert by_name["typecheck_incremental"].skipped and by_name["after"].skipped   # transitivo
+        assert res.failing_checks == ["git_apply_check"]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+import random
+import sys
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.quantile_sketch import ALL, LatencySketch, SketchStore, load_sketches
+from llm.ops.trace_store import TraceStore, _day
+
+
+def _exact(values, q):
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]
+
+
+def test_quantiles_within_relative_error_and_merge_is_exact():
+    rnd = random.Random(7)
+    values = [rnd.lognormvariate(4, 1) for _ in range(20000)]
+    a, b, whole = LatencySketch(), LatencySketch(), LatencySketch()
+    for i, v in enumerate(values):
+        (a if i % 2 else b).add(v)
+        whole.add(v)
+    merged = LatencySketch().merge(a).merge(b)
+    assert merged.buckets == whole.buckets and merged.count == whole.count
+    for q in (0.5, 0.95, 0.99):
+        assert abs(merged.quantile(q) - _exact(values, q)) / _exact(values, q) <= 0.02
+    assert len(merged.buckets) < 1000                       # compacto, independente de n
+    back = LatencySketch.from_dict(merged.to_dict())
+    assert back.summary() == merged.summary()
+
+
+def test_store_merges_processes_and_days(tmp_path):
+    s1 = SketchStore(tmp_path)
+    for v in range(1, 101):
+        s1.observe("/a", v, "20260101")
+    s1.persist()
+    # outro processo (pid vivo diferente) no mesmo dia + outro dia
+    s2 = SketchStore(tmp_path)
+    s2.pid = s1.pid + 1 if s1.pid + 1 != os.getpid() else s1.pid + 2
+    s2._days["20260101"] = {}
+    for v in range(101, 201):
+        s2.observe("/b", v, "20260101")
+    s2.observe("/a", 5, "20260102")
+    s2.persist()
+    day = load_sketches(tmp_path, ["20260101"])
+    assert day[ALL].count == 200 and day["/a"].count == 100 and day["/b"].count == 100
+    both = load_sketches(tmp_path, ["20260101", "20260102"])
+    assert both["/a"].count == 101
+    assert abs(day[ALL].quantile(0.5) - 100) <= 2
+
+
+def test_trace_store_feeds_sketches(tmp_path):
+    store = TraceStore(tmp_path, fsync_interval_s=0.01)
+    try:
+        for i in range(1, 1001):
+            store.log({"endpoint": "/strategos/plan", "latency_ms": i})
+        assert store.flush()
+    finally:
+        store.close()
+    sk = load_sketches(tmp_path, [_day()])
+    assert sk["/strategos/plan"].count == 1000
+    assert abs(sk[ALL].quantile(0.95) - 950) / 950 <= 0.02
@@ -0,0 +1,59 @@
+from __future__ import annotations
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.sandbox import SandboxPool
+
+
+def test_shims_are_shared_and_network_is_blocked():
+    pool = SandboxPool(max_workers=4)
+    rc, _, err = pool.run(["curl", "https://example.com"], timeout_s=5)
+    assert rc != 0 and "network disabled" in err
+    shims = pool.shim_dir()
+    rc, out, _ = pool.run(["bash", "-c", "command -v wget"], timeout_s=5)
+    assert rc == 0 and out.strip() == os.path.join(shims, "wget")
+    assert pool.shim_dir() == shims and os.path.isdir(shims)   # não é recriado por execução
+
+
+def test_concurrent_runs_are_bounded_and_measured(tmp_path):
+    pool = SandboxPool(max_workers=4)
+    log = tmp_path / "spans.log"
+    cmd = [sys.executable, "-c", "import time; s = time.time(); time.sleep(0.3); print('ok'); "
+           f"open({str(log)!r}, 'a').write(f'{{s}} {{time.time()}}\\n')"]
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        res = list(ex.map(lambda _: pool.run(cmd, timeout_s=10, mem_mb=1024), range(8)))
+    assert all(r[0] == 0 and r[1].strip() == "ok" for r in res)
+    # pico de execuções simultâneas: há paralelismo, mas nunca acima das 4 vagas
+    events = sorted(ev for l in log.read_text().splitlines()
+                    for ev in ((float(l.split()[0]), 1), (float(l.split()[1]), -1)))
+    live = peak = 0
+    for _, d in events:
+        live += d
+        peak = max(peak, live)
+    assert len(events) == 16 and 2 <= peak <= 4
+    m = pool.stats()
+    assert m["runs"] == 8 and m["avg_overhead_ms"] > 0 and m["avg_queue_ms"] > 0
+
+
+def test_limits_still_apply():
+    pool = SandboxPool(max_workers=1)
+    rc, _, _ = pool.run([sys.executable, "-c", "while True: pass"], timeout_s=10, cpu_seconds=1)
+    assert rc != 0                                 # SIGXCPU/SIGKILL pelo RLIMIT_CPU
+    rc, _, err = pool.run(["sleep", "5"], timeout_s=0.2)
+    assert (rc, err) == (124, "timeout") and pool.stats()["timeouts"] == 1
+
+
+def test_limits_in_place_before_exec():
+    # o comando (e netos) já nasce com os limites: nunca há janela "unlimited" após o exec
+    pool = SandboxPool(max_workers=4)
+    cmd = ["bash", "-c", "cat /proc/self/limits; (cat /proc/self/limits)"]
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        res = list(ex.map(lambda _: pool.run(cmd, timeout_s=10, cpu_seconds=7, nofile=512), range(40)))
+    for rc, out, _ in res:
+        cpu = [l for l in out.splitlines() if l.startswith("Max cpu time")]
+        files = [l for l in out.splitlines() if l.startswith("Max open files")]
+        assert rc == 0 and len(cpu) == 2
+        assert all(l.split()[3:5] == ["7", "7"] for l in cpu)
+        assert all(l.split()[3:5] == ["512", "512"] for l in files)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.speculative import SpeculativeEvaluator, WorktreePool, speculative_apply
+
+# gate lento (0.4s) que só passa se o candidato escreveu "good"
+GATES = {"tests": ["bash", "-c", "sleep 0.4; grep -q good app.txt && echo ok || echo FAIL"]}
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", "-C", str(cwd), *args], capture_output=True, text=True, check=True).stdout
+
+
+def _repo(tmp_path):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _git(repo, "init", "-q")
+    _git(repo, "config", "user.email", "dev@local")
+    _git(repo, "config", "user.name", "Dev")
+    (repo / "app.txt").write_text("hello\n")
+    _git(repo, "add", "app.txt")
+    _git(repo, "commit", "-q", "-m", "init")
+    return repo
+
+
+def _diff(line: str) -> str:
+    return ("--- a/app.txt\n+++ b/app.txt\n@@ -1 +1,2 @@\n hello\n" f"+{line}\n")
+
+
+CANDIDATES = [_diff("bad one"), _diff("good"), _diff("bad two")]
+
+
+def test_candidates_are_evaluated_concurrently_in_worktrees(tmp_path):
+    repo = _repo(tmp_path)
+    log = tmp_path / "gate.log"
+    # mesmo gate, mas cada execução regista início/fim (relógio de parede partilhado)
+    gates = {"tests": ["bash", "-c", f"s=$(date +%s.%N); {GATES['tests'][2]}; echo $s $(date +%s.%N) >> {log}"]}
+    pool = WorktreePool(str(repo), size=3, base_dir=str(tmp_path / "wt"))
+    ev = SpeculativeEvaluator(str(repo), gates=gates, quotas={"timeout_s": 10}, pool=pool)
+    try:
+        ev.evaluate([_diff("warm-up")])  # cria os slots (custo único; árvore fora da cache dos gates)
+        log.unlink()
+        results = ev.evaluate(CANDIDATES)
+        assert [r.passed for r in results] == [False, True, False]
+        spans = [tuple(map(float, l.split())) for l in log.read_text().splitlines()]
+        assert len(spans) == 3
+        assert max(s for s, _ in spans) < min(e for _, e in spans)   # os 3 gates sobrepõem-se
+        assert ev.select(results).index == 1
+        assert (repo / "app.txt").read_text() == "hello\n"   # workspace real intacto
+    finally:
+        pool.close()
+
+
+def test_speculative_apply_lands_only_the_winner(tmp_path, monkeypatch):
+    monkeypatch.setenv("FORTALEZA_WORKTREES_DIR", str(tmp_path / "wt"))
+    repo = _repo(tmp_path)
+    res = speculative_apply(str(repo), CANDIDATES, gates=GATES, quotas={"timeout_s": 10})
+    assert res["ok"] and res["selected_index"] == 1
+    assert (repo / "app.txt").read_text() == "hello\ngood\n"
+    assert "[fortaleza] apply candidate" in _git(repo, "log", "-1", "--format=%s")
+    assert not (repo / ".fortaleza" / "locks" / "rollback.lock").exists()
+
+    # nenhum verde → nada aplicado, sem revert nem lock
+    res = speculative_apply(str(repo), [_diff("bad"), "not a diff"], gates=GATES, quotas={"timeout_s": 10})
+    assert not res["ok"] and res["selected_index"] is None
+    assert [c["stage"] for c in res["candidates"]] == ["apply", "apply"]
+    assert (repo / "app.txt").read_text() == "hello\ngood\n"
+
+
+def test_slot_reset_is_checked_and_closes_slot_services(tmp_path):
+    from llm.ops import ts_service
+    repo = _repo(tmp_path)
+    (repo / ".gitignore").write_text("dist/\n")
+    _git(repo, "add", ".gitignore")
+    _git(repo, "commit", "-q", "-m", "ignore")
+    head = _git(repo, "rev-parse", "HEAD").strip()
+    pool = WorktreePool(str(repo), size=1, base_dir=str(tmp_path / "wt"))
+    closed = []
+
+    class FakeService:
+        def refresh(self):
+            pass
+
+        def close(self):
+            closed.append(True)
+
+    try:
+        with pool.acquire(head) as slot:
+            (Path(slot) / "dist").mkdir()
+            (Path(slot) / "dist" / "out.js").write_text("stale")
+        with pool.acquire(head) as slot:
+            assert not (Path(slot) / "dist").exists()   # ignorados também saem no reset
+        # alterações do workspace que não aplicam → erro, não um slot meio preparado
+        with pytest.raises(RuntimeError):
+            with pool.acquire(head, base_patch=_diff("x").replace("hello", "absent")):
+                pass
+        ts_service._SERVICES[str(Path(slot).resolve())] = FakeService()
+    finally:
+        pool.close()
+    assert closed == [True]
+    assert str(Path(slot).resolve()) not in ts_service._SERVICES
+
+
+def test_slots_see_untracked_workspace_files(tmp_path):
+    repo = _repo(tmp_path)
+    (repo / "helper.txt").write_text("good\n")          # módulo novo, ainda não seguido
+    gates = {"tests": ["bash", "-c", "grep -q good helper.txt && grep -q good app.txt && echo ok || echo FAIL"]}
+    pool = WorktreePool(str(repo), size=1, base_dir=str(tmp_path / "wt"))
+    ev = SpeculativeEvaluator(str(repo), gates=gates, quotas={"timeout_s": 10}, pool=pool, use_cache=False)
+    try:
+        [res] = ev.evaluate([_diff("good")])
+        assert res.passed                                # mesmo tree que commit_diff comitaria
+        assert _git(repo, "status", "--porcelain") == "?? helper.txt\n"   # índice real intacto
+    finally:
+        pool.close()
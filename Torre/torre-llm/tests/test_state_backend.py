@@ -0,0 +1,77 @@
+from __future__ import annotations
+import multiprocessing as mp
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.state_backend import MemoryBackend, SQLiteBackend, make_state_backend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    b = make_state_backend(request.param, tmp_path / "state.sqlite")
+    yield b
+    b.close()
+
+
+def test_primitives(backend):
+    assert backend.get("badge") is None and backend.get("badge", {}) == {}
+    backend.set("badge", {"mode": "PATCH", "n": 1})
+    assert backend.get("badge") == {"mode": "PATCH", "n": 1}
+
+    assert [backend.incr_window("rate:ip|/x", 60, now=120.0) for _ in range(3)] == [1, 2, 3]
+    assert backend.incr_window("rate:ip|/x", 60, now=180.5) == 1           # nova janela
+    assert backend.incr_window("rate:other", 60, now=180.5) == 1
+
+    for i in range(60):
+        backend.push_capped("events", {"i": i}, cap=50)
+    assert [e["i"] for e in backend.recent("events", 3)] == [57, 58, 59]
+    assert len(backend.recent("events", 100)) == 50
+
+    for t in (0.0, 1000.0, 3000.0, 3500.0):
+        backend.mark("posts", keep_s=3600, now=t)
+    assert backend.count_since("posts", 3600, now=3600.0) == 4
+    assert backend.count_since("posts", 3600, now=4500.0) == 3
+    backend.mark("posts", keep_s=3600, now=4700.0)                          # poda < 1100
+    assert backend.count_since("posts", 10_000, now=4700.0) == 3
+
+
+def _hammer(path: str, n: int) -> None:
+    b = SQLiteBackend(path)
+    for _ in range(n):
+        b.incr_window("rate:shared", 3600, now=7200.0)
+        b.push_capped("events", {"pid": os.getpid()}, cap=50)
+        b.mark("posts", keep_s=3600, now=7200.0)
+    b.close()
+
+
+def test_sqlite_is_consistent_across_processes(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    SQLiteBackend(path).close()
+    procs = [mp.get_context("spawn").Process(target=_hammer, args=(path, 100)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    b = SQLiteBackend(path)
+    assert b.incr_window("rate:shared", 3600, now=7200.0) == 401          # nenhum incremento perdido
+    assert len(b.recent("events", 1000)) == 50
+    assert b.count_since("posts", 60, now=7200.0) == 400
+
+
+def test_default_backend_is_sqlite(monkeypatch, tmp_path):
+    # uvicorn --workers N não define WEB_CONCURRENCY: o default não pode depender dele
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setenv("REPO_ROOT", str(tmp_path))
+    monkeypatch.delenv("FORTALEZA_STATE_DB", raising=False)
+    b = make_state_backend("")
+    assert isinstance(b, SQLiteBackend) and b.path == tmp_path / ".fortaleza" / "state" / "server.sqlite"
+    assert isinstance(make_state_backend("memory"), MemoryBackend)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    with pytest.raises(ValueError):
+        make_state_backend("memory")              # estado por worker → falha à cabeça
+    with pytest.raises(ValueError):
+        make_state_backend("redis")
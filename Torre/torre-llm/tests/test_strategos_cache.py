@@ -0,0 +1,39 @@
+from __future__ import annotations
+import random
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.strategos import scorer_v2
+from llm.strategos.scorer_v2 import StrategosV2Graph
+
+def _graph(n: int = 60, seed: int = 7) -> dict:
+    rnd = random.Random(seed)
+    ids = [f"src/{'core/' if i % 5 == 0 else ''}m{i}.ts" for i in range(n)]
+    edges = [{"from": rnd.choice(ids), "to": rnd.choice(ids)} for _ in range(n * 3)]
+    return {"nodes": [{"id": p} for p in ids], "edges": edges}
+
+def test_cached_plan_matches_full_sort():
+    g = _graph()
+    eps = [{"file": f"src/m{i % 7}.ts", "ts": str(i)} for i in range(20)]
+    files = {"src/m3.ts": "x\n" * 150, "src/core/m10.ts": "y\n" * 10}
+    logs = {"tsc": "TS2304: Cannot find name 'x'"}
+    expected = StrategosV2Graph().plan(g, logs, files, eps, top_k=6)   # sem versão → sem cache
+    versioned = {**g, "root": "/r", "version": 1}
+    before = dict(scorer_v2.PRECOMP_STATS)
+    for _ in range(3):
+        assert StrategosV2Graph().plan(versioned, logs, files, eps, top_k=6) == expected
+    assert scorer_v2.PRECOMP_STATS["misses"] - before["misses"] == 1
+    assert scorer_v2.PRECOMP_STATS["hits"] - before["hits"] == 2
+    # files_ctx vazio → custo neutro para todos; continua igual ao caminho completo
+    assert StrategosV2Graph().plan(versioned, logs, {}, eps, top_k=4) == StrategosV2Graph().plan(g, logs, {}, eps, top_k=4)
+
+def test_new_episode_or_version_invalidates():
+    g = {**_graph(20), "root": "/r2", "version": 1}
+    eps = [{"file": "src/m1.ts", "ts": "1"}]
+    before = scorer_v2.PRECOMP_STATS["misses"]
+    sg = StrategosV2Graph()
+    sg.plan(g, {}, {}, eps)
+    sg.plan(g, {}, {}, eps + [{"file": "src/m2.ts", "ts": "2"}])
+    sg.plan({**g, "version": 2}, {}, {}, eps)
+    assert scorer_v2.PRECOMP_STATS["misses"] - before == 3
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from pathlib import Path
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.reverse.symbol_index import SymbolIndex, import_statement
+from llm.providers.adapters.vanguard_fix import VanguardFixAdapter
+from strategies import ts_codemods
+
+def _repo(tmp_path: Path) -> Path:
+    (tmp_path / "src" / "utils").mkdir(parents=True)
+    (tmp_path / "src" / "utils" / "format.ts").write_text(
+        "export function formatDate(d: Date) { return d; }\nexport interface DateOpts {}\n")
+    (tmp_path / "src" / "Button.tsx").write_text("export default function Button() { return null; }\n")
+    (tmp_path / "src" / "app.ts").write_text("const x = formatDate(new Date());\n")
+    return tmp_path
+
+def test_lookup_prefix_fuzzy_and_incremental(tmp_path: Path):
+    root = _repo(tmp_path)
+    idx = SymbolIndex(str(root))
+    assert idx.refresh()["reparsed"] == 3
+    [hit] = idx.lookup("formatDate")
+    assert (hit.file, hit.kind, hit.style) == ("src/utils/format.ts", "function", "named")
+    assert idx.prefix("format") == ["formatDate"]
+    assert idx.fuzzy("fromatDate") == ["formatDate"]
+    assert idx.resolve("button").style == "default"
+    assert import_statement(hit, "src/app.ts") == "import { formatDate } from './utils/format'"
+
+    # reabrir noutro "processo" não re-parseia nada; alterar um ficheiro só re-parseia esse
+    again = SymbolIndex(str(root))
+    assert again.lookup("DateOpts")[0].kind == "interface"
+    assert again.refresh()["reparsed"] == 0
+    (root / "src" / "utils" / "format.ts").write_text("export const parseDate = 1;\n")
+    assert again.refresh()["reparsed"] == 1
+    assert again.lookup("formatDate") == [] and again.lookup("parseDate")
+
+def test_consumers_use_index(tmp_path: Path, monkeypatch):
+    root = _repo(tmp_path)
+    assert ts_codemods._guess_file_for_symbol(root, "formatDate") == root / "src/utils/format.ts"
+    monkeypatch.chdir(root)
+    line = VanguardFixAdapter()._find_correct_import("formatDate", "", "src/app.ts")
+    assert line == "import { formatDate } from './utils/format'"
+
+def test_fuzzy_hits_are_only_suggested(tmp_path: Path, monkeypatch):
+    root = _repo(tmp_path)
+    (root / "src" / "testutil.ts").write_text(
+        "export const expected = 1;\nexport function progress() {}\nexport const Item = 1;\nexport const ITEM = 2;\n")
+    idx = SymbolIndex(str(root))
+    idx.refresh()
+    assert idx.resolve("expect") is None and idx.resolve("process") is None
+    assert idx.resolve("item") is None                                # case-insensitive ambíguo
+    assert idx.resolve("formatdate").symbol == "formatDate"           # case-insensitive único
+    monkeypatch.chdir(root)
+    adapter, analysis = VanguardFixAdapter(), {}
+    line = adapter._find_correct_import("expect", "", "src/app.ts", analysis)
+    assert " as " not in line and "expected" not in line
+    assert "expected" in analysis["advisory"]
+    line = adapter._find_correct_import("formatdate", "", "src/app.ts")
+    assert line == "import { formatDate } from './utils/format'"
@@ -0,0 +1,112 @@
+from __future__ import annotations
+import gzip
+import json
+import sys
+import time
+
+import pytest
+
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops.trace_store import TraceStore, _day
+
+
+def _rec(i, endpoint="/strategos/plan"):
+    return {"ts": f"t{i}", "trace_id": f"id{i}", "endpoint": endpoint, "latency_ms": i, "req_bytes": 40, "res_bytes": 80}
+
+
+def test_log_is_non_blocking_and_batched(tmp_path):
+    store = TraceStore(tmp_path, fsync_interval_s=0.05)
+    try:
+        t0 = time.perf_counter()
+        for i in range(2000):
+            store.log(_rec(i, "/a" if i % 2 else "/b"))
+        assert time.perf_counter() - t0 < 0.5
+        # índice em memória imediato (badge O(1))
+        assert store.latest()["trace_id"] == "id1999"
+        assert [r["trace_id"] for r in store.tail("/a", 2)] == ["id1997", "id1999"]
+        assert store.flush()
+        lines = (tmp_path / f"trace-{_day()}.jsonl").read_text().splitlines()
+        assert len(lines) == 2000 and json.loads(lines[-1])["trace_id"] == "id1999"
+        assert store.stats["batches"] < 2000
+    finally:
+        store.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    store = TraceStore(tmp_path, max_queue=1)
+    store.close()                      # writer parado → a fila enche
+    assert store.log(_rec(1)) is True
+    assert store.log(_rec(2)) is False
+    assert store.stats["dropped"] == 1 and store.latest()["trace_id"] == "id2"
+
+
+def test_old_days_are_compressed_and_latest_survives_restart(tmp_path):
+    old = tmp_path / "trace-20000101.jsonl"
+    old.write_text(json.dumps(_rec(0)) + "\n")
+    store = TraceStore(tmp_path)
+    try:
+        assert store.latest()["trace_id"] == "id0"      # lido do fim do ficheiro, sem readlines
+        store.log(_rec(1))
+        assert store.flush()
+    finally:
+        store.close()
+    assert not old.exists()
+    with gzip.open(tmp_path / "trace-20000101.jsonl.gz", "rt") as f:
+        assert json.loads(f.read())["trace_id"] == "id0"
+    again = TraceStore(tmp_path)
+    try:
+        assert again.latest()["trace_id"] == "id1"
+    finally:
+        again.close()
+
+
+def test_compression_waits_for_other_writers(tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    old = tmp_path / "trace-20000101.jsonl"
+    old.write_text(json.dumps(_rec(0)) + "\n")
+    other = (tmp_path / "trace.lock").open("a")       # outro worker a meio de um lote
+    fcntl.flock(other, fcntl.LOCK_SH)
+    store = TraceStore(tmp_path)
+    try:
+        store.log(_rec(1))
+        assert store.flush(timeout=0.3) is False      # escreve hoje, mas não comprime ainda
+        assert old.exists() and (tmp_path / f"trace-{_day()}.jsonl").exists()
+        fcntl.flock(other, fcntl.LOCK_UN)
+        assert store.flush()
+        assert not old.exists() and (tmp_path / "trace-20000101.jsonl.gz").exists()
+    finally:
+        other.close()
+        store.close()
+
+
+def test_write_errors_are_counted(tmp_path):
+    store = TraceStore(tmp_path)
+    try:
+        def boom(day):
+            raise OSError("disk full")
+        store._open = boom
+        store.log(_rec(1))
+        store.log(_rec(2))
+        assert store.flush()
+        assert store.stats["write_errors"] >= 1 and store.stats["lost"] == 2
+        assert "disk full" in store.last_error
+    finally:
+        store.close()
+
+
+def test_concurrent_writers_never_interleave_lines(tmp_path):
+    # dois "workers" (stores independentes) com lotes bem acima do buffer de 8 KiB
+    stores = [TraceStore(tmp_path, fsync_interval_s=0.05, sketches=False) for _ in range(2)]
+    pad = "x" * 2000
+    try:
+        for i in range(600):
+            for w, store in enumerate(stores):
+                store.log({**_rec(i, f"/w{w}"), "pad": pad})
+        assert all(s.flush() for s in stores)
+    finally:
+        for s in stores:
+            s.close()
+    lines = (tmp_path / f"trace-{_day()}.jsonl").read_text().splitlines()
+    assert len(lines) == 1200
+    assert all(json.loads(l)["pad"] == pad for l in lines)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import sys
+import textwrap
+
+import os
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from llm.ops import ts_service
+from llm.ops.ts_service import TSService, parse_tsc_output
+
+# tsserver falso (mesmo protocolo stdio): "BROKEN" numa linha → TS2304 nessa linha
+FAKE_TSSERVER = textwrap.dedent('''
+    import json, os, sys
+    files = {}
+    def out(msg):
+        data = json.dumps(msg) + "\\n"
+        sys.stdout.write("Content-Length: %d\\r\\n\\r\\n%s" % (len(data.encode()), data))
+        sys.stdout.flush()
+    def diags(path):
+        text = files.get(path)
+        if text is None:
+            text = open(path).read()
+        return [{"start": {"line": i, "offset": 1}, "text": "Cannot find name 'BROKEN'.", "code": 2304,
+                 "category": "error"} for i, l in enumerate(text.splitlines(), 1) if "BROKEN" in l]
+    for line in sys.stdin:
+        req = json.loads(line)
+        cmd, args, seq = req["command"], req["arguments"], req["seq"]
+        if cmd == "open":
+            files[args["file"]] = args.get("fileContent") or open(args["file"]).read()
+        elif cmd == "close":
+            files.pop(args["file"], None)
+        elif cmd == "reload":
+            files[args["file"]] = open(args["tmpfile"]).read()
+            out({"type": "response", "request_seq": seq, "success": True, "command": cmd})
+        elif cmd == "configure":
+            out({"type": "response", "request_seq": seq, "success": True, "command": cmd})
+        elif cmd.endswith("DiagnosticsSync"):
+            body = diags(args["file"]) if cmd.startswith("semantic") else []
+            out({"type": "response", "request_seq": seq, "success": True, "command": cmd, "body": body})
+        elif cmd == "geterrForProject":
+            root = os.path.dirname(args["file"])
+            for name in sorted(os.listdir(root)):
+                if name.endswith(".ts"):
+                    p = os.path.join(root, name)
+                    out({"type": "event", "event": "semanticDiag", "body": {"file": p, "diagnostics": diags(p)}})
+            out({"type": "event", "event": "requestCompleted", "body": {"request_seq": seq}})
+''')
+
+
+def _service(tmp_path):
+    fake = tmp_path / "fake_tsserver.py"
+    fake.write_text(FAKE_TSSERVER)
+    return TSService(tmp_path, cmd=[sys.executable, str(fake)], timeout_s=10)
+
+
+def test_parse_tsc_output_relative_paths(tmp_path):
+    text = (f"{tmp_path}/src/a.ts(3,7): error TS2304: Cannot find name 'x'.\n"
+            "src/b.tsx(10,1): warning TS6133: 'y' is declared but never used.\n"
+            "Found 2 errors.\n")
+    diags = parse_tsc_output(text, tmp_path)
+    assert [(d.file, d.line, d.col, d.code, d.category) for d in diags] == [
+        ("src/a.ts", 3, 7, "TS2304", "error"), ("src/b.tsx", 10, 1, "TS6133", "warning")]
+    assert diags[0].format().startswith("src/a.ts(3,7): error TS2304:")
+
+
+def test_daemon_is_reused_and_sees_disk_changes(tmp_path):
+    (tmp_path / "a.ts").write_text("const a = 1;\n")
+    (tmp_path / "b.ts").write_text("BROKEN;\n")
+    svc = _service(tmp_path)
+    try:
+        assert svc.diagnostics(["a.ts"]) == []
+        assert svc.error_count() == 1
+        # diff aplicado: a.ts passa a ter erro; reload por stat sem reiniciar o processo
+        (tmp_path / "a.ts").write_text("const a = 1;\nBROKEN;\n")
+        diags = svc.diagnostics(["a.ts"])
+        assert [(d.file, d.line, d.code) for d in diags] == [("a.ts", 2, "TS2304")]
+        assert svc.error_count(["a.ts"]) == 2
+        assert svc.stats == {"daemon": 4, "cold": 0, "restarts": 0}
+    finally:
+        svc.close()
+
+
+def test_in_memory_contents_do_not_touch_disk(tmp_path):
+    (tmp_path / "a.ts").write_text("const a = 1;\n")
+    svc = _service(tmp_path)
+    try:
+        assert len(svc.diagnostics(["a.ts"], contents={"a.ts": "BROKEN;\n"})) == 1
+        assert (tmp_path / "a.ts").read_text() == "const a = 1;\n"
+        assert svc.diagnostics(["a.ts"]) == []   # volta ao conteúdo do disco
+    finally:
+        svc.close()
+
+
+def test_in_memory_contents_do_not_leak_into_project_queries(tmp_path):
+    (tmp_path / "a.ts").write_text("const a = 1;\n")
+    (tmp_path / "b.ts").write_text("const b = 2;\n")
+    svc = _service(tmp_path)
+    try:
+        assert len(svc.diagnostics(["a.ts"], contents={"a.ts": "BROKEN;\n"})) == 1
+        # candidato nunca aplicado: consultas que não o pedem veem o disco
+        assert svc.error_count(["b.ts"]) == 0
+        assert svc.diagnostics(["a.ts"], contents={"a.ts": "BROKEN;\n"}) != []
+        assert svc.diagnostics(["b.ts"], contents={"b.ts": "const b = 3;\n"}) == []
+        assert svc.error_count() == 0
+    finally:
+        svc.close()
+
+
+def test_fallback_when_daemon_unavailable(tmp_path, monkeypatch):
+    svc = TSService(tmp_path, cmd=[])
+    assert not svc.available
+    with pytest.raises(RuntimeError):
+        svc.diagnostics(["a.ts"], cold=False)
+    # fallback frio sem tsc local nem npx → FileNotFoundError (os chamadores tratam)
+    monkeypatch.setattr(ts_service.shutil, "which", lambda name: None)
+    with pytest.raises(FileNotFoundError):
+        svc.diagnostics(["a.ts"], allow_npx=False)
+    assert svc.diagnostics(["README.md"]) == []